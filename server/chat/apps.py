@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chat'
+
+    def ready(self):
+        # 첫 WebSocket 연결 전에도 SIGUSR1(drain)을 받을 수 있도록 시작 시 설치
+        from . import drain
+        drain.install_signal_handler()
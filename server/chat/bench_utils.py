@@ -0,0 +1,149 @@
+"""
+벤치마크 management command 공용 유틸 (통계 계산, 임시 데이터, 결과 저장)
+"""
+import json
+import statistics
+import time
+import uuid
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+def percentile(values, pct):
+    """정렬 후 nearest-rank 방식 백분위수"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(values):
+    """지연시간(초) 목록을 ms 단위 요약 통계로 변환"""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": statistics.fmean(values) * 1000,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": max(values) * 1000,
+    }
+
+
+class Stopwatch:
+    """with 블록의 경과 시간 측정"""
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+        return False
+
+
+def rss_bytes(pid="self"):
+    """프로세스 RSS(bytes). /proc가 없는 환경에서는 None"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def create_bench_room(participants=0):
+    """벤치마크용 임시 사용자/방 생성. (room, admin_profile, participant_profiles) 반환"""
+    from login.models import UserProfile
+    from .models import ChatRoom
+
+    tag = uuid.uuid4().hex[:8]
+    admin_user = User.objects.create(username=f"bench_admin_{tag}")
+    admin_profile, _ = UserProfile.objects.get_or_create(user=admin_user)
+    room = ChatRoom.objects.create(room_name=f"bench_{tag}", admin=admin_profile)
+    room.participants.add(admin_profile)
+
+    profiles = []
+    for i in range(participants):
+        user = User.objects.create(username=f"bench_{tag}_{i}")
+        profile, _ = UserProfile.objects.get_or_create(user=user)
+        profiles.append(profile)
+    if profiles:
+        room.participants.add(*profiles)
+    return room, admin_profile, profiles
+
+
+def drop_bench_room(room, profiles=()):
+    """create_bench_room으로 만든 데이터 정리 (CASCADE로 메시지까지 삭제)"""
+    users = [room.admin.user_id] + [p.user_id for p in profiles]
+    room.delete()
+    User.objects.filter(id__in=users).delete()
+
+
+def write_results(path, name, results):
+    """결과를 JSON 파일로 저장 (추세 추적용 타임스탬프 포함)"""
+    if not path:
+        return
+    payload = {
+        "benchmark": name,
+        "recorded_at": timezone.now().isoformat(),
+        "results": results,
+    }
+    Path(path).write_text(json.dumps(payload, indent=2, ensure_ascii=False))
+
+
+def create_bench_profiles(count, prefix="bench"):
+    """벤치마크/테스트용 사용자 count명 생성 (post_save 시그널로 프로필 생성). 프로필 목록 반환"""
+    from login.models import UserProfile
+
+    tag = uuid.uuid4().hex[:8]
+    profiles = []
+    for i in range(count):
+        user = User.objects.create(username=f"{prefix}_{tag}_{i}")
+        profile, _ = UserProfile.objects.get_or_create(user=user)
+        profiles.append(profile)
+    return profiles
+
+
+def seed_member_rooms(member, owner, count, participants=(), admin_every=5):
+    """
+    member가 속한 방 count개를 bulk_create로 생성 (목록 API 부하 재현용)
+    admin_every번째 방마다 member가 방장, 나머지는 owner가 방장이고 member는 참가자.
+    participants는 모든 방에 함께 넣을 추가 참가자. 생성한 방 목록 반환
+    """
+    from .models import ChatRoom
+
+    tag = uuid.uuid4().hex[:8]
+    rooms = ChatRoom.objects.bulk_create(
+        ChatRoom(
+            room_name=f"seed_{tag}_{i}",
+            admin=member if admin_every and i % admin_every == 0 else owner,
+        )
+        for i in range(count)
+    )
+    Participant = ChatRoom.participants.through
+    rows = []
+    for room in rooms:
+        member_ids = {room.admin_id, member.id, owner.id} | {profile.id for profile in participants}
+        rows.extend(Participant(chatroom_id=room.room_uuid, userprofile_id=profile_id) for profile_id in member_ids)
+    Participant.objects.bulk_create(rows, batch_size=1000)
+    return rooms
+
+
+def seed_messages(room, senders, count, batch_size=2000):
+    """room에 senders가 번갈아 보낸 메시지 count개를 bulk_create"""
+    from .models import Message
+
+    Message.objects.bulk_create(
+        (
+            Message(room=room, sender=senders[i % len(senders)], content=f"seed message {i}")
+            for i in range(count)
+        ),
+        batch_size=batch_size,
+    )
@@ -0,0 +1,72 @@
+"""
+여러 Redis 노드에 그룹을 나눠 담는 채널 레이어
+
+channels_redis의 RedisChannelLayer는 hosts가 여러 개면 crc32 % 노드 수로 샤드를 고르는데,
+노드를 하나 추가하면 거의 모든 그룹이 다른 노드로 옮겨져 기존 그룹 멤버십이 사라진다.
+ShardedRedisChannelLayer는 가상 노드를 둔 해시 링으로 샤드를 골라 노드 추가/제거 시
+약 1/N 그룹만 이동하게 하고, 그룹 이름의 방 UUID로 해싱해서
+같은 방의 chat_<uuid> / llm_chat_<uuid> 그룹이 같은 노드에 모이게 한다.
+
+설정: CHANNEL_REDIS_HOSTS="redis1:6379,redis2:6379" (settings.CHANNEL_LAYERS 참고)
+"""
+import bisect
+import binascii
+import re
+
+from channels_redis.core import RedisChannelLayer
+
+_UUID_RE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+def _crc(value):
+    return binascii.crc32(value.encode("utf8")) & 0xFFFFFFFF
+
+
+def _host_id(host):
+    """링 위치 계산용 노드 식별자 (노드 순서가 바뀌어도 위치가 같도록 주소 기반)"""
+    if isinstance(host, dict):
+        if "address" in host:
+            return str(host["address"])
+        return f"{host.get('host', 'localhost')}:{host.get('port', 6379)}/{host.get('db', 0)}"
+    return str(host)
+
+
+def shard_key(value):
+    """
+    해싱 대상 문자열
+    - 프로세스 전용 채널("specific.<client>!<id>"): "!"까지 (send/receive가 같은 노드를 보도록)
+    - 방/세션 UUID가 들어있는 그룹 이름: UUID
+    - 그 외: 이름 그대로
+    """
+    if isinstance(value, bytes):
+        value = value.decode("utf8")
+    if "!" in value:
+        return value[:value.index("!") + 1]
+    match = _UUID_RE.search(value)
+    return match.group(0) if match else value
+
+
+class HashRing:
+    def __init__(self, node_ids, vnodes=160):
+        points = []
+        for index, node_id in enumerate(node_ids):
+            for replica in range(vnodes):
+                points.append((_crc(f"{node_id}#{replica}"), index))
+        points.sort()
+        self._points = [point for point, _ in points]
+        self._nodes = [index for _, index in points]
+
+    def get(self, key):
+        position = bisect.bisect(self._points, _crc(key)) % len(self._points)
+        return self._nodes[position]
+
+
+class ShardedRedisChannelLayer(RedisChannelLayer):
+    def __init__(self, hosts=None, vnodes=160, **kwargs):
+        super().__init__(hosts=hosts, **kwargs)
+        self.ring = HashRing([_host_id(host) for host in self.hosts], vnodes=vnodes)
+
+    def consistent_hash(self, value):
+        if self.ring_size == 1:
+            return 0
+        return self.ring.get(shard_key(value))
@@ -0,0 +1,108 @@
+"""
+WebSocket 프레임 코덱
+
+기본은 JSON 텍스트 프레임이고, 클라이언트가 Sec-WebSocket-Protocol로
+devchat.msgpack.v1 을 요청하면 같은 스키마를 MessagePack 바이너리 프레임으로 주고받는다.
+수신 시에는 협상 결과와 관계없이 텍스트는 JSON, 바이너리는 MessagePack으로 해석한다.
+멀티플렉스 연결(chat/multiplex.py)은 구독별 프레임을 wrap()으로 {"channel", "event"} 봉투에 담아 보낸다.
+"""
+import json
+
+import msgpack
+
+
+class FrameDecodeError(ValueError):
+    """프레임을 해석할 수 없거나 객체(dict)가 아닌 경우"""
+
+
+class JsonCodec:
+    name = "json"
+    subprotocol = None
+
+    def encode(self, payload):
+        return json.dumps(payload)
+
+    def decode(self, data):
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise FrameDecodeError(str(e)) from e
+
+    def wrap(self, channel, encoded):
+        """이미 인코딩된 프레임을 {"channel": ..., "event": <frame>}로 감쌈 (다시 직렬화하지 않음)"""
+        return '{"channel": ' + json.dumps(channel) + ', "event": ' + encoded + '}'
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    subprotocol = "devchat.msgpack.v1"
+
+    def encode(self, payload):
+        return msgpack.packb(payload, use_bin_type=True)
+
+    def decode(self, data):
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except (ValueError, msgpack.exceptions.UnpackException) as e:
+            raise FrameDecodeError(str(e)) from e
+
+    def wrap(self, channel, encoded):
+        """JsonCodec.wrap과 같은 구조의 2-항목 map (키/값을 이어 붙이기만 함)"""
+        return _ENVELOPE_CHANNEL + self.encode(channel) + _ENVELOPE_EVENT + encoded
+
+
+# MsgpackCodec.wrap용: fixmap(2) + "channel" 키 / "event" 키
+_ENVELOPE_CHANNEL = b"\x82" + msgpack.packb("channel")
+_ENVELOPE_EVENT = msgpack.packb("event")
+
+
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec()
+CODECS = {codec.name: codec for codec in (JSON, MSGPACK)}
+_BY_SUBPROTOCOL = {codec.subprotocol: codec for codec in CODECS.values() if codec.subprotocol}
+
+
+def negotiate(scope):
+    """클라이언트가 요청한 subprotocol 중 지원하는 첫 번째 코덱 (없으면 JSON)"""
+    for subprotocol in scope.get("subprotocols") or []:
+        codec = _BY_SUBPROTOCOL.get(subprotocol)
+        if codec:
+            return codec
+    return JSON
+
+
+def encode_all(payload):
+    """사전 직렬화용: 지원하는 모든 코덱으로 인코딩 {codec_name: encoded}"""
+    return {name: codec.encode(payload) for name, codec in CODECS.items()}
+
+
+class CodecMixin:
+    """consumer용: 협상된 코덱으로 accept / 송신 / 수신 처리"""
+
+    codec = JSON
+
+    async def accept_with_codec(self):
+        self.codec = negotiate(self.scope)
+        await self.accept(subprotocol=self.codec.subprotocol)
+
+    async def send_frame(self, payload, kind=None):
+        """dict 프레임을 협상된 코덱으로 인코딩해서 전송"""
+        await self.send_encoded(self.codec.encode(payload), kind=kind)
+
+    async def send_encoded(self, encoded, kind=None):
+        """
+        이미 인코딩된 프레임 전송 (str → 텍스트, bytes → 바이너리)
+        kind는 송신 큐(OutboundQueueMixin)의 drop/coalesce 판단에 사용
+        """
+        extra = {"kind": kind} if kind else {}
+        if isinstance(encoded, bytes):
+            await self.send(bytes_data=encoded, **extra)
+        else:
+            await self.send(text_data=encoded, **extra)
+
+    def decode_frame(self, text_data=None, bytes_data=None):
+        """수신 프레임 해석. 객체가 아니면 FrameDecodeError"""
+        data = MSGPACK.decode(bytes_data) if bytes_data is not None else JSON.decode(text_data)
+        if not isinstance(data, dict):
+            raise FrameDecodeError("frame must be an object")
+        return data
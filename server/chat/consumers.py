@@ -1,15 +1,48 @@
-import json
+import asyncio
 import uuid
+from urllib.parse import parse_qs
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.contrib.auth import get_user_model
 from .models import ChatRoom, Message, UserProfile
+from .message_buffer import get_message_buffer
+from . import dedupe, membership, message_stream, metrics, presence, ratelimit, room_hub, unread
+from .typing_indicator import typing_aggregator
+from .frames import chat_event, select_frame
+from .codecs import CodecMixin, FrameDecodeError
+from .outbound import OutboundQueueMixin, KIND_TYPING
+from .heartbeat import HeartbeatMixin, HEARTBEAT_TYPES
+from .drain import DrainMixin
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 
 User = get_user_model()
-JOINED_USERS = {}
 
-class ChatConsumer(AsyncWebsocketConsumer):
+
+def room_permission(room, user_role, user_profile):
+    """멤버십 role로 방 참여 권한 판단. 방장이거나 참가자면 connect에 쓸 방 정보, 아니면 None"""
+    is_admin = user_role == membership.ROLE_ADMIN
+    is_participant = user_role is not None
+
+    print(f"[DEBUG] 권한 확인 - 방장: {is_admin}, 참가자: {is_participant}")
+
+    if is_admin or is_participant:
+        print(f"[DEBUG] ✅ 권한 확인 완료: {user_profile.user.username} → {room.room_name}")
+
+        # async 컨텍스트에서 안전하게 사용할 수 있도록 필요한 데이터만 반환
+        return {
+            'room': room,
+            'room_name': room.room_name,
+            'admin_username': room.admin.user.username,
+            'is_admin': is_admin,
+            'is_participant': is_participant
+        }
+    print(f"[DEBUG] ❌ 참여 권한 없음: {user_profile.user.username} → {room.room_name}")
+    return None
+
+
+class ChatConsumer(DrainMixin, HeartbeatMixin, CodecMixin, OutboundQueueMixin, AsyncWebsocketConsumer):
     async def connect(self):
         try:
             print(f"\n[DEBUG] ========== WebSocket 연결 시도 ==========")
@@ -50,8 +83,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.room_group_name = f"chat_{str(self.room_uuid)}"
             print(f"[DEBUG] 그룹 이름: {self.room_group_name}")
             
-            # 3. 사용자 프로필 가져오기
-            self.user_profile = await self._get_user_profile(self.user)
+            # 3. 사용자 프로필 가져오기 (ProfileScopeMiddleware가 연결 시 캐시에서 조회, 없으면 DB)
+            self.user_profile = self.scope.get('profile') or await self._get_user_profile(self.user)
             if not self.user_profile:
                 print(f"[ERROR] UserProfile 가져오기 실패")
                 await self.close(code=4001)
@@ -74,38 +107,36 @@ class ChatConsumer(AsyncWebsocketConsumer):
             
             print(f"[DEBUG] 권한 확인 완료 - 방: {room_name}, 방장: {admin_username}")
 
-            # 5. 그룹 가입 및 연결 수락
+            # 5. 그룹 가입 및 연결 수락 (대형 방 모드면 이 프로세스의 방 허브에도 등록)
             await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-            await self.accept()
+            if room_hub.enabled():
+                await room_hub.get_room_hub().join(self.room_uuid, self)
+                self._hub_joined = True
+            await self.accept_with_codec()
             
             print(f"[SUCCESS] ✅ WebSocket 연결 성공: {self.username} → {room_name} ({self.room_uuid})")
+
+            # 재접속: 클라이언트가 마지막으로 받은 메시지 이후만 재전송
+            last_message_id = self._last_message_id_from_query()
+            if last_message_id is not None:
+                await self._replay_missed_messages(last_message_id)
             
-            # 6. 최초 입장인지 확인 후 메시지 전송
-            room_uuid_str = str(self.room_uuid)
-            user_id = self.user_profile.id
-            
-            # 방별 입장 사용자 목록이 없으면 생성
-            if room_uuid_str not in JOINED_USERS:
-                JOINED_USERS[room_uuid_str] = set()
+            # 6. 클러스터 전체 presence 등록 후 최초 입장인지 확인
+            connection_count = await presence.join(
+                self.room_uuid, self.user_profile.id, self.username, self.channel_name
+            )
+            self._presence_task = self._start_presence_heartbeat()
+            presence.watch(self.room_uuid, self.channel_name, self._broadcast_user_left)
             
-            # 이미 입장 메시지를 보낸 사용자인지 확인
-            if user_id not in JOINED_USERS[room_uuid_str]:
+            # 이 사용자의 첫 번째 연결일 때만 입장 메시지 전송
+            if connection_count == 1:
                 # 🎉 최초 입장! 입장 메시지 전송
-                JOINED_USERS[room_uuid_str].add(user_id)
-                
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        "type": "user_joined",
-                        "username": self.username,
-                        "message": f"{self.username}님이 입장했습니다.",
-                        "timestamp": timezone.now().isoformat(),
-                        "room_name": room_name,
-                    }
-                )
+                await self._broadcast_user_joined()
                 print(f"[DEBUG] 🎉 최초 입장 메시지 전송: {self.username}")
+            elif connection_count is None:
+                print(f"[WARNING] presence 확인 불가 (입장 메시지 스킵): {self.username}")
             else:
-                print(f"[DEBUG] 🔄 재연결 (입장 메시지 스킵): {self.username}")
+                print(f"[DEBUG] 🔄 추가 연결 (입장 메시지 스킵): {self.username} - 연결 {connection_count}개")
             
             
         except Exception as e:
@@ -116,27 +147,28 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         try:
+            presence_task = getattr(self, '_presence_task', None)
+            if presence_task:
+                presence_task.cancel()
+                presence.unwatch(self.room_uuid, self.channel_name)
+
+            if getattr(self, '_hub_joined', False):
+                await room_hub.get_room_hub().leave(self.room_uuid, self)
+
             if hasattr(self, 'room_group_name') and hasattr(self, 'username'):
-                # 퇴장 시 사용자 목록에서 제거
-                room_uuid_str = str(getattr(self, 'room_uuid', ''))
-                user_id = getattr(self, 'user_profile', {}).id if hasattr(self, 'user_profile') else None
-                
-                if room_uuid_str in JOINED_USERS and user_id:
-                    JOINED_USERS[room_uuid_str].discard(user_id)  # set에서 안전하게 제거
-                    print(f"[DEBUG] 🚪 사용자 목록에서 제거: {self.username}")
-                
-                # 퇴장 메시지 전송
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        "type": "user_left",
-                        "username": self.username,
-                        "message": f"{self.username}님이 퇴장했습니다.",
-                        "timestamp": timezone.now().isoformat(),
-                    }
-                )
-                
-                # 그룹에서 제거
+                if presence_task:
+                    # presence에서 이 연결 제거 (클러스터 전체 기준 남은 연결 수)
+                    remaining = await presence.leave(self.room_uuid, self.user_profile.id, self.channel_name)
+
+                    # 마지막 연결이 끊겼을 때만 퇴장 메시지 전송
+                    if remaining == 0:
+                        await typing_aggregator.update(
+                            self.room_uuid, self.room_group_name, self.username, False
+                        )
+                        print(f"[DEBUG] 🚪 마지막 연결 종료: {self.username}")
+                        await self._broadcast_user_left(self.username)
+
+                # 그룹에서 제거 (presence 등록 전에 끊긴 연결도 그룹에는 가입되어 있음)
                 await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
                 
             print(f"[DEBUG] WebSocket 연결 종료: {getattr(self, 'username', 'Unknown')} (code: {close_code})")
@@ -145,11 +177,11 @@ class ChatConsumer(AsyncWebsocketConsumer):
             print(f"[ERROR] WebSocket 연결 종료 중 오류: {e}")
 
     async def receive(self, text_data=None, bytes_data=None):
-        if not text_data:
+        if not text_data and not bytes_data:
             return
 
         try:
-            data = json.loads(text_data)
+            data = self.decode_frame(text_data, bytes_data)
             message_type = data.get("type", "")
             
             print(f"[DEBUG] 메시지 수신: type={message_type}, data={data}")
@@ -159,15 +191,21 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 await self._handle_chat_message(data)
             elif message_type == "typing":
                 await self._handle_typing_indicator(data)
+            elif message_type == "get_online_users":
+                await self._handle_get_online_users()
+            elif message_type == "mark_read":
+                await self._handle_mark_read()
+            elif message_type in HEARTBEAT_TYPES:
+                await self.handle_heartbeat_frame(data)
             else:
                 print(f"[WARNING] 알 수 없는 메시지 타입: {message_type}")
                 
-        except json.JSONDecodeError as e:
-            print(f"[ERROR] JSON 파싱 실패: {e}")
-            await self.send(text_data=json.dumps({
+        except FrameDecodeError as e:
+            print(f"[ERROR] 프레임 파싱 실패: {e}")
+            await self.send_frame({
                 "type": "error",
                 "message": "잘못된 메시지 형식입니다."
-            }))
+            })
         except Exception as e:
             print(f"[ERROR] 메시지 처리 실패: {e}")
             import traceback
@@ -182,73 +220,265 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         # 메시지 길이 제한
         if len(message) > 1000:
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 "type": "error",
                 "message": "메시지가 너무 깁니다. (최대 1000자)"
-            }))
+            })
+            return
+
+        try:
+            client_msg_id = dedupe.valid_client_msg_id(data.get("client_msg_id"))
+        except ValueError as e:
+            await self.send_frame({"type": "error", "message": str(e)})
+            return
+
+        # 재전송된 프레임: 이미 처리한 client_msg_id면 저장/브로드캐스트 없이 ack만 다시 보냄
+        if client_msg_id:
+            existing = await dedupe.aclaim(self.room_uuid, self.user_profile.id, client_msg_id)
+            if existing is not None and existing["pending"]:
+                # 첫 요청이 아직 처리 중: ack 없이 재전송 요청 (클라이언트는 메시지를 보관하고 다시 보냄)
+                await self.send_frame({
+                    "type": "error",
+                    "code": "message_pending",
+                    "message": "이전 전송을 처리 중입니다. 잠시 후 다시 보내주세요.",
+                    "client_msg_id": client_msg_id,
+                    "retry_after": dedupe.pending_retry_after(),
+                })
+                return
+            if existing is not None:
+                metrics.inc("chat_duplicate_messages_total")
+                await self._send_ack(
+                    client_msg_id, existing["message_id"], existing["timestamp"], True, existing["provisional_id"]
+                )
+                return
+
+        # 사용자별 → 방 전체 순으로 요청 제한 (DB 저장 전에 차단)
+        decision = await ratelimit.ahit_all(
+            ("ws_chat_message:user", self.user_profile.id),
+            ("ws_chat_message:room", self.room_uuid),
+        )
+        if not decision.allowed:
+            if client_msg_id:
+                await dedupe.arelease(self.room_uuid, self.user_profile.id, client_msg_id)
+            await self.send_frame(ratelimit.rate_limited_frame(decision))
             return
 
         print(f"[DEBUG] 채팅 메시지 처리: {self.username} → {message}")
 
-        # 메시지 DB에 저장
-        stored_message = await self._save_message(self.room, self.user_profile, message)
+        if getattr(settings, 'CHAT_WRITE_BEHIND', False):
+            # write-behind 모드: 임시 ID로 먼저 브로드캐스트, 저장은 flusher가 배치로 처리
+            pending = await get_message_buffer().enqueue(
+                self.room.room_uuid, self.user_profile.id, message, self.room_group_name,
+                username=self.username, client_msg_id=client_msg_id,
+            )
+            message_id = None
+            provisional_id = pending.provisional_id
+            timestamp = pending.created_at.isoformat()
+            if client_msg_id:
+                await dedupe.aresolve(
+                    self.room_uuid, self.user_profile.id, client_msg_id,
+                    provisional_id=provisional_id, timestamp=timestamp,
+                )
+        else:
+            # 메시지 DB에 저장
+            stored_message, created = await self._save_message(self.room, self.user_profile, message, client_msg_id)
+            
+            if not stored_message:
+                if client_msg_id:
+                    await dedupe.arelease(self.room_uuid, self.user_profile.id, client_msg_id)
+                await self.send_frame({
+                    "type": "error",
+                    "message": "메시지 저장 중 오류가 발생했습니다."
+                })
+                return
+
+            message_id = stored_message.id
+            provisional_id = None
+            timestamp = stored_message.created_at.isoformat()
+            if client_msg_id:
+                await dedupe.aresolve(
+                    self.room_uuid, self.user_profile.id, client_msg_id, message_id=message_id, timestamp=timestamp
+                )
+            if not created:
+                # Redis 선점이 없었거나 윈도우가 지난 재전송: DB unique 제약에 걸린 기존 메시지
+                metrics.inc("chat_duplicate_messages_total")
+                await self._send_ack(client_msg_id, message_id, timestamp, True)
+                return
+
+        if client_msg_id:
+            await self._send_ack(client_msg_id, message_id, timestamp, False, provisional_id)
         
-        if not stored_message:
-            await self.send(text_data=json.dumps({
-                "type": "error",
-                "message": "메시지 저장 중 오류가 발생했습니다."
-            }))
-            return
+        frame = {
+            "type": "chat_message",  # ✅ 프론트엔드가 기대하는 타입
+            "message": message,
+            "username": self.username,
+            "message_id": message_id,
+            "timestamp": timestamp,
+        }
+        if provisional_id:
+            # write-behind 모드: 저장 전이므로 message_committed로 실제 ID가 나중에 전달됨
+            frame["provisional_id"] = provisional_id
+        if client_msg_id:
+            frame["client_msg_id"] = client_msg_id
+
+        # 그룹의 모든 사용자에게 메시지 전송 (프레임은 여기서 한 번만 직렬화, 대형 방은 워커별 허브로)
+        await room_hub.room_send(
+            self.room_uuid,
+            self.room_group_name,
+            chat_event(frame, self.user_profile.id)
+        )
         
-        # 그룹의 모든 사용자에게 메시지 전송
-        await self.channel_layer.group_send(
+        print(f"[DEBUG] 메시지 브로드캐스트 완료: {message}")
+
+    async def _send_ack(self, client_msg_id, message_id, timestamp, duplicate, provisional_id=None):
+        """발신자에게만 보내는 처리 확인 (재전송이면 duplicate=True, message_id는 처음 저장된 메시지)"""
+        frame = {
+            "type": "ack",
+            "client_msg_id": client_msg_id,
+            "message_id": message_id,
+            "timestamp": timestamp,
+            "duplicate": duplicate,
+        }
+        if provisional_id:
+            frame["provisional_id"] = provisional_id
+        await self.send_frame(frame)
+
+    def _last_message_id_from_query(self):
+        """?last_message_id=<id> 파싱 (없거나 잘못된 값이면 None)"""
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        try:
+            return int(query["last_message_id"][0])
+        except (KeyError, IndexError, ValueError):
+            return None
+
+    async def _replay_missed_messages(self, last_message_id):
+        """
+        놓친 메시지를 missed_messages 프레임 하나로 전송
+        Redis 스트림이 구간을 덮으면 스트림에서, 아니면 DB id 범위 조회로 가져온다.
+        재전송 중 도착한 실시간 메시지와 겹칠 수 있으므로 클라이언트는 message_id로 중복 제거한다.
+        """
+        limit = getattr(settings, 'CHAT_RESUME_MAX_MESSAGES', 500)
+        result = await message_stream.since(self.room_uuid, last_message_id, limit)
+        source = "stream"
+        if result is None:
+            result = await self._get_messages_since(self.room, last_message_id, limit)
+            source = "db"
+        missed, has_more = result
+
+        await self.send_frame({
+            "type": "missed_messages",
+            "messages": [
+                {
+                    "type": "chat_message",
+                    "message": message["content"],
+                    "username": message["username"],
+                    "message_id": message["id"],
+                    "timestamp": message["created_at"],
+                    "is_self": message["sender_id"] == self.user_profile.id,
+                }
+                for message in missed
+            ],
+            # True면 재전송 한도를 넘었으므로 REST로 최신 페이지를 다시 불러와야 함
+            "has_more": has_more,
+        })
+        print(f"[DEBUG] 놓친 메시지 재전송: {self.username} - {len(missed)}개 ({source})")
+
+    async def _handle_mark_read(self):
+        """방의 현재 메시지까지 읽음 처리 (last_read_at은 presence heartbeat 때 지연 반영)"""
+        if not await unread.amark_read(self.room_uuid, self.user_profile.id):
+            await database_sync_to_async(unread.write_last_read_at)(
+                self.room_uuid, self.user_profile.id, timezone.now()
+            )
+        await self.send_frame({
+            "type": "unread_count",
+            "room_uuid": str(self.room_uuid),
+            "unread_count": 0,
+        })
+
+    async def _handle_get_online_users(self):
+        """현재 방 접속자 목록 응답 (presence HGETALL 한 번)"""
+        members = await presence.online_members(self.room_uuid)
+        await self.send_frame({
+            "type": "online_users",
+            "users": members,
+            "count": len(members),
+        })
+
+    def _start_presence_heartbeat(self):
+        """presence 갱신 태스크 시작 (disconnect에서 cancel)"""
+        return asyncio.create_task(self._presence_heartbeat())
+
+    async def _presence_heartbeat(self):
+        """presence TTL 갱신 (끊긴 다른 연결 정리와 읽음 시각 반영은 워커 단위 reaper가 담당)"""
+        interval = presence.heartbeat_interval()
+        while True:
+            await asyncio.sleep(interval)
+            await self.refresh_presence()
+
+    async def refresh_presence(self):
+        """이 연결의 presence TTL 한 번 갱신"""
+        try:
+            rejoined = await presence.heartbeat(
+                self.room_uuid, self.user_profile.id, self.username, self.channel_name
+            )
+            if rejoined:
+                # 정리됐던 연결이 다시 살아난 경우 입장으로 처리
+                await self._broadcast_user_joined()
+        except Exception as e:
+            print(f"[ERROR] presence heartbeat 실패: {e}")
+
+    async def _broadcast_user_joined(self):
+        await room_hub.room_send(
+            self.room_uuid,
             self.room_group_name,
             {
-                "type": "chat_message",  # 이벤트 핸들러 이름
-                "message": message,
+                "type": "user_joined",
                 "username": self.username,
-                "message_id": stored_message.id,
-                "timestamp": stored_message.created_at.isoformat(),
-                "sender_id": self.user_profile.id,
+                "message": f"{self.username}님이 입장했습니다.",
+                "timestamp": timezone.now().isoformat(),
+                "room_name": self.room.room_name,
             }
         )
-        
-        print(f"[DEBUG] 메시지 브로드캐스트 완료: {message}")
 
-    async def _handle_typing_indicator(self, data):
-        """타이핑 표시 처리"""
-        is_typing = data.get("is_typing", False)
-        
-        print(f"[DEBUG] 타이핑 표시: {self.username} → {is_typing}")
-        
-        await self.channel_layer.group_send(
+    async def _broadcast_user_left(self, username):
+        await room_hub.room_send(
+            self.room_uuid,
             self.room_group_name,
             {
-                "type": "typing_indicator",
-                "username": self.username,
-                "is_typing": is_typing,
+                "type": "user_left",
+                "username": username,
+                "message": f"{username}님이 퇴장했습니다.",
+                "timestamp": timezone.now().isoformat(),
             }
         )
 
+    async def _handle_typing_indicator(self, data):
+        """타이핑 표시 처리 - 방 단위 집계기로 넘겨 묶어서 브로드캐스트"""
+        is_typing = bool(data.get("is_typing", False))
+        # 입력 시작 이벤트만 제한 (입력 종료는 항상 반영)
+        if is_typing and not (await ratelimit.ahit("ws_typing:user", self.user_profile.id)).allowed:
+            return
+        await typing_aggregator.update(self.room_uuid, self.room_group_name, self.username, is_typing)
+
     # ==================== WebSocket 이벤트 핸들러들 ====================
     
     async def chat_message(self, event):
-        """채팅 메시지 전송 - 프론트엔드와 타입 일치"""
-        # 현재 사용자가 메시지 발송자인지 확인
-        is_self = event.get("sender_id") == self.user_profile.id
-        
-        message_data = {
-            "type": "chat_message",  # ✅ 프론트엔드가 기대하는 타입
-            "message": event.get("message"),
-            "username": event.get("username"),
-            "message_id": event.get("message_id"),
-            "timestamp": event.get("timestamp"),  # created_at → timestamp로 통일
-            "is_self": is_self,  # ✅ 본인 메시지 여부
-        }
-        
-        print(f"[DEBUG] 메시지 전송: {self.username} ← {message_data}")
-        
-        await self.send(text_data=json.dumps(message_data))
+        """채팅 메시지 전송 - 발신자가 미리 직렬화한 프레임을 그대로 전송"""
+        await self.send_encoded(select_frame(event, self.user_profile.id, self.codec.name))
+
+    async def message_committed(self, event):
+        """write-behind 저장 완료 알림 (provisional_id → message_id)"""
+        await self.send_frame({
+            "type": "message_committed",
+            "commits": event.get("commits", []),
+        })
+
+    async def message_failed(self, event):
+        """write-behind 저장 포기 알림 (임시 메시지 제거용)"""
+        await self.send_frame({
+            "type": "message_failed",
+            "provisional_ids": event.get("provisional_ids", []),
+        })
 
     async def user_joined(self, event):
         """사용자 입장 알림"""
@@ -262,7 +492,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
         
         print(f"[DEBUG] 입장 알림: {join_data}")
         
-        await self.send(text_data=json.dumps(join_data))
+        await self.send_frame(join_data)
 
     async def user_left(self, event):
         """사용자 퇴장 알림"""
@@ -275,21 +505,16 @@ class ChatConsumer(AsyncWebsocketConsumer):
         
         print(f"[DEBUG] 퇴장 알림: {leave_data}")
         
-        await self.send(text_data=json.dumps(leave_data))
+        await self.send_frame(leave_data)
 
-    async def typing_indicator(self, event):
-        """타이핑 표시"""
+    async def typing_users(self, event):
+        """현재 입력 중인 사용자 목록 (방 단위로 묶인 이벤트)"""
         # 자신의 타이핑 표시는 보내지 않음
-        if event.get("username") != self.username:
-            typing_data = {
-                "type": "typing",
-                "username": event.get("username"),
-                "is_typing": event.get("is_typing"),
-            }
-            
-            print(f"[DEBUG] 타이핑 표시: {typing_data}")
-            
-            await self.send(text_data=json.dumps(typing_data))
+        users = [username for username in event.get("users", []) if username != self.username]
+        await self.send_frame({
+            "type": "typing_users",
+            "users": users,
+        }, kind=KIND_TYPING)
 
     # ==================== 데이터베이스 접근 함수들 ====================
     
@@ -319,26 +544,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
             room = ChatRoom.objects.select_related('admin__user').get(room_uuid=room_uuid)
             print(f"[DEBUG] 방 조회 성공: {room.room_name}")
             
-            # 참여 권한 확인: 방장이거나 참가자여야 함
-            is_admin = room.admin == user_profile
-            is_participant = user_profile in room.participants.all()
-            
-            print(f"[DEBUG] 권한 확인 - 방장: {is_admin}, 참가자: {is_participant}")
-            
-            if is_admin or is_participant:
-                print(f"[DEBUG] ✅ 권한 확인 완료: {user_profile.user.username} → {room.room_name}")
-                
-                # async 컨텍스트에서 안전하게 사용할 수 있도록 필요한 데이터만 반환
-                return {
-                    'room': room,
-                    'room_name': room.room_name,
-                    'admin_username': room.admin.user.username,
-                    'is_admin': is_admin,
-                    'is_participant': is_participant
-                }
-            else:
-                print(f"[DEBUG] ❌ 참여 권한 없음: {user_profile.user.username} → {room.room_name}")
-                return None
+            # 참여 권한 확인: 방장이거나 참가자여야 함 (멤버십 인덱스 사용)
+            return room_permission(room, membership.role(room_uuid, user_profile.id), user_profile)
                 
         except ChatRoom.DoesNotExist:
             print(f"[DEBUG] ❌ 방이 존재하지 않음: {room_uuid}")
@@ -350,19 +557,50 @@ class ChatConsumer(AsyncWebsocketConsumer):
             return None
 
     @database_sync_to_async
-    def _save_message(self, room: ChatRoom, sender: UserProfile, content: str):
-        """메시지 DB에 저장"""
+    def _save_message(self, room: ChatRoom, sender: UserProfile, content: str, client_msg_id=None):
+        """메시지 DB에 저장. (message, created) 반환 - 같은 client_msg_id가 이미 있으면 기존 메시지와 False"""
         try:
-            message = Message.objects.create(
-                room=room, 
-                sender=sender, 
-                content=content,
-                created_at=timezone.now()
-            )
+            try:
+                with transaction.atomic():
+                    message = Message.objects.create(
+                        room=room, 
+                        sender=sender, 
+                        content=content,
+                        created_at=timezone.now(),
+                        client_msg_id=client_msg_id,
+                    )
+            except IntegrityError:
+                if not client_msg_id:
+                    raise
+                return Message.objects.get(room=room, sender=sender, client_msg_id=client_msg_id), False
             print(f"[DEBUG] 메시지 저장 성공: {sender.user.username} → {content[:50]}...")
-            return message
+            message_stream.append(room.room_uuid, [message_stream.entry_fields(
+                message.id, sender.id, sender.user.username, content, message.created_at
+            )])
+            unread.messages_saved(room.room_uuid, [sender.id])
+            return message, True
         except Exception as e:
             print(f"[ERROR] 메시지 저장 실패: {e}")
             import traceback
             traceback.print_exc()
-            return None
\ No newline at end of file
+            return None, False
+
+    @database_sync_to_async
+    def _get_messages_since(self, room: ChatRoom, last_message_id: int, limit: int):
+        """last_message_id 이후 메시지 (PK 범위 조회, 오래된 순). (messages, has_more) 반환"""
+        rows = list(
+            Message.objects.filter(room=room, id__gt=last_message_id)
+            .order_by('id')
+            .values_list('id', 'sender_id', 'sender__user__username', 'content', 'created_at')[:limit + 1]
+        )
+        messages = [
+            {
+                "id": message_id,
+                "sender_id": sender_id,
+                "username": username,
+                "content": content,
+                "created_at": created_at.isoformat(),
+            }
+            for message_id, sender_id, username, content, created_at in rows[:limit]
+        ]
+        return messages, len(rows) > limit
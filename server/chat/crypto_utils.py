@@ -27,6 +27,12 @@ def get_master_key() -> bytes:
 
     return key
 
+
+# AESGCM 객체 재사용 (마스터키가 고정이므로 매 호출마다 새로 만들 필요 없음, encrypt/decrypt는 스레드 안전)
+@lru_cache(maxsize=1)
+def get_cipher() -> AESGCM:
+    return AESGCM(get_master_key())
+
 # 채팅방 고유 TOTP 비밀키 생성
 def generate_pseudo_number():
     """
@@ -49,8 +55,7 @@ def encrypt_aes_gcm(secret_key: bytes, iv: bytes) -> str:
     AES-GCM으로 secret_key 를 암호화하고,
     (iv + ciphertext) 바이트를 base64 문자열로 인코딩해서 반환.
     """
-    master_key = get_master_key()
-    aesgcm = AESGCM(master_key)
+    aesgcm = get_cipher()
 
     # ciphertext에는 tag까지 포함됨
     ciphertext = aesgcm.encrypt(iv, secret_key, None)
@@ -64,11 +69,9 @@ def decrypt_aes_gcm(b64_data: str) -> bytes:
     base64(iv + ciphertext) 문자열을 복호화해
     원래 secret_key(bytes)를 반환.
     """
-    master_key = get_master_key()
     data = base64.b64decode(b64_data)
 
     iv = data[:12]
     ciphertext = data[12:]
 
-    aesgcm = AESGCM(master_key)
-    return aesgcm.decrypt(iv, ciphertext, None)
\ No newline at end of file
+    return get_cipher().decrypt(iv, ciphertext, None)
\ No newline at end of file
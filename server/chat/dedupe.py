@@ -0,0 +1,150 @@
+"""
+채팅 메시지 재전송 중복 제거 (client_msg_id)
+
+클라이언트가 chat_message 프레임에 client_msg_id를 붙이면 (방, 발신자, client_msg_id)마다
+Redis 키 하나를 SET NX로 선점한 뒤 저장한다. 재접속 후 같은 프레임을 다시 보내면
+선점에 실패하므로 DB 쓰기와 브로드캐스트 없이 기존 message_id로 ack만 보낸다.
+
+- dedupe:<room_uuid>:<sender_id>:<client_msg_id>  STRING  "pending" → 저장 후 "<message_id>|<timestamp>"
+  (write-behind 모드에서는 저장 전까지 "p:<provisional_id>|<timestamp>")
+  중복 ack에 처음 메시지의 timestamp를 그대로 돌려주기 위해 함께 저장한다.
+
+"pending"은 짧은 TTL(CHAT_DEDUPE_PENDING_TTL)로 선점하고 결과를 기록할 때 윈도우 전체로 늘린다.
+저장 도중 프로세스가 죽어도 pending이 윈도우 내내 남지 않으므로 재전송이 message_id 없는 중복으로 처리되어 유실되지 않는다.
+재전송이 pending을 만나면 잠시 결과를 기다리고, 그동안 선점이 풀리면 재전송이 선점해서 저장을 진행한다.
+
+윈도우(CHAT_DEDUPE_WINDOW)가 지났거나 Redis 장애로 선점하지 못한 경우에는
+Message의 (room, sender, client_msg_id) unique 제약이 마지막으로 중복 저장을 막는다.
+"""
+import asyncio
+import time
+
+import redis
+from django.conf import settings
+
+from .redis_utils import redis_client, get_async_redis
+
+DEDUPE_KEY = "dedupe:{}:{}:{}"
+PENDING = "pending"
+PROVISIONAL_PREFIX = "p:"
+MAX_CLIENT_MSG_ID_LENGTH = 64
+
+# 선점 성공이면 nil, 이미 있으면 기존 값 반환
+_CLAIM_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return false
+end
+return redis.call('GET', KEYS[1])
+"""
+
+
+def _window():
+    return getattr(settings, 'CHAT_DEDUPE_WINDOW', 600)
+
+
+def _pending_ttl():
+    return getattr(settings, 'CHAT_DEDUPE_PENDING_TTL', 15)
+
+
+def _pending_wait():
+    return getattr(settings, 'CHAT_DEDUPE_PENDING_WAIT', 2.0)
+
+
+def _key(room_uuid, sender_id, client_msg_id):
+    return DEDUPE_KEY.format(str(room_uuid), sender_id, client_msg_id)
+
+
+def valid_client_msg_id(value):
+    """프레임의 client_msg_id 검증 (없으면 None, 잘못된 값이면 ValueError)"""
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str) or len(value) > MAX_CLIENT_MSG_ID_LENGTH:
+        raise ValueError(f"client_msg_id는 {MAX_CLIENT_MSG_ID_LENGTH}자 이하 문자열이어야 합니다.")
+    return value
+
+
+async def aclaim(room_uuid, sender_id, client_msg_id):
+    """
+    client_msg_id 선점. 처음 보는 ID면 None을 반환하고 호출 측이 저장을 진행한다.
+    이미 처리된 ID면 {"message_id": int|None, "provisional_id": str|None, "timestamp": str|None, "pending": False}
+    첫 요청이 CHAT_DEDUPE_PENDING_WAIT초 안에 끝나지 않으면 "pending": True (호출 측은 재전송을 요청)
+    Redis 장애 시에는 None (DB unique 제약으로 fallback)
+    """
+    key = _key(room_uuid, sender_id, client_msg_id)
+    deadline = time.monotonic() + _pending_wait()
+    while True:
+        try:
+            existing = await get_async_redis().eval(_CLAIM_SCRIPT, 1, key, PENDING, _pending_ttl())
+        except redis.RedisError as e:
+            print(f"[WARNING] 메시지 중복 확인 실패, DB 제약으로 대체: {e}")
+            return None
+        if existing is None:
+            return None
+        if existing != PENDING:
+            return _parse(existing)
+        # 첫 요청이 아직 저장 중: 결과가 기록되거나 선점이 풀릴 때까지 잠시 대기
+        if time.monotonic() >= deadline:
+            return {"message_id": None, "provisional_id": None, "timestamp": None, "pending": True}
+        await asyncio.sleep(0.05)
+
+
+def pending_retry_after():
+    """pending 응답을 받은 클라이언트에 권하는 재전송 간격(초)"""
+    return _pending_wait()
+
+
+def _parse(value):
+    result, _, timestamp = value.partition("|")
+    parsed = {"message_id": None, "provisional_id": None, "timestamp": timestamp or None, "pending": False}
+    if result.startswith(PROVISIONAL_PREFIX):
+        parsed["provisional_id"] = result[len(PROVISIONAL_PREFIX):]
+    else:
+        parsed["message_id"] = int(result)
+    return parsed
+
+
+def _set_value(client, room_uuid, sender_id, client_msg_id, value, timestamp):
+    # pending의 짧은 TTL을 윈도우 전체로 연장 (선점이 이미 풀렸으면 기록하지 않음)
+    return client.set(
+        _key(room_uuid, sender_id, client_msg_id), f"{value}|{timestamp or ''}", xx=True, ex=_window()
+    )
+
+
+async def aresolve(room_uuid, sender_id, client_msg_id, message_id=None, provisional_id=None, timestamp=None):
+    """저장(또는 write-behind 버퍼 등록) 후 선점 키에 결과와 timestamp 기록"""
+    value = message_id if message_id is not None else f"{PROVISIONAL_PREFIX}{provisional_id}"
+    try:
+        await _set_value(get_async_redis(), room_uuid, sender_id, client_msg_id, value, timestamp)
+    except redis.RedisError as e:
+        print(f"[WARNING] 메시지 중복 키 갱신 실패: {e}")
+
+
+def resolve_many(resolved):
+    """write-behind 저장 후 [(room_uuid, sender_id, client_msg_id, message_id, timestamp)]를 파이프라인 한 번으로 기록"""
+    if not resolved:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for room_uuid, sender_id, client_msg_id, message_id, timestamp in resolved:
+            _set_value(pipe, room_uuid, sender_id, client_msg_id, message_id, timestamp)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"[WARNING] 메시지 중복 키 갱신 실패: {e}")
+
+
+def release_many(claims):
+    """write-behind 저장을 포기한 [(room_uuid, sender_id, client_msg_id)]의 선점 해제"""
+    if not claims:
+        return
+    try:
+        redis_client.delete(*(_key(room_uuid, sender_id, client_msg_id) for room_uuid, sender_id, client_msg_id in claims))
+    except redis.RedisError as e:
+        print(f"[WARNING] 메시지 중복 키 삭제 실패: {e}")
+
+
+async def arelease(room_uuid, sender_id, client_msg_id):
+    """저장 실패 시 선점 해제 (클라이언트가 같은 ID로 다시 보낼 수 있도록)"""
+    try:
+        await get_async_redis().delete(_key(room_uuid, sender_id, client_msg_id))
+    except redis.RedisError as e:
+        print(f"[WARNING] 메시지 중복 키 삭제 실패: {e}")
@@ -0,0 +1,216 @@
+"""
+WebSocket 워커 drain 모드 (배포 전 연결을 천천히 내보내기)
+
+daphne 컨테이너를 그냥 재시작하면 연결이 한꺼번에 끊기고, 모든 클라이언트가 동시에 재접속하면서
+프로필 조회와 방 권한 확인이 몰린다. drain 모드에서 이 프로세스는 다음과 같이 동작한다.
+- 새 WebSocket은 consumer 로직(DB 조회) 없이 바로 reconnect 힌트를 보내고 닫는다.
+- 기존 연결은 CHAT_DRAIN_WINDOW초 안의 임의 시각에 하나씩 reconnect 힌트를 보내고 닫는다.
+- 진행 중인 AI 응답이 있는 연결은 응답이 끝날 때까지(최대 CHAT_DRAIN_AI_GRACE초) 기다렸다가 닫는다.
+
+reconnect 힌트: {"type": "reconnect", "reason": "drain", "delay_ms": 0~CHAT_DRAIN_RECONNECT_JITTER_MS}
+클라이언트는 delay_ms만큼 기다린 뒤 재접속(last_message_id로 이어받기)한다.
+close code는 CHAT_DRAIN_CLOSE_CODE(기본 1012, Service Restart).
+
+시작 방법
+- 시그널: kill -USR1 <daphne pid> (이 프로세스만, 핸들러는 앱 로딩 시 설치)
+- 관리 명령: python manage.py drain_websockets [--host <hostname>] [--window 60] [--cancel]
+  Redis 키(ws:drain:all / ws:drain:<hostname>)를 남기면 각 워커가 CHAT_DRAIN_POLL_INTERVAL마다 확인한다.
+  키보다 나중에 시작된 프로세스(재시작된 컨테이너)는 drain하지 않는다.
+"""
+import asyncio
+import json
+import random
+import signal
+import socket
+import threading
+import time
+
+import redis
+from django.conf import settings
+
+from . import metrics
+from .redis_utils import get_async_redis, redis_client
+
+DRAIN_KEY = "ws:drain:{}"
+ALL_HOSTS = "all"
+
+_STARTED_AT = time.time()
+
+_consumers = set()
+_state = {"draining": False, "source": None, "deadline": 0.0}
+_watchers = {}
+
+
+def _window():
+    return getattr(settings, 'CHAT_DRAIN_WINDOW', 60)
+
+
+def hostname():
+    return socket.gethostname()
+
+
+def is_draining():
+    return _state["draining"]
+
+
+# ==================== drain 시작 / 취소 ====================
+
+def start_drain(window=None, source="signal"):
+    """이 프로세스의 연결을 window초에 걸쳐 종료 시작 (이미 drain 중이면 무시)"""
+    if _state["draining"]:
+        return
+    window = _window() if window is None else window
+    _state.update(draining=True, source=source, deadline=time.monotonic() + window)
+    metrics.gauge_set("ws_draining", 1)
+    print(f"[WARNING] drain 시작 ({source}): 연결 {len(_consumers)}개를 {window}초에 걸쳐 종료")
+    for consumer in list(_consumers):
+        _schedule_close(consumer)
+
+
+def stop_drain():
+    """drain 취소 (아직 닫히지 않은 연결은 유지하고 새 연결을 다시 받음)"""
+    if not _state["draining"]:
+        return
+    _state.update(draining=False, source=None)
+    metrics.gauge_set("ws_draining", 0)
+    for consumer in list(_consumers):
+        task = consumer._drain_task
+        if task is not None and not task.done():
+            task.cancel()
+        consumer._drain_task = None
+    print(f"[WARNING] drain 취소")
+
+
+def _schedule_close(consumer):
+    if consumer._drain_task is not None:
+        return
+    remaining = max(0.0, _state["deadline"] - time.monotonic())
+    consumer._drain_task = asyncio.create_task(_close_gradually(consumer, random.uniform(0, remaining)))
+
+
+async def _close_gradually(consumer, delay):
+    await asyncio.sleep(delay)
+    grace = getattr(settings, 'CHAT_DRAIN_AI_GRACE', 120)
+    waited = 0.0
+    while consumer.has_pending_work() and waited < grace:
+        await asyncio.sleep(0.5)
+        waited += 0.5
+    metrics.inc("ws_drain_closed_total", consumer=consumer.__class__.__name__)
+    await consumer.close_for_reconnect()
+
+
+# ==================== 트리거 (시그널 / Redis 키) ====================
+
+def install_signal_handler():
+    """
+    SIGUSR1 → drain 시작. ChatConfig.ready()에서 프로세스 시작 시 설치한다
+    (첫 연결 전에 시그널을 받아도 기본 동작인 프로세스 종료가 일어나지 않도록).
+    메인 스레드가 아니면 설치하지 않음
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    try:
+        signal.signal(signal.SIGUSR1, _handle_signal)
+    except (ValueError, AttributeError) as e:
+        print(f"[WARNING] drain 시그널 핸들러 설치 실패: {e}")
+
+
+def _handle_signal(signum, frame):
+    """연결을 받은 이벤트 루프마다 drain 시작을 예약 (아직 연결이 없으면 바로 drain 상태로 전환해 새 연결을 돌려보냄)"""
+    loops = [loop for loop in _watchers if not loop.is_closed()]
+    if not loops:
+        start_drain()
+        return
+    for loop in loops:
+        loop.call_soon_threadsafe(start_drain)
+
+
+def _ensure_watcher():
+    loop = asyncio.get_running_loop()
+    watcher = _watchers.get(loop)
+    if watcher is not None and not watcher.done():
+        return
+    for old_loop in [l for l in _watchers if l.is_closed()]:
+        del _watchers[old_loop]
+    _watchers[loop] = loop.create_task(_watch())
+
+
+async def _watch():
+    """drain 관리 명령이 남긴 Redis 키 확인 (키 삭제 = 취소)"""
+    keys = [DRAIN_KEY.format(ALL_HOSTS), DRAIN_KEY.format(hostname())]
+    while True:
+        await asyncio.sleep(getattr(settings, 'CHAT_DRAIN_POLL_INTERVAL', 2))
+        try:
+            values = await get_async_redis().mget(keys)
+        except redis.RedisError as e:
+            print(f"[WARNING] drain 상태 조회 실패: {e}")
+            continue
+        requests = [json.loads(value) for value in values if value]
+        # 이 프로세스가 시작된 뒤에 걸린 drain만 적용 (재시작된 프로세스는 이전 요청 무시)
+        requests = [request for request in requests if request["at"] >= _STARTED_AT]
+        if requests and not _state["draining"]:
+            start_drain(min(request["window"] for request in requests), source="command")
+        elif not requests and _state["source"] == "command":
+            stop_drain()
+
+
+def request_drain(host=ALL_HOSTS, window=None, ttl=None):
+    """관리 명령용: drain 요청 키 기록"""
+    value = json.dumps({"window": _window() if window is None else window, "at": time.time()})
+    redis_client.set(DRAIN_KEY.format(host), value, ex=ttl or getattr(settings, 'CHAT_DRAIN_KEY_TTL', 3600))
+
+
+def cancel_drain(host=ALL_HOSTS):
+    redis_client.delete(DRAIN_KEY.format(host))
+
+
+# ==================== consumer mixin ====================
+
+class DrainMixin:
+    """HeartbeatMixin/CodecMixin과 함께 쓰는 consumer mixin (websocket_connect / accept / websocket_disconnect 재정의)"""
+
+    drain_enabled = True
+    _drain_task = None
+    _drain_closing = False
+
+    async def websocket_connect(self, message):
+        if self.drain_enabled and is_draining():
+            # DB 조회 없이 바로 다른 워커로 보냄
+            metrics.inc("ws_drain_rejected_total", consumer=self.__class__.__name__)
+            self._drain_closing = True
+            await self.accept_with_codec()
+            await self.close_for_reconnect()
+            return
+        await super().websocket_connect(message)
+
+    async def accept(self, subprotocol=None, headers=None):
+        await super().accept(subprotocol=subprotocol, headers=headers)
+        if not self.drain_enabled or self._drain_closing:
+            return
+        _ensure_watcher()
+        _consumers.add(self)
+        if is_draining():
+            # 연결 확인 중에 drain이 시작된 경우
+            _schedule_close(self)
+
+    async def websocket_disconnect(self, message):
+        _consumers.discard(self)
+        if self._drain_task is not None and self._drain_task is not asyncio.current_task():
+            self._drain_task.cancel()
+        await super().websocket_disconnect(message)
+
+    def has_pending_work(self):
+        """drain 시 닫기 전에 기다려야 하는 작업(진행 중인 AI 응답 등)이 있으면 True"""
+        return False
+
+    async def close_for_reconnect(self):
+        """reconnect 힌트(지터 포함 지연)를 보내고 송신 큐를 비운 뒤 close"""
+        self._drain_closing = True
+        jitter_ms = getattr(settings, 'CHAT_DRAIN_RECONNECT_JITTER_MS', 10000)
+        await self.send_frame({
+            "type": "reconnect",
+            "reason": "drain",
+            "delay_ms": random.randint(0, jitter_ms),
+        })
+        await self.flush_outbound()
+        await self.close(code=getattr(settings, 'CHAT_DRAIN_CLOSE_CODE', 1012))
@@ -0,0 +1,31 @@
+"""
+브로드캐스트 프레임 사전 직렬화
+
+메시지를 보내는 쪽에서 프레임을 한 번만 직렬화해 이벤트에 실어 보내고,
+수신자별 핸들러는 is_self 값과 협상된 코덱에 맞는 프레임을 골라 그대로 전송한다.
+방 인원이 N명이어도 직렬화는 N번이 아니라 (is_self 2가지 × 코덱 수)번만 실행된다.
+"""
+from .codecs import encode_all
+
+
+def encode_self_variants(frame):
+    """is_self False/True 두 가지 프레임을 모든 코덱으로 직렬화해서 반환"""
+    return {
+        "other": encode_all(dict(frame, is_self=False)),
+        "self": encode_all(dict(frame, is_self=True)),
+    }
+
+
+def chat_event(frame, sender_id):
+    """group_send용 chat_message 이벤트 생성"""
+    return {
+        "type": "chat_message",
+        "sender_id": sender_id,
+        "frames": encode_self_variants(frame),
+    }
+
+
+def select_frame(event, profile_id, codec_name="json"):
+    """수신자 기준으로 보낼 프레임 선택 (직렬화 없음)"""
+    variant = "self" if event.get("sender_id") == profile_id else "other"
+    return event["frames"][variant][codec_name]
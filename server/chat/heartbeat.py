@@ -0,0 +1,124 @@
+"""
+WebSocket 애플리케이션 레벨 heartbeat (ping/pong, 응답 없는 연결 정리, RTT 측정)
+
+nginx가 WebSocket 프록시에 긴 read timeout을 주고 있어서, 클라이언트가 사라진 반쯤 죽은 연결이
+오래 남아 그룹 멤버십과 consumer 메모리를 잡고 있을 수 있다.
+
+- 서버 → 클라이언트: CHAT_WS_PING_INTERVAL초마다 {"type": "ping", "id": n}
+- 클라이언트 → 서버: {"type": "pong", "id": n}  (클라이언트가 먼저 ping을 보내면 서버가 pong으로 응답)
+- pong이 돌아오면 왕복 시간을 ws_rtt_ms 히스토그램(consumer 라벨)에 기록
+- 한 번이라도 pong을 보낸 클라이언트는 CHAT_WS_PONG_TIMEOUT초 안에 다음 pong이 없으면 정리
+- pong을 보내지 않는 (heartbeat 미지원) 클라이언트는 CHAT_WS_IDLE_TIMEOUT초(기본 300) 동안 아무 프레임도 없으면 정리.
+  조용한 방에서 몇십 초씩 프레임이 없는 건 정상이라 ping 주기보다 훨씬 길게 잡는다
+  (ping 주기 × IDLE_MARGIN보다 짧게 설정해도 그 값까지 늘림). 0이면 끔.
+정리는 CHAT_WS_REAP_CLOSE_CODE(기본 4009)로 close하고, 이후 disconnect()에서 그룹/presence가 평소처럼 정리된다.
+클라이언트는 4009를 오류가 아닌 "응답 없음으로 정리됨"으로 보고, 바로 재접속해 last_message_id로 이어받는다.
+"""
+import asyncio
+import itertools
+import time
+
+from django.conf import settings
+
+from . import metrics
+
+HEARTBEAT_TYPES = {"ping", "pong"}
+
+# idle timeout은 최소 ping 주기의 이 배수 (pong을 보내는 클라이언트가 ping 사이에 정리되지 않도록)
+IDLE_MARGIN = 3
+
+
+def _ping_interval():
+    return getattr(settings, 'CHAT_WS_PING_INTERVAL', 20)
+
+
+def _pong_timeout():
+    return getattr(settings, 'CHAT_WS_PONG_TIMEOUT', 45)
+
+
+def _idle_timeout():
+    idle_timeout = getattr(settings, 'CHAT_WS_IDLE_TIMEOUT', 300)
+    if idle_timeout <= 0:
+        return 0
+    return max(idle_timeout, _ping_interval() * IDLE_MARGIN)
+
+
+class HeartbeatMixin:
+    """CodecMixin을 쓰는 consumer 앞에 두는 mixin (accept / websocket_receive / websocket_disconnect 재정의)"""
+
+    heartbeat_enabled = True
+
+    _heartbeat_task = None
+    _heartbeat_ids = None
+    _pending_pings = None
+    _last_seen = 0.0
+    _last_pong = None
+    rtt_ms = None
+
+    async def accept(self, subprotocol=None, headers=None):
+        await super().accept(subprotocol=subprotocol, headers=headers)
+        if self.heartbeat_enabled and _ping_interval() > 0:
+            self._last_seen = time.monotonic()
+            self._heartbeat_ids = itertools.count(1)
+            self._pending_pings = {}
+            self._heartbeat_task = asyncio.create_task(self._run_heartbeat())
+
+    async def websocket_receive(self, message):
+        # 어떤 프레임이든 받으면 살아 있는 연결
+        self._last_seen = time.monotonic()
+        await super().websocket_receive(message)
+
+    async def websocket_disconnect(self, message):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        await super().websocket_disconnect(message)
+
+    async def handle_heartbeat_frame(self, data):
+        """receive()에서 type이 ping/pong인 프레임 처리"""
+        if data.get("type") == "ping":
+            await self.send_frame({"type": "pong", "id": data.get("id")})
+            return
+        sent_at = (self._pending_pings or {}).pop(data.get("id"), None)
+        if sent_at is None:
+            return
+        now = time.monotonic()
+        self._last_pong = now
+        # 응답한 ping보다 오래된 ping은 더 기다리지 않음 (pong 유실/순서 뒤바뀜)
+        for ping_id in [ping_id for ping_id, sent in self._pending_pings.items() if sent < sent_at]:
+            del self._pending_pings[ping_id]
+        self.rtt_ms = (now - sent_at) * 1000
+        metrics.observe("ws_rtt_ms", self.rtt_ms, consumer=self.__class__.__name__)
+
+    async def _run_heartbeat(self):
+        interval = _ping_interval()
+        while True:
+            await asyncio.sleep(interval)
+            reason = self._reap_reason(time.monotonic())
+            if reason:
+                await self._reap(reason)
+                return
+            ping_id = next(self._heartbeat_ids)
+            if self._last_pong is None:
+                # pong을 보낸 적 없는 클라이언트는 마지막 ping만 기억 (쌓이지 않게)
+                self._pending_pings.clear()
+            self._pending_pings[ping_id] = time.monotonic()
+            try:
+                await self.send_frame({"type": "ping", "id": ping_id})
+            except Exception as e:
+                print(f"[WARNING] ping 전송 실패: {e}")
+
+    def _reap_reason(self, now):
+        if self._last_pong is not None:
+            oldest = min(self._pending_pings.values(), default=None)
+            if oldest is not None and now - oldest >= _pong_timeout():
+                return "pong_timeout"
+        idle_timeout = _idle_timeout()
+        if idle_timeout > 0 and now - self._last_seen >= idle_timeout:
+            return "idle"
+        return None
+
+    async def _reap(self, reason):
+        print(f"[WARNING] 응답 없는 WebSocket 정리 ({reason}): {getattr(self, 'username', 'Unknown')}")
+        metrics.inc("ws_reaped_total", reason=reason, consumer=self.__class__.__name__)
+        await self.close(code=getattr(settings, 'CHAT_WS_REAP_CLOSE_CODE', 4009))
@@ -0,0 +1,190 @@
+"""
+방 초대 코드(TOTP 6자리) 인덱스
+
+이전에는 access-code 요청마다 totp:<코드> 키를 30초 TTL로 덮어썼기 때문에
+- 활성 방이 많으면 다른 방의 같은 코드가 서로를 덮어써 엉뚱한 방으로 참여하고
+- 창(30초)이 넘어가는 순간 방금 받은 코드가 만료됐다.
+
+- invite:code:<코드>  STRING  room_uuid (창 W의 코드는 W 이전 창에서 미리 등록, W+1 창이 끝날 때 만료)
+- invite:open         ZSET    room_uuid → 초대 유지 기한(unix time). refresh_open_invitations가 다음 창 코드를 미리 등록
+
+코드는 SET NX처럼 먼저 등록한 방이 가진다. 다른 방이 이미 가진 코드는 등록하지 않고(충돌),
+access-code 응답에는 이 방으로 등록된 코드(현재 창, 충돌이면 다음 창)만 내려주므로 사용자가 받은 코드는 항상 한 방만 가리킨다.
+참여 시에는 GET 한 번이면 되므로 초대 중인 방 수와 무관하다.
+키 만료 시각이 창 단위라 이전 창 / 다음 창 코드도 받아들인다 (시계 오차, 창 경계 직전에 받은 코드).
+"""
+import time
+
+import pyotp
+import redis
+from django.conf import settings
+
+from . import metrics
+from .redis_utils import redis_client
+from .room_utils import get_room_secrets
+
+CODE_KEY = "invite:code:{}"
+OPEN_KEY = "invite:open"
+
+# TOTP 창 길이(초), pyotp 기본값과 같음
+INTERVAL = 30
+
+# 코드 등록: KEYS[i] ← ARGV[2i-1](room_uuid), ARGV[2i](유지 시간). 비었거나 같은 방이면 등록(유지 시간 연장)
+# 다른 방이 가진 코드면 건드리지 않음. 키별 1(등록) / 0(충돌) 목록 반환
+_CLAIM_SCRIPT = """
+local result = {}
+for i = 1, #KEYS do
+    local room = ARGV[2 * i - 1]
+    local ttl = tonumber(ARGV[2 * i])
+    local current = redis.call('GET', KEYS[i])
+    if not current then
+        redis.call('SET', KEYS[i], room, 'EX', ttl)
+        result[i] = 1
+    elseif current == room then
+        if redis.call('TTL', KEYS[i]) < ttl then
+            redis.call('EXPIRE', KEYS[i], ttl)
+        end
+        result[i] = 1
+    else
+        result[i] = 0
+    end
+end
+return result
+"""
+
+# ARGV[1](room_uuid)이 가진 코드만 삭제
+_RELEASE_SCRIPT = """
+for i = 1, #KEYS do
+    if redis.call('GET', KEYS[i]) == ARGV[1] then
+        redis.call('DEL', KEYS[i])
+    end
+end
+return 1
+"""
+
+
+def _open_seconds():
+    return getattr(settings, 'CHAT_INVITE_OPEN_SECONDS', 300)
+
+
+def _window(now):
+    return int(now // INTERVAL)
+
+
+def _code(secret, window):
+    return pyotp.TOTP(secret, interval=INTERVAL).at(window * INTERVAL)
+
+
+def _claims(room_uuid, secret, windows, now):
+    """[(창, 코드, 키, 유지 시간)]. 창 W의 코드는 W+1 창이 끝날 때까지 유효"""
+    claims = []
+    for window in windows:
+        code = _code(secret, window)
+        ttl = max(1, int((window + 2) * INTERVAL - now))
+        claims.append((window, code, CODE_KEY.format(code), ttl))
+    return claims
+
+
+def _claim_args(room_uuid, claims):
+    keys = [key for _, _, key, _ in claims]
+    args = []
+    for _, _, _, ttl in claims:
+        args.extend([room_uuid, ttl])
+    return keys, args
+
+
+def _count_collisions(results):
+    collisions = sum(1 for claimed in results if not int(claimed))
+    if collisions:
+        metrics.inc("chat_invite_code_collisions_total", collisions)
+    return collisions
+
+
+# ==================== 초대 열기 / 닫기 ====================
+
+def open_invitation(room_uuid, secret, now=None):
+    """
+    access-code 요청 시 호출: 현재 / 다음 창 코드를 등록하고 초대 유지 기한을 연장
+    이 방으로 등록된 (코드, 남은 유효 시간) 반환. 두 창 모두 충돌이면 (None, 0)
+    """
+    now = time.time() if now is None else now
+    room_uuid = str(room_uuid)
+    current = _window(now)
+    claims = _claims(room_uuid, secret, [current, current + 1], now)
+    keys, args = _claim_args(room_uuid, claims)
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zadd(OPEN_KEY, {room_uuid: now + _open_seconds()})
+    pipe.eval(_CLAIM_SCRIPT, len(keys), *keys, *args)
+    _, results = pipe.execute()
+    _count_collisions(results)
+
+    for (window, code, _, ttl), claimed in zip(claims, results):
+        if int(claimed):
+            if window != current:
+                print(f"[WARNING] 초대 코드 충돌: {room_uuid} 현재 창 대신 다음 창 코드 사용")
+            return code, ttl
+    print(f"[WARNING] 초대 코드 충돌: {room_uuid} 현재 / 다음 창 모두 사용 중")
+    return None, 0
+
+
+def close_invitation(room_uuid, secret, now=None):
+    """방 삭제 시 호출: 초대 목록에서 빼고 이 방이 가진 이전 / 현재 / 다음 창 코드 삭제"""
+    now = time.time() if now is None else now
+    room_uuid = str(room_uuid)
+    current = _window(now)
+    keys = [key for _, _, key, _ in _claims(room_uuid, secret, [current - 1, current, current + 1], now)]
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zrem(OPEN_KEY, room_uuid)
+        pipe.eval(_RELEASE_SCRIPT, len(keys), *keys, room_uuid)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"[WARNING] 초대 코드 삭제 실패: {e}")
+
+
+def lookup(code):
+    """코드 → room_uuid (없거나 만료면 None)"""
+    return redis_client.get(CODE_KEY.format(code))
+
+
+def forget(code, room_uuid):
+    """참여 시 방이 이미 없을 때 해당 코드 정리"""
+    redis_client.eval(_RELEASE_SCRIPT, 1, CODE_KEY.format(code), str(room_uuid))
+
+
+# ==================== 미리 등록 ====================
+
+def refresh_open_invitations(now=None, batch_size=1000):
+    """
+    초대 중인 모든 방의 현재 / 다음 창 코드를 한 번의 파이프라인으로 등록 (refresh_invite_codes 커맨드, 창마다)
+    기한이 지난 초대와 비밀키가 없는(삭제된) 방은 목록에서 뺀다. (등록한 방 수, 충돌 수) 반환
+    """
+    now = time.time() if now is None else now
+    current = _window(now)
+    redis_client.zremrangebyscore(OPEN_KEY, "-inf", now)
+    room_uuids = redis_client.zrange(OPEN_KEY, 0, -1)
+    if not room_uuids:
+        return 0, 0
+
+    secrets = get_room_secrets(room_uuids)
+    gone = [room_uuid for room_uuid in room_uuids if room_uuid not in secrets]
+
+    pipe = redis_client.pipeline(transaction=False)
+    if gone:
+        pipe.zrem(OPEN_KEY, *gone)
+    rooms = [room_uuid for room_uuid in room_uuids if room_uuid in secrets]
+    for start in range(0, len(rooms), batch_size):
+        keys, args = [], []
+        for room_uuid in rooms[start:start + batch_size]:
+            batch_keys, batch_args = _claim_args(
+                room_uuid, _claims(room_uuid, secrets[room_uuid], [current, current + 1], now)
+            )
+            keys.extend(batch_keys)
+            args.extend(batch_args)
+        pipe.eval(_CLAIM_SCRIPT, len(keys), *keys, *args)
+    results = pipe.execute()
+    if gone:
+        results = results[1:]
+    collisions = _count_collisions([claimed for batch in results for claimed in batch])
+    return len(rooms), collisions
@@ -0,0 +1,176 @@
+import asyncio
+import shutil
+import subprocess
+import time
+import uuid
+import zlib
+
+import redis
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.bench_utils import Stopwatch, write_results
+from chat.channel_layers import HashRing, ShardedRedisChannelLayer, shard_key
+
+
+class Command(BaseCommand):
+    help = (
+        "샤딩된 채널 레이어 벤치마크: 로컬 redis-server N개를 띄워 "
+        "샤드 수별 group_send 처리량(messages/s, deliveries/s)과 노드 추가 시 그룹 이동 비율 측정"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', default="1,2,4", help="측정할 샤드 수 목록 (쉼표 구분)")
+        parser.add_argument('--hosts', help="이미 떠 있는 Redis 목록 host:port,... (지정하면 프로세스를 띄우지 않음)")
+        parser.add_argument('--redis-server', default="redis-server", help="redis-server 실행 파일 경로")
+        parser.add_argument('--base-port', type=int, default=7400)
+        parser.add_argument('--workers', type=int, default=8, help="daphne 워커 수 흉내 (레이어 인스턴스 수)")
+        parser.add_argument('--groups', type=int, default=200, help="방(그룹) 수")
+        parser.add_argument('--members', type=int, default=4, help="그룹당 연결 수")
+        parser.add_argument('--messages', type=int, default=2000, help="group_send 횟수")
+        parser.add_argument('--concurrency', type=int, default=50, help="동시 group_send 수")
+        parser.add_argument('--output', help="결과 JSON 저장 경로")
+
+    def handle(self, *args, **options):
+        shard_counts = [int(count) for count in options['shards'].split(',') if count]
+        processes = []
+        try:
+            if options['hosts']:
+                hosts = [
+                    (host.rsplit(':', 1)[0], int(host.rsplit(':', 1)[1]))
+                    for host in options['hosts'].split(',') if host
+                ]
+                if len(hosts) < max(shard_counts):
+                    raise CommandError(f"--hosts에 {max(shard_counts)}개 이상의 노드가 필요합니다.")
+            else:
+                hosts, processes = self._spawn_redis(options['redis_server'], options['base_port'], max(shard_counts))
+
+            results = {"remap": self._remap_ratios(hosts, shard_counts)}
+            for count in shard_counts:
+                results[f"{count}_shards"] = asyncio.run(self._run(hosts[:count], options))
+                result = results[f"{count}_shards"]
+                self.stdout.write(
+                    f"{count} shard(s): {result['messages_per_sec']:.0f} group_send/s, "
+                    f"{result['deliveries_per_sec']:.0f} deliveries/s, groups per shard {result['groups_per_shard']}"
+                )
+            for step, ratio in results["remap"].items():
+                self.stdout.write(
+                    f"노드 추가 {step}: 해시 링 {ratio['hash_ring']:.1%} 이동 / crc32 % N {ratio['modulo']:.1%} 이동"
+                )
+            write_results(options['output'], 'channel_shards', results)
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=10)
+
+    # ==================== 로컬 Redis 하네스 ====================
+
+    def _spawn_redis(self, executable, base_port, count):
+        if not shutil.which(executable):
+            raise CommandError(f"{executable}를 찾을 수 없습니다. --redis-server 또는 --hosts를 지정하세요.")
+        hosts, processes = [], []
+        for index in range(count):
+            port = base_port + index
+            processes.append(subprocess.Popen(
+                [executable, "--port", str(port), "--bind", "127.0.0.1", "--save", "", "--appendonly", "no"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            ))
+            hosts.append(("127.0.0.1", port))
+
+        deadline = time.monotonic() + 10
+        for host, port in hosts:
+            client = redis.Redis(host=host, port=port)
+            while True:
+                try:
+                    client.ping()
+                    break
+                except redis.ConnectionError:
+                    if time.monotonic() > deadline:
+                        raise CommandError(f"redis-server {host}:{port} 시작 실패")
+                    time.sleep(0.05)
+        return hosts, processes
+
+    # ==================== 측정 ====================
+
+    def _remap_ratios(self, hosts, shard_counts):
+        """샤드 수를 늘릴 때 다른 노드로 옮겨지는 그룹 비율 (해시 링 vs channels_redis 기본 방식)"""
+        keys = [shard_key(f"chat_{uuid.uuid4()}") for _ in range(10000)]
+        host_ids = [f"{host}:{port}" for host, port in hosts]
+        ratios = {}
+        for before, after in zip(shard_counts, shard_counts[1:]):
+            ring_before, ring_after = HashRing(host_ids[:before]), HashRing(host_ids[:after])
+            ring_moved = sum(ring_before.get(key) != ring_after.get(key) for key in keys)
+            modulo_moved = sum(self._modulo(key, before) != self._modulo(key, after) for key in keys)
+            ratios[f"{before}->{after}"] = {
+                "hash_ring": ring_moved / len(keys),
+                "modulo": modulo_moved / len(keys),
+            }
+        return ratios
+
+    @staticmethod
+    def _modulo(key, ring_size):
+        # channels_redis 기본 _consistent_hash와 같은 계산
+        return int((zlib.crc32(key.encode("utf8")) & 0xFFF) / (4096 / float(ring_size)))
+
+    async def _run(self, hosts, options):
+        layers = [
+            ShardedRedisChannelLayer(hosts=hosts, capacity=100000, expiry=120)
+            for _ in range(max(1, options['workers']))
+        ]
+        await layers[0].flush()
+
+        groups = [f"chat_{uuid.uuid4()}" for _ in range(options['groups'])]
+        channels = []
+        for index, group in enumerate(groups):
+            for member in range(options['members']):
+                layer = layers[(index * options['members'] + member) % len(layers)]
+                channel = await layer.new_channel()
+                await layer.group_add(group, channel)
+                channels.append((layer, channel))
+
+        expected = options['messages'] * options['members']
+        received = 0
+        done = asyncio.Event()
+
+        async def receiver(layer, channel):
+            nonlocal received
+            while True:
+                await layer.receive(channel)
+                received += 1
+                if received >= expected:
+                    done.set()
+
+        receivers = [asyncio.create_task(receiver(layer, channel)) for layer, channel in channels]
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def sender(index):
+            async with semaphore:
+                await layers[index % len(layers)].group_send(
+                    groups[index % len(groups)], {"type": "chat.message", "index": index}
+                )
+
+        try:
+            with Stopwatch() as stopwatch:
+                await asyncio.gather(*(sender(index) for index in range(options['messages'])))
+                await asyncio.wait_for(done.wait(), timeout=120)
+        finally:
+            for task in receivers:
+                task.cancel()
+            await asyncio.gather(*receivers, return_exceptions=True)
+            await layers[0].flush()
+            for layer in layers:
+                await layer.close_pools()
+
+        groups_per_shard = [0] * len(hosts)
+        for group in groups:
+            groups_per_shard[layers[0].consistent_hash(group)] += 1
+        return {
+            "shards": len(hosts),
+            "messages": options['messages'],
+            "deliveries": received,
+            "seconds": stopwatch.elapsed,
+            "messages_per_sec": options['messages'] / stopwatch.elapsed,
+            "deliveries_per_sec": received / stopwatch.elapsed,
+            "groups_per_shard": groups_per_shard,
+        }
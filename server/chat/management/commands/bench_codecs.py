@@ -0,0 +1,81 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.bench_utils import write_results
+from chat.codecs import CODECS
+
+
+def _chat_frame(index=1):
+    return {
+        "type": "chat_message",
+        "message": f"PR #{index} 리뷰 부탁드립니다. consumers.py 쪽 예외 처리 바꿨어요 🙏",
+        "username": "octocat",
+        "message_id": 100000 + index,
+        "timestamp": timezone.now().isoformat(),
+        "is_self": False,
+    }
+
+
+def _ai_history_frame(count=50):
+    messages = []
+    for index in range(count):
+        is_ai = index % 2 == 1
+        messages.append({
+            "id": 5000 + index,
+            "message": (
+                "Django Channels에서 group_send는 그룹에 속한 모든 채널에 메시지를 복사합니다. " * 4
+                if is_ai else "group_send 비용이 방 인원에 비례하나요?"
+            ),
+            "username": "AI_Assistant" if is_ai else "octocat",
+            "timestamp": timezone.now().isoformat(),
+            "is_ai": is_ai,
+            "is_self": not is_ai,
+        })
+    return {
+        "type": "message_history",
+        "messages": messages,
+        "pagination": {
+            "current_page": 1,
+            "total_pages": 3,
+            "total_messages": 120,
+            "has_next": True,
+            "has_previous": False,
+        },
+        "session_id": "e1692be2-9d48-4bd6-8e8d-cd816e1b3fc8",
+    }
+
+
+class Command(BaseCommand):
+    help = "WebSocket 프레임 코덱 벤치마크: JSON vs MessagePack (인코딩/디코딩 CPU, 전송 바이트)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+        parser.add_argument('--output', help="결과 JSON 저장 경로")
+
+    def handle(self, *args, **options):
+        payloads = {
+            "chat_message": _chat_frame(),
+            "ai_history_50": _ai_history_frame(),
+        }
+        results = {}
+        for payload_name, payload in payloads.items():
+            # 큰 페이로드는 반복 횟수를 줄여 실행 시간을 비슷하게 맞춤
+            iterations = options['iterations'] if payload_name == "chat_message" else max(1, options['iterations'] // 50)
+            for codec_name, codec in CODECS.items():
+                encoded = codec.encode(payload)
+                assert codec.decode(encoded) == payload
+                encode_s = timeit.timeit(lambda: codec.encode(payload), number=iterations)
+                decode_s = timeit.timeit(lambda: codec.decode(encoded), number=iterations)
+                size = len(encoded.encode() if isinstance(encoded, str) else encoded)
+                results[f"{payload_name}/{codec_name}"] = {
+                    "bytes": size,
+                    "encode_us": encode_s / iterations * 1e6,
+                    "decode_us": decode_s / iterations * 1e6,
+                }
+                self.stdout.write(
+                    f"{payload_name:>14} {codec_name:>7}: {size:>6} bytes, "
+                    f"encode {encode_s / iterations * 1e6:8.2f}µs, decode {decode_s / iterations * 1e6:8.2f}µs"
+                )
+        write_results(options['output'], 'codecs', results)
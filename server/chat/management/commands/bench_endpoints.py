@@ -0,0 +1,102 @@
+import contextlib
+import io
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from chat import message_stream
+from chat.bench_utils import (
+    Stopwatch, create_bench_profiles, seed_member_rooms, seed_messages, summarize, write_results,
+)
+from chat.models import ChatRoom
+from llm.models import AiChatMessage, AiChatSession
+
+
+class Command(BaseCommand):
+    help = (
+        "조회 REST 엔드포인트 벤치마크: 방 N개에 참여한 사용자 / 메시지 M개인 방을 만들어 "
+        "엔드포인트별 p50/p99와 요청당 쿼리 수 측정 (쿼리 수 회귀는 chat/login/llm tests에서 검사)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=500, help="사용자가 참여한 방 수")
+        parser.add_argument('--messages', type=int, default=10000, help="큰 방의 메시지 수")
+        parser.add_argument('--participants', type=int, default=30, help="큰 방의 추가 참가자 수")
+        parser.add_argument('--requests', type=int, default=50, help="엔드포인트별 요청 수")
+        parser.add_argument('--output', help="결과 JSON 저장 경로")
+
+    def handle(self, *args, **options):
+        owner, member = create_bench_profiles(2, prefix="bench_endpoints")
+        crowd = create_bench_profiles(options['participants'], prefix="bench_endpoints_crowd")
+        rooms = seed_member_rooms(member, owner, options['rooms'], participants=crowd[:3])
+        busy_room = rooms[1]
+        seed_messages(busy_room, [owner, member], options['messages'])
+        ChatRoom.participants.through.objects.bulk_create(
+            ChatRoom.participants.through(chatroom_id=busy_room.room_uuid, userprofile_id=profile.id)
+            for profile in crowd[3:]
+        )
+        session = AiChatSession.objects.create(base_room=busy_room, session_id=f"bench-{busy_room.room_uuid}")
+        AiChatMessage.objects.bulk_create(
+            (AiChatMessage(session=session, sender=member, content=f"bench {i}") for i in range(options['messages'])),
+            batch_size=2000,
+        )
+
+        client = Client()
+        client.force_login(member.user)
+        messages_path = reverse("chat:get_room_messages", args=[str(busy_room.room_uuid)])
+        ai_messages_path = reverse("llm:get_ai_messages", args=[session.session_id])
+        endpoints = {
+            "chat:get_my_rooms": (reverse("chat:get_my_rooms"), {}),
+            "chat:get_current_room_info": (reverse("chat:get_current_room_info"), {}),
+            "chat:get_room_messages(page=1)": (messages_path, {"page": 1, "limit": 50}),
+            "chat:get_room_messages(page=20)": (messages_path, {"page": 20, "limit": 50}),
+            "login:current_user": (reverse("login:current_user"), {}),
+            "llm:get_ai_sessions": (reverse("llm:get_ai_sessions"), {}),
+            "llm:get_ai_messages(page=20)": (ai_messages_path, {"page": 20, "limit": 50}),
+        }
+
+        results = {}
+        try:
+            # Client 요청의 Host(testserver) 허용
+            allowed_hosts = [*settings.ALLOWED_HOSTS, "testserver"]
+            with override_settings(CHAT_RATE_LIMIT_ENABLED=False, ALLOWED_HOSTS=allowed_hosts), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                client.post(
+                    reverse("chat:select_room"), {"room_uuid": str(busy_room.room_uuid)},
+                    content_type="application/json",
+                )
+                for name, (path, params) in endpoints.items():
+                    results[name] = self._measure(client, path, params, options['requests'])
+        finally:
+            for room in rooms:
+                message_stream.delete(room.room_uuid)
+            ChatRoom.objects.filter(room_uuid__in=[room.room_uuid for room in rooms]).delete()
+            User.objects.filter(id__in=[owner.user_id, member.user_id] + [p.user_id for p in crowd]).delete()
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:>34}: p50 {result['p50_ms']:.2f}ms, p99 {result['p99_ms']:.2f}ms, "
+                f"{result['queries_per_request']:.1f} queries/request"
+            )
+        write_results(options['output'], 'endpoints', results)
+
+    def _measure(self, client, path, params, requests):
+        # 첫 요청(캐시 warm)은 측정에서 제외
+        response = client.get(path, params)
+        assert response.status_code == 200, response.content[:500]
+        latencies = []
+        query_count = 0
+        for _ in range(requests):
+            # 요청마다 따로 캡처 (CaptureQueriesContext는 최근 9000개까지만 보관)
+            with CaptureQueriesContext(connection) as queries, Stopwatch() as stopwatch:
+                client.get(path, params)
+            latencies.append(stopwatch.elapsed)
+            query_count += len(queries)
+        result = summarize(latencies)
+        result["queries_per_request"] = query_count / requests
+        return result
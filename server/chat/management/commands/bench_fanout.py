@@ -0,0 +1,96 @@
+import asyncio
+import contextlib
+import io
+import json
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.bench_utils import Stopwatch, write_results
+from chat.codecs import CodecMixin
+from chat.consumers import ChatConsumer
+from chat.frames import chat_event
+
+
+class _Recipient(CodecMixin):
+    """send만 흉내 내는 수신자 (소켓 쓰기 비용 제외, 직렬화 비용만 측정)"""
+
+    def __init__(self, profile_id):
+        self.user_profile = SimpleNamespace(id=profile_id)
+        self.username = f"user{profile_id}"
+        self.sent_bytes = 0
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        self.sent_bytes += len(text_data or bytes_data or b"")
+
+
+async def legacy_chat_message(recipient, event):
+    """기존 핸들러: 수신자마다 dict 재구성 + json.dumps + 전체 payload print"""
+    is_self = event.get("sender_id") == recipient.user_profile.id
+    message_data = {
+        "type": "chat_message",
+        "message": event.get("message"),
+        "username": event.get("username"),
+        "message_id": event.get("message_id"),
+        "timestamp": event.get("timestamp"),
+        "is_self": is_self,
+    }
+    print(f"[DEBUG] 메시지 전송: {recipient.username} ← {message_data}")
+    await recipient.send(text_data=json.dumps(message_data))
+
+
+class Command(BaseCommand):
+    help = "채팅 브로드캐스트 fan-out 벤치마크: 수신자별 직렬화 vs 발신자 1회 직렬화"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default="10,100,1000", help="방 인원 목록 (쉼표 구분)")
+        parser.add_argument('--messages', type=int, default=200, help="방 크기별 전송 메시지 수")
+        parser.add_argument('--output', help="결과 JSON 저장 경로")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size]
+        results = asyncio.run(self._run(sizes, options['messages']))
+        for size, result in results.items():
+            self.stdout.write(
+                f"{size:>5}명: legacy {result['legacy_us_per_delivery']:.2f}µs/수신자, "
+                f"serialize-once {result['serialize_once_us_per_delivery']:.2f}µs/수신자 "
+                f"(x{result['speedup']:.1f})"
+            )
+        write_results(options['output'], 'fanout', results)
+
+    async def _run(self, sizes, messages):
+        results = {}
+        for size in sizes:
+            recipients = [_Recipient(profile_id) for profile_id in range(1, size + 1)]
+            frame = {
+                "type": "chat_message",
+                "message": "안녕하세요! 오늘 배포 일정 공유드립니다. " * 3,
+                "username": "user1",
+                "message_id": 12345,
+                "timestamp": timezone.now().isoformat(),
+            }
+            legacy_event = dict(frame, sender_id=1)
+
+            with Stopwatch() as legacy, contextlib.redirect_stdout(io.StringIO()):
+                for _ in range(messages):
+                    for recipient in recipients:
+                        await legacy_chat_message(recipient, legacy_event)
+
+            with Stopwatch() as once:
+                for _ in range(messages):
+                    # 발신자가 한 번 직렬화 → 수신자 핸들러는 선택 후 전송만
+                    event = chat_event(frame, 1)
+                    for recipient in recipients:
+                        await ChatConsumer.chat_message(recipient, event)
+
+            deliveries = size * messages
+            results[size] = {
+                "deliveries": deliveries,
+                "legacy_seconds": legacy.elapsed,
+                "serialize_once_seconds": once.elapsed,
+                "legacy_us_per_delivery": legacy.elapsed / deliveries * 1e6,
+                "serialize_once_us_per_delivery": once.elapsed / deliveries * 1e6,
+                "speedup": legacy.elapsed / once.elapsed if once.elapsed else 0.0,
+            }
+        return results
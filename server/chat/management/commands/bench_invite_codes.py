@@ -0,0 +1,139 @@
+import contextlib
+import io
+import random
+import time
+
+import pyotp
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from chat import invites
+from chat.bench_utils import Stopwatch, create_bench_profiles, seed_member_rooms, summarize, write_results
+from chat.crypto_utils import encrypt_aes_gcm, generate_pseudo_number
+from chat.models import ChatRoom, SecureData
+from chat.redis_utils import redis_client
+from chat.room_utils import clear_room_secrets, get_room_secret
+
+
+class Command(BaseCommand):
+    help = (
+        "초대 코드 벤치마크: 방 N개가 동시에 초대 중일 때 "
+        "기존 totp:<코드> 덮어쓰기 vs 초대 코드 인덱스 - 잘못된 방 연결 수, 등록/미리 등록/조회 지연"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=10000, help="동시에 초대 중인 방 수")
+        parser.add_argument('--opens', type=int, default=200, help="access-code 등록 지연 측정 횟수 (표본)")
+        parser.add_argument('--lookups', type=int, default=2000, help="참여(코드 조회) 측정 횟수")
+        parser.add_argument('--output', help="결과 JSON 저장 경로")
+
+    def handle(self, *args, **options):
+        owner = create_bench_profiles(1, prefix="bench_invite")[0]
+        rooms = seed_member_rooms(owner, owner, options['rooms'], admin_every=1)
+        SecureData.objects.bulk_create(
+            (SecureData(room=room, encrypted_value=encrypt_aes_gcm(*generate_pseudo_number())) for room in rooms),
+            batch_size=1000,
+        )
+        room_uuids = [str(room.room_uuid) for room in rooms]
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = {
+                    "legacy": self._legacy(room_uuids),
+                    "index": self._index(room_uuids, options),
+                }
+        finally:
+            self._cleanup(room_uuids)
+            ChatRoom.objects.filter(room_uuid__in=room_uuids).delete()
+            User.objects.filter(id=owner.user_id).delete()
+            clear_room_secrets()
+
+        self.stdout.write(f"legacy: 다른 방 코드에 덮어써져 잘못된 방으로 연결되는 방 {results['legacy']['misrouted']}개 / {len(room_uuids)}개")
+        index = results["index"]
+        self.stdout.write(
+            f" index: 충돌 후 다음 창 코드 사용 {index['fallbacks']}개, 코드 없음(재요청) {index['unavailable']}개, "
+            f"access-code 등록 p50 {index['open']['p50_ms']:.2f}ms, "
+            f"전체 미리 등록 {index['refresh_ms']:.1f}ms, "
+            f"조회 p50 {index['lookup']['p50_ms']:.3f}ms / p99 {index['lookup']['p99_ms']:.3f}ms"
+        )
+        write_results(options['output'], 'invite_codes', results)
+
+    def _legacy(self, room_uuids):
+        """이전 방식: 방마다 현재 코드로 totp:<코드>를 덮어씀 (같은 창 안)"""
+        now = time.time()
+        codes = {}
+        pipe = redis_client.pipeline(transaction=False)
+        for room_uuid in room_uuids:
+            code = pyotp.TOTP(get_room_secret(room_uuid)).at(now)
+            codes[room_uuid] = code
+            pipe.setex(f"bench:totp:{code}", 30, room_uuid)
+        pipe.execute()
+        owners = dict(zip(codes.values(), redis_client.mget([f"bench:totp:{code}" for code in codes.values()])))
+        redis_client.delete(*{f"bench:totp:{code}" for code in codes.values()})
+        return {"misrouted": sum(1 for room_uuid, code in codes.items() if owners[code] != room_uuid)}
+
+    def _index(self, room_uuids, options):
+        # access-code 요청 한 번의 등록 지연 (표본)
+        latencies = []
+        for room_uuid in random.sample(room_uuids, min(options['opens'], len(room_uuids))):
+            secret = get_room_secret(room_uuid)
+            with Stopwatch() as stopwatch:
+                invites.open_invitation(room_uuid, secret)
+            latencies.append(stopwatch.elapsed)
+
+        # 나머지 방도 초대 중으로 두고 전체를 한 번에 미리 등록
+        redis_client.zadd(invites.OPEN_KEY, {room_uuid: time.time() + 300 for room_uuid in room_uuids})
+        clear_room_secrets()
+        with Stopwatch() as refresh:
+            invites.refresh_open_invitations()
+
+        # 방마다 access-code가 내려줄 코드: 현재 창 코드가 이 방 것이면 그것, 아니면 다음 창 코드
+        window = invites._window(time.time())
+        secrets = {room_uuid: get_room_secret(room_uuid) for room_uuid in room_uuids}
+        current = [invites._code(secrets[room_uuid], window) for room_uuid in room_uuids]
+        upcoming = [invites._code(secrets[room_uuid], window + 1) for room_uuid in room_uuids]
+        current_owners = redis_client.mget([invites.CODE_KEY.format(code) for code in current])
+        upcoming_owners = redis_client.mget([invites.CODE_KEY.format(code) for code in upcoming])
+        fallbacks = unavailable = 0
+        codes = []
+        for room_uuid, code, owner, next_code, next_owner in zip(
+            room_uuids, current, current_owners, upcoming, upcoming_owners
+        ):
+            if owner == room_uuid:
+                codes.append(code)
+            elif next_owner == room_uuid:
+                fallbacks += 1
+                codes.append(next_code)
+            else:
+                # 코드를 받지 못한 방 (현재 / 다음 창 모두 충돌, 다음 창에서 다시 요청)
+                unavailable += 1
+
+        lookups = []
+        for code in random.choices(codes, k=options['lookups']):
+            with Stopwatch() as stopwatch:
+                invites.lookup(code)
+            lookups.append(stopwatch.elapsed)
+        # 인덱스는 먼저 등록한 방만 코드를 가지므로 내려준 코드가 다른 방으로 연결되는 경우는 없음
+        return {
+            "fallbacks": fallbacks,
+            "unavailable": unavailable,
+            "open": summarize(latencies),
+            "refresh_ms": refresh.elapsed * 1000,
+            "lookup": summarize(lookups),
+        }
+
+    def _cleanup(self, room_uuids):
+        """이 벤치마크의 방이 가진 초대 코드(앞뒤 창 포함)와 초대 목록을 한 번에 삭제"""
+        window = invites._window(time.time())
+        keys = {
+            invites.CODE_KEY.format(invites._code(get_room_secret(room_uuid), w))
+            for room_uuid in room_uuids
+            for w in range(window - 2, window + 3)
+        }
+        keys = list(keys)
+        owned = set(room_uuids)
+        stale = [key for key, owner in zip(keys, redis_client.mget(keys)) if owner in owned]
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zrem(invites.OPEN_KEY, *room_uuids)
+        if stale:
+            pipe.delete(*stale)
+        pipe.execute()
@@ -0,0 +1,173 @@
+import asyncio
+import time
+import uuid
+
+import redis
+import redis.asyncio
+from channels_redis.core import RedisChannelLayer
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.bench_utils import summarize, write_results
+from chat.frames import chat_event
+from chat.room_hub import RoomHub
+
+
+class _Counter:
+    """메시지 하나의 전달 완료(수신자 전원)를 기다리기 위한 카운터"""
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.latencies = []
+        self.done = asyncio.Event()
+        self.received = 0
+
+    def record(self, event):
+        self.latencies.append(time.perf_counter() - event["sent_at"])
+        self.received += 1
+        if self.received >= self.expected:
+            self.done.set()
+
+
+class _LocalConsumer:
+    """허브가 핸들러를 직접 호출하는 consumer 대역 (소켓 쓰기 제외)"""
+
+    def __init__(self, state):
+        self.state = state
+
+    async def chat_message(self, event):
+        self.state["counter"].record(event)
+
+
+class Command(BaseCommand):
+    help = (
+        "대형 방 팬아웃 벤치마크: 채널 그룹(group_send) vs 워커별 방 허브(pub/sub) - "
+        "메시지당 Redis 명령 수와 전송~수신자 전원 도착 지연"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=2000, help="방 접속 수")
+        parser.add_argument('--workers', type=int, default=4, help="daphne 워커 수 흉내 (레이어/허브 인스턴스 수)")
+        parser.add_argument('--messages', type=int, default=100, help="모드별 전송 메시지 수")
+        parser.add_argument('--output', help="결과 JSON 저장 경로")
+
+    def handle(self, *args, **options):
+        results = asyncio.run(self._run(options))
+        for mode, result in results.items():
+            ops = result["redis_commands_per_message"]
+            self.stdout.write(
+                f"{mode:>5}: 전원 도착 p50 {result['fanout']['p50_ms']:.2f}ms / p99 {result['fanout']['p99_ms']:.2f}ms, "
+                f"수신자별 p50 {result['delivery']['p50_ms']:.2f}ms, "
+                f"Redis 명령 {'측정 불가' if ops is None else f'{ops:.1f}'}/메시지"
+            )
+        write_results(options['output'], 'large_room', results)
+
+    async def _run(self, options):
+        host = (getattr(settings, 'REDIS_HOST', 'redis'), getattr(settings, 'REDIS_PORT', 6379))
+        stats = redis.asyncio.Redis(host=host[0], port=host[1])
+        frame = {
+            "type": "chat_message",
+            "message": "대형 방 공지입니다. " * 5,
+            "username": "bench",
+            "message_id": 1,
+            "timestamp": timezone.now().isoformat(),
+        }
+        try:
+            return {
+                "group": await self._run_group(host, stats, frame, options),
+                "hub": await self._run_hub(host, stats, frame, options),
+            }
+        finally:
+            await stats.aclose()
+
+    async def _measure(self, stats, send, state, options):
+        """메시지를 하나씩 보내고 수신자 전원 도착까지 기다림"""
+        for _ in range(3):
+            state["counter"] = _Counter(options['members'])
+            await send()
+            await asyncio.wait_for(state["counter"].done.wait(), timeout=60)
+
+        before = await self._command_calls(stats)
+        fanout, deliveries = [], []
+        for _ in range(options['messages']):
+            state["counter"] = counter = _Counter(options['members'])
+            started = time.perf_counter()
+            await send()
+            await asyncio.wait_for(counter.done.wait(), timeout=60)
+            fanout.append(time.perf_counter() - started)
+            deliveries.extend(counter.latencies)
+        after = await self._command_calls(stats)
+
+        return {
+            "fanout": summarize(fanout),
+            "delivery": summarize(deliveries),
+            "redis_commands_per_message": (
+                None if before is None or after is None else (after - before) / options['messages']
+            ),
+        }
+
+    @staticmethod
+    async def _command_calls(stats):
+        """INFO commandstats의 전체 호출 수 (Lua 안에서 실행된 명령 포함). 지원하지 않는 서버면 None"""
+        try:
+            info = await stats.info("commandstats")
+        except redis.RedisError:
+            return None
+        return sum(value["calls"] for value in info.values() if isinstance(value, dict))
+
+    async def _run_group(self, host, stats, frame, options):
+        layers = [RedisChannelLayer(hosts=[host], capacity=100000, expiry=60) for _ in range(options['workers'])]
+        group = f"chat_{uuid.uuid4()}"
+        state = {}
+        channels = []
+        for index in range(options['members']):
+            layer = layers[index % len(layers)]
+            channel = await layer.new_channel()
+            await layer.group_add(group, channel)
+            channels.append((layer, channel))
+
+        async def receiver(layer, channel):
+            while True:
+                # receive 이후에 카운터를 조회해야 메시지마다 새로 만든 카운터에 기록됨
+                event = await layer.receive(channel)
+                state["counter"].record(event)
+
+        receivers = [asyncio.create_task(receiver(layer, channel)) for layer, channel in channels]
+
+        async def send():
+            await layers[0].group_send(group, dict(chat_event(frame, 0), sent_at=time.perf_counter()))
+
+        try:
+            return await self._measure(stats, send, state, options)
+        finally:
+            for task in receivers:
+                task.cancel()
+            await asyncio.gather(*receivers, return_exceptions=True)
+            for layer, channel in channels:
+                await layer.group_discard(group, channel)
+            for layer in layers:
+                await layer.close_pools()
+
+    async def _run_hub(self, host, stats, frame, options):
+        hubs = [RoomHub(redis.asyncio.Redis(host=host[0], port=host[1])) for _ in range(options['workers'])]
+        room_uuid = uuid.uuid4()
+        state = {}
+        consumers = []
+        for index in range(options['members']):
+            hub = hubs[index % len(hubs)]
+            consumer = _LocalConsumer(state)
+            await hub.join(room_uuid, consumer)
+            consumers.append((hub, consumer))
+
+        async def send():
+            await hubs[0].publish(room_uuid, dict(chat_event(frame, 0), sent_at=time.perf_counter()))
+
+        try:
+            return await self._measure(stats, send, state, options)
+        finally:
+            for hub, consumer in consumers:
+                await hub.leave(room_uuid, consumer)
+            for hub in hubs:
+                await hub.close()
+                await hub.client.aclose()
@@ -0,0 +1,76 @@
+import contextlib
+import io
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from chat.bench_utils import Stopwatch, create_bench_room, drop_bench_room, seed_messages, summarize, write_results
+from chat.pagination import encode_cursor
+from chat.views import get_room_messages
+
+
+class Command(BaseCommand):
+    help = "메시지 목록 깊은 스크롤 벤치마크: page(COUNT + OFFSET) vs before 커서(keyset), 깊이별 지연시간"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200000, help="방에 미리 넣어둘 메시지 수")
+        parser.add_argument('--requests', type=int, default=50, help="깊이/방식별 요청 수")
+        parser.add_argument('--limit', type=int, default=50)
+        parser.add_argument('--depths', default="1,10,100,1000,3000", help="측정할 page 번호 (쉼표 구분)")
+        parser.add_argument('--output', help="결과 JSON 저장 경로")
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        depths = [int(depth) for depth in options['depths'].split(",")]
+        depths = [depth for depth in depths if (depth - 1) * limit < options['messages']]
+
+        room, admin_profile, _ = create_bench_room()
+        results = {}
+        try:
+            seed_messages(room, [admin_profile], options['messages'])
+            for depth in depths:
+                results[f"page_{depth}"] = {
+                    "offset": self._measure(room, admin_profile, options, {"page": depth, "limit": limit}),
+                    "keyset": self._measure(room, admin_profile, options, {"before": self._cursor(room, depth, limit), "limit": limit}),
+                }
+        finally:
+            drop_bench_room(room)
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:>10}: offset p50 {result['offset']['p50_ms']:.2f}ms / p99 {result['offset']['p99_ms']:.2f}ms, "
+                f"keyset p50 {result['keyset']['p50_ms']:.2f}ms / p99 {result['keyset']['p99_ms']:.2f}ms "
+                f"({result['keyset']['queries_per_request']:.1f} queries/request)"
+            )
+        write_results(options['output'], 'message_pagination', results)
+
+    def _cursor(self, room, depth, limit):
+        """page=depth와 같은 구간을 가져오는 before 커서 (이전 페이지의 가장 오래된 메시지)"""
+        if depth == 1:
+            newest = room.messages.order_by('-created_at', '-id').first()
+            # 가장 최신 메시지도 포함되도록 id를 하나 늘림
+            return encode_cursor(newest.created_at.isoformat(), newest.id + 1)
+        message = room.messages.order_by('-created_at', '-id')[(depth - 1) * limit - 1]
+        return encode_cursor(message.created_at.isoformat(), message.id)
+
+    def _measure(self, room, profile, options, params):
+        factory = RequestFactory()
+        path = f"/api/chat/rooms/{room.room_uuid}/messages/"
+        latencies = []
+        # 첫 페이지도 DB 경로로 비교 (스트림 캐시는 bench_room_history에서 측정)
+        with override_settings(CHAT_MESSAGE_CACHE_ENABLED=False, CHAT_RATE_LIMIT_ENABLED=False), \
+                contextlib.redirect_stdout(io.StringIO()):
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(options['requests']):
+                    request = factory.get(path, params)
+                    request.user = profile.user
+                    request.profile = profile
+                    with Stopwatch() as stopwatch:
+                        response = get_room_messages(request, str(room.room_uuid))
+                    assert response.status_code == 200, response.content
+                    latencies.append(stopwatch.elapsed)
+        result = summarize(latencies)
+        result["queries_per_request"] = len(queries) / options['requests']
+        return result
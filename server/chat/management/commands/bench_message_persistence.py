@@ -0,0 +1,82 @@
+import asyncio
+
+from channels.db import database_sync_to_async
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.bench_utils import Stopwatch, create_bench_room, drop_bench_room, write_results
+from chat.message_buffer import MessageWriteBuffer
+from chat.models import Message
+
+
+class Command(BaseCommand):
+    help = "메시지 저장 경로 벤치마크: 메시지당 create() vs write-behind bulk_create (messages/s)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000, help="전송할 메시지 수")
+        parser.add_argument('--senders', type=int, default=20, help="동시 전송자 수")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--flush-interval', type=float, default=0.2)
+        parser.add_argument('--output', help="결과 JSON 저장 경로")
+
+    def handle(self, *args, **options):
+        room, admin_profile, _ = create_bench_room()
+        try:
+            results = asyncio.run(self._run(room, admin_profile, options))
+        finally:
+            drop_bench_room(room)
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:>13}: {result['messages']}개 / {result['seconds']:.3f}s "
+                f"= {result['messages_per_sec']:.0f} msg/s"
+            )
+        write_results(options['output'], 'message_persistence', results)
+
+    async def _run(self, room, sender, options):
+        total = options['messages']
+        senders = max(1, options['senders'])
+        per_sender = total // senders
+        total = per_sender * senders
+
+        @database_sync_to_async
+        def save_direct(content):
+            return Message.objects.create(
+                room=room, sender=sender, content=content, created_at=timezone.now()
+            )
+
+        async def direct_sender(index):
+            for i in range(per_sender):
+                await save_direct(f"direct {index}-{i}")
+
+        with Stopwatch() as direct:
+            await asyncio.gather(*(direct_sender(i) for i in range(senders)))
+
+        buffer = MessageWriteBuffer(
+            batch_size=options['batch_size'],
+            flush_interval=options['flush_interval'],
+            notify=False,
+        )
+
+        async def buffered_sender(index):
+            for i in range(per_sender):
+                await buffer.enqueue(room.room_uuid, sender.id, f"buffered {index}-{i}", "bench")
+
+        with Stopwatch() as buffered:
+            await asyncio.gather(*(buffered_sender(i) for i in range(senders)))
+            # 내구성까지 포함해 측정: 남은 배치가 모두 저장될 때까지 대기
+            while buffer.pending_count:
+                await buffer.flush()
+
+        return {
+            "direct": self._result(total, direct.elapsed),
+            "write_behind": self._result(total, buffered.elapsed),
+        }
+
+    @staticmethod
+    def _result(count, seconds):
+        return {
+            "messages": count,
+            "seconds": seconds,
+            "messages_per_sec": count / seconds if seconds else 0.0,
+        }
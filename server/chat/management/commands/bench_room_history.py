@@ -0,0 +1,72 @@
+import contextlib
+import io
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from chat import message_stream
+from chat.bench_utils import Stopwatch, create_bench_room, drop_bench_room, summarize, write_results
+from chat.models import Message
+from chat.views import get_room_messages
+
+
+class Command(BaseCommand):
+    help = "메시지 목록 첫 페이지 벤치마크: ORM(조회 + COUNT) vs Redis 스트림"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=5000, help="방에 미리 넣어둘 메시지 수")
+        parser.add_argument('--requests', type=int, default=300, help="경로별 요청 수")
+        parser.add_argument('--limit', type=int, default=50)
+        parser.add_argument('--output', help="결과 JSON 저장 경로")
+
+    def handle(self, *args, **options):
+        room, admin_profile, _ = create_bench_room()
+        try:
+            now = timezone.now()
+            Message.objects.bulk_create(
+                Message(room=room, sender=admin_profile, content=f"history {i}", created_at=now)
+                for i in range(options['messages'])
+            )
+            results = {
+                "orm": self._measure(room, admin_profile, options, cache_enabled=False),
+                "stream": self._measure(room, admin_profile, options, cache_enabled=True),
+            }
+        finally:
+            message_stream.delete(room.room_uuid)
+            drop_bench_room(room)
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:>6}: p50 {result['p50_ms']:.2f}ms, p99 {result['p99_ms']:.2f}ms, "
+                f"{result['queries_per_request']:.1f} queries/request"
+            )
+        write_results(options['output'], 'room_history', results)
+
+    def _measure(self, room, profile, options, cache_enabled):
+        factory = RequestFactory()
+        path = f"/api/chat/rooms/{room.room_uuid}/messages/"
+        latencies = []
+        with override_settings(CHAT_MESSAGE_CACHE_ENABLED=cache_enabled, CHAT_RATE_LIMIT_ENABLED=False), \
+                contextlib.redirect_stdout(io.StringIO()):
+            if cache_enabled:
+                # 첫 요청(miss → warm)은 측정에서 제외
+                message_stream.delete(room.room_uuid)
+                self._get(factory, path, room, profile, options['limit'])
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(options['requests']):
+                    with Stopwatch() as stopwatch:
+                        response = self._get(factory, path, room, profile, options['limit'])
+                    assert response.status_code == 200, response.content
+                    latencies.append(stopwatch.elapsed)
+        result = summarize(latencies)
+        result["queries_per_request"] = len(queries) / options['requests']
+        return result
+
+    def _get(self, factory, path, room, profile, limit):
+        request = factory.get(path, {"page": 1, "limit": limit})
+        request.user = profile.user
+        request.profile = profile
+        return get_room_messages(request, str(room.room_uuid))
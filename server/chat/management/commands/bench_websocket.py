@@ -0,0 +1,336 @@
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+import uuid
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from chat.bench_utils import create_bench_room, drop_bench_room, rss_bytes, summarize, write_results
+
+LAYERS = {
+    "memory": {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    "redis": None,  # settings.CHANNEL_LAYERS 그대로 사용
+}
+
+# 벤치마크 중에는 요청 제한과 송신 큐 정책이 측정을 방해하지 않게 끔
+BENCH_SETTINGS = {
+    "CHAT_RATE_LIMIT_ENABLED": False,
+    "CHAT_OUTBOUND_QUEUE_SIZE": 100000,
+}
+
+
+# ==================== 클라이언트 ====================
+
+class _CommunicatorClient:
+    """channels.testing.WebsocketCommunicator (프로세스 내 ASGI 호출)"""
+
+    def __init__(self, application, path, user):
+        from channels.testing import WebsocketCommunicator
+        self.communicator = WebsocketCommunicator(application, path)
+        self.communicator.scope["user"] = user
+        self.frames = asyncio.Queue()
+        self._reader = None
+
+    async def connect(self):
+        connected, _ = await self.communicator.connect(timeout=30)
+        if not connected:
+            raise CommandError("WebSocket 연결 거부됨")
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        while True:
+            # timeout=None: 타임아웃으로 앱이 취소되지 않도록 무기한 대기 (종료 시 태스크 취소)
+            output = await self.communicator.receive_output(timeout=None)
+            if output.get("type") == "websocket.send" and output.get("text"):
+                self.frames.put_nowait(json.loads(output["text"]))
+
+    async def send(self, payload):
+        await self.communicator.send_to(text_data=json.dumps(payload))
+
+    async def close(self):
+        if self._reader:
+            self._reader.cancel()
+        await self.communicator.disconnect()
+
+
+class _SocketClient:
+    """
+    실제 TCP 소켓 클라이언트 (로컬 daphne 대상)
+    daphne 앱이 설치되어 있으면 txaio가 twisted로 고정되어 autobahn asyncio 클라이언트를 쓸 수 없으므로
+    벤치마크에 필요한 만큼(핸드셰이크, 텍스트/close/ping 프레임)만 asyncio 스트림으로 직접 구현
+    """
+
+    def __init__(self, host, port, path, session_key):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.session_key = session_key
+        self.frames = asyncio.Queue()
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        self._writer.write((
+            f"GET {self.path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n"
+            f"Cookie: sessionid={self.session_key}\r\n"
+            "\r\n"
+        ).encode())
+        response = await asyncio.wait_for(self._reader.readuntil(b"\r\n\r\n"), timeout=30)
+        if not response.startswith(b"HTTP/1.1 101"):
+            raise CommandError(f"WebSocket 연결 거부됨: {response.splitlines()[0].decode()}")
+        self._read_task = asyncio.create_task(self._read())
+
+    async def _read(self):
+        while True:
+            header = await self._reader.readexactly(2)
+            opcode = header[0] & 0x0F
+            length = header[1] & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", await self._reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", await self._reader.readexactly(8))[0]
+            payload = await self._reader.readexactly(length)
+            if opcode == 0x1:
+                self.frames.put_nowait(json.loads(payload.decode("utf8")))
+            elif opcode == 0x8:
+                return
+            elif opcode == 0x9:
+                self._write_frame(0xA, payload)
+
+    def _write_frame(self, opcode, payload):
+        # 클라이언트 → 서버 프레임은 마스킹 필수 (RFC 6455 5.3)
+        mask = os.urandom(4)
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, 0x80 | length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 0x80 | 127, length)
+        masked = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+        self._writer.write(header + mask + masked)
+
+    async def send(self, payload):
+        self._write_frame(0x1, json.dumps(payload).encode("utf8"))
+        await self._writer.drain()
+
+    async def close(self):
+        if self._read_task:
+            self._read_task.cancel()
+        if self._writer:
+            with contextlib.suppress(ConnectionError):
+                self._write_frame(0x8, struct.pack("!H", 1000))
+                await self._writer.drain()
+            self._writer.close()
+
+
+# ==================== 명령 ====================
+
+class Command(BaseCommand):
+    help = (
+        "WebSocket 부하/fan-out 벤치마크: ChatConsumer / AiChatConsumer를 WebsocketCommunicator와 "
+        "로컬 daphne 실소켓으로 구동 (인메모리 / Redis 채널 레이어). "
+        "연결 지연, fan-out p50/p99, messages/s, 연결당 메모리를 JSON으로 저장"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transport', choices=["communicator", "daphne", "both"], default="communicator")
+        parser.add_argument('--layer', choices=["memory", "redis", "both"], default="memory")
+        parser.add_argument('--consumer', choices=["chat", "ai", "both"], default="chat",
+                            help="ai는 communicator에서만 (OpenAI 호출 대신 고정 지연 응답 사용)")
+        parser.add_argument('--sizes', default="10,50", help="방 인원(연결 수) 목록 (쉼표 구분)")
+        parser.add_argument('--messages', type=int, default=50, help="방 크기별 전송 메시지 수")
+        parser.add_argument('--ai-latency', type=float, default=0.05, help="AI 응답 대신 사용할 고정 지연(초)")
+        parser.add_argument('--port', type=int, default=8765, help="daphne 포트")
+        parser.add_argument('--timeout', type=float, default=60, help="전체 메시지 수신 대기 시간(초)")
+        parser.add_argument('--output', help="결과 JSON 저장 경로")
+
+    def handle(self, *args, **options):
+        transports = ["communicator", "daphne"] if options['transport'] == "both" else [options['transport']]
+        layers = ["memory", "redis"] if options['layer'] == "both" else [options['layer']]
+        consumers = ["chat", "ai"] if options['consumer'] == "both" else [options['consumer']]
+        sizes = [int(size) for size in options['sizes'].split(',') if size]
+
+        results = {}
+        for transport in transports:
+            for layer in layers:
+                for consumer in consumers:
+                    if consumer == "ai" and transport == "daphne":
+                        self.stdout.write("ai/daphne 조합은 건너뜀 (실서버에서는 OpenAI 호출을 대체할 수 없음)")
+                        continue
+                    for size in sizes:
+                        name = f"{transport}/{layer}/{consumer}/{size}"
+                        result = self._run_case(transport, layer, consumer, size, options)
+                        results[name] = result
+                        self.stdout.write(
+                            f"{name}: connect p50 {result['connect']['p50_ms']:.1f}ms, "
+                            f"fan-out p50 {result['fanout']['p50_ms']:.1f}ms / p99 {result['fanout']['p99_ms']:.1f}ms, "
+                            f"{result['messages_per_sec']:.0f} msg/s, "
+                            f"{result['memory_per_connection_kb'] or 0:.0f} KB/conn"
+                        )
+        write_results(options['output'], 'websocket', results)
+
+    def _run_case(self, transport, layer, consumer, size, options):
+        room, admin_profile, profiles = create_bench_room(size - 1)
+        members = [admin_profile] + profiles
+        session = None
+        if consumer == "ai":
+            from llm.models import AiChatSession
+            session = AiChatSession.objects.create(base_room=room, session_id=str(uuid.uuid4()))
+        path = f"/ws/llm/{session.session_id}/" if session else f"/ws/chat/{room.room_uuid}/"
+
+        try:
+            if transport == "communicator":
+                return self._run_communicator(layer, members, path, options)
+            return self._run_daphne(layer, members, path, options)
+        finally:
+            drop_bench_room(room, profiles)
+
+    def _run_communicator(self, layer, members, path, options):
+        from server.asgi import application
+        import llm.consumers
+
+        async def fake_ai_response(history):
+            await asyncio.sleep(options['ai_latency'])
+            return "벤치마크 응답입니다."
+
+        layer_override = {"CHANNEL_LAYERS": LAYERS[layer]} if LAYERS[layer] else {}
+        users = [member.user for member in members]
+        with override_settings(**BENCH_SETTINGS, **layer_override), \
+                mock.patch.object(llm.consumers, "get_ai_response", fake_ai_response), \
+                contextlib.redirect_stdout(io.StringIO()):
+            return asyncio.run(self._drive(
+                lambda index: _CommunicatorClient(application, path, users[index]),
+                len(members), options, pid="self",
+            ))
+
+    def _run_daphne(self, layer, members, path, options):
+        session_keys = [self._session_key(member.user) for member in members]
+        env = dict(os.environ, CHANNEL_LAYER_BACKEND=layer,
+                   **{key: str(value) for key, value in BENCH_SETTINGS.items()})
+        process = subprocess.Popen(
+            [sys.executable, "-m", "daphne", "-b", "127.0.0.1", "-p", str(options['port']), "server.asgi:application"],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            self._wait_for_port(options['port'], process)
+            return asyncio.run(self._drive(
+                lambda index: _SocketClient("127.0.0.1", options['port'], path, session_keys[index]),
+                len(members), options, pid=process.pid,
+            ))
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    @staticmethod
+    def _session_key(user):
+        """daphne 인증용 로그인 세션 (AuthMiddlewareStack이 sessionid 쿠키로 사용자 조회)"""
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session.session_key
+
+    @staticmethod
+    def _wait_for_port(port, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError("daphne 시작 실패")
+            with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+            time.sleep(0.1)
+        raise CommandError("daphne 포트 대기 시간 초과")
+
+    async def _drive(self, make_client, size, options, pid):
+        # 1. 연결 (동시 접속 폭주를 흉내 내어 한꺼번에 연결)
+        rss_before = await sync_to_async(rss_bytes)(pid)
+        clients = [make_client(index) for index in range(size)]
+        connect_latencies = []
+
+        async def connect(client):
+            started = time.perf_counter()
+            await client.connect()
+            connect_latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(connect(client) for client in clients))
+        await asyncio.sleep(0.5)  # 입장 알림/히스토리 프레임 정리
+        rss_after = await sync_to_async(rss_bytes)(pid)
+        for client in clients:
+            while not client.frames.empty():
+                client.frames.get_nowait()
+
+        # 2. fan-out: 보낸 시각을 기록하고 모든 연결이 받을 때까지 지연 측정
+        sent_at = {}
+        fanout_latencies = []
+        expected = options['messages'] * size
+        all_received = asyncio.Event()
+
+        async def collect(client):
+            while True:
+                frame = await client.frames.get()
+                if frame.get("type") != "chat_message" or frame.get("is_ai"):
+                    continue
+                started = sent_at.get(frame.get("message"))
+                if started is None:
+                    continue
+                fanout_latencies.append(time.perf_counter() - started)
+                if len(fanout_latencies) >= expected:
+                    all_received.set()
+
+        collectors = [asyncio.create_task(collect(client)) for client in clients]
+        started = time.perf_counter()
+        try:
+            for index in range(options['messages']):
+                text = f"bench:{index}"
+                sent_at[text] = time.perf_counter()
+                await clients[index % size].send({"type": "chat_message", "message": text})
+                await asyncio.sleep(0)
+            await asyncio.wait_for(all_received.wait(), timeout=options['timeout'])
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - started
+
+        for task in collectors:
+            task.cancel()
+        await asyncio.gather(*collectors, return_exceptions=True)
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+
+        memory_per_connection = (
+            (rss_after - rss_before) / size / 1024 if rss_before is not None and rss_after is not None else None
+        )
+        return {
+            "connections": size,
+            "connect": summarize(connect_latencies),
+            "fanout": summarize(fanout_latencies),
+            "messages": options['messages'],
+            "deliveries": len(fanout_latencies),
+            "expected_deliveries": expected,
+            "seconds": elapsed,
+            "messages_per_sec": options['messages'] / elapsed if elapsed else 0.0,
+            "deliveries_per_sec": len(fanout_latencies) / elapsed if elapsed else 0.0,
+            "memory_per_connection_kb": memory_per_connection,
+        }
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from chat import drain
+
+
+class Command(BaseCommand):
+    help = (
+        "WebSocket 워커 drain 시작/취소: 새 연결을 받지 않고 기존 연결을 --window초에 걸쳐 "
+        "reconnect 힌트와 함께 종료 (진행 중인 AI 응답은 끝날 때까지 대기)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=drain.ALL_HOSTS, help="대상 컨테이너 hostname (기본: 전체 워커)")
+        parser.add_argument('--window', type=float, help="기존 연결을 닫는 데 쓰는 시간(초), 기본 CHAT_DRAIN_WINDOW")
+        parser.add_argument('--cancel', action='store_true', help="drain 취소 (아직 닫히지 않은 연결은 유지)")
+
+    def handle(self, *args, **options):
+        if options['cancel']:
+            drain.cancel_drain(options['host'])
+            self.stdout.write(f"drain 취소: {options['host']}")
+            return
+        drain.request_drain(options['host'], options['window'])
+        self.stdout.write(
+            f"drain 요청: {options['host']} (워커가 CHAT_DRAIN_POLL_INTERVAL 안에 시작, "
+            f"window={options['window'] or '기본값'}초)"
+        )
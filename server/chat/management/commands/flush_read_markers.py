@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from chat.unread import flush_read_markers
+
+
+class Command(BaseCommand):
+    help = "Redis에 쌓인 읽음 시각을 UserChatRoomActivity.last_read_at에 반영 (cron용)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            flushed = flush_read_markers(options['batch_size'])
+            total += flushed
+            if flushed < options['batch_size']:
+                break
+        self.stdout.write(f"last_read_at 반영: {total}개")
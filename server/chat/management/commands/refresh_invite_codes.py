@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.invites import INTERVAL, refresh_open_invitations
+
+
+class Command(BaseCommand):
+    help = "초대 중인 방들의 현재 / 다음 창 초대 코드를 Redis에 미리 등록 (--loop이면 창마다 반복)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="스크립트 호출 하나에 넣을 방 수")
+        parser.add_argument('--loop', action='store_true', help="종료할 때까지 창이 바뀔 때마다 실행")
+
+    def handle(self, *args, **options):
+        while True:
+            rooms, collisions = refresh_open_invitations(batch_size=options['batch_size'])
+            self.stdout.write(f"초대 코드 등록: 방 {rooms}개, 충돌 {collisions}개")
+            if not options['loop']:
+                break
+            # 다음 창 시작 직후에 다시 실행 (그 다음 창 코드가 미리 등록되도록)
+            time.sleep(INTERVAL - time.time() % INTERVAL + 1)
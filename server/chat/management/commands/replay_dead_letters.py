@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from chat.message_buffer import replay_dead_letters
+
+
+class Command(BaseCommand):
+    help = "write-behind 버퍼가 저장하지 못한 메시지(dead letter)를 다시 저장 (한 번에 하나만 실행)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--drop-failed', action='store_true', help="다시 실패한 메시지는 목록에 되돌리지 않고 버림")
+
+    def handle(self, *args, **options):
+        saved, failed = replay_dead_letters(options['batch_size'], drop_failed=options['drop_failed'])
+        self.stdout.write(f"dead letter 재저장: {saved}개, 실패: {failed}개")
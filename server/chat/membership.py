@@ -0,0 +1,239 @@
+"""
+채팅방 멤버십 인덱스
+
+방마다 Redis Set(room:<uuid>:members)과 방장 키(room:<uuid>:admin)를 유지해서
+is_member / role 확인을 O(1)로 처리한다.
+방장 키가 없으면 아직 캐시되지 않은 방으로 보고 인덱스가 있는 EXISTS 쿼리로 답한 뒤 캐시를 채운다.
+Redis 장애 시에도 항상 DB 쿼리로 fallback 한다.
+
+캐시 채우기(warm)는 DB를 읽는 동안 참가/나가기가 커밋되면 이전 멤버 목록을 다시 써넣을 수 있다.
+그래서 참가/나가기 훅은 room:<uuid>:members:version을 올리고, warm은 이 키를 WATCH한 뒤 DB를 읽어
+임시 키에 새 Set을 만들고 RENAME으로 교체한다. 그 사이 버전이 바뀌면 EXEC가 취소되어 아무것도 쓰지 않는다.
+참가 / 나가기 반영이 실패하면 캐시가 DB와 어긋난 채 남지 않도록 방 캐시를 통째로 지운다 (다음 조회 때 DB에서 다시 채움).
+"""
+import redis
+from django.conf import settings
+from django.db import transaction
+
+from . import room_queries, versions
+from .models import ChatRoom
+from .redis_utils import redis_client
+
+MEMBERS_KEY = "room:{}:members"
+ADMIN_KEY = "room:{}:admin"
+VERSION_KEY = "room:{}:members:version"
+
+ROLE_ADMIN = "admin"
+ROLE_PARTICIPANT = "participant"
+
+Participant = ChatRoom.participants.through
+
+
+def _ttl():
+    return getattr(settings, 'CHAT_MEMBERSHIP_CACHE_TTL', 600)
+
+
+# ==================== 조회 ====================
+
+def role(room_uuid, profile_id):
+    """'admin' / 'participant' / None (멤버 아님 또는 방 없음)"""
+    room_uuid = str(room_uuid)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.get(ADMIN_KEY.format(room_uuid))
+        pipe.sismember(MEMBERS_KEY.format(room_uuid), profile_id)
+        admin_id, is_participant = pipe.execute()
+    except redis.RedisError as e:
+        print(f"[WARNING] 멤버십 캐시 조회 실패, DB로 대체: {e}")
+        return _role_from_db(room_uuid, profile_id)
+
+    if admin_id is None:
+        # 캐시 미스: DB로 답하고 다음 조회를 위해 캐시 채우기
+        result = _role_from_db(room_uuid, profile_id)
+        warm(room_uuid)
+        return result
+
+    if int(admin_id) == profile_id:
+        return ROLE_ADMIN
+    return ROLE_PARTICIPANT if is_participant else None
+
+
+def roles(room_uuids, profile_id):
+    """여러 방의 role을 파이프라인 한 번으로 조회 ({room_uuid: 'admin' / 'participant' / None})"""
+    room_uuids = [str(room_uuid) for room_uuid in room_uuids]
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for room_uuid in room_uuids:
+            pipe.get(ADMIN_KEY.format(room_uuid))
+            pipe.sismember(MEMBERS_KEY.format(room_uuid), profile_id)
+        replies = pipe.execute()
+    except redis.RedisError as e:
+        print(f"[WARNING] 멤버십 캐시 조회 실패, DB로 대체: {e}")
+        return {room_uuid: _role_from_db(room_uuid, profile_id) for room_uuid in room_uuids}
+
+    result = {}
+    for room_uuid, admin_id, is_participant in zip(room_uuids, replies[::2], replies[1::2]):
+        if admin_id is None:
+            # 캐시 미스인 방만 DB로 답하고 캐시 채우기
+            result[room_uuid] = _role_from_db(room_uuid, profile_id)
+            warm(room_uuid)
+        elif int(admin_id) == profile_id:
+            result[room_uuid] = ROLE_ADMIN
+        else:
+            result[room_uuid] = ROLE_PARTICIPANT if is_participant else None
+    return result
+
+
+def is_member(room_uuid, profile_id):
+    """방장이거나 참가자이면 True"""
+    return role(room_uuid, profile_id) is not None
+
+
+def _role_from_db(room_uuid, profile_id):
+    admin_id = ChatRoom.objects.filter(room_uuid=room_uuid).values_list('admin_id', flat=True).first()
+    if admin_id is None:
+        return None
+    if admin_id == profile_id:
+        return ROLE_ADMIN
+    # (chatroom_id, userprofile_id) unique 인덱스를 타는 EXISTS
+    if Participant.objects.filter(chatroom_id=room_uuid, userprofile_id=profile_id).exists():
+        return ROLE_PARTICIPANT
+    return None
+
+
+def warm(room_uuid):
+    """DB에서 방 멤버 전체를 읽어 캐시 채우기 (실패하거나 그 사이 멤버가 바뀌면 쓰지 않음)"""
+    room_uuid = str(room_uuid)
+    pipe = redis_client.pipeline(transaction=True)
+    try:
+        # DB 조회 중 참가/나가기가 반영되면 EXEC가 취소됨
+        pipe.watch(VERSION_KEY.format(room_uuid))
+        admin_id, member_ids = _load_members(room_uuid)
+        if admin_id is None:
+            return
+        pipe.multi()
+        _write_members(pipe, room_uuid, admin_id, member_ids)
+        pipe.execute()
+    except redis.WatchError:
+        print(f"[DEBUG] 멤버십 캐시 적재 중 멤버 변경됨, 다음 조회 때 재시도: {room_uuid}")
+    except redis.RedisError as e:
+        print(f"[WARNING] 멤버십 캐시 적재 실패: {e}")
+    finally:
+        pipe.reset()
+
+
+def _load_members(room_uuid):
+    """(방장 id, 참가자 id 목록). 방이 없으면 (None, [])"""
+    admin_id = ChatRoom.objects.filter(room_uuid=room_uuid).values_list('admin_id', flat=True).first()
+    if admin_id is None:
+        return None, []
+    member_ids = list(
+        Participant.objects.filter(chatroom_id=room_uuid).values_list('userprofile_id', flat=True)
+    )
+    return admin_id, member_ids
+
+
+# ==================== 갱신 ====================
+
+def _write_members(pipe, room_uuid, admin_id, member_ids):
+    """임시 키에 멤버 Set을 만들고 RENAME으로 교체 (기존 Set에 SADD하지 않으므로 이전 멤버가 남지 않음)"""
+    members_key = MEMBERS_KEY.format(room_uuid)
+    admin_key = ADMIN_KEY.format(room_uuid)
+    temp_key = f"{members_key}:rebuild"
+    pipe.delete(temp_key)
+    pipe.sadd(temp_key, admin_id, *member_ids)
+    pipe.rename(temp_key, members_key)
+    pipe.set(admin_key, admin_id)
+    pipe.expire(members_key, _ttl())
+    pipe.expire(admin_key, _ttl())
+
+
+def _bump_version(pipe, room_uuid):
+    version_key = VERSION_KEY.format(room_uuid)
+    pipe.incr(version_key)
+    pipe.expire(version_key, _ttl())
+
+
+def _forget(room_uuid):
+    """반영이 누락됐을 수 있는 방 캐시 삭제 (다음 조회 때 DB에서 다시 채움)"""
+    try:
+        redis_client.delete(
+            MEMBERS_KEY.format(room_uuid), ADMIN_KEY.format(room_uuid), VERSION_KEY.format(room_uuid)
+        )
+    except redis.RedisError as e:
+        print(f"[ERROR] 멤버십 캐시 삭제 실패, TTL 만료까지 이전 값이 남음: {e}")
+
+
+def _after_commit(func):
+    """트랜잭션 커밋 후 캐시 갱신, Redis 오류는 로그만 남김"""
+    def run():
+        try:
+            func()
+        except redis.RedisError as e:
+            print(f"[WARNING] 멤버십 캐시 갱신 실패: {e}")
+    transaction.on_commit(run)
+
+
+def room_created(room_uuid, admin_id):
+    """새 방: 방장만 있는 상태로 캐시 초기화"""
+    def run():
+        pipe = redis_client.pipeline()
+        _write_members(pipe, str(room_uuid), admin_id, [])
+        pipe.execute()
+        room_queries.invalidate(admin_id)
+        versions.members_changed(room_uuid)
+    _after_commit(run)
+
+
+def member_added(room_uuid, profile_id):
+    def run():
+        room_uuid_str = str(room_uuid)
+        try:
+            pipe = redis_client.pipeline()
+            _bump_version(pipe, room_uuid_str)
+            # 캐시된 방에만 반영 (미캐시 방은 다음 조회 때 DB에서 채워짐)
+            if redis_client.exists(ADMIN_KEY.format(room_uuid_str)):
+                pipe.sadd(MEMBERS_KEY.format(room_uuid_str), profile_id)
+            pipe.execute()
+        except redis.RedisError as e:
+            # 새 멤버가 캐시된 Set에 빠진 채 거부되지 않도록 방 캐시를 지움
+            print(f"[WARNING] 멤버십 캐시 참가 반영 실패, 방 캐시 삭제: {e}")
+            _forget(room_uuid_str)
+        room_queries.invalidate(profile_id)
+        versions.members_changed(room_uuid)
+    _after_commit(run)
+
+
+def member_removed(room_uuid, profile_id):
+    def run():
+        room_uuid_str = str(room_uuid)
+        try:
+            pipe = redis_client.pipeline()
+            _bump_version(pipe, room_uuid_str)
+            pipe.srem(MEMBERS_KEY.format(room_uuid_str), profile_id)
+            pipe.execute()
+        except redis.RedisError as e:
+            # 나간 사용자가 멤버로 남지 않도록 방 캐시를 지움
+            print(f"[WARNING] 멤버십 캐시 나가기 반영 실패, 방 캐시 삭제: {e}")
+            _forget(room_uuid_str)
+        room_queries.invalidate(profile_id)
+        versions.members_changed(room_uuid)
+    _after_commit(run)
+
+
+def room_deleted(room_uuid):
+    room_uuid = str(room_uuid)
+
+    def run():
+        # 캐시된 멤버들의 방 목록도 무효화 (미캐시 방이면 목록 캐시 TTL 안에서만 남음)
+        try:
+            member_ids = redis_client.smembers(MEMBERS_KEY.format(room_uuid))
+        except redis.RedisError as e:
+            # 멤버 목록을 모르면 방 캐시만 지움 (멤버들의 방 목록 캐시는 TTL 안에서만 남음)
+            print(f"[WARNING] 멤버십 캐시 조회 실패, 방 캐시만 삭제: {e}")
+            member_ids = ()
+        _forget(room_uuid)
+        if member_ids:
+            room_queries.invalidate(*member_ids)
+        versions.forget_room(room_uuid)
+    _after_commit(run)
@@ -0,0 +1,419 @@
+"""
+채팅 메시지 write-behind 버퍼
+
+CHAT_WRITE_BEHIND 설정이 켜져 있으면 ChatConsumer는 메시지를 즉시 DB에 저장하지 않고
+이 버퍼에 넣은 뒤 임시 ID(provisional_id)로 먼저 브로드캐스트한다.
+프로세스당 하나의 flusher가 배치 크기 또는 시간 간격 기준으로 bulk_create 하고,
+저장이 끝나면 방 그룹에 message_committed 이벤트로 실제 message_id를 알려준다.
+
+배치 저장이 제약 위반(IntegrityError, 예: 그 사이 삭제된 방)으로 실패하면 한 건씩 다시 저장해서
+문제가 있는 행만 골라낸다. 실패한 행은 다음 flush에서 재시도하고, max_attempts번 실패하면
+dead letter로 옮긴 뒤 방 그룹에 message_failed로 알린다 (버퍼가 끝없이 커지지 않도록).
+
+이 메시지들은 이미 임시 ID로 브로드캐스트되었으므로 프로세스가 끝나도 사라지면 안 된다.
+- dead letter는 Redis 목록(chat:write_behind:dead_letters)에 원문 그대로 남기고
+  python manage.py replay_dead_letters 로 다시 저장한다. Redis도 실패하면 원문을 로그로 남긴다.
+- flusher가 꺼내서 저장 중인 배치(in-flight)는 스레드에서 재시도 / dead letter 처리까지 끝낸 뒤 비워지고,
+  종료 시 flush_sync는 in-flight 배치가 끝나기를 기다린 뒤(CHAT_WRITE_BEHIND_SHUTDOWN_TIMEOUT) 남은 메시지를 저장한다.
+"""
+import asyncio
+import atexit
+import collections
+import json
+import threading
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+
+import redis
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import dedupe, message_stream, metrics, room_hub, unread
+from .models import Message
+from .redis_utils import redis_client
+
+DEAD_LETTER_KEY = "chat:write_behind:dead_letters"
+
+
+@dataclass
+class PendingMessage:
+    """아직 DB에 저장되지 않은 메시지"""
+    room_id: uuid.UUID
+    sender_id: int
+    content: str
+    group_name: str
+    username: str = ""
+    client_msg_id: str = None
+    provisional_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    created_at: datetime = field(default_factory=timezone.now)
+    # 저장 실패 횟수 (max_attempts에 도달하면 dead letter)
+    attempts: int = 0
+
+    def to_json(self):
+        return json.dumps(dict(asdict(self), room_id=str(self.room_id), created_at=self.created_at.isoformat()))
+
+    @classmethod
+    def from_json(cls, data):
+        values = json.loads(data)
+        values["room_id"] = uuid.UUID(values["room_id"])
+        values["created_at"] = parse_datetime(values["created_at"])
+        return cls(**values)
+
+
+class MessageWriteBuffer:
+    """프로세스 단위 write-behind 버퍼 (배치 크기 / 시간 간격 기준 flush)"""
+
+    def __init__(self, batch_size=100, flush_interval=0.2, notify=True, max_attempts=5, dead_letter_size=1000):
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        self.notify = notify
+        self.max_attempts = max(1, int(max_attempts))
+        # 끝내 저장하지 못한 메시지 중 최근 dead_letter_size개 (영구 보관은 DEAD_LETTER_KEY)
+        self.dead_letters = collections.deque(maxlen=dead_letter_size)
+        self._pending = []
+        # 꺼내서 저장 중인 배치 {id(batch): batch}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._task = None
+        self._wakeup = None
+
+    # ==================== 공개 API ====================
+
+    async def enqueue(self, room_id, sender_id, content, group_name, username="", client_msg_id=None):
+        """메시지를 버퍼에 넣고 PendingMessage를 반환 (DB 접근 없음)"""
+        pending = PendingMessage(
+            room_id=room_id,
+            sender_id=sender_id,
+            content=content,
+            group_name=group_name,
+            username=username,
+            client_msg_id=client_msg_id,
+        )
+        with self._lock:
+            self._pending.append(pending)
+            size = len(self._pending)
+
+        self._ensure_flusher()
+        if size >= self.batch_size:
+            self._wakeup.set()
+        return pending
+
+    async def flush(self):
+        """버퍼에 쌓인 메시지를 한 번에 저장. 저장된 메시지 수를 반환"""
+        batch = self._take()
+        if not batch:
+            return 0
+
+        written, dropped = await database_sync_to_async(self._write_batch)(batch)
+        if self.notify:
+            await self._notify_committed(written)
+            await self._notify_failed(dropped)
+        return len(written)
+
+    def flush_sync(self, timeout=None):
+        """
+        이벤트 루프 밖(프로세스 종료 시)에서 남은 메시지를 동기적으로 저장. 저장하지 못한 메시지는 dead letter
+        flusher가 저장 중인 배치가 있으면 끝날 때까지 timeout초 기다리고, 그래도 남아 있으면 (루프가 먼저 멈춰
+        스레드에 넘어가지 못한 배치) 함께 저장한다. client_msg_id가 있는 메시지는 중복 저장되지 않는다.
+        """
+        if timeout is None:
+            timeout = getattr(settings, 'CHAT_WRITE_BEHIND_SHUTDOWN_TIMEOUT', 10)
+        with self._idle:
+            if not self._idle.wait_for(lambda: not self._inflight, timeout=timeout):
+                print(f"[WARNING] 저장 중인 메시지 배치 {len(self._inflight)}개가 끝나지 않아 다시 저장")
+            batch = [pending for inflight in self._inflight.values() for pending in inflight] + self._pending
+            self._inflight, self._pending = {}, []
+        if not batch:
+            return 0
+        try:
+            written, failed = self._write(batch)
+        except Exception as e:
+            print(f"[ERROR] 종료 전 메시지 저장 실패 ({len(batch)}개): {e}")
+            written, failed = [], batch
+        if failed:
+            # 종료 중이라 다음 flush가 없음
+            self._dead_letter(failed)
+        print(f"[DEBUG] 종료 전 메시지 {len(written)}개 저장 완료")
+        return len(written)
+
+    @property
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    # ==================== 내부 구현 ====================
+
+    def _ensure_flusher(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[ERROR] 메시지 flusher 오류: {e}")
+
+    def _take(self):
+        """대기 중인 메시지를 꺼내 in-flight로 표시 (_write_batch가 끝나면 해제)"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+            if batch:
+                self._inflight[id(batch)] = batch
+        return batch
+
+    def _write_batch(self, batch):
+        """
+        스레드에서 실행: 배치를 저장하고 실패분을 재시도 대기열 / dead letter로 옮긴 뒤 in-flight 해제
+        (저장됨, dead letter로 옮김) 반환. flush 코루틴이 취소되어도 여기까지는 끝까지 실행됨
+        """
+        try:
+            try:
+                written, failed = self._write(batch)
+            except Exception as e:
+                # 배치 전체 실패 (DB 연결 오류 등): 저장된 행이 없으므로 전부 재시도 대상
+                print(f"[ERROR] 메시지 배치 저장 실패 ({len(batch)}개), 재시도 예정: {e}")
+                written, failed = [], batch
+            return written, self._retry_or_drop(failed)
+        finally:
+            with self._idle:
+                self._inflight.pop(id(batch), None)
+                self._idle.notify_all()
+
+    def _requeue(self, batch):
+        with self._lock:
+            self._pending = batch + self._pending
+
+    def _retry_or_drop(self, failed):
+        """실패한 메시지의 시도 횟수를 늘려 다시 넣고, 한도에 도달한 메시지는 dead letter로 옮김. 옮긴 목록 반환"""
+        retry, dropped = [], []
+        for pending in failed:
+            pending.attempts += 1
+            (retry if pending.attempts < self.max_attempts else dropped).append(pending)
+        if retry:
+            self._requeue(retry)
+        if dropped:
+            self._dead_letter(dropped)
+        return dropped
+
+    def _dead_letter(self, dropped):
+        self.dead_letters.extend(dropped)
+        metrics.inc("chat_write_behind_dead_letters_total", len(dropped))
+        for pending in dropped:
+            print(
+                f"[ERROR] 메시지 저장 포기 (시도 {pending.attempts}회): "
+                f"room={pending.room_id} sender={pending.sender_id} provisional_id={pending.provisional_id}"
+            )
+        try:
+            redis_client.rpush(DEAD_LETTER_KEY, *(pending.to_json() for pending in dropped))
+        except redis.RedisError as e:
+            # 마지막 수단: 원문을 로그에 남겨 수동으로 복구
+            print(f"[ERROR] dead letter 보관 실패, 원문을 로그로 남김: {e}")
+            for pending in dropped:
+                print(f"[ERROR] dead letter: {pending.to_json()}")
+        # 같은 client_msg_id로 다시 보낼 수 있도록 중복 키 해제
+        dedupe.release_many([
+            (pending.room_id, pending.sender_id, pending.client_msg_id)
+            for pending in dropped if pending.client_msg_id
+        ])
+
+    def _write(self, batch):
+        """
+        배치를 저장하고 ([(pending, Message)], [저장 실패한 pending]) 반환
+        스트림 / 안 읽은 수 / 중복 키 갱신은 커밋 이후 작업이라 실패해도 재시도 대상이 아님 (로그만 남김)
+        """
+        written, failed = self._save(batch)
+        try:
+            self._after_commit(written)
+        except Exception as e:
+            print(f"[ERROR] 저장 후 스트림/읽음/중복 키 갱신 실패 ({len(written)}개): {e}")
+        return written, failed
+
+    def _save(self, batch):
+        """
+        bulk_create로 한 트랜잭션에 저장 (SQLite는 RETURNING으로 id를 채워줌)
+        이미 저장된 client_msg_id는 기존 메시지로 채운다 (created=False).
+        제약 위반이면 한 건씩 저장해서 실패한 행만 골라낸다
+        ([(pending, Message, created)], [저장 실패한 pending]) 반환
+        """
+        existing = self._existing_client_messages(batch)
+        new_pending, results, first_index = [], [None] * len(batch), {}
+        for index, pending in enumerate(batch):
+            dedupe_key = self._dedupe_key(pending)
+            if dedupe_key in existing:
+                results[index] = (existing[dedupe_key], False)
+            elif dedupe_key is not None and dedupe_key in first_index:
+                # 같은 배치 안의 재전송 (Redis 선점이 실패한 경우)
+                results[index] = first_index[dedupe_key]
+            else:
+                if dedupe_key is not None:
+                    first_index[dedupe_key] = index
+                new_pending.append((index, pending))
+
+        try:
+            with transaction.atomic():
+                saved = Message.objects.bulk_create([self._build(pending) for _, pending in new_pending])
+        except IntegrityError as e:
+            print(f"[WARNING] 메시지 배치 저장 중 제약 위반, 한 건씩 다시 저장: {e}")
+            saved = [self._save_one(pending) for _, pending in new_pending]
+
+        for (index, _), message in zip(new_pending, saved):
+            results[index] = (message, True) if message is not None else None
+        for index, result in enumerate(results):
+            if isinstance(result, int):
+                # 같은 배치의 첫 메시지를 가리킴 (그 메시지가 실패했으면 같이 재시도)
+                first = results[result]
+                results[index] = (first[0], False) if first is not None else None
+
+        written, failed = [], []
+        for pending, result in zip(batch, results):
+            if result is None:
+                failed.append(pending)
+            else:
+                written.append((pending, *result))
+        return written, failed
+
+    @staticmethod
+    def _build(pending):
+        return Message(
+            room_id=pending.room_id,
+            sender_id=pending.sender_id,
+            content=pending.content,
+            created_at=pending.created_at,
+            client_msg_id=pending.client_msg_id,
+        )
+
+    def _save_one(self, pending):
+        """한 건 저장 (자기 트랜잭션이라 SQLite의 지연 FK 검사도 이 행에서 걸림). 실패하면 None"""
+        try:
+            with transaction.atomic():
+                message = self._build(pending)
+                message.save(force_insert=True)
+            return message
+        except IntegrityError as e:
+            print(f"[WARNING] 메시지 저장 실패 (provisional_id={pending.provisional_id}): {e}")
+            return None
+
+    def _after_commit(self, written):
+        """새로 저장된 메시지를 방별 최근 메시지 스트림 / 안 읽은 수에, 모든 결과를 중복 키에 반영"""
+        entries_by_room = {}
+        for pending, message, created in written:
+            if created:
+                entries_by_room.setdefault(pending.room_id, []).append(message_stream.entry_fields(
+                    message.id, pending.sender_id, pending.username, pending.content, message.created_at
+                ))
+        for room_id, entries in entries_by_room.items():
+            message_stream.append(room_id, entries)
+            unread.messages_saved(room_id, [entry["sender_id"] for entry in entries])
+        dedupe.resolve_many([
+            (pending.room_id, pending.sender_id, pending.client_msg_id, message.id, message.created_at.isoformat())
+            for pending, message, _ in written if pending.client_msg_id
+        ])
+
+    @staticmethod
+    def _dedupe_key(pending):
+        if not pending.client_msg_id:
+            return None
+        return (str(pending.room_id), pending.sender_id, pending.client_msg_id)
+
+    def _existing_client_messages(self, batch):
+        """배치의 client_msg_id 중 이미 DB에 저장된 메시지 (쿼리 한 번, client_msg_id가 없으면 생략)"""
+        client_msg_ids = {pending.client_msg_id for pending in batch if pending.client_msg_id}
+        if not client_msg_ids:
+            return {}
+        return {
+            (str(message.room_id), message.sender_id, message.client_msg_id): message
+            for message in Message.objects.filter(client_msg_id__in=client_msg_ids)
+        }
+
+    async def _notify_committed(self, written):
+        """방 그룹별로 provisional_id → message_id 매핑을 한 번씩 전송"""
+        commits_by_room = {}
+        for pending, message, _ in written:
+            commits_by_room.setdefault((pending.room_id, pending.group_name), []).append({
+                "provisional_id": pending.provisional_id,
+                "message_id": message.id,
+                "timestamp": message.created_at.isoformat(),
+            })
+
+        for (room_id, group_name), commits in commits_by_room.items():
+            try:
+                await room_hub.room_send(room_id, group_name, {
+                    "type": "message_committed",
+                    "commits": commits,
+                })
+            except Exception as e:
+                print(f"[ERROR] message_committed 전송 실패 ({group_name}): {e}")
+
+    async def _notify_failed(self, dropped):
+        """저장을 포기한 메시지의 provisional_id를 방 그룹별로 전송 (클라이언트가 임시 메시지를 지우도록)"""
+        failed_by_room = {}
+        for pending in dropped:
+            failed_by_room.setdefault((pending.room_id, pending.group_name), []).append(pending.provisional_id)
+
+        for (room_id, group_name), provisional_ids in failed_by_room.items():
+            try:
+                await room_hub.room_send(room_id, group_name, {
+                    "type": "message_failed",
+                    "provisional_ids": provisional_ids,
+                })
+            except Exception as e:
+                print(f"[ERROR] message_failed 전송 실패 ({group_name}): {e}")
+
+
+def replay_dead_letters(batch_size=100, drop_failed=False):
+    """
+    dead letter 목록을 앞에서부터 다시 저장 (replay_dead_letters 커맨드, 한 번에 하나만 실행)
+    저장한 뒤에 목록에서 빼므로 중간에 죽어도 잃지 않는다. 다시 실패한 메시지는 목록 끝에 넣거나(drop_failed면 버림)
+    (저장, 실패) 개수 반환. client_msg_id로 이미 저장된 메시지는 다시 만들지 않고 저장으로 센다
+    """
+    buffer = MessageWriteBuffer(notify=False)
+    remaining = redis_client.llen(DEAD_LETTER_KEY)
+    saved = failed_count = 0
+    while remaining > 0:
+        raw = redis_client.lrange(DEAD_LETTER_KEY, 0, min(batch_size, remaining) - 1)
+        if not raw:
+            break
+        written, failed = buffer._write([PendingMessage.from_json(item) for item in raw])
+        pipe = redis_client.pipeline()
+        pipe.ltrim(DEAD_LETTER_KEY, len(raw), -1)
+        if failed and not drop_failed:
+            for pending in failed:
+                pending.attempts += 1
+            pipe.rpush(DEAD_LETTER_KEY, *(pending.to_json() for pending in failed))
+        pipe.execute()
+        remaining -= len(raw)
+        saved += len(written)
+        failed_count += len(failed)
+    return saved, failed_count
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_message_buffer():
+    """settings 기반 프로세스 전역 버퍼 (최초 호출 시 생성, 종료 시 flush 등록)"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = MessageWriteBuffer(
+                    batch_size=getattr(settings, 'CHAT_WRITE_BEHIND_BATCH_SIZE', 100),
+                    flush_interval=getattr(settings, 'CHAT_WRITE_BEHIND_FLUSH_INTERVAL', 0.2),
+                    max_attempts=getattr(settings, 'CHAT_WRITE_BEHIND_MAX_ATTEMPTS', 5),
+                )
+                atexit.register(_buffer.flush_sync)
+    return _buffer
@@ -0,0 +1,204 @@
+"""
+방별 최근 메시지 링 버퍼 (Redis Stream)
+
+메시지가 DB에 저장되면 room:<uuid>:stream 에 XADD(MAXLEN ~N)로 추가한다.
+엔트리 필드: id(message_id), sender_id, username, content, created_at
+스트림 ID는 Redis가 자동 부여하고 message_id는 필드로만 보관한다
+(여러 프로세스가 저장 순서와 다르게 XADD할 수 있으므로 읽을 때 message_id 기준으로 정렬).
+
+스트림이 완전한지는 room:<uuid>:stream:meta 해시로 판단한다.
+- complete: DB에서 최근 메시지로 채운(warm) 이후 추가가 빠짐없이 반영된 상태면 "1"
+- total:    방 전체 메시지 수 (append마다 HINCRBY, warm 때 DB COUNT로 재설정)
+스트림이 만료되었다가 새 메시지로 다시 생긴 경우 complete가 없으므로 warm 전까지는 DB로 응답한다.
+추가에 실패하면 스트림과 meta를 함께 지워 빠진 메시지가 있는 스트림이 남지 않게 한다.
+
+재접속 시 놓친 메시지 재전송(since)과 메시지 목록 첫 페이지(recent_page) 모두
+complete인 스트림이 구간 전체를 덮을 때만 스트림으로 응답하고, 그렇지 않으면 호출 측이 DB 조회로 대신한다.
+"""
+import redis
+from django.conf import settings
+
+from . import versions
+from .models import Message
+from .redis_utils import redis_client, get_async_redis
+
+STREAM_KEY = "room:{}:stream"
+META_KEY = "room:{}:stream:meta"
+
+
+def _maxlen():
+    return getattr(settings, 'CHAT_MESSAGE_STREAM_MAXLEN', 200)
+
+
+def _ttl():
+    return getattr(settings, 'CHAT_MESSAGE_STREAM_TTL', 60 * 60 * 24 * 7)
+
+
+def entry_fields(message_id, sender_id, username, content, created_at):
+    return {
+        "id": message_id,
+        "sender_id": sender_id,
+        "username": username,
+        "content": content,
+        "created_at": created_at.isoformat(),
+    }
+
+
+def _decode(fields):
+    return {
+        "id": int(fields["id"]),
+        "sender_id": int(fields["sender_id"]),
+        "username": fields.get("username", ""),
+        "content": fields.get("content", ""),
+        "created_at": fields.get("created_at", ""),
+    }
+
+
+def append(room_uuid, entries):
+    """저장이 끝난 메시지들을 스트림에 추가 (entries: entry_fields 목록, 파이프라인 한 번)"""
+    if not entries:
+        return
+    key = STREAM_KEY.format(str(room_uuid))
+    meta_key = META_KEY.format(str(room_uuid))
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        for fields in entries:
+            pipe.xadd(key, fields, maxlen=_maxlen(), approximate=True)
+        pipe.hincrby(meta_key, "total", len(entries))
+        pipe.expire(key, _ttl())
+        pipe.expire(meta_key, _ttl())
+        versions.add_last_message(pipe, room_uuid, max(int(fields["id"]) for fields in entries))
+        pipe.execute()
+    except redis.RedisError as e:
+        # 스트림은 캐시일 뿐이므로 실패해도 저장 흐름은 계속 (재전송은 DB로 대체됨)
+        print(f"[WARNING] 메시지 스트림 추가 실패: {e}")
+        _invalidate(room_uuid)
+        versions.forget_room(room_uuid)
+
+
+def _since(raw_entries, last_message_id, limit):
+    messages = sorted((_decode(fields) for _, fields in raw_entries), key=lambda m: m["id"])
+    # 스트림의 가장 오래된 메시지가 last_message_id 이후라면 그 사이가 잘려나간 것
+    if not messages or messages[0]["id"] > last_message_id:
+        return None
+    missed = [message for message in messages if message["id"] > last_message_id]
+    return missed[:limit], len(missed) > limit
+
+
+async def since(room_uuid, last_message_id, limit):
+    """
+    last_message_id 이후 메시지를 스트림에서 조회 (오래된 순)
+    (messages, has_more) 또는 스트림이 완전하지 않거나 구간을 덮지 못하면 None
+    """
+    try:
+        pipe = get_async_redis().pipeline(transaction=False)
+        pipe.hget(META_KEY.format(str(room_uuid)), "complete")
+        pipe.xrange(STREAM_KEY.format(str(room_uuid)))
+        complete, raw_entries = await pipe.execute()
+    except redis.RedisError as e:
+        print(f"[WARNING] 메시지 스트림 조회 실패: {e}")
+        return None
+    # warm 없이 append로만 생긴 스트림은 중간이 빠져 있을 수 있음
+    if complete != "1":
+        return None
+    return _since(raw_entries, last_message_id, limit)
+
+
+def _invalidate(room_uuid):
+    """
+    추가가 누락됐으므로 스트림과 meta를 함께 삭제 (다음 첫 페이지 조회 때 warm)
+    스트림을 남겨 두면 이후 append가 빠진 메시지 뒤에 이어 붙어 since가 구멍 난 구간을 돌려줄 수 있음
+    """
+    try:
+        redis_client.delete(STREAM_KEY.format(str(room_uuid)), META_KEY.format(str(room_uuid)))
+    except redis.RedisError as e:
+        print(f"[WARNING] 메시지 스트림 무효화 실패: {e}")
+
+
+def recent_page(room_uuid, limit):
+    """
+    최신 limit개 메시지를 스트림에서 조회 (오래된 순)
+    (messages, total) 또는 스트림이 완전하지 않으면 None
+    """
+    key = STREAM_KEY.format(str(room_uuid))
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hmget(META_KEY.format(str(room_uuid)), "complete", "total")
+        pipe.xrevrange(key, count=limit)
+        (complete, total), raw_entries = pipe.execute()
+    except redis.RedisError as e:
+        print(f"[WARNING] 메시지 스트림 조회 실패: {e}")
+        return None
+    if complete != "1" or total is None:
+        return None
+    total = int(total)
+    # 스트림 길이보다 요청이 크면 잘린 구간이 있을 수 있음
+    if len(raw_entries) < min(limit, total):
+        return None
+    messages = sorted((_decode(fields) for _, fields in raw_entries), key=lambda m: m["id"])
+    return messages, total
+
+
+def approximate_total(room_uuid):
+    """
+    meta 해시의 방 전체 메시지 수 (warm 때 COUNT, 이후 append마다 증가하는 근사치)
+    meta가 없거나 Redis 실패 시 None
+    """
+    try:
+        total = redis_client.hget(META_KEY.format(str(room_uuid)), "total")
+    except redis.RedisError as e:
+        print(f"[WARNING] 메시지 수 조회 실패: {e}")
+        return None
+    return int(total) if total is not None else None
+
+
+def warm(room_uuid, limit):
+    """
+    DB에서 최근 메시지(스트림 최대 길이만큼)와 전체 개수를 읽어 스트림을 다시 채움
+    recent_page와 같은 형식으로 최신 limit개를 반환 (Redis 실패와 무관하게 DB 결과를 돌려줌)
+    """
+    key = STREAM_KEY.format(str(room_uuid))
+    meta_key = META_KEY.format(str(room_uuid))
+    pipe = redis_client.pipeline(transaction=True)
+    try:
+        # DB 조회 중 다른 프로세스가 append하면 EXEC가 취소되어 complete 표시를 남기지 않음
+        pipe.watch(key)
+    except redis.RedisError as e:
+        print(f"[WARNING] 메시지 스트림 warm 실패: {e}")
+        pipe.reset()
+        pipe = None
+
+    rows = list(
+        Message.objects.filter(room_id=room_uuid)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'sender_id', 'sender__user__username', 'content', 'created_at')[:max(_maxlen(), limit)]
+    )
+    total = Message.objects.filter(room_id=room_uuid).count()
+    rows.reverse()
+    entries = [entry_fields(*row) for row in rows]
+
+    if pipe is not None:
+        try:
+            pipe.multi()
+            pipe.delete(key)
+            for fields in entries[-_maxlen():]:
+                pipe.xadd(key, fields)
+            pipe.hset(meta_key, mapping={"complete": "1", "total": total})
+            pipe.expire(key, _ttl())
+            pipe.expire(meta_key, _ttl())
+            pipe.execute()
+        except redis.WatchError:
+            print(f"[DEBUG] 메시지 스트림 warm 중 새 메시지 추가됨, 다음 조회 때 재시도: {room_uuid}")
+        except redis.RedisError as e:
+            print(f"[WARNING] 메시지 스트림 warm 실패: {e}")
+        finally:
+            pipe.reset()
+
+    return [_decode(fields) for fields in entries[-limit:]], total
+
+
+def delete(room_uuid):
+    try:
+        redis_client.delete(STREAM_KEY.format(str(room_uuid)), META_KEY.format(str(room_uuid)))
+    except redis.RedisError as e:
+        print(f"[WARNING] 메시지 스트림 삭제 실패: {e}")
@@ -0,0 +1,101 @@
+"""
+프로세스 단위 인메모리 메트릭 (카운터 / 게이지 / 히스토그램)
+
+WebSocket 워커 용량 산정과 캐시 효율 확인용. 각 daphne 프로세스가 자기 값만 가지고 있으며
+/api/chat/metrics/ (스태프 전용)에서 JSON 스냅샷으로 조회한다.
+"""
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+
+
+def _key(name, labels):
+    if not labels:
+        return name
+    label_str = ",".join(f"{key}={value}" for key, value in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "buckets": buckets,
+        }
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def gauge_add(name, value, **labels):
+    """게이지 증감 (현재 값 기준 +/-)"""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + value
+
+
+def gauge_set(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+
+def ratio(hits_name, misses_name):
+    """hit / (hit + miss). 관측값이 없으면 None"""
+    with _lock:
+        hits = _counters.get(hits_name, 0)
+        misses = _counters.get(misses_name, 0)
+    total = hits + misses
+    return hits / total if total else None
+
+
+def snapshot():
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "histograms": {key: histogram.snapshot() for key, histogram in _histograms.items()},
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
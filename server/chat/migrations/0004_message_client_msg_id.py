@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_is_ai_chat'),
+        ('login', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='client_msg_id',
+            field=models.CharField(blank=True, help_text='클라이언트가 붙인 재전송 중복 제거용 ID', max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(condition=models.Q(('client_msg_id__isnull', False)), fields=('room', 'sender', 'client_msg_id'), name='unique_message_client_msg_id'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_message_client_msg_id'),
+        ('login', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['room', 'created_at', 'id'], name='message_room_created_id_idx'),
+        ),
+    ]
@@ -53,9 +53,22 @@ class Message(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     is_ai_chat = models.BooleanField(default=False, help_text="AI 채팅방 메시지인지 여부")
+    client_msg_id = models.CharField(max_length=64, blank=True, null=True, help_text="클라이언트가 붙인 재전송 중복 제거용 ID")
 
     class Meta:
         ordering = ["created_at"]
+        constraints = [
+            # 같은 사용자가 같은 방에 같은 client_msg_id로 보낸 메시지는 한 번만 저장
+            models.UniqueConstraint(
+                fields=["room", "sender", "client_msg_id"],
+                condition=models.Q(client_msg_id__isnull=False),
+                name="unique_message_client_msg_id",
+            ),
+        ]
+        indexes = [
+            # 방별 메시지 목록 keyset 페이지네이션 ((created_at, id) 커서)
+            models.Index(fields=["room", "created_at", "id"], name="message_room_created_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.sender.user.username or 'Anonymous'}: {self.content[:20]}"
\ No newline at end of file
@@ -0,0 +1,406 @@
+"""
+멀티플렉스 WebSocket (ws/multiplex/)
+
+방마다 ws/chat/<room_uuid>/, AI 세션마다 ws/llm/<session_id>/ 소켓을 따로 여는 대신
+연결 하나에서 subscribe / unsubscribe 프레임으로 여러 채널을 구독한다.
+
+클라이언트 → 서버
+- {"type": "subscribe", "channel": "room:<room_uuid>", "last_message_id": 123}   (last_message_id 선택)
+- {"type": "subscribe", "channel": "ai:<session_id>"}
+- {"type": "subscribe", "channels": ["room:<a>", "room:<b>", ...], "last_message_ids": {"room:<a>": 123}}   (재접속 시 한 번에)
+- {"type": "unsubscribe", "channel": "room:<room_uuid>"}
+- 그 외 프레임은 "channel"로 지정한 구독에 그대로 전달 (예: {"channel": "room:...", "type": "chat_message", ...})
+
+서버 → 클라이언트
+- {"type": "subscribed", "channel": ...} / {"type": "unsubscribed", "channel": ..., "code": ...}
+- 구독별 프레임은 {"channel": ..., "event": <기존 ChatConsumer / AiChatConsumer 프레임>}
+
+구독 하나는 기존 consumer를 돌리는 가상 연결이지만, 연결 단위로 모을 수 있는 일은 연결에서 한 번만 한다.
+- 채널: 구독은 채널을 새로 만들지 않고 이 연결의 채널 하나로 방 / AI 그룹에 가입한다.
+  그룹 이벤트에는 그룹 이름("group")이 실려 오므로 그룹 → 구독 표로 해당 구독의 inbox에 넣는다.
+- 권한 확인: subscribe 프레임 하나에 담긴 방들은 방 조회 쿼리 1번 + 멤버십 파이프라인 1번으로 확인하고
+  결과를 구독 consumer에 넘겨 connect에서 다시 조회하지 않는다.
+- presence: 방마다 등록은 따로 하지만 TTL 갱신은 연결의 태스크 하나가 모든 방 구독을 모아서 한다.
+세션 인증(AuthMiddlewareStack)과 TCP/TLS 핸드셰이크, 송신 큐/writer 태스크도 연결당 한 번뿐이다.
+"""
+import asyncio
+import uuid
+from urllib.parse import urlencode
+
+from channels.db import database_sync_to_async
+from channels.exceptions import StopConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.utils import await_many_dispatch
+from django.conf import settings
+
+from llm.consumers import AiChatConsumer
+
+from . import membership, metrics, presence
+from .codecs import CodecMixin, FrameDecodeError
+from .consumers import ChatConsumer, room_permission
+from .heartbeat import HeartbeatMixin, HEARTBEAT_TYPES
+from .drain import DrainMixin
+from .models import ChatRoom
+from .outbound import OutboundQueueMixin
+
+# 연결 단위 권한 확인을 거치지 않은 구독 (consumer가 직접 확인)
+_UNCHECKED = object()
+
+
+class _SharedChannelLayer:
+    """구독용 채널 레이어: 그룹 가입 / 탈퇴를 멀티플렉스의 그룹 → 구독 표에 반영하고 나머지는 실제 레이어에 위임"""
+
+    def __init__(self, multiplex, channel):
+        self._multiplex = multiplex
+        self._channel = channel
+
+    def __getattr__(self, name):
+        return getattr(self._multiplex.channel_layer, name)
+
+    async def group_add(self, group, channel):
+        # 가입 전에 등록해야 가입 직후 오는 이벤트도 라우팅됨
+        self._multiplex.group_routes[group] = self._channel
+        await self._multiplex.channel_layer.group_add(group, channel)
+
+    async def group_discard(self, group, channel):
+        if self._multiplex.group_routes.get(group) == self._channel:
+            del self._multiplex.group_routes[group]
+        await self._multiplex.channel_layer.group_discard(group, channel)
+
+
+class _PresenceRegistration:
+    """방 구독의 presence 갱신 등록 (consumer의 _presence_task 자리, disconnect에서 cancel)"""
+
+    def __init__(self, multiplex, consumer):
+        self._multiplex = multiplex
+        self._consumer = consumer
+        multiplex.presence_rooms.add(consumer)
+
+    def cancel(self):
+        self._multiplex.presence_rooms.discard(self._consumer)
+
+
+class _SubscriptionMixin:
+    """구독(가상 연결)용: 프레임을 자기 송신 큐 대신 멀티플렉스 연결의 송신 큐로 바로 넘김 (kind 유지)"""
+
+    # ping/pong과 drain은 멀티플렉스 연결 단위로만
+    heartbeat_enabled = False
+    drain_enabled = False
+    multiplex = None
+    multiplex_channel = None
+
+    async def __call__(self, scope, receive, send):
+        """
+        AsyncConsumer.__call__ 대신: 채널을 새로 만들지 않고 멀티플렉스 연결의 채널을 같이 씀
+        그룹 이벤트는 멀티플렉스가 receive(inbox)로 넣어 주므로 inbox 하나만 읽는다.
+        """
+        self.scope = scope
+        self.channel_layer = _SharedChannelLayer(self.multiplex, self.multiplex_channel)
+        self.channel_name = self.multiplex.channel_name
+        self.base_send = send
+        try:
+            await await_many_dispatch([receive], self.dispatch)
+        except StopConsumer:
+            pass
+
+    async def send(self, text_data=None, bytes_data=None, close=False, kind=None):
+        if close:
+            await self.close()
+            return
+        encoded = bytes_data if bytes_data is not None else text_data
+        await self.multiplex.send_subscription_frame(self.multiplex_channel, encoded, kind)
+
+
+class RoomSubscription(_SubscriptionMixin, ChatConsumer):
+    # 멀티플렉스가 subscribe 프레임 단위로 미리 확인한 권한 (room_permission 결과)
+    room_check = _UNCHECKED
+
+    async def _get_room_and_check_permission(self, room_uuid, user_profile):
+        if self.room_check is not _UNCHECKED:
+            return self.room_check
+        return await super()._get_room_and_check_permission(room_uuid, user_profile)
+
+    def _start_presence_heartbeat(self):
+        # TTL 갱신은 멀티플렉스 연결의 presence 태스크가 모든 방 구독을 모아서 처리
+        return _PresenceRegistration(self.multiplex, self)
+
+
+class AiSessionSubscription(_SubscriptionMixin, AiChatConsumer):
+    pass
+
+
+def _parse_channel(channel):
+    """'room:<uuid>' / 'ai:<session_id>' → (consumer 클래스, url_route kwargs). 잘못된 값이면 ValueError"""
+    if not isinstance(channel, str) or ":" not in channel:
+        raise ValueError("channel은 'room:<room_uuid>' 또는 'ai:<session_id>' 형식이어야 합니다.")
+    kind, key = channel.split(":", 1)
+    if kind == "room":
+        return RoomSubscription, {"room_uuid": str(uuid.UUID(key))}
+    if kind == "ai" and key:
+        return AiSessionSubscription, {"session_id": key}
+    raise ValueError(f"알 수 없는 채널: {channel}")
+
+
+class _Subscription:
+    """구독 하나의 ASGI 입출력 (consumer.__call__에 receive/send로 넘김)"""
+
+    def __init__(self, consumer):
+        self.consumer = consumer
+        self.inbox = asyncio.Queue()
+        self.accepted = False
+        self.closed = False
+        self.task = None
+
+
+class MultiplexConsumer(DrainMixin, HeartbeatMixin, CodecMixin, OutboundQueueMixin, AsyncWebsocketConsumer):
+    async def connect(self):
+        self.user = self.scope.get('user')
+        if not self.user or not self.user.is_authenticated:
+            print(f"[ERROR] 멀티플렉스 연결 인증 실패")
+            await self.close(code=4001)
+            return
+        self.username = self.user.username
+        self.subscriptions = {}
+        # 그룹 이름 → 구독 채널 (구독의 group_add / group_discard로 관리)
+        self.group_routes = {}
+        # presence 갱신 대상 방 구독 consumer
+        self.presence_rooms = set()
+        self._presence_task = asyncio.create_task(self._presence_heartbeat())
+        await self.accept_with_codec()
+        metrics.gauge_add("ws_multiplex_connections", 1)
+        print(f"[DEBUG] 멀티플렉스 연결: {self.username}")
+
+    async def disconnect(self, close_code):
+        subscriptions = getattr(self, 'subscriptions', None)
+        if subscriptions is None:
+            return
+        metrics.gauge_add("ws_multiplex_connections", -1)
+        self._presence_task.cancel()
+        await asyncio.gather(
+            *(self._unsubscribe(channel, close_code) for channel in list(subscriptions)),
+            return_exceptions=True,
+        )
+        print(f"[DEBUG] 멀티플렉스 연결 종료: {self.username} (code: {close_code})")
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if not text_data and not bytes_data:
+            return
+        try:
+            data = self.decode_frame(text_data, bytes_data)
+        except FrameDecodeError as e:
+            print(f"[ERROR] 프레임 파싱 실패: {e}")
+            await self.send_frame({"type": "error", "message": "잘못된 메시지 형식입니다."})
+            return
+
+        message_type = data.get("type", "")
+        channel = data.get("channel")
+        if message_type == "subscribe":
+            if "channels" in data:
+                await self._subscribe_many(data.get("channels"), data.get("last_message_ids") or {})
+            else:
+                await self._subscribe_many([channel], {channel: data.get("last_message_id")})
+        elif message_type == "unsubscribe":
+            if channel in self.subscriptions:
+                await self._unsubscribe(channel, 1000)
+        elif message_type in HEARTBEAT_TYPES and channel is None:
+            await self.handle_heartbeat_frame(data)
+        else:
+            await self._forward(channel, data)
+
+    def has_pending_work(self):
+        return any(subscription.consumer.has_pending_work() for subscription in self.subscriptions.values())
+
+    async def dispatch(self, message):
+        """그룹 이벤트("group" 포함)는 그 그룹에 가입한 구독의 inbox로, 나머지는 이 연결의 핸들러로"""
+        group = message.get("group")
+        if group is None or message["type"].startswith("websocket."):
+            await super().dispatch(message)
+            return
+        subscription = self.subscriptions.get(self.group_routes.get(group))
+        if subscription is None or subscription.closed:
+            # 구독 해제 직후 도착한 이벤트 (단독 소켓이 닫힌 뒤 도착한 것과 같음)
+            metrics.inc("ws_multiplex_unrouted_total")
+            return
+        subscription.inbox.put_nowait(message)
+
+    async def _presence_heartbeat(self):
+        """이 연결의 모든 방 구독 presence TTL을 한 번에 갱신 (읽음 시각 반영은 워커 단위 reaper가 담당)"""
+        interval = presence.heartbeat_interval()
+        while True:
+            await asyncio.sleep(interval)
+            if self.presence_rooms:
+                await asyncio.gather(*(consumer.refresh_presence() for consumer in list(self.presence_rooms)))
+
+    # ==================== 구독 관리 ====================
+
+    async def _subscribe_many(self, channels, last_message_ids):
+        """subscribe 프레임 하나의 채널들을 구독. 새로 구독하는 방은 권한을 한 번에 확인"""
+        if not isinstance(channels, list) or not isinstance(last_message_ids, dict):
+            await self._send_error(None, "channels는 목록, last_message_ids는 객체여야 합니다.")
+            return
+        max_subscriptions = getattr(settings, 'CHAT_MULTIPLEX_MAX_SUBSCRIPTIONS', 100)
+        if len(channels) > max_subscriptions:
+            await self._send_error(None, f"구독은 연결당 최대 {max_subscriptions}개입니다.")
+            return
+
+        room_uuids = []
+        for channel in channels:
+            if not isinstance(channel, str):
+                continue
+            existing = self.subscriptions.get(channel)
+            if existing is not None and not existing.closed:
+                continue
+            try:
+                consumer_class, kwargs = _parse_channel(channel)
+            except ValueError:
+                continue
+            if consumer_class is RoomSubscription:
+                room_uuids.append(kwargs["room_uuid"])
+        room_checks = {}
+        profile = self.scope.get('profile')
+        if room_uuids and profile is not None:
+            room_checks = await self._check_rooms(room_uuids, profile)
+
+        for channel in channels:
+            if not isinstance(channel, str):
+                await self._send_error(None, "channel은 'room:<room_uuid>' 또는 'ai:<session_id>' 형식이어야 합니다.")
+                continue
+            await self._subscribe(channel, last_message_ids.get(channel), room_checks)
+
+    @database_sync_to_async
+    def _check_rooms(self, room_uuids, profile):
+        """방 조회 쿼리 1번 + 멤버십 파이프라인 1번으로 방마다 room_permission 결과 ({room_uuid: 방 정보 / None})"""
+        try:
+            rooms = {
+                str(room.room_uuid): room
+                for room in ChatRoom.objects.select_related('admin__user').filter(room_uuid__in=room_uuids)
+            }
+            roles = membership.roles(list(rooms), profile.id)
+        except Exception as e:
+            # 구독마다 connect에서 다시 확인
+            print(f"[ERROR] 구독 권한 일괄 확인 실패: {e}")
+            return {}
+        metrics.inc("ws_multiplex_room_checks_total")
+        return {
+            room_uuid: room_permission(rooms[room_uuid], roles[room_uuid], profile) if room_uuid in rooms else None
+            for room_uuid in room_uuids
+        }
+
+    async def _subscribe(self, channel, last_message_id=None, room_checks=None):
+        existing = self.subscriptions.get(channel)
+        if existing is not None:
+            if not existing.closed:
+                # 이미 구독 중 (accept 전이면 accept 때 subscribed가 나감)
+                if existing.accepted:
+                    await self.send_frame({"type": "subscribed", "channel": channel})
+                return
+            # 해제 중인 구독: 정리가 끝난 뒤 새로 구독
+            await asyncio.wait({existing.task}, timeout=10)
+            if self.subscriptions.get(channel) is existing:
+                await self._send_error(channel, "이전 구독을 정리하는 중입니다. 잠시 후 다시 시도하세요.")
+                return
+        max_subscriptions = getattr(settings, 'CHAT_MULTIPLEX_MAX_SUBSCRIPTIONS', 100)
+        if len(self.subscriptions) >= max_subscriptions:
+            await self._send_error(channel, f"구독은 연결당 최대 {max_subscriptions}개입니다.")
+            return
+        try:
+            consumer_class, kwargs = _parse_channel(channel)
+        except ValueError as e:
+            await self._send_error(channel, str(e))
+            return
+
+        query = {}
+        if last_message_id is not None:
+            query["last_message_id"] = last_message_id
+        # 단독 소켓으로 접속했을 때와 같은 scope (user, session, subprotocols는 이 연결의 것)
+        scope = dict(
+            self.scope,
+            path=f"/ws/multiplex/{channel}/",
+            query_string=urlencode(query).encode(),
+            url_route={"args": (), "kwargs": kwargs},
+        )
+
+        consumer = consumer_class()
+        consumer.multiplex = self
+        consumer.multiplex_channel = channel
+        if room_checks and kwargs.get("room_uuid") in room_checks:
+            consumer.room_check = room_checks[kwargs["room_uuid"]]
+        subscription = self.subscriptions[channel] = _Subscription(consumer)
+        subscription.inbox.put_nowait({"type": "websocket.connect"})
+        subscription.task = asyncio.create_task(
+            self._run_subscription(channel, subscription, scope)
+        )
+        metrics.inc("ws_multiplex_subscribe_total", kind=consumer_class.__name__)
+        metrics.gauge_add("ws_multiplex_subscriptions", 1)
+
+    async def _run_subscription(self, channel, subscription, scope):
+        async def send(message):
+            await self._handle_subscription_message(channel, subscription, message)
+
+        try:
+            await subscription.consumer(scope, subscription.inbox.get, send)
+        except Exception as e:
+            print(f"[ERROR] 구독 처리 중 예외 ({channel}): {e}")
+            import traceback
+            traceback.print_exc()
+            if not subscription.closed:
+                subscription.closed = True
+                await self.send_frame({"type": "unsubscribed", "channel": channel, "code": 4000})
+        finally:
+            if self.subscriptions.get(channel) is subscription:
+                del self.subscriptions[channel]
+            metrics.gauge_add("ws_multiplex_subscriptions", -1)
+
+    async def _handle_subscription_message(self, channel, subscription, message):
+        """구독 consumer가 보낸 ASGI 메시지 (accept / close). 일반 프레임은 _SubscriptionMixin.send로 옴"""
+        message_type = message["type"]
+        if message_type == "websocket.accept":
+            subscription.accepted = True
+            await self.send_frame({"type": "subscribed", "channel": channel})
+        elif message_type == "websocket.close":
+            if subscription.closed:
+                return
+            # 권한 없음(4003) 등으로 거부되었거나 서버가 구독을 닫음 → consumer 정리 후 종료
+            subscription.closed = True
+            code = message.get("code") or 1000
+            subscription.inbox.put_nowait({"type": "websocket.disconnect", "code": code})
+            await self.send_frame({"type": "unsubscribed", "channel": channel, "code": code})
+
+    async def _unsubscribe(self, channel, code):
+        subscription = self.subscriptions.get(channel)
+        if subscription is None:
+            return
+        if not subscription.closed:
+            subscription.closed = True
+            subscription.inbox.put_nowait({"type": "websocket.disconnect", "code": code})
+            if code == 1000:
+                await self.send_frame({"type": "unsubscribed", "channel": channel, "code": code})
+        try:
+            # consumer.disconnect()(presence 정리, 그룹 탈퇴)가 끝날 때까지 대기
+            await asyncio.wait_for(asyncio.shield(subscription.task), timeout=10)
+        except asyncio.TimeoutError:
+            print(f"[WARNING] 구독 종료 지연, 강제 종료: {channel}")
+            subscription.task.cancel()
+
+    # ==================== 프레임 전달 ====================
+
+    async def _forward(self, channel, data):
+        """채널이 지정된 프레임을 해당 구독 consumer의 receive로 전달"""
+        subscription = self.subscriptions.get(channel)
+        if subscription is None or not subscription.accepted or subscription.closed:
+            await self._send_error(channel, "구독하지 않은 채널입니다.")
+            return
+        frame = {key: value for key, value in data.items() if key != "channel"}
+        encoded = self.codec.encode(frame)
+        key = "bytes" if isinstance(encoded, bytes) else "text"
+        subscription.inbox.put_nowait({"type": "websocket.receive", key: encoded})
+
+    async def send_subscription_frame(self, channel, encoded, kind=None):
+        """구독 consumer가 인코딩한 프레임을 채널 봉투에 담아 이 연결의 송신 큐에 넣음"""
+        subscription = self.subscriptions.get(channel)
+        if subscription is None or subscription.closed:
+            return
+        await self.send_encoded(self.codec.wrap(channel, encoded), kind=kind)
+
+    async def _send_error(self, channel, message):
+        await self.send_frame({"type": "error", "channel": channel, "message": message})
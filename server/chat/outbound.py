@@ -0,0 +1,215 @@
+"""
+연결별 송신 큐 (backpressure / 느린 클라이언트 정책)
+
+consumer의 send()를 가로채 연결마다 크기가 제한된 큐에 넣고, writer 태스크가 순서대로 소켓에 쓴다.
+이벤트 핸들러는 소켓 쓰기를 기다리지 않으므로 채널 레이어 버퍼를 계속 비울 수 있고,
+큐가 가득 차면 CHAT_OUTBOUND_POLICY에 따라 처리한다.
+
+daphne에서는 ASGI send가 기다리지 않고 Twisted transport 버퍼에 바로 쓰므로(handle_reply → serverSend),
+send만 보고는 느린 클라이언트를 알 수 없다. 그래서 writer는 쓰기 전에 transport에 쌓인(소켓에 아직 못 쓴) 바이트를 확인하고
+CHAT_OUTBOUND_MAX_BUFFERED_BYTES를 넘으면 줄어들 때까지 쓰지 않는다. 그동안 프레임은 이 큐에 쌓이고 정책이 적용된다.
+transport를 찾을 수 없는 서버(uvicorn 등 send 자체가 소켓 쓰기를 기다리는 경우)에서는 send가 기다리는 것으로 충분하다.
+transport 탐색과 버퍼 크기 확인은 daphne / Twisted 내부 속성에 기대므로, 찾지 못하면
+ws_outbound_backpressure_unavailable_total을 올리고 프로세스당 한 번 경고를 남긴다 (업그레이드 후 조용히 꺼지지 않도록).
+- drop_typing: 큐에 쌓인 타이핑 프레임부터 버리고, 버릴 타이핑 프레임이 없으면 disconnect와 같이 연결 종료
+               (채팅 메시지는 버리지 않는다. 클라이언트가 빈 구간을 알 수 없기 때문)
+- coalesce:    같은 종류의 최신 상태 프레임(타이핑 목록)은 큐에서 교체, 가득 차면 drop_typing과 동일
+- disconnect:  재접속 후 이어받기(last_message_id)가 가능한 close code(CHAT_OUTBOUND_CLOSE_CODE)로 연결 종료
+"""
+import asyncio
+import functools
+from collections import deque
+
+from django.conf import settings
+
+from . import metrics
+
+POLICY_DROP_TYPING = "drop_typing"
+POLICY_COALESCE = "coalesce"
+POLICY_DISCONNECT = "disconnect"
+
+KIND_TYPING = "typing"
+
+# 큐가 가득 찼을 때 먼저 버려도 되는 프레임 종류
+DROPPABLE_KINDS = {KIND_TYPING}
+# 최신 값만 의미가 있어 큐 안에서 교체 가능한 프레임 종류
+COALESCE_KINDS = {KIND_TYPING}
+
+
+# transport를 찾지 못했음을 표시 (연결마다 한 번만 찾음)
+_NO_TRANSPORT = object()
+
+# 경고를 이미 남긴 backpressure 불가 사유 (프로세스당 한 번만 출력)
+_warned = set()
+
+
+def _backpressure_unavailable(reason, labels):
+    """transport backpressure를 쓸 수 없는 연결 기록 (reason: no_transport / unreadable_buffer)"""
+    metrics.inc("ws_outbound_backpressure_unavailable_total", reason=reason, **labels)
+    if reason not in _warned:
+        _warned.add(reason)
+        print(f"[WARNING] transport backpressure 비활성 ({reason}): 서버 내부 구조가 바뀌었거나 daphne가 아닌 서버")
+
+
+def find_transport(send):
+    """
+    ASGI send 호출 체인을 따라가 daphne 프로토콜의 Twisted transport를 찾음 (없으면 None)
+    consumer.base_send → (SessionMiddleware의 InstanceSessionWrapper.send → real_send)
+    → functools.partial(Server.handle_reply, protocol)
+    """
+    for _ in range(8):
+        if isinstance(send, functools.partial):
+            protocol = send.args[0] if send.args else None
+            return getattr(protocol, "transport", None)
+        wrapper = getattr(send, "__self__", None)
+        send = getattr(wrapper, "real_send", None)
+        if send is None:
+            return None
+    return None
+
+
+def buffered_bytes(transport):
+    """transport가 소켓에 아직 쓰지 못한 바이트 수 (Twisted FileDescriptor 버퍼, 알 수 없으면 None)"""
+    try:
+        return len(transport.dataBuffer) - transport.offset + transport._tempDataLen
+    except (AttributeError, TypeError):
+        return None
+
+
+class _Frame:
+    __slots__ = ("kind", "text", "bytes")
+
+    def __init__(self, kind, text, bytes_):
+        self.kind = kind
+        self.text = text
+        self.bytes = bytes_
+
+
+class OutboundQueueMixin:
+    """AsyncWebsocketConsumer 앞에 두는 mixin (send / websocket_disconnect 재정의)"""
+
+    _outbound_frames = None
+    _outbound_ready = None
+    _outbound_writer = None
+    _outbound_closed = False
+    _outbound_transport = None
+
+    def _outbound_labels(self):
+        return {"consumer": self.__class__.__name__}
+
+    async def send(self, text_data=None, bytes_data=None, close=False, kind=None):
+        if close:
+            await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+            return
+        if self._outbound_closed:
+            return
+
+        if self._outbound_frames is None:
+            self._outbound_frames = deque()
+            self._outbound_ready = asyncio.Event()
+            self._outbound_writer = asyncio.create_task(self._run_outbound_writer())
+
+        frames = self._outbound_frames
+        frame = _Frame(kind, text_data, bytes_data)
+        labels = self._outbound_labels()
+        policy = getattr(settings, 'CHAT_OUTBOUND_POLICY', POLICY_DROP_TYPING)
+
+        if policy == POLICY_COALESCE and kind in COALESCE_KINDS:
+            for index, queued in enumerate(frames):
+                if queued.kind == kind:
+                    frames[index] = frame
+                    metrics.inc("ws_outbound_coalesced_total", kind=kind, **labels)
+                    return
+
+        if len(frames) >= getattr(settings, 'CHAT_OUTBOUND_QUEUE_SIZE', 256):
+            if policy == POLICY_DISCONNECT:
+                await self._disconnect_slow_consumer()
+                return
+            if not self._drop_queued_frame(labels):
+                if kind in DROPPABLE_KINDS:
+                    metrics.inc("ws_outbound_dropped_total", kind=kind, **labels)
+                    return
+                # 버릴 수 있는 프레임이 없음: 메시지를 조용히 버리지 않고 이어받기 가능한 close로 종료
+                await self._disconnect_slow_consumer()
+                return
+
+        frames.append(frame)
+        metrics.gauge_add("ws_outbound_queue_depth", 1, **labels)
+        metrics.observe("ws_outbound_queue_depth_on_enqueue", len(frames), **labels)
+        self._outbound_ready.set()
+
+    def _drop_queued_frame(self, labels):
+        """큐에서 버려도 되는 가장 오래된 프레임 하나 제거"""
+        for queued in self._outbound_frames:
+            if queued.kind in DROPPABLE_KINDS:
+                self._outbound_frames.remove(queued)
+                metrics.gauge_add("ws_outbound_queue_depth", -1, **labels)
+                metrics.inc("ws_outbound_dropped_total", kind=queued.kind, **labels)
+                return True
+        return False
+
+    async def _run_outbound_writer(self):
+        frames = self._outbound_frames
+        labels = self._outbound_labels()
+        while True:
+            while not frames:
+                self._outbound_ready.clear()
+                await self._outbound_ready.wait()
+            await self._wait_for_transport(labels)
+            frame = frames.popleft()
+            metrics.gauge_add("ws_outbound_queue_depth", -1, **labels)
+            await super().send(text_data=frame.text, bytes_data=frame.bytes)
+
+    def _transport_backlog(self):
+        """transport에 쌓인 바이트 수 (transport를 찾을 수 없으면 None)"""
+        if self._outbound_transport is None:
+            self._outbound_transport = find_transport(getattr(self, "base_send", None)) or _NO_TRANSPORT
+            if self._outbound_transport is _NO_TRANSPORT:
+                _backpressure_unavailable("no_transport", self._outbound_labels())
+        if self._outbound_transport is _NO_TRANSPORT:
+            return None
+        backlog = buffered_bytes(self._outbound_transport)
+        if backlog is None:
+            # transport는 찾았지만 버퍼 속성을 읽을 수 없음 (Twisted 내부 변경)
+            _backpressure_unavailable("unreadable_buffer", self._outbound_labels())
+            self._outbound_transport = _NO_TRANSPORT
+        return backlog
+
+    async def _wait_for_transport(self, labels):
+        """클라이언트가 읽지 않아 transport 버퍼가 한도를 넘었으면 줄어들 때까지 대기 (그동안 큐에 쌓임)"""
+        limit = getattr(settings, 'CHAT_OUTBOUND_MAX_BUFFERED_BYTES', 256 * 1024)
+        backlog = self._transport_backlog()
+        if backlog is None or backlog <= limit:
+            return
+        metrics.inc("ws_outbound_transport_stalls_total", **labels)
+        poll = getattr(settings, 'CHAT_OUTBOUND_DRAIN_POLL', 0.05)
+        while backlog is not None and backlog > limit:
+            await asyncio.sleep(poll)
+            backlog = self._transport_backlog()
+
+    async def flush_outbound(self, timeout=1.0):
+        """송신 큐가 빌 때까지 대기 (close 직전에 보낸 마지막 프레임이 소켓에 쓰이도록)"""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while self._outbound_frames and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.01)
+        # writer가 꺼낸 마지막 프레임의 쓰기 완료
+        await asyncio.sleep(0)
+
+    async def _disconnect_slow_consumer(self):
+        labels = self._outbound_labels()
+        print(f"[WARNING] 송신 큐 초과로 연결 종료: {getattr(self, 'username', 'Unknown')}")
+        metrics.inc("ws_outbound_slow_disconnects_total", **labels)
+        self._stop_outbound_writer()
+        await self.close(code=getattr(settings, 'CHAT_OUTBOUND_CLOSE_CODE', 4008))
+
+    def _stop_outbound_writer(self):
+        self._outbound_closed = True
+        if self._outbound_writer is not None:
+            self._outbound_writer.cancel()
+        if self._outbound_frames:
+            metrics.gauge_add("ws_outbound_queue_depth", -len(self._outbound_frames), **self._outbound_labels())
+            self._outbound_frames.clear()
+
+    async def websocket_disconnect(self, message):
+        self._stop_outbound_writer()
+        await super().websocket_disconnect(message)
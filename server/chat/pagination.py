@@ -0,0 +1,77 @@
+"""
+메시지 목록 keyset(cursor) 페이지네이션
+
+page/limit 방식은 COUNT(*)와 OFFSET 스캔 때문에 깊이 스크롤할수록 느려진다.
+(created_at, id) 순서의 커서 기준으로 before(더 오래된) / after(더 최신) 페이지를 조회하면
+Message(room, created_at, id) 인덱스에서 limit + 1개만 읽으므로 깊이와 관계없이 일정하다.
+
+커서 문자열: "<created_at ISO 8601>_<message_id>" 를 URL-safe base64로 인코딩
+"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+MAX_LIMIT = 100
+
+
+def encode_cursor(created_at, message_id):
+    """created_at: 응답에 내려가는 ISO 8601 문자열"""
+    raw = f"{created_at}_{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """커서 → (created_at, message_id). 잘못된 커서면 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at_str, message_id = raw.rsplit("_", 1)
+        created_at = parse_datetime(created_at_str)
+        if created_at is None:
+            raise ValueError(cursor)
+        return created_at, int(message_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"잘못된 커서입니다: {cursor}") from e
+
+
+def keyset_page(queryset, limit, before=None, after=None):
+    """
+    queryset(한 방의 메시지)에서 before 커서보다 오래된 / after 커서보다 최신인 메시지 limit개
+    before와 after가 모두 없으면 최신 limit개. (rows 오래된 순, has_more) 반환
+    has_more는 같은 방향으로 더 있는지 여부 (before/없음 → 더 오래된 메시지, after → 더 최신 메시지)
+
+    (created_at, id) < 커서 비교를 OR 조건만으로 쓰면 SQLite가 인덱스를 room_id로만 타고 앞에서부터 걸러내므로,
+    created_at 범위 조건을 따로 붙여 인덱스 범위 검색이 되게 한다.
+    """
+    if after is not None:
+        created_at, message_id = decode_cursor(after)
+        rows = list(
+            queryset.filter(created_at__gte=created_at)
+            .filter(Q(created_at__gt=created_at) | Q(id__gt=message_id))
+            .order_by('created_at', 'id')[:limit + 1]
+        )
+        return rows[:limit], len(rows) > limit
+
+    if before is not None:
+        created_at, message_id = decode_cursor(before)
+        queryset = queryset.filter(created_at__lte=created_at).filter(Q(created_at__lt=created_at) | Q(id__lt=message_id))
+    rows = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, has_more
+
+
+def page_cursors(messages):
+    """
+    응답 메시지(오래된 순 dict 리스트) 양 끝의 커서
+    before_cursor: 가장 오래된 메시지 (더 오래된 페이지 요청용), after_cursor: 가장 최신 메시지 (새 메시지 요청용)
+    """
+    if not messages:
+        return {"before_cursor": None, "after_cursor": None}
+    first, last = messages[0], messages[-1]
+    return {
+        "before_cursor": encode_cursor(first["created_at"], first["id"]),
+        "after_cursor": encode_cursor(last["created_at"], last["id"]),
+    }
@@ -0,0 +1,249 @@
+"""
+클러스터 전체 접속자(presence) 레지스트리
+
+방마다 Redis에 다음 키를 유지한다.
+- presence:<uuid>:conns  ZSET  "<profile_id>:<channel_name>" → 만료 시각 (연결 단위 TTL)
+- presence:<uuid>:users  HASH  profile_id → 연결 수 (refcount)
+- presence:<uuid>:names  HASH  profile_id → username (online_members 조회용)
+
+여러 daphne 프로세스/컨테이너가 같은 방을 서비스해도 첫 연결/마지막 연결 해제를
+정확히 판단할 수 있고, 빈 방의 키는 TTL로 자동 삭제된다.
+
+Redis 장애 시 join / leave는 None(알 수 없음), heartbeat는 False를 반환하므로 호출 측은 입장/퇴장을 알리지 않는다.
+만료된 연결 정리(reap)는 연결마다가 아니라 워커(이벤트 루프)마다 한 번, 이 워커에 연결이 있는 방에 대해 실행한다.
+"""
+import asyncio
+import time
+
+import redis
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from . import unread
+from .redis_utils import get_async_redis
+
+CONNS_KEY = "presence:{}:conns"
+USERS_KEY = "presence:{}:users"
+NAMES_KEY = "presence:{}:names"
+
+# 연결 등록(또는 heartbeat 갱신). 사용자의 현재 연결 수를 반환
+_JOIN_SCRIPT = """
+local added = redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+local count
+if added == 1 then
+    count = redis.call('HINCRBY', KEYS[2], ARGV[3], 1)
+else
+    count = tonumber(redis.call('HGET', KEYS[2], ARGV[3]) or '1')
+end
+redis.call('HSET', KEYS[3], ARGV[3], ARGV[4])
+for i = 1, 3 do
+    redis.call('EXPIRE', KEYS[i], ARGV[5])
+end
+return {added, count}
+"""
+
+# 연결 해제. 남은 연결 수를 반환 (이미 정리된 연결이면 -1)
+_LEAVE_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return -1
+end
+local count = redis.call('HINCRBY', KEYS[2], ARGV[2], -1)
+if count <= 0 then
+    redis.call('HDEL', KEYS[2], ARGV[2])
+    redis.call('HDEL', KEYS[3], ARGV[2])
+    return 0
+end
+return count
+"""
+
+# heartbeat가 끊긴 연결 정리. 마지막 연결까지 사라진 사용자의 username 목록 반환
+_REAP_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local gone = {}
+for _, member in ipairs(expired) do
+    redis.call('ZREM', KEYS[1], member)
+    local pid = string.match(member, '^([^:]+):')
+    local count = redis.call('HINCRBY', KEYS[2], pid, -1)
+    if count <= 0 then
+        local name = redis.call('HGET', KEYS[3], pid)
+        redis.call('HDEL', KEYS[2], pid)
+        redis.call('HDEL', KEYS[3], pid)
+        table.insert(gone, name or pid)
+    end
+end
+return gone
+"""
+
+
+def heartbeat_interval():
+    return getattr(settings, 'CHAT_PRESENCE_HEARTBEAT_INTERVAL', 30)
+
+
+def _connection_ttl():
+    # heartbeat 2번을 놓치면 끊긴 연결로 간주
+    return heartbeat_interval() * 3
+
+
+def _keys(room_uuid):
+    room_uuid = str(room_uuid)
+    return [CONNS_KEY.format(room_uuid), USERS_KEY.format(room_uuid), NAMES_KEY.format(room_uuid)]
+
+
+def _member(profile_id, channel_name):
+    return f"{profile_id}:{channel_name}"
+
+
+async def join(room_uuid, profile_id, username, channel_name):
+    """
+    연결 등록. 클러스터 전체에서 이 사용자의 연결 수를 반환
+    (1이면 최초 입장 → 입장 메시지 전송 대상, Redis 장애로 알 수 없으면 None)
+    """
+    result = await _register(room_uuid, profile_id, username, channel_name)
+    if result is None:
+        return None
+    added, count = result
+    return count if added else max(count, 2)
+
+
+async def heartbeat(room_uuid, profile_id, username, channel_name):
+    """연결 TTL 갱신. 이미 정리된 연결이었다면 다시 등록하고 True 반환 (Redis 장애 시 False)"""
+    result = await _register(room_uuid, profile_id, username, channel_name)
+    if result is None:
+        return False
+    added, count = result
+    return bool(added) and count == 1
+
+
+async def _register(room_uuid, profile_id, username, channel_name):
+    ttl = _connection_ttl()
+    try:
+        client = get_async_redis()
+        added, count = await client.eval(
+            _JOIN_SCRIPT, 3, *_keys(room_uuid),
+            _member(profile_id, channel_name), time.time() + ttl, profile_id, username, ttl * 2,
+        )
+        return int(added), int(count)
+    except redis.RedisError as e:
+        # 최초 입장으로 취급하면 heartbeat마다 입장 메시지가 나가므로 알 수 없음으로 반환
+        print(f"[WARNING] presence 등록 실패: {e}")
+        return None
+
+
+async def leave(room_uuid, profile_id, channel_name):
+    """
+    연결 해제. 남은 연결 수를 반환
+    (0이면 마지막 연결 해제 → 퇴장 메시지 전송 대상, -1이면 이미 정리된 연결, Redis 장애 시 None)
+    """
+    try:
+        client = get_async_redis()
+        keys = _keys(room_uuid)
+        return int(await client.eval(
+            _LEAVE_SCRIPT, 3, *keys, _member(profile_id, channel_name), profile_id
+        ))
+    except redis.RedisError as e:
+        print(f"[WARNING] presence 해제 실패: {e}")
+        return None
+
+
+async def reap(room_uuid):
+    """만료된 연결 정리. 더 이상 접속 중이 아닌 사용자 username 목록 반환"""
+    try:
+        client = get_async_redis()
+        return list(await client.eval(_REAP_SCRIPT, 3, *_keys(room_uuid), time.time()))
+    except redis.RedisError as e:
+        print(f"[WARNING] presence 정리 실패: {e}")
+        return []
+
+
+async def flush_read_markers():
+    """Redis에만 있는 읽음 시각을 last_read_at에 반영 (dirty 목록은 전역이므로 연결마다가 아니라 워커당 한 번)"""
+    try:
+        await database_sync_to_async(unread.flush_read_markers)()
+    except Exception as e:
+        print(f"[ERROR] 읽음 시각 반영 실패: {e}")
+
+
+class _Reaper:
+    """
+    워커(이벤트 루프)당 하나: heartbeat 주기마다 이 워커에 연결이 있는 방을 한 번씩 reap하고 읽음 시각을 반영
+    마지막 연결까지 사라진 사용자는 그 방에 등록된 on_gone(username) 하나로 알린다.
+    연결이 없는 워커에서는 멈추므로 REST로만 읽은 경우는 flush_read_markers 명령(cron)이 반영한다.
+    """
+
+    def __init__(self):
+        # room_uuid → {channel_name: on_gone}
+        self.rooms = {}
+        self.task = None
+
+    def add(self, room_uuid, channel_name, on_gone):
+        self.rooms.setdefault(str(room_uuid), {})[channel_name] = on_gone
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def discard(self, room_uuid, channel_name):
+        room_uuid = str(room_uuid)
+        callbacks = self.rooms.get(room_uuid)
+        if callbacks is None:
+            return
+        callbacks.pop(channel_name, None)
+        if not callbacks:
+            del self.rooms[room_uuid]
+        if not self.rooms and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(heartbeat_interval())
+            await self.reap_all()
+            await flush_read_markers()
+
+    async def reap_all(self):
+        for room_uuid, callbacks in list(self.rooms.items()):
+            gone = await reap(room_uuid)
+            if not gone or not callbacks:
+                continue
+            on_gone = next(iter(callbacks.values()))
+            for username in gone:
+                print(f"[DEBUG] 🧹 응답 없는 연결 정리: {username}")
+                try:
+                    await on_gone(username)
+                except Exception as e:
+                    print(f"[ERROR] 퇴장 메시지 전송 실패: {e}")
+
+
+_reapers = {}
+
+
+def get_reaper():
+    """현재 이벤트 루프용 reaper"""
+    loop = asyncio.get_running_loop()
+    reaper = _reapers.get(loop)
+    if reaper is None:
+        for old_loop in [l for l in _reapers if l.is_closed()]:
+            del _reapers[old_loop]
+        reaper = _reapers[loop] = _Reaper()
+    return reaper
+
+
+def watch(room_uuid, channel_name, on_gone):
+    """이 워커의 reaper에 연결 등록 (on_gone: 정리된 사용자 username을 받는 코루틴 함수)"""
+    get_reaper().add(room_uuid, channel_name, on_gone)
+
+
+def unwatch(room_uuid, channel_name):
+    get_reaper().discard(room_uuid, channel_name)
+
+
+async def online_members(room_uuid):
+    """현재 접속 중인 사용자 목록 [{"user_id", "username"}] (HGETALL 한 번)"""
+    try:
+        client = get_async_redis()
+        names = await client.hgetall(NAMES_KEY.format(str(room_uuid)))
+    except redis.RedisError as e:
+        print(f"[WARNING] presence 조회 실패: {e}")
+        return []
+    return sorted(
+        ({"user_id": int(profile_id), "username": username} for profile_id, username in names.items()),
+        key=lambda member: member["username"],
+    )
@@ -0,0 +1,268 @@
+"""
+토큰 버킷 기반 요청 제한 (WebSocket 프레임 / REST 엔드포인트 공용)
+
+정책은 settings.CHAT_RATE_LIMITS 에 "이름 → (버킷 크기, 초당 충전량)"으로 정의하고,
+버킷은 "ratelimit:<정책>:<식별자>" Redis 해시에 두어 모든 daphne/WSGI 프로세스가 공유한다.
+차감은 Lua 스크립트 한 번으로 원자적으로 처리하며, Redis 장애 시에는 프로세스 로컬 버킷으로 대신한다.
+여러 버킷을 함께 검사할 때(사용자 + 방)는 모든 버킷이 허용할 때만 모두 차감한다.
+한 버킷이 거절했는데 다른 버킷의 토큰을 쓰면, 거절된 요청이 사용자 한도를 깎게 되기 때문이다.
+
+REST 요청의 익명 사용자 식별은 REMOTE_ADDR를 쓴다. X-Forwarded-For는 클라이언트가 임의로 넣을 수 있으므로
+REMOTE_ADDR가 CHAT_TRUSTED_PROXIES(주소 또는 CIDR)에 속할 때만, 신뢰하는 프록시가 아닌 가장 오른쪽 주소를 쓴다.
+"""
+import functools
+import ipaddress
+import threading
+import time
+from dataclasses import dataclass
+
+import redis
+from django.conf import settings
+from django.http import JsonResponse
+from login.auth_check import check_authentication
+
+from . import metrics
+from .redis_utils import redis_client, get_async_redis
+
+BUCKET_KEY = "ratelimit:{}:{}"
+
+# 버킷 갱신 + 토큰 차감. ARGV: now, cost, (capacity, rate) × 키 수
+# 모든 버킷에 토큰이 있으면 모두 차감하고, 하나라도 부족하면 아무것도 차감하지 않음
+# 키별 재시도까지 남은 ms 목록 반환 (모두 0이면 허용)
+_TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local tokens = {}
+local retry = {}
+local allowed = true
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[2 * i + 1])
+    local rate = tonumber(ARGV[2 * i + 2])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local current = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    current = math.min(capacity, current + math.max(0, now - ts) * rate)
+    tokens[i] = current
+    if current >= cost then
+        retry[i] = 0
+    else
+        retry[i] = math.ceil((cost - current) / rate * 1000)
+        allowed = false
+    end
+end
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[2 * i + 1])
+    local rate = tonumber(ARGV[2 * i + 2])
+    local current = tokens[i]
+    if allowed then
+        current = current - cost
+    end
+    redis.call('HSET', KEYS[i], 'tokens', tostring(current), 'ts', tostring(now))
+    redis.call('PEXPIRE', KEYS[i], math.ceil(capacity / rate * 1000) + 1000)
+end
+return retry
+"""
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    retry_after: float = 0.0  # 초
+
+
+_ALLOW = Decision(True)
+
+
+def _policy(name):
+    """(capacity, rate) 또는 None (정의되지 않았거나 비활성화된 정책)"""
+    if not getattr(settings, 'CHAT_RATE_LIMIT_ENABLED', True):
+        return None
+    return getattr(settings, 'CHAT_RATE_LIMITS', {}).get(name)
+
+
+class _LocalBuckets:
+    """Redis 장애 시 사용하는 프로세스 로컬 토큰 버킷"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take_all(self, buckets, now, cost=1):
+        """[(key, capacity, rate)] 모두 토큰이 있으면 모두 차감. 키별 재시도까지 남은 초 목록 반환"""
+        with self._lock:
+            refilled = []
+            for key, capacity, rate in buckets:
+                tokens, ts = self._buckets.get(key, (capacity, now))
+                refilled.append(min(capacity, tokens + max(0.0, now - ts) * rate))
+            retry = [
+                0.0 if tokens >= cost else (cost - tokens) / rate
+                for tokens, (_, _, rate) in zip(refilled, buckets)
+            ]
+            allowed = not any(retry)
+            for tokens, (key, _, _) in zip(refilled, buckets):
+                self._buckets[key] = (tokens - cost if allowed else tokens, now)
+            # 오래된 버킷 정리 (가득 찬 버킷은 없는 것과 같음)
+            if len(self._buckets) > 10000:
+                self._buckets = {
+                    k: (t, s) for k, (t, s) in self._buckets.items() if now - s < 600
+                }
+            return retry
+
+
+_local_buckets = _LocalBuckets()
+
+
+def _prepare(checks):
+    """[(정책, 식별자)] → 활성화된 정책만 [(정책, key, capacity, rate)]"""
+    buckets = []
+    for policy_name, identity in checks:
+        policy = _policy(policy_name)
+        if policy:
+            capacity, rate = policy
+            buckets.append((policy_name, BUCKET_KEY.format(policy_name, identity), capacity, rate))
+    return buckets
+
+
+def _script_args(buckets, now, cost):
+    keys = [key for _, key, _, _ in buckets]
+    args = [now, cost]
+    for _, _, capacity, rate in buckets:
+        args.extend([capacity, rate])
+    return keys, args
+
+
+def _local_retry(buckets, now, cost):
+    return _local_buckets.take_all([(key, capacity, rate) for _, key, capacity, rate in buckets], now, cost)
+
+
+def _decide(buckets, retry):
+    """키별 재시도 시간(초) → Decision. 거절한 정책마다 메트릭 기록"""
+    rejected = [(policy_name, wait) for (policy_name, _, _, _), wait in zip(buckets, retry) if wait > 0]
+    if not rejected:
+        return _ALLOW
+    for policy_name, _ in rejected:
+        metrics.inc("ratelimit_rejected_total", policy=policy_name)
+    return Decision(False, max(wait for _, wait in rejected))
+
+
+def hit_all(*checks, cost=1):
+    """(정책, 식별자) 버킷을 함께 검사해 모두 허용할 때만 모두 차감 (동기 뷰용)"""
+    buckets = _prepare(checks)
+    if not buckets:
+        return _ALLOW
+    now = time.time()
+    keys, args = _script_args(buckets, now, cost)
+    try:
+        retry = [int(ms) / 1000 for ms in redis_client.eval(_TOKEN_BUCKET_SCRIPT, len(keys), *keys, *args)]
+    except redis.RedisError as e:
+        print(f"[WARNING] rate limit Redis 실패, 로컬 버킷 사용: {e}")
+        retry = _local_retry(buckets, now, cost)
+    return _decide(buckets, retry)
+
+
+async def ahit_all(*checks, cost=1):
+    """
+    (정책, 식별자) 버킷을 함께 검사해 모두 허용할 때만 모두 차감 (consumer용)
+    예) 사용자 버킷 + 방 버킷: 방 한도로 거절된 메시지가 사용자 버킷을 소모하지 않음
+    """
+    buckets = _prepare(checks)
+    if not buckets:
+        return _ALLOW
+    now = time.time()
+    keys, args = _script_args(buckets, now, cost)
+    try:
+        result = await get_async_redis().eval(_TOKEN_BUCKET_SCRIPT, len(keys), *keys, *args)
+        retry = [int(ms) / 1000 for ms in result]
+    except redis.RedisError as e:
+        print(f"[WARNING] rate limit Redis 실패, 로컬 버킷 사용: {e}")
+        retry = _local_retry(buckets, now, cost)
+    return _decide(buckets, retry)
+
+
+def hit(policy_name, identity, cost=1):
+    """정책 버킷에서 토큰 차감 (동기 뷰용)"""
+    return hit_all((policy_name, identity), cost=cost)
+
+
+async def ahit(policy_name, identity, cost=1):
+    """정책 버킷에서 토큰 차감 (consumer용)"""
+    return await ahit_all((policy_name, identity), cost=cost)
+
+
+def _trusted_proxies():
+    networks = []
+    for value in getattr(settings, 'CHAT_TRUSTED_PROXIES', ()):
+        try:
+            networks.append(ipaddress.ip_network(value.strip(), strict=False))
+        except ValueError:
+            print(f"[WARNING] 잘못된 CHAT_TRUSTED_PROXIES 항목 무시: {value}")
+    return networks
+
+
+def _is_trusted(address, networks):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_ip(request):
+    """요청한 클라이언트 IP (신뢰하는 프록시를 거친 경우에만 X-Forwarded-For 사용)"""
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    networks = _trusted_proxies()
+    if not networks or not _is_trusted(remote_addr, networks):
+        return remote_addr
+    forwarded = [address.strip() for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+    # 프록시가 뒤에 덧붙이므로 오른쪽부터 보며 신뢰하는 프록시가 아닌 첫 주소가 실제 클라이언트
+    for address in reversed(forwarded):
+        if address and not _is_trusted(address, networks):
+            return address
+    return remote_addr
+
+
+def _client_identity(request):
+    if request.user.is_authenticated:
+        return f"user:{request.user.id}"
+    return f"ip:{client_ip(request)}"
+
+
+def rate_limited_response(decision):
+    response = JsonResponse({
+        "error": "Too many requests",
+        "retry_after": round(decision.retry_after, 2),
+    }, status=429)
+    response["Retry-After"] = str(max(1, int(decision.retry_after + 0.999)))
+    return response
+
+
+def rate_limited_frame(decision):
+    """WebSocket 클라이언트에 보내는 제한 초과 프레임"""
+    return {
+        "type": "error",
+        "code": "rate_limited",
+        "message": "요청이 너무 많습니다. 잠시 후 다시 시도해주세요.",
+        "retry_after": round(decision.retry_after, 2),
+    }
+
+
+def rate_limit(policy_name, require_auth=False):
+    """
+    뷰 데코레이터: 로그인 사용자(없으면 클라이언트 IP) 단위로 정책 적용, 초과 시 429
+    @login_required 아래에 두면 인증되지 않은 요청은 버킷을 소모하지 않는다.
+    require_auth=True이면 버킷보다 먼저 인증을 확인해 JSON 401을 반환한다 (login_required 리다이렉트 대신 401을 주는 뷰용).
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            if require_auth:
+                auth_error = check_authentication(request)
+                if auth_error:
+                    return auth_error
+            decision = hit(policy_name, _client_identity(request))
+            if not decision.allowed:
+                print(f"[WARNING] rate limit 초과: {policy_name} - {_client_identity(request)}")
+                return rate_limited_response(decision)
+            return view_func(request, *args, **kwargs)
+        return wrapped
+    return decorator
@@ -0,0 +1,32 @@
+import asyncio
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+# Redis 설정 (views, 캐시/인덱스 모듈에서 공유)
+redis_client = redis.Redis(
+    host=getattr(settings, 'REDIS_HOST', 'redis'),
+    port=getattr(settings, 'REDIS_PORT', 6379),
+    decode_responses=True
+)
+
+# 비동기 클라이언트는 이벤트 루프에 묶이므로 루프별로 하나씩 생성
+_async_clients = {}
+
+
+def get_async_redis():
+    """현재 이벤트 루프용 redis.asyncio 클라이언트 (consumer에서 사용)"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        # 닫힌 루프의 클라이언트 정리
+        for old_loop in [l for l in _async_clients if l.is_closed()]:
+            del _async_clients[old_loop]
+        client = redis.asyncio.Redis(
+            host=getattr(settings, 'REDIS_HOST', 'redis'),
+            port=getattr(settings, 'REDIS_PORT', 6379),
+            decode_responses=True
+        )
+        _async_clients[loop] = client
+    return client
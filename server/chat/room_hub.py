@@ -0,0 +1,178 @@
+"""
+대형 방 팬아웃 허브 (워커 프로세스당 방 구독 하나 + 메모리 팬아웃)
+
+channels_redis의 group_send는 그룹의 채널마다 메시지 사본을 Redis에 넣는다.
+2,000명이 접속한 방이면 같은 daphne 프로세스에 500명이 있어도 사본 2,000개를 넣고 꺼낸다.
+
+CHAT_LARGE_ROOM_THRESHOLD가 0보다 크면 ChatConsumer는 채널 그룹과 함께 이 프로세스의 허브에도 등록한다.
+허브는 방마다 Redis pub/sub 채널(room:<uuid>:hub)을 프로세스당 한 번만 구독하고,
+받은 이벤트를 같은 프로세스의 consumer 핸들러로 직접 전달한다.
+room_send()는 방 접속 수(presence ZCARD, CHECK_INTERVAL 동안 캐시)가 임계값 이상이면
+PUBLISH 한 번, 아니면 기존처럼 group_send로 보낸다. 모든 consumer가 양쪽에 등록되어 있으므로
+어느 경로로 보내도 한 번씩만 전달된다. (임계값을 넘나드는 순간의 두 경로 사이 순서는 보장하지 않음)
+
+pub/sub는 구독 중인 프로세스에만 전달되고 저장되지 않으므로,
+재접속 중 놓친 메시지는 기존처럼 last_message_id 재전송으로 복구한다.
+"""
+import asyncio
+import time
+
+import msgpack
+import redis
+import redis.asyncio
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from . import metrics
+from .presence import CONNS_KEY
+
+HUB_CHANNEL = "room:{}:hub"
+
+
+def enabled():
+    return getattr(settings, 'CHAT_LARGE_ROOM_THRESHOLD', 0) > 0
+
+
+def _check_interval():
+    return getattr(settings, 'CHAT_LARGE_ROOM_CHECK_INTERVAL', 5.0)
+
+
+class RoomHub:
+    """이벤트 루프(워커 프로세스) 하나에 허브 하나. client는 bytes를 그대로 주고받는 redis.asyncio 클라이언트"""
+
+    def __init__(self, client):
+        self.client = client
+        self._rooms = {}
+        self._pubsub = None
+        self._reader = None
+        self._large = {}
+
+    # ==================== 로컬 consumer 등록 ====================
+
+    async def join(self, room_uuid, consumer):
+        """consumer를 방에 등록. 이 프로세스의 첫 번째 consumer면 방 채널 구독"""
+        room_key = str(room_uuid)
+        consumers = self._rooms.get(room_key)
+        if consumers is None:
+            consumers = self._rooms[room_key] = set()
+            if self._pubsub is None:
+                self._pubsub = self.client.pubsub()
+            await self._pubsub.subscribe(HUB_CHANNEL.format(room_key))
+            metrics.gauge_set("room_hub_rooms", len(self._rooms))
+        consumers.add(consumer)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+    async def leave(self, room_uuid, consumer):
+        """등록 해제. 마지막 consumer였으면 구독 해제"""
+        room_key = str(room_uuid)
+        consumers = self._rooms.get(room_key)
+        if consumers is None:
+            return
+        consumers.discard(consumer)
+        if consumers:
+            return
+        del self._rooms[room_key]
+        metrics.gauge_set("room_hub_rooms", len(self._rooms))
+        try:
+            await self._pubsub.unsubscribe(HUB_CHANNEL.format(room_key))
+        except redis.RedisError as e:
+            print(f"[WARNING] 방 허브 구독 해제 실패: {e}")
+
+    def local_count(self, room_uuid):
+        return len(self._rooms.get(str(room_uuid), ()))
+
+    async def close(self):
+        """수신 태스크와 pub/sub 연결 정리 (벤치마크/종료용)"""
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+    # ==================== 전송 ====================
+
+    async def publish(self, room_uuid, event):
+        """방 이벤트를 구독 중인 모든 워커에 한 번씩 전송 (PUBLISH 1회)"""
+        await self.client.publish(HUB_CHANNEL.format(str(room_uuid)), msgpack.packb(event, use_bin_type=True))
+        metrics.inc("room_hub_published_total")
+
+    async def is_large(self, room_uuid):
+        """방 접속 수가 임계값 이상인지 (방마다 CHECK_INTERVAL에 한 번만 ZCARD)"""
+        room_key = str(room_uuid)
+        now = time.monotonic()
+        cached = self._large.get(room_key)
+        if cached is not None and now - cached[1] < _check_interval():
+            return cached[0]
+        try:
+            connections = await self.client.zcard(CONNS_KEY.format(room_key))
+        except redis.RedisError as e:
+            print(f"[WARNING] 방 접속 수 조회 실패: {e}")
+            connections = 0
+        large = connections >= getattr(settings, 'CHAT_LARGE_ROOM_THRESHOLD', 0)
+        self._large[room_key] = (large, now)
+        return large
+
+    # ==================== 수신 / 로컬 팬아웃 ====================
+
+    async def _read(self):
+        while self._rooms:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except (redis.RedisError, OSError) as e:
+                # 연결이 끊기면 다음 호출 때 redis-py가 재접속 후 구독을 복구
+                print(f"[WARNING] 방 허브 수신 실패: {e}")
+                await asyncio.sleep(0.5)
+                continue
+            if message is None or message.get("type") != "message":
+                continue
+            channel = message["channel"].decode() if isinstance(message["channel"], bytes) else message["channel"]
+            room_key = channel.split(":")[1]
+            await self.dispatch(room_key, msgpack.unpackb(message["data"], raw=False))
+
+    async def dispatch(self, room_key, event):
+        """이벤트를 이 프로세스에 있는 방 consumer들의 핸들러로 전달"""
+        handler_name = event["type"].replace(".", "_")
+        consumers = list(self._rooms.get(room_key, ()))
+        for consumer in consumers:
+            try:
+                await getattr(consumer, handler_name)(event)
+            except Exception as e:
+                print(f"[ERROR] 방 허브 전달 실패 ({handler_name}): {e}")
+        metrics.inc("room_hub_delivered_total", len(consumers))
+
+
+_hubs = {}
+
+
+def get_room_hub():
+    """현재 이벤트 루프용 허브 (pub/sub 메시지를 bytes 그대로 받도록 decode_responses 없는 전용 클라이언트)"""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        for old_loop in [l for l in _hubs if l.is_closed()]:
+            del _hubs[old_loop]
+        hub = _hubs[loop] = RoomHub(redis.asyncio.Redis(
+            host=getattr(settings, 'REDIS_HOST', 'redis'),
+            port=getattr(settings, 'REDIS_PORT', 6379),
+        ))
+    return hub
+
+
+async def room_send(room_uuid, group_name, event):
+    """
+    방 전체 브로드캐스트. 대형 방이면 허브(PUBLISH 1회), 아니면 채널 그룹으로 전송
+    허브 전송이 실패하면 group_send로 대체 (consumer는 그룹에도 등록되어 있음)
+    """
+    if enabled():
+        hub = get_room_hub()
+        try:
+            if await hub.is_large(room_uuid):
+                await hub.publish(room_uuid, event)
+                return
+        except redis.RedisError as e:
+            print(f"[WARNING] 방 허브 전송 실패, group_send로 대체: {e}")
+    # 멀티플렉스 연결은 채널 하나로 여러 방 그룹을 받으므로 그룹 이름으로 구독을 찾는다
+    await get_channel_layer().group_send(group_name, dict(event, group=group_name))
@@ -0,0 +1,112 @@
+"""
+사용자별 채팅방 목록 조회 (목록 화면용 projection)
+
+get_my_rooms와 login.current_user가 같은 목록을 쓴다. 방마다 room.admin / admin.user /
+participants.count()를 따로 읽으면 방 하나에 쿼리 3개가 나가므로, 필요한 필드만 쿼리 한 번으로 가져온다.
+- 방장 사용자명: admin__user__username (JOIN)
+- 참가자 수: Count 주석
+- 마지막 메시지: (room, created_at) 순 상관 서브쿼리
+
+결과는 CHAT_ROOM_LIST_CACHE_TTL초 동안 사용자별 Redis 키(room_list:<profile_id>)에 캐시한다. (0이면 끔)
+멤버십이 바뀌면(membership.member_added/removed, room_created/deleted) 관련 사용자의 키를 지우고,
+새 메시지에 따른 last_message는 TTL 동안 늦게 반영될 수 있다 (실시간 갱신은 WebSocket 담당).
+DB에서 목록을 만들 때 방 uuid 목록과 방별 버전 스탬프를 남겨 ETag 비교에 쓴다 (versions 모듈).
+"""
+import json
+
+import redis
+from django.conf import settings
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Substr
+
+from . import versions
+from .models import ChatRoom, Message
+from .redis_utils import redis_client
+
+ROOM_LIST_KEY = "room_list:{}"
+LAST_MESSAGE_PREVIEW_LENGTH = 100
+
+Participant = ChatRoom.participants.through
+
+
+def _ttl():
+    return getattr(settings, 'CHAT_ROOM_LIST_CACHE_TTL', 5)
+
+
+def _query(profile_id):
+    last_message = Message.objects.filter(room=OuterRef('pk')).order_by('-created_at', '-id')
+    member_room_ids = Participant.objects.filter(userprofile_id=profile_id).values('chatroom_id')
+    return (
+        ChatRoom.objects
+        .filter(Q(admin_id=profile_id) | Q(room_uuid__in=member_room_ids))
+        .annotate(
+            participant_count=Count('participants', distinct=True),
+            last_message_id=Subquery(last_message.values('id')[:1]),
+            last_message_at=Subquery(last_message.values('created_at')[:1]),
+            last_message_preview=Subquery(
+                last_message.annotate(preview=Substr('content', 1, LAST_MESSAGE_PREVIEW_LENGTH)).values('preview')[:1]
+            ),
+        )
+        .order_by('-updated_at')
+        .values(
+            'room_uuid', 'room_name', 'description', 'admin_id', 'admin__user__username',
+            'created_at', 'updated_at', 'participant_count',
+            'last_message_id', 'last_message_at', 'last_message_preview',
+        )
+    )
+
+
+def _row(values):
+    return {
+        "room_uuid": str(values["room_uuid"]),
+        "room_name": values["room_name"],
+        "description": values["description"],
+        "admin_id": values["admin_id"],
+        "admin_username": values["admin__user__username"],
+        # 참가자 테이블 행 수 (방장 포함 여부는 호출하는 쪽 응답 형식에 맞춤)
+        "participant_count": values["participant_count"],
+        "created_at": values["created_at"].isoformat(),
+        "updated_at": values["updated_at"].isoformat(),
+        "last_message": {
+            "id": values["last_message_id"],
+            "preview": values["last_message_preview"],
+            "created_at": values["last_message_at"].isoformat(),
+        } if values["last_message_id"] is not None else None,
+    }
+
+
+def member_rooms(profile_id, use_cache=True):
+    """
+    profile이 방장이거나 참가자인 방 목록 (updated_at 최신순, JSON 직렬화 가능한 dict 리스트)
+    use_cache=False면 캐시를 읽지 않고 DB에서 만든다 (ETag를 붙이는 응답: 캐시가 스탬프보다 오래됐을 수 있음)
+    """
+    ttl = _ttl()
+    key = ROOM_LIST_KEY.format(profile_id)
+    if ttl > 0 and use_cache:
+        try:
+            cached = redis_client.get(key)
+        except redis.RedisError as e:
+            print(f"[WARNING] 방 목록 캐시 조회 실패: {e}")
+            cached = None
+        if cached is not None:
+            return json.loads(cached)
+
+    rooms = [_row(values) for values in _query(profile_id)]
+    versions.remember_room_list(profile_id, rooms)
+
+    if ttl > 0:
+        try:
+            redis_client.set(key, json.dumps(rooms), ex=ttl)
+        except redis.RedisError as e:
+            print(f"[WARNING] 방 목록 캐시 저장 실패: {e}")
+    return rooms
+
+
+def invalidate(*profile_ids):
+    """멤버십 변경 후 해당 사용자들의 방 목록 캐시 삭제"""
+    if not profile_ids:
+        return
+    redis_client.delete(
+        *(ROOM_LIST_KEY.format(profile_id) for profile_id in profile_ids),
+        *(versions.ROOM_LIST_ROOMS_KEY.format(profile_id) for profile_id in profile_ids),
+    )
@@ -1,4 +1,9 @@
 import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
 from django.db import IntegrityError, transaction
 from django.http import (
     JsonResponse,
@@ -10,6 +15,7 @@ from django.shortcuts import get_object_or_404
 
 from .models import SecureData, ChatRoom
 from .crypto_utils import decrypt_aes_gcm
+from . import membership
 
 
 def load_room_name(request):
@@ -56,6 +62,7 @@ def save_room_secret_key(room_name: str, encrypted: str, admin_profile):
                 admin=admin_profile
             )
             room.participants.add(admin_profile)
+            membership.room_created(room.room_uuid, admin_profile.id)
 
             SecureData.objects.create(
                 room=room,
@@ -70,27 +77,102 @@ def save_room_secret_key(room_name: str, encrypted: str, admin_profile):
 
 
 #totp 코드 필요할 때 암호문 가져와서 복호화
+# 복호화한 비밀키는 프로세스 로컬 LRU에 CHAT_ROOM_SECRET_CACHE_TTL초 동안 보관 (방 비밀키는 바뀌지 않음)
+# 방 삭제 시 evict_room_secret으로 제거. 다른 프로세스에 남은 항목은 방이 없으므로 쓰이지 않고 TTL 후 사라짐
+_secret_lock = threading.Lock()
+_secret_cache = OrderedDict()
+
+
+def _secret_cache_size():
+    return getattr(settings, 'CHAT_ROOM_SECRET_CACHE_SIZE', 1024)
+
+
+def _secret_cache_ttl():
+    return getattr(settings, 'CHAT_ROOM_SECRET_CACHE_TTL', 300)
+
+
+def _cached_secret(key, now):
+    with _secret_lock:
+        entry = _secret_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, secret = entry
+        if expires_at <= now:
+            del _secret_cache[key]
+            return None
+        _secret_cache.move_to_end(key)
+        return secret
+
+
+def _cache_secret(key, secret, now):
+    if _secret_cache_ttl() <= 0:
+        return
+    with _secret_lock:
+        _secret_cache[key] = (now + _secret_cache_ttl(), secret)
+        _secret_cache.move_to_end(key)
+        while len(_secret_cache) > _secret_cache_size():
+            _secret_cache.popitem(last=False)
+
+
 def get_room_secret(room_uuid):
+    key = str(room_uuid)
+    now = time.monotonic()
+    secret = _cached_secret(key, now)
+    if secret is not None:
+        return secret
+
     try:
-        from .models import ChatRoom, SecureData  # SecureData 모델 사용
-        from .crypto_utils import decrypt_aes_gcm  # 복호화 함수
-        
-        # 1. 먼저 ChatRoom 객체 찾기
-        room = ChatRoom.objects.get(room_uuid=room_uuid)
-        
-        # 2. room과 연결된 SecureData 찾기 (OneToOneField)
-        secure_data = SecureData.objects.get(room=room)
-        
-        # 3. 복호화
-        if secure_data.encrypted_value:
-            decrypted_secret = decrypt_aes_gcm(secure_data.encrypted_value)
-            return decrypted_secret
-        else:
+        # ChatRoom + SecureData를 조인 한 번으로 조회
+        encrypted_value = (
+            SecureData.objects.filter(room__room_uuid=room_uuid)
+            .values_list('encrypted_value', flat=True)
+            .first()
+        )
+        if not encrypted_value:
             return None
-        
-    except ChatRoom.DoesNotExist:
-        return None
-    except SecureData.DoesNotExist:
-        return None
+        secret = decrypt_aes_gcm(encrypted_value)
     except Exception as e:
-        return None
\ No newline at end of file
+        print(f"[WARNING] 방 비밀키 조회 실패: {e}")
+        return None
+
+    _cache_secret(key, secret, now)
+    return secret
+
+
+def get_room_secrets(room_uuids):
+    """여러 방의 비밀키 {room_uuid 문자열: secret}. 캐시에 없는 방만 쿼리 한 번으로 조회 (없는 방은 빠짐)"""
+    now = time.monotonic()
+    secrets = {}
+    missing = []
+    for room_uuid in room_uuids:
+        key = str(room_uuid)
+        secret = _cached_secret(key, now)
+        if secret is None:
+            missing.append(key)
+        else:
+            secrets[key] = secret
+    if not missing:
+        return secrets
+
+    rows = SecureData.objects.filter(room__room_uuid__in=missing).values_list('room_id', 'encrypted_value')
+    for room_id, encrypted_value in rows:
+        key = str(room_id)
+        try:
+            secret = decrypt_aes_gcm(encrypted_value)
+        except Exception as e:
+            print(f"[WARNING] 방 비밀키 복호화 실패 ({key}): {e}")
+            continue
+        secrets[key] = secret
+        _cache_secret(key, secret, now)
+    return secrets
+
+
+def evict_room_secret(room_uuid):
+    """방 삭제 시 캐시된 비밀키 제거"""
+    with _secret_lock:
+        _secret_cache.pop(str(room_uuid), None)
+
+
+def clear_room_secrets():
+    with _secret_lock:
+        _secret_cache.clear()
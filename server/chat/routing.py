@@ -1,6 +1,8 @@
 from django.urls import re_path
-from . import consumers
+from . import consumers, multiplex
 
 websocket_urlpatterns = [
     re_path(r'ws/chat/(?P<room_uuid>[0-9a-f-]{36})/$', consumers.ChatConsumer.as_asgi()),
+    # 방/AI 세션 여러 개를 연결 하나로 구독
+    re_path(r'ws/multiplex/$', multiplex.MultiplexConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -0,0 +1,296 @@
+"""
+REST 엔드포인트 쿼리 수 / 응답 시간 회귀 테스트 공용 베이스 (chat, llm, login 테스트에서 사용)
+
+같은 엔드포인트를 데이터가 적은 사용자와 많은 사용자(방 SEED_ROOMS개, 메시지 SEED_MESSAGES개)로
+호출해서 쿼리 수가 같은지 확인한다. 행마다 쿼리가 붙는 변경(N+1)은 여기서 실패한다.
+캐시를 채우는 첫 요청은 측정에서 제외하고, 두 번째 요청의 쿼리 수와 경과 시간을 예산과 비교한다.
+
+데이터 규모와 시간 예산은 환경 변수로 조정 (느린 CI에서는 TIME_SCALE을 키운다)
+- QUERY_SUITE_ROOMS       사용자 한 명이 참여한 방 수 (기본 500)
+- QUERY_SUITE_MESSAGES    큰 방의 메시지 수 (기본 10000)
+- QUERY_SUITE_TIME_SCALE  시간 예산 배수 (기본 1.0)
+"""
+import base64
+import contextlib
+import io
+import json
+import os
+import socket
+import struct
+import threading
+import time
+import unittest
+
+import redis
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from login import profile_cache
+
+from . import invites, membership, message_stream, unread, versions
+from .bench_utils import Stopwatch, create_bench_profiles, seed_member_rooms
+from .redis_utils import redis_client
+from .room_utils import clear_room_secrets
+
+SEED_ROOMS = int(os.environ.get("QUERY_SUITE_ROOMS", 500))
+SEED_MESSAGES = int(os.environ.get("QUERY_SUITE_MESSAGES", 10000))
+TIME_BUDGET_SCALE = float(os.environ.get("QUERY_SUITE_TIME_SCALE", 1.0))
+
+# 비교 대상인 작은 사용자의 방 수
+SMALL_ROOMS = max(2, SEED_ROOMS // 10)
+
+
+def require_redis():
+    """Redis가 없으면 테스트 클래스 전체를 건너뜀"""
+    try:
+        redis_client.ping()
+    except redis.RedisError as e:
+        raise unittest.SkipTest(f"Redis에 연결할 수 없어 테스트를 건너뜀: {e}")
+
+
+def drop_redis_keys():
+    """테스트 중 생긴 방별 캐시 키 정리 (DB는 롤백되지만 Redis는 남으므로)"""
+    from login.models import UserProfile
+    from .models import ChatRoom
+
+    # 롤백된 사용자 id가 다음 테스트에서 재사용될 수 있으므로 프로필 캐시도 비움
+    profile_cache.clear_local()
+    clear_room_secrets()
+
+    room_uuids = {str(room_uuid) for room_uuid in ChatRoom.objects.values_list('room_uuid', flat=True)}
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for room_uuid in room_uuids:
+            pipe.delete(
+                membership.MEMBERS_KEY.format(room_uuid),
+                membership.ADMIN_KEY.format(room_uuid),
+                membership.VERSION_KEY.format(room_uuid),
+                message_stream.STREAM_KEY.format(room_uuid),
+                message_stream.META_KEY.format(room_uuid),
+                unread.SEQ_KEY.format(room_uuid),
+                unread.READ_KEY.format(room_uuid),
+                unread.READ_AT_KEY.format(room_uuid),
+            )
+            pipe.hdel(versions.LAST_MESSAGE_KEY, room_uuid)
+            pipe.hdel(versions.META_KEY, room_uuid)
+        for profile_id, user_id in UserProfile.objects.values_list('id', 'user_id'):
+            pipe.delete(
+                versions.ROOM_LIST_ROOMS_KEY.format(profile_id),
+                versions.READ_VERSION_KEY.format(profile_id),
+                profile_cache.PROFILE_KEY.format(user_id),
+            )
+        if room_uuids:
+            pipe.zrem(invites.OPEN_KEY, *room_uuids)
+        pipe.execute()
+        codes = [
+            key for key in redis_client.scan_iter(match=invites.CODE_KEY.format("*"), count=10000)
+            if redis_client.get(key) in room_uuids
+        ]
+        if codes:
+            redis_client.delete(*codes)
+        dirty = [
+            member for member in redis_client.smembers(unread.DIRTY_KEY)
+            if member.rsplit(":", 1)[0] in room_uuids
+        ]
+        if dirty:
+            redis_client.srem(unread.DIRTY_KEY, *dirty)
+    except redis.RedisError as e:
+        print(f"[WARNING] 테스트 Redis 키 정리 실패: {e}")
+
+
+# 방 목록 캐시는 끄고 DB 경로(최악의 경우)를 측정
+@override_settings(CHAT_RATE_LIMIT_ENABLED=False, CHAT_ROOM_LIST_CACHE_TTL=0)
+class EndpointBudgetTestCase(TestCase):
+    """
+    setUpTestData에서 만드는 공통 데이터
+    - owner: 대부분의 방의 방장
+    - small_member / large_member: SMALL_ROOMS개 / SEED_ROOMS개 방에 참여 (5번째 방마다 방장)
+    - staff: is_staff 사용자
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        require_redis()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._drop_redis_keys()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, cls.small_member, cls.large_member, cls.staff = create_bench_profiles(4, prefix="suite")
+        cls.staff.user.is_staff = True
+        cls.staff.user.save(update_fields=["is_staff"])
+        cls.small_rooms = seed_member_rooms(cls.small_member, cls.owner, SMALL_ROOMS)
+        cls.large_rooms = seed_member_rooms(cls.large_member, cls.owner, SEED_ROOMS)
+
+    def setUp(self):
+        # 이전 테스트가 채운 캐시에 따라 쿼리 수가 달라지지 않도록 매번 비운 상태에서 시작
+        self._drop_redis_keys()
+
+    @classmethod
+    def _drop_redis_keys(cls):
+        drop_redis_keys()
+
+    # ==================== 요청 / 측정 ====================
+
+    def warm_membership(self, *rooms):
+        """warm=False 요청 전에 멤버십 캐시만 채워 둠 (캐시 미스 쿼리가 측정에 섞이지 않도록)"""
+        for room in rooms:
+            membership.warm(room.room_uuid)
+
+    def request(self, profile, method, path, data=None, warm=True, headers=None):
+        """
+        profile로 로그인해서 요청하고 (response, 실행된 SQL 목록, 경과 초) 반환
+        warm=True면 같은 요청을 한 번 먼저 보내 캐시를 채운다 (부수 효과가 있는 POST는 False)
+        """
+        self.client.force_login(profile.user)
+        # request.profile 캐시는 항상 채워진 상태에서 측정 (POST처럼 warm=False인 요청도 같은 조건)
+        profile_cache.get_profile(profile.user)
+
+        def send():
+            if method == "get":
+                return self.client.get(path, data or {}, headers=headers)
+            return self.client.post(path, json.dumps(data or {}), content_type="application/json")
+
+        # 뷰의 디버그 출력은 숨김
+        with contextlib.redirect_stdout(io.StringIO()):
+            if warm:
+                send()
+            with CaptureQueriesContext(connection) as queries, Stopwatch() as stopwatch:
+                response = send()
+        return response, [query["sql"] for query in queries.captured_queries], stopwatch.elapsed
+
+    def conditional(self, profile, path, data=None):
+        """
+        ETag를 받아 둔 뒤 If-None-Match로 다시 요청한 측정 결과 반환
+        첫 요청은 버전 스탬프를 채우고, 두 번째 요청의 ETag로 조건부 요청을 보낸다
+        """
+        response = self.request(profile, "get", path, data)[0]
+        self.assertTrue(response.has_header("ETag"), "버전 스탬프가 채워진 뒤에도 ETag가 없음")
+        return self.request(profile, "get", path, data, warm=False, headers={"If-None-Match": response["ETag"]})
+
+    def assertQueriesDoNotScale(self, small, large):
+        """데이터 양이 다른 두 측정 결과의 쿼리 수가 같은지 확인"""
+        small_queries, large_queries = small[1], large[1]
+        if len(small_queries) != len(large_queries):
+            self.fail(
+                f"데이터 양에 따라 쿼리 수가 늘어남: {len(small_queries)} → {len(large_queries)}\n"
+                + "\n".join(large_queries[:20])
+            )
+
+    def assertWithinBudget(self, result, queries, ms, status=200):
+        """쿼리 수 상한 / 응답 시간 상한(ms, TIME_BUDGET_SCALE 적용) / 상태 코드 확인"""
+        response, executed, elapsed = result
+        self.assertEqual(response.status_code, status, response.content[:500])
+        self.assertLessEqual(
+            len(executed), queries,
+            f"쿼리 예산 초과: {len(executed)} > {queries}\n" + "\n".join(executed[:20])
+        )
+        self.assertLessEqual(
+            elapsed * 1000, ms * TIME_BUDGET_SCALE,
+            f"시간 예산 초과: {elapsed * 1000:.1f}ms > {ms * TIME_BUDGET_SCALE:.1f}ms"
+        )
+
+
+# ==================== 실제 daphne 서버 / 원시 WebSocket 클라이언트 ====================
+
+_live_server = None
+_live_application = None
+
+
+async def _live_dispatch(scope, receive, send):
+    await _live_application(scope, receive, send)
+
+
+def live_daphne(application):
+    """
+    테스트용 daphne 서버를 띄우고 (host, port) 반환. 이후 연결은 application으로 전달
+    Twisted reactor는 프로세스당 한 번만 실행할 수 있으므로 서버는 한 번 띄워 테스트 간에 재사용한다.
+    """
+    global _live_server, _live_application
+    _live_application = application
+    if _live_server is None:
+        from daphne.server import Server
+
+        server = Server(
+            application=_live_dispatch,
+            endpoints=["tcp:port=0:interface=127.0.0.1"],
+            signal_handlers=False,
+            verbosity=0,
+        )
+        threading.Thread(target=server.run, daemon=True).start()
+        deadline = time.monotonic() + 10
+        while not server.listening_addresses:
+            if time.monotonic() > deadline:
+                raise RuntimeError("daphne 테스트 서버 시작 실패")
+            time.sleep(0.01)
+        _live_server = server
+    return _live_server.listening_addresses[0]
+
+
+class RawWebSocket:
+    """
+    소켓을 직접 다루는 최소 WebSocket 클라이언트 (읽기를 멈춘 느린 클라이언트 재현용)
+    recv_buffer를 주면 수신 버퍼를 줄여 서버 쪽 transport에 데이터가 빨리 쌓이게 한다.
+    """
+
+    def __init__(self, address, path, recv_buffer=None, timeout=10):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if recv_buffer:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, recv_buffer)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+        self._buffer = b""
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.sock.sendall((
+            f"GET {path} HTTP/1.1\r\nHost: {address[0]}:{address[1]}\r\n"
+            "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        while b"\r\n\r\n" not in self._buffer:
+            self._fill()
+        head, self._buffer = self._buffer.split(b"\r\n\r\n", 1)
+        if b" 101 " not in head.split(b"\r\n", 1)[0]:
+            raise AssertionError(f"WebSocket 핸드셰이크 실패: {head[:100]!r}")
+
+    def _fill(self):
+        chunk = self.sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("서버가 연결을 닫음")
+        self._buffer += chunk
+
+    def _read(self, size):
+        while len(self._buffer) < size:
+            self._fill()
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def send_text(self, text):
+        payload = text.encode()
+        mask = os.urandom(4)
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x81, 0x80 | length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x81, 0x80 | 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x81, 0x80 | 127, length)
+        masked = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+        self.sock.sendall(header + mask + masked)
+
+    def receive_frame(self):
+        """(opcode, payload). close 프레임이면 payload 앞 2바이트가 close code"""
+        first, second = self._read(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self._read(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._read(8))[0]
+        return first & 0x0F, self._read(length)
+
+    def close(self):
+        self.sock.close()
+
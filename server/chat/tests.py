@@ -1,3 +1,1510 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import io
+import json
+import signal
+import threading
+import time
+import uuid
+from unittest import mock
 
-# Create your tests here.
+import redis
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.db import OperationalError
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    channel_layers, codecs, dedupe, drain, invites, membership, message_buffer, message_stream, metrics, presence,
+    ratelimit, room_hub, room_utils, typing_indicator, unread,
+)
+from .bench_utils import create_bench_profiles, seed_member_rooms, seed_messages
+from .codecs import CodecMixin
+from .consumers import ChatConsumer
+from .crypto_utils import encrypt_aes_gcm, generate_pseudo_number
+from .drain import DrainMixin
+from .frames import chat_event, select_frame
+from .heartbeat import HeartbeatMixin
+from .message_buffer import MessageWriteBuffer
+from .models import Message, SecureData
+from .multiplex import MultiplexConsumer, RoomSubscription
+from .outbound import OutboundQueueMixin
+from .pagination import encode_cursor
+from .redis_utils import redis_client
+from .test_utils import (
+    SEED_MESSAGES, EndpointBudgetTestCase, RawWebSocket, drop_redis_keys, live_daphne, require_redis,
+)
+
+
+class ChatEndpointBudgetTests(EndpointBudgetTestCase):
+    """chat/urls.py 엔드포인트별 쿼리 수 / 응답 시간 회귀 테스트"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # owner가 방장이고 member가 참가자인 방 (목록의 1번 방)
+        cls.quiet_room = cls.small_rooms[1]
+        cls.busy_room = cls.large_rooms[1]
+        seed_messages(cls.quiet_room, [cls.owner, cls.small_member], 120)
+        seed_messages(cls.busy_room, [cls.owner, cls.large_member], SEED_MESSAGES)
+        # 참가자가 많은 방 (current-room 참가자 목록 비교용)
+        cls.crowd = create_bench_profiles(30, prefix="crowd")
+        cls.crowded_room = seed_member_rooms(cls.large_member, cls.owner, 1, participants=cls.crowd, admin_every=0)[0]
+        # access-code용 방 비밀키
+        for room in (cls.quiet_room, cls.busy_room):
+            SecureData.objects.create(room=room, encrypted_value=encrypt_aes_gcm(*generate_pseudo_number()))
+
+    def _messages_path(self, room):
+        return reverse("chat:get_room_messages", args=[str(room.room_uuid)])
+
+    def test_my_rooms(self):
+        path = reverse("chat:get_my_rooms")
+        small = self.request(self.small_member, "get", path)
+        large = self.request(self.large_member, "get", path)
+        self.assertQueriesDoNotScale(small, large)
+        self.assertWithinBudget(large, queries=7, ms=500)
+
+    def test_create_room(self):
+        result = self.request(
+            self.large_member, "post", reverse("chat:create_chat_room"), {"room_name": "budget room"}, warm=False
+        )
+        self.assertWithinBudget(result, queries=12, ms=250)
+
+    def test_leave_room(self):
+        path = reverse("chat:delete_room")
+        self.warm_membership(self.quiet_room, self.busy_room)
+        small = self.request(self.small_member, "post", path, {"room_uuid": str(self.quiet_room.room_uuid)}, warm=False)
+        large = self.request(self.large_member, "post", path, {"room_uuid": str(self.busy_room.room_uuid)}, warm=False)
+        self.assertQueriesDoNotScale(small, large)
+        self.assertWithinBudget(large, queries=10, ms=250)
+
+    def test_delete_room(self):
+        path = reverse("chat:delete_room")
+        self.warm_membership(self.quiet_room, self.busy_room)
+        small = self.request(self.owner, "post", path, {"room_uuid": str(self.quiet_room.room_uuid)}, warm=False)
+        large = self.request(self.owner, "post", path, {"room_uuid": str(self.busy_room.room_uuid)}, warm=False)
+        self.assertQueriesDoNotScale(small, large)
+        self.assertWithinBudget(large, queries=18, ms=500)
+
+    def test_access_code(self):
+        result = self.request(
+            self.owner, "post", reverse("chat:generate_totp"), {"room_uuid": str(self.busy_room.room_uuid)}
+        )
+        self.assertWithinBudget(result, queries=6, ms=250)
+
+    def test_access_code_secret_cache(self):
+        path = reverse("chat:generate_totp")
+        data = {"room_uuid": str(self.busy_room.room_uuid)}
+        cold = self.request(self.owner, "post", path, data, warm=False)
+        cached = self.request(self.owner, "post", path, data, warm=False)
+        self.assertEqual(len(cached[1]), len(cold[1]) - 1)
+        self.assertFalse(any("chat_securedata" in sql for sql in cached[1]))
+
+        # 방 삭제 시 캐시에서 제거되고, 이 방의 초대 코드도 지워짐
+        self.request(self.owner, "post", reverse("chat:delete_room"), data, warm=False)
+        self.assertNotIn(str(self.busy_room.room_uuid), room_utils._secret_cache)
+        self.assertIsNone(invites.lookup(cached[0].json()["totp"]))
+        self.assertIsNone(redis_client.zscore(invites.OPEN_KEY, str(self.busy_room.room_uuid)))
+
+    def test_invite_codes(self):
+        busy, quiet = str(self.busy_room.room_uuid), str(self.quiet_room.room_uuid)
+        secret = room_utils.get_room_secret(busy)
+        # 창 경계에서 멀리 떨어진 시각으로 고정
+        now = (time.time() // invites.INTERVAL) * invites.INTERVAL + 5
+        window = int(now // invites.INTERVAL)
+        current, upcoming = invites._code(secret, window), invites._code(secret, window + 1)
+
+        # 다른 방이 현재 창 코드를 먼저 가지고 있으면 덮어쓰지 않고 다음 창 코드를 내려줌
+        redis_client.set(invites.CODE_KEY.format(current), quiet, ex=60)
+        code, expires_in = invites.open_invitation(busy, secret, now=now)
+        if current != upcoming:
+            self.assertEqual(code, upcoming)
+            self.assertEqual(expires_in, 2 * invites.INTERVAL + invites.INTERVAL - 5)
+        self.assertEqual(invites.lookup(current), quiet)
+        self.assertEqual(invites.lookup(code), busy)
+
+        # 이전 창 코드도 받아들임: 한 창 전에 받은 코드가 현재 창에서도 유효
+        redis_client.delete(invites.CODE_KEY.format(current))
+        previous, _ = invites.open_invitation(busy, secret, now=now - invites.INTERVAL)
+        self.assertEqual(previous, invites._code(secret, window - 1))
+        self.assertEqual(invites.lookup(previous), busy)
+        self.assertGreater(redis_client.ttl(invites.CODE_KEY.format(previous)), 0)
+
+        # 초대 중인 방 전체를 한 번에 미리 등록 (비밀키는 쿼리 한 번으로 조회)
+        room_utils.clear_room_secrets()
+        invites.open_invitation(quiet, room_utils.get_room_secret(quiet), now=now)
+        room_utils.clear_room_secrets()
+        with self.assertNumQueries(1):
+            rooms, _ = invites.refresh_open_invitations(now=now + invites.INTERVAL)
+        self.assertEqual(rooms, 2)
+        self.assertEqual(invites.lookup(invites._code(secret, window + 2)), busy)
+
+    def test_join_room_collision_free(self):
+        path = reverse("chat:generate_totp")
+        response, _, _ = self.request(self.owner, "post", path, {"room_uuid": str(self.busy_room.room_uuid)}, warm=False)
+        other, _, _ = self.request(self.owner, "post", path, {"room_uuid": str(self.quiet_room.room_uuid)}, warm=False)
+        self.assertEqual(invites.lookup(response.json()["totp"]), str(self.busy_room.room_uuid))
+        self.assertEqual(invites.lookup(other.json()["totp"]), str(self.quiet_room.room_uuid))
+        # 나중에 연 방의 코드가 먼저 받은 코드를 덮어쓰지 않음
+        self.assertNotEqual(response.json()["totp"], other.json()["totp"])
+
+        self.warm_membership(self.busy_room)
+        result = self.request(
+            self.small_member, "post", reverse("chat:join_room"), {"totp": response.json()["totp"]}, warm=False
+        )
+        self.assertEqual(result[0].json()["result"], "success")
+        self.assertEqual(result[0].json()["room_uuid"], str(self.busy_room.room_uuid))
+
+    def test_join_room(self):
+        response, _, _ = self.request(
+            self.owner, "post", reverse("chat:generate_totp"), {"room_uuid": str(self.busy_room.room_uuid)}, warm=False
+        )
+        self.warm_membership(self.busy_room)
+        result = self.request(
+            self.small_member, "post", reverse("chat:join_room"), {"totp": response.json()["totp"]}, warm=False
+        )
+        self.assertWithinBudget(result, queries=18, ms=250)
+
+    def test_select_room(self):
+        result = self.request(
+            self.large_member, "post", reverse("chat:select_room"), {"room_uuid": str(self.busy_room.room_uuid)}
+        )
+        self.assertWithinBudget(result, queries=6, ms=250)
+
+    def test_current_room(self):
+        path = reverse("chat:get_current_room_info")
+        results = []
+        for profile, room in ((self.small_member, self.quiet_room), (self.large_member, self.crowded_room)):
+            self.request(profile, "post", reverse("chat:select_room"), {"room_uuid": str(room.room_uuid)}, warm=False)
+            results.append(self.request(profile, "get", path))
+        self.assertQueriesDoNotScale(*results)
+        self.assertWithinBudget(results[1], queries=7, ms=250)
+
+    def test_room_messages_first_page(self):
+        small = self.request(self.small_member, "get", self._messages_path(self.quiet_room), {"page": 1, "limit": 50})
+        large = self.request(self.large_member, "get", self._messages_path(self.busy_room), {"page": 1, "limit": 50})
+        self.assertQueriesDoNotScale(small, large)
+        self.assertWithinBudget(large, queries=7, ms=250)
+
+    def test_room_messages_older_page(self):
+        small = self.request(self.small_member, "get", self._messages_path(self.quiet_room), {"page": 2, "limit": 50})
+        large = self.request(self.large_member, "get", self._messages_path(self.busy_room), {"page": 2, "limit": 50})
+        self.assertQueriesDoNotScale(small, large)
+        self.assertWithinBudget(large, queries=10, ms=250)
+
+    def test_room_messages_before_cursor(self):
+        # 깊은 위치의 커서도 첫 페이지 근처와 같은 쿼리 수 (COUNT/OFFSET 없음)
+        small = self.request(self.small_member, "get", self._messages_path(self.quiet_room),
+                             {"before": self._cursor_at(self.quiet_room, 60), "limit": 50})
+        large = self.request(self.large_member, "get", self._messages_path(self.busy_room),
+                             {"before": self._cursor_at(self.busy_room, SEED_MESSAGES - 100), "limit": 50})
+        self.assertQueriesDoNotScale(small, large)
+        self.assertWithinBudget(large, queries=8, ms=250)
+        message_queries = [sql for sql in large[1] if 'FROM "chat_message"' in sql]
+        self.assertFalse(any("COUNT(" in sql or "OFFSET" in sql for sql in message_queries), message_queries)
+
+    def test_room_messages_cursor_walk(self):
+        # 첫 페이지 → before로 끝까지 → 중복/누락 없이 전체 메시지
+        path = self._messages_path(self.quiet_room)
+        response = self.request(self.small_member, "get", path, {"page": 1, "limit": 50})[0].json()
+        seen = [message["id"] for message in response["messages"]]
+        while response["pagination"].get("has_older", True) and response["messages"]:
+            before = response["pagination"]["before_cursor"]
+            response = self.request(self.small_member, "get", path, {"before": before, "limit": 50}, warm=False)[0].json()
+            seen = [message["id"] for message in response["messages"]] + seen
+        self.assertEqual(seen, list(self.quiet_room.messages.order_by("created_at", "id").values_list("id", flat=True)))
+
+        # 가장 오래된 메시지 이후(after)는 다음 50개
+        first = self._cursor_at(self.quiet_room, 0, newest_first=False)
+        response = self.request(self.small_member, "get", path, {"after": first, "limit": 50}, warm=False)[0].json()
+        self.assertEqual([message["id"] for message in response["messages"]], seen[1:51])
+        self.assertTrue(response["pagination"]["has_newer"])
+
+        bad = self.request(self.small_member, "get", path, {"before": "not-a-cursor"}, warm=False)
+        self.assertEqual(bad[0].status_code, 400)
+
+    def _cursor_at(self, room, offset, newest_first=True):
+        ordering = ("-created_at", "-id") if newest_first else ("created_at", "id")
+        message = room.messages.order_by(*ordering)[offset]
+        return encode_cursor(message.created_at.isoformat(), message.id)
+
+    def test_my_rooms_not_modified(self):
+        path = reverse("chat:get_my_rooms")
+        small = self.conditional(self.small_member, path)
+        large = self.conditional(self.large_member, path)
+        self.assertQueriesDoNotScale(small, large)
+        self.assertWithinBudget(large, queries=5, ms=100, status=304)
+
+        # 새 메시지 → 해당 방 스탬프가 바뀌어 다시 200
+        etag = large[0]["ETag"]
+        message_stream.append(self.busy_room.room_uuid, [message_stream.entry_fields(
+            10 ** 9, self.owner.id, self.owner.user.username, "new", timezone.now()
+        )])
+        changed = self.request(self.large_member, "get", path, warm=False, headers={"If-None-Match": etag})
+        self.assertEqual(changed[0].status_code, 200)
+        self.assertNotEqual(changed[0]["ETag"], etag)
+
+        # 읽음 처리 → 안 읽은 수가 바뀌므로 다시 200
+        etag = changed[0]["ETag"]
+        unread.mark_read(self.busy_room.room_uuid, self.large_member.id)
+        read = self.request(self.large_member, "get", path, warm=False, headers={"If-None-Match": etag})
+        self.assertEqual(read[0].status_code, 200)
+
+    def test_current_room_not_modified(self):
+        self.client.force_login(self.large_member.user)
+        self.client.post(
+            reverse("chat:select_room"), json.dumps({"room_uuid": str(self.crowded_room.room_uuid)}),
+            content_type="application/json"
+        )
+        result = self.conditional(self.large_member, reverse("chat:get_current_room_info"))
+        self.assertWithinBudget(result, queries=5, ms=100, status=304)
+
+    def test_room_messages_not_modified(self):
+        small = self.conditional(self.small_member, self._messages_path(self.quiet_room), {"page": 3, "limit": 50})
+        large = self.conditional(self.large_member, self._messages_path(self.busy_room), {"page": 3, "limit": 50})
+        self.assertQueriesDoNotScale(small, large)
+        self.assertWithinBudget(large, queries=5, ms=100, status=304)
+
+        # 다른 페이지는 다른 ETag
+        other = self.request(self.large_member, "get", self._messages_path(self.busy_room), {"page": 4, "limit": 50},
+                             warm=False, headers={"If-None-Match": large[0]["ETag"]})
+        self.assertEqual(other[0].status_code, 200)
+
+    def test_mark_room_read(self):
+        path = reverse("chat:mark_room_read", args=[str(self.busy_room.room_uuid)])
+        result = self.request(self.large_member, "post", path)
+        self.assertWithinBudget(result, queries=9, ms=250)
+
+    def test_metrics(self):
+        result = self.request(self.staff, "get", reverse("chat:get_metrics"))
+        self.assertWithinBudget(result, queries=5, ms=100)
+
+
+class MessageWriteBufferTests(TransactionTestCase):
+    """
+    write-behind 버퍼 flush / 재시도 / dead letter / 종료 시 저장
+    SQLite의 FK 검사가 커밋 시점에 일어나므로 실제로 커밋되는 TransactionTestCase를 사용
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        require_redis()
+        super().setUpClass()
+
+    def setUp(self):
+        self.sender = create_bench_profiles(1, prefix="buffer")[0]
+        self.room = seed_member_rooms(self.sender, self.sender, 1)[0]
+        # flusher는 사실상 멈춰 두고 테스트에서 직접 flush
+        self.buffer = MessageWriteBuffer(batch_size=1000, flush_interval=60, notify=False, max_attempts=3)
+        # dead letter는 테스트 전용 목록에
+        dead_letter_key = f"test:dead_letters:{uuid.uuid4().hex}"
+        patcher = mock.patch.object(message_buffer, "DEAD_LETTER_KEY", dead_letter_key)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(redis_client.delete, dead_letter_key)
+
+    def tearDown(self):
+        drop_redis_keys()
+
+    def _dead_letter_rooms(self):
+        return [
+            message_buffer.PendingMessage.from_json(item).room_id
+            for item in redis_client.lrange(message_buffer.DEAD_LETTER_KEY, 0, -1)
+        ]
+
+    def _enqueue(self, *items):
+        """(room_id, content[, client_msg_id]) 목록을 버퍼에 넣음"""
+        async def run():
+            for room_id, content, *client_msg_id in items:
+                await self.buffer.enqueue(
+                    room_id, self.sender.id, content, f"chat_{room_id}",
+                    username=self.sender.username, client_msg_id=client_msg_id[0] if client_msg_id else None,
+                )
+        async_to_sync(run)()
+
+    def _flush(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return async_to_sync(self.buffer.flush)()
+
+    def _contents(self):
+        return list(Message.objects.filter(room=self.room).order_by('id').values_list('content', flat=True))
+
+    def test_flush_saves_batch(self):
+        self._enqueue((self.room.room_uuid, "first"), (self.room.room_uuid, "second"))
+        self.assertEqual(self._flush(), 2)
+        self.assertEqual(self.buffer.pending_count, 0)
+        self.assertEqual(self._contents(), ["first", "second"])
+        self.assertEqual(redis_client.xlen(message_stream.STREAM_KEY.format(self.room.room_uuid)), 2)
+
+    def test_bad_row_is_isolated_and_dead_lettered(self):
+        # 그 사이 삭제된 방의 메시지 (FK 위반) 하나가 같은 배치의 다른 메시지를 막지 않음
+        ghost = uuid.uuid4()
+        claim = dedupe._key(ghost, self.sender.id, "c1")
+        redis_client.set(claim, "p:provisional", ex=60)
+        self._enqueue((self.room.room_uuid, "before"), (ghost, "lost", "c1"), (self.room.room_uuid, "after"))
+
+        self.assertEqual(self._flush(), 2)
+        self.assertEqual(self._contents(), ["before", "after"])
+        self.assertEqual(self.buffer.pending_count, 1)
+
+        # 시도 한도까지 재시도한 뒤 dead letter로 옮기고 중복 키를 풀어줌
+        for _ in range(self.buffer.max_attempts - 1):
+            self.assertEqual(self._flush(), 0)
+        self.assertEqual(self.buffer.pending_count, 0)
+        self.assertEqual([pending.room_id for pending in self.buffer.dead_letters], [ghost])
+        self.assertIsNone(redis_client.get(claim))
+        self.assertEqual(self._contents(), ["before", "after"])
+
+    def test_whole_batch_failure_is_requeued(self):
+        self._enqueue((self.room.room_uuid, "retry me"))
+        with mock.patch.object(Message.objects, "bulk_create", side_effect=OperationalError("database is locked")):
+            self.assertEqual(self._flush(), 0)
+        self.assertEqual(self.buffer.pending_count, 1)
+        self.assertEqual(self._flush(), 1)
+        self.assertEqual(self._contents(), ["retry me"])
+
+    def test_after_commit_failure_is_not_requeued(self):
+        # 커밋 이후 단계(스트림 추가)가 실패해도 이미 저장된 메시지를 다시 넣지 않음
+        self._enqueue((self.room.room_uuid, "once"))
+        with mock.patch.object(message_stream, "append", side_effect=RuntimeError("boom")):
+            self.assertEqual(self._flush(), 1)
+        self.assertEqual(self.buffer.pending_count, 0)
+        self.assertEqual(self._flush(), 0)
+        self.assertEqual(self._contents(), ["once"])
+
+    def test_flush_sync_on_exit(self):
+        ghost = uuid.uuid4()
+        self._enqueue((self.room.room_uuid, "saved at exit"), (ghost, "lost"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(self.buffer.flush_sync(), 1)
+        self.assertEqual(self.buffer.pending_count, 0)
+        self.assertEqual([pending.room_id for pending in self.buffer.dead_letters], [ghost])
+        self.assertEqual(self._dead_letter_rooms(), [ghost])
+        self.assertEqual(self._contents(), ["saved at exit"])
+
+    def test_dead_letters_survive_and_replay(self):
+        self._enqueue((self.room.room_uuid, "db down at exit", "c9"))
+        with mock.patch.object(Message.objects, "bulk_create", side_effect=OperationalError("database is locked")):
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(self.buffer.flush_sync(), 0)
+        # 프로세스 메모리가 아니라 Redis 목록에 원문이 남음
+        self.assertEqual(self._dead_letter_rooms(), [self.room.room_uuid])
+        self.assertEqual(self._contents(), [])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(message_buffer.replay_dead_letters(), (1, 0))
+            # 다시 실행해도 중복 저장하지 않음 (목록이 비었음)
+            self.assertEqual(message_buffer.replay_dead_letters(), (0, 0))
+        self.assertEqual(self._contents(), ["db down at exit"])
+        message = Message.objects.get(room=self.room)
+        self.assertEqual(message.client_msg_id, "c9")
+        self.assertEqual(self._dead_letter_rooms(), [])
+
+    def test_replay_keeps_messages_that_still_fail(self):
+        ghost = uuid.uuid4()
+        self._enqueue((ghost, "room is gone"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.buffer.flush_sync()
+            self.assertEqual(message_buffer.replay_dead_letters(), (0, 1))
+            self.assertEqual(self._dead_letter_rooms(), [ghost])
+            self.assertEqual(message_buffer.replay_dead_letters(drop_failed=True), (0, 1))
+        self.assertEqual(self._dead_letter_rooms(), [])
+
+    def test_shutdown_waits_for_inflight_batch(self):
+        self._enqueue((self.room.room_uuid, "in flight", "c1"))
+        # flusher가 배치를 꺼내 스레드에서 저장하는 중에 종료가 시작됨
+        batch = self.buffer._take()
+        self._enqueue((self.room.room_uuid, "queued"))
+        writer = threading.Timer(0.2, self.buffer._write_batch, [batch])
+        writer.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(self.buffer.flush_sync(timeout=5), 1)
+        writer.join()
+        self.assertEqual(sorted(self._contents()), ["in flight", "queued"])
+
+    def test_shutdown_saves_abandoned_inflight_batch(self):
+        self._enqueue((self.room.room_uuid, "abandoned", "c2"))
+        # 루프가 멈춰 스레드로 넘어가지 못한 배치
+        self.buffer._take()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(self.buffer.flush_sync(timeout=0.1), 1)
+        self.assertEqual(self._contents(), ["abandoned"])
+
+
+class FloodConsumer(OutboundQueueMixin, AsyncWebsocketConsumer):
+    """"<개수>:<크기>[:<kind>]"를 받으면 그만큼의 텍스트 프레임을 보냄 (프레임마다 writer에 차례를 넘김)"""
+
+    # 아직 끝나지 않은 연결 수 (다음 테스트가 이전 연결의 메트릭을 보지 않도록)
+    active = 0
+
+    async def connect(self):
+        FloodConsumer.active += 1
+        await self.accept()
+
+    async def disconnect(self, code):
+        FloodConsumer.active -= 1
+
+    async def receive(self, text_data=None, bytes_data=None):
+        count, size, *kind = text_data.split(":")
+        payload = "x" * int(size)
+        for _ in range(int(count)):
+            if self._outbound_closed:
+                break
+            await self.send(text_data=payload, kind=kind[0] if kind else None)
+            await asyncio.sleep(0)
+
+
+@override_settings(CHAT_OUTBOUND_QUEUE_SIZE=32, CHAT_OUTBOUND_MAX_BUFFERED_BYTES=64 * 1024, CHAT_OUTBOUND_DRAIN_POLL=0.01)
+class OutboundBackpressureTests(SimpleTestCase):
+    """
+    실제 daphne 서버에서 읽기를 멈춘 클라이언트가 송신 큐 정책을 발동시키는지 확인
+    daphne의 send는 기다리지 않으므로 transport 버퍼를 보지 않으면 큐가 차지 않는다.
+    """
+
+    FRAMES = 4000
+    FRAME_SIZE = 4096
+
+    def setUp(self):
+        metrics.reset()
+        self.address = live_daphne(FloodConsumer.as_asgi())
+
+    def tearDown(self):
+        deadline = time.monotonic() + 10
+        while FloodConsumer.active and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+    def _counter(self, name, **labels):
+        return metrics.snapshot()["counters"].get(metrics._key(name, {"consumer": "FloodConsumer", **labels}), 0)
+
+    def _wait_for(self, name, timeout=10, **labels):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._counter(name, **labels):
+                return True
+            time.sleep(0.02)
+        return False
+
+    @override_settings(CHAT_OUTBOUND_POLICY="disconnect", CHAT_OUTBOUND_CLOSE_CODE=4008)
+    def test_stalled_client_is_disconnected(self):
+        client = RawWebSocket(self.address, "/ws/flood/", recv_buffer=4096)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                client.send_text(f"{self.FRAMES}:{self.FRAME_SIZE}")
+                # 클라이언트는 읽지 않음
+                self.assertTrue(self._wait_for("ws_outbound_slow_disconnects_total"))
+            self.assertGreaterEqual(self._counter("ws_outbound_transport_stalls_total"), 1)
+        finally:
+            client.close()
+
+    @override_settings(CHAT_OUTBOUND_POLICY="drop_typing")
+    def test_stalled_client_drops_typing_frames(self):
+        client = RawWebSocket(self.address, "/ws/flood/", recv_buffer=4096)
+        try:
+            client.send_text(f"{self.FRAMES}:{self.FRAME_SIZE}:typing")
+            self.assertTrue(self._wait_for("ws_outbound_dropped_total", kind="typing"))
+        finally:
+            client.close()
+        self.assertEqual(self._counter("ws_outbound_slow_disconnects_total"), 0)
+
+    @override_settings(CHAT_OUTBOUND_POLICY="drop_typing")
+    def test_drop_typing_never_drops_messages(self):
+        # 버릴 타이핑 프레임이 없으면 메시지를 버리지 않고 이어받기 가능한 close로 종료
+        client = RawWebSocket(self.address, "/ws/flood/", recv_buffer=4096)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                client.send_text(f"{self.FRAMES}:{self.FRAME_SIZE}")
+                self.assertTrue(self._wait_for("ws_outbound_slow_disconnects_total"))
+        finally:
+            client.close()
+        self.assertEqual(self._counter("ws_outbound_dropped_total", kind="message"), 0)
+
+    def test_missing_transport_is_counted(self):
+        async def run():
+            communicator = WebsocketCommunicator(FloodConsumer.as_asgi(), "/ws/flood/")
+            await communicator.connect()
+            with contextlib.redirect_stdout(io.StringIO()):
+                await communicator.send_to(text_data="1:10")
+                await communicator.receive_from()
+            await communicator.disconnect()
+
+        async_to_sync(run)()
+        self.assertEqual(self._counter("ws_outbound_backpressure_unavailable_total", reason="no_transport"), 1)
+
+    @override_settings(CHAT_OUTBOUND_POLICY="disconnect")
+    def test_reading_client_receives_everything(self):
+        client = RawWebSocket(self.address, "/ws/flood/")
+        try:
+            client.send_text(f"{self.FRAMES}:{self.FRAME_SIZE}")
+            received = 0
+            while received < self.FRAMES:
+                opcode, payload = client.receive_frame()
+                self.assertEqual(opcode, 0x1)
+                self.assertEqual(len(payload), self.FRAME_SIZE)
+                received += 1
+        finally:
+            client.close()
+        self.assertEqual(self._counter("ws_outbound_slow_disconnects_total"), 0)
+
+
+class HeartbeatConsumer(HeartbeatMixin, CodecMixin, AsyncWebsocketConsumer):
+    async def connect(self):
+        await self.accept_with_codec()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        await self.handle_heartbeat_frame(self.decode_frame(text_data, bytes_data))
+
+
+@override_settings(CHAT_WS_PING_INTERVAL=0.05, CHAT_WS_PONG_TIMEOUT=0.2, CHAT_WS_REAP_CLOSE_CODE=4009)
+class HeartbeatTests(SimpleTestCase):
+    """ping / pong, RTT 기록, 응답 없는 연결 정리"""
+
+    def setUp(self):
+        metrics.reset()
+
+    async def _connect(self):
+        communicator = WebsocketCommunicator(HeartbeatConsumer.as_asgi(), "/ws/heartbeat/")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    def _reaped(self, reason):
+        return metrics.snapshot()["counters"].get(
+            metrics._key("ws_reaped_total", {"reason": reason, "consumer": "HeartbeatConsumer"}), 0
+        )
+
+    async def _expect_close(self, communicator, timeout=2):
+        while True:
+            output = await communicator.receive_output(timeout)
+            if output["type"] == "websocket.close":
+                return output["code"]
+
+    async def test_client_ping_gets_pong(self):
+        communicator = await self._connect()
+        await communicator.send_json_to({"type": "ping", "id": "c1"})
+        while True:
+            frame = await communicator.receive_json_from(timeout=1)
+            if frame["type"] == "pong":
+                break
+        self.assertEqual(frame["id"], "c1")
+        await communicator.disconnect()
+
+    async def test_pong_records_rtt_and_missing_pong_is_reaped(self):
+        communicator = await self._connect()
+        ping = await communicator.receive_json_from(timeout=1)
+        self.assertEqual(ping["type"], "ping")
+        await communicator.send_json_to({"type": "pong", "id": ping["id"]})
+        await communicator.receive_json_from(timeout=1)
+        self.assertEqual(metrics.snapshot()["histograms"]["ws_rtt_ms{consumer=HeartbeatConsumer}"]["count"], 1)
+
+        # 이후 pong을 보내지 않으면 pong timeout으로 정리
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(await self._expect_close(communicator), 4009)
+        self.assertEqual(self._reaped("pong_timeout"), 1)
+
+    async def test_client_without_pong_is_kept_until_idle_timeout(self):
+        # heartbeat 미지원 클라이언트 (pong 없음, 다른 프레임도 없음)는 idle timeout(기본 300초) 전에는 끊지 않음
+        communicator = await self._connect()
+        for _ in range(10):
+            frame = await communicator.receive_json_from(timeout=1)
+            self.assertEqual(frame["type"], "ping")
+        self.assertEqual(self._reaped("idle"), 0)
+        self.assertEqual(self._reaped("pong_timeout"), 0)
+        await communicator.disconnect()
+
+    @override_settings(CHAT_WS_IDLE_TIMEOUT=0.2)
+    async def test_idle_timeout_reaps_client_without_pong(self):
+        communicator = await self._connect()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(await self._expect_close(communicator), 4009)
+        self.assertEqual(self._reaped("idle"), 1)
+
+    @override_settings(CHAT_WS_IDLE_TIMEOUT=0.01)
+    async def test_idle_timeout_is_at_least_ping_interval_margin(self):
+        # ping 주기보다 짧게 설정해도 pong을 보내는 클라이언트는 ping 사이에 정리되지 않음
+        communicator = await self._connect()
+        for _ in range(8):
+            ping = await communicator.receive_json_from(timeout=1)
+            self.assertEqual(ping["type"], "ping")
+            await communicator.send_json_to({"type": "pong", "id": ping["id"]})
+        self.assertEqual(self._reaped("idle"), 0)
+        await communicator.disconnect()
+
+
+class MessageStreamReplayTests(TestCase):
+    """재접속 재전송(since)이 빠진 구간이 있는 스트림을 쓰지 않는지 확인"""
+
+    @classmethod
+    def setUpClass(cls):
+        require_redis()
+        super().setUpClass()
+
+    def setUp(self):
+        self.sender = create_bench_profiles(1, prefix="stream")[0]
+        self.room = seed_member_rooms(self.sender, self.sender, 1)[0]
+        seed_messages(self.room, [self.sender], 10)
+        self.ids = list(Message.objects.filter(room=self.room).order_by('id').values_list('id', flat=True))
+
+    def tearDown(self):
+        drop_redis_keys()
+
+    def _entries(self, *contents):
+        """새 메시지를 저장하고 스트림에 넣을 entry 목록 반환"""
+        messages = [Message.objects.create(room=self.room, sender=self.sender, content=content) for content in contents]
+        return [
+            message_stream.entry_fields(message.id, self.sender.id, self.sender.user.username, message.content, message.created_at)
+            for message in messages
+        ]
+
+    def _since(self, last_message_id, limit=100):
+        return async_to_sync(message_stream.since)(self.room.room_uuid, last_message_id, limit)
+
+    def _ids(self, result):
+        return [message["id"] for message in result[0]]
+
+    def test_complete_stream_replays(self):
+        message_stream.warm(self.room.room_uuid, 50)
+        self.assertEqual(self._ids(self._since(self.ids[4])), self.ids[5:])
+        messages, has_more = self._since(self.ids[4], limit=2)
+        self.assertEqual([message["id"] for message in messages], self.ids[5:7])
+        self.assertTrue(has_more)
+
+    def test_failed_append_leaves_no_gap(self):
+        message_stream.warm(self.room.room_uuid, 50)
+        lost = self._entries("lost")
+        with mock.patch.object(message_stream.redis_client, "pipeline", side_effect=redis.ConnectionError("down")):
+            with contextlib.redirect_stdout(io.StringIO()):
+                message_stream.append(self.room.room_uuid, lost)
+        message_stream.append(self.room.room_uuid, self._entries("after"))
+
+        # 스트림에는 "after"만 남았지만 complete가 아니므로 DB로 대체
+        self.assertIsNone(self._since(self.ids[4]))
+        self.assertIsNone(message_stream.recent_page(self.room.room_uuid, 20))
+
+        # warm 이후에는 빠짐없이 스트림에서 응답
+        message_stream.warm(self.room.room_uuid, 50)
+        replayed = self._since(self.ids[-1])[0]
+        self.assertEqual([message["content"] for message in replayed], ["lost", "after"])
+
+    def test_partly_filled_stream_falls_back(self):
+        # warm 없이 append로만 채워진 스트림 (만료 후 다시 생긴 경우): 가장 오래된 엔트리가 구간 안이어도 DB로
+        message_stream.append(self.room.room_uuid, self._entries("one", "two", "three"))
+        first = Message.objects.get(room=self.room, content="one").id
+        self.assertIsNone(self._since(first))
+
+
+class MembershipCacheTests(TestCase):
+    """멤버십 캐시 적재 / 참가 / 나가기 반영"""
+
+    @classmethod
+    def setUpClass(cls):
+        require_redis()
+        super().setUpClass()
+
+    def setUp(self):
+        self.owner, self.member = create_bench_profiles(2, prefix="membership")
+        self.room = seed_member_rooms(self.member, self.owner, 1, admin_every=0)[0]
+        self.room_uuid = str(self.room.room_uuid)
+        self.members_key = membership.MEMBERS_KEY.format(self.room_uuid)
+
+    def tearDown(self):
+        drop_redis_keys()
+
+    def _cached_members(self):
+        return {int(member_id) for member_id in redis_client.smembers(self.members_key)}
+
+    def _leave(self):
+        """참가자가 방을 나감 (DB 삭제 + 커밋 후 캐시 반영)"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.participants.remove(self.member)
+            membership.member_removed(self.room_uuid, self.member.id)
+
+    def test_warm_and_role(self):
+        self.assertEqual(membership.role(self.room_uuid, self.member.id), membership.ROLE_PARTICIPANT)
+        self.assertEqual(self._cached_members(), {self.owner.id, self.member.id})
+        self.assertEqual(membership.role(self.room_uuid, self.owner.id), membership.ROLE_ADMIN)
+        self._leave()
+        self.assertIsNone(membership.role(self.room_uuid, self.member.id))
+
+    def test_warm_replaces_stale_members(self):
+        redis_client.sadd(self.members_key, 999999)
+        membership.warm(self.room_uuid)
+        self.assertEqual(self._cached_members(), {self.owner.id, self.member.id})
+
+    def test_leave_during_warm_is_not_overwritten(self):
+        load = membership._load_members
+
+        def load_then_leave(room_uuid):
+            # DB를 읽은 직후 (쓰기 전에) 다른 요청의 나가기가 커밋됨
+            result = load(room_uuid)
+            self._leave()
+            return result
+
+        with mock.patch.object(membership, "_load_members", side_effect=load_then_leave):
+            with contextlib.redirect_stdout(io.StringIO()):
+                membership.warm(self.room_uuid)
+        self.assertNotIn(self.member.id, self._cached_members())
+        self.assertIsNone(membership.role(self.room_uuid, self.member.id))
+
+    def test_failed_leave_drops_cache(self):
+        membership.warm(self.room_uuid)
+        with mock.patch.object(membership.redis_client, "pipeline", side_effect=redis.ConnectionError("down")):
+            with contextlib.redirect_stdout(io.StringIO()):
+                self._leave()
+        self.assertFalse(redis_client.exists(self.members_key, membership.ADMIN_KEY.format(self.room_uuid)))
+        self.assertIsNone(membership.role(self.room_uuid, self.member.id))
+
+    def test_failed_join_drops_cache_and_invalidates(self):
+        membership.warm(self.room_uuid)
+        newcomer = create_bench_profiles(1, prefix="membership_new")[0]
+        with mock.patch.object(membership.redis_client, "pipeline", side_effect=redis.ConnectionError("down")), \
+                mock.patch.object(membership.room_queries, "invalidate") as invalidate, \
+                mock.patch.object(membership.versions, "members_changed") as members_changed:
+            with contextlib.redirect_stdout(io.StringIO()), self.captureOnCommitCallbacks(execute=True):
+                self.room.participants.add(newcomer)
+                membership.member_added(self.room_uuid, newcomer.id)
+        # 새 멤버가 빠진 Set이 남아 거부되지 않음
+        self.assertFalse(redis_client.exists(self.members_key, membership.ADMIN_KEY.format(self.room_uuid)))
+        invalidate.assert_called_once_with(newcomer.id)
+        members_changed.assert_called_once_with(self.room_uuid)
+        self.assertEqual(membership.role(self.room_uuid, newcomer.id), membership.ROLE_PARTICIPANT)
+
+    def test_room_deleted_without_member_list(self):
+        membership.warm(self.room_uuid)
+        with mock.patch.object(membership.redis_client, "smembers", side_effect=redis.ConnectionError("down")), \
+                mock.patch.object(membership.versions, "forget_room") as forget_room:
+            with contextlib.redirect_stdout(io.StringIO()), self.captureOnCommitCallbacks(execute=True):
+                membership.room_deleted(self.room_uuid)
+        self.assertFalse(redis_client.exists(self.members_key, membership.ADMIN_KEY.format(self.room_uuid)))
+        forget_room.assert_called_once_with(self.room_uuid)
+
+
+class PresenceTests(SimpleTestCase):
+    """연결 refcount / 퇴장 / 만료 연결 정리 / Redis 장애 시 동작"""
+
+    @classmethod
+    def setUpClass(cls):
+        require_redis()
+        super().setUpClass()
+
+    def setUp(self):
+        self.room_uuid = str(uuid.uuid4())
+
+    def tearDown(self):
+        redis_client.delete(*presence._keys(self.room_uuid))
+
+    async def test_refcount_and_leave(self):
+        self.assertEqual(await presence.join(self.room_uuid, 1, "alice", "ch.1"), 1)
+        self.assertEqual(await presence.join(self.room_uuid, 1, "alice", "ch.2"), 2)
+        # 같은 연결의 heartbeat는 연결 수를 늘리지 않음
+        self.assertFalse(await presence.heartbeat(self.room_uuid, 1, "alice", "ch.1"))
+        self.assertEqual(await presence.online_members(self.room_uuid), [{"user_id": 1, "username": "alice"}])
+
+        self.assertEqual(await presence.leave(self.room_uuid, 1, "ch.1"), 1)
+        self.assertEqual(await presence.leave(self.room_uuid, 1, "ch.2"), 0)
+        self.assertEqual(await presence.leave(self.room_uuid, 1, "ch.2"), -1)
+        self.assertEqual(await presence.online_members(self.room_uuid), [])
+
+    async def test_reap_expired_connections(self):
+        await presence.join(self.room_uuid, 1, "alice", "ch.1")
+        await presence.join(self.room_uuid, 2, "bob", "ch.2")
+        await presence.join(self.room_uuid, 2, "bob", "ch.3")
+        # alice의 연결과 bob의 연결 하나가 heartbeat를 놓침
+        redis_client.zadd(presence.CONNS_KEY.format(self.room_uuid), {"1:ch.1": 0, "2:ch.2": 0})
+        self.assertEqual(await presence.reap(self.room_uuid), ["alice"])
+        self.assertEqual(await presence.online_members(self.room_uuid), [{"user_id": 2, "username": "bob"}])
+        # 정리된 연결의 heartbeat는 재입장으로 처리
+        self.assertTrue(await presence.heartbeat(self.room_uuid, 1, "alice", "ch.1"))
+
+    async def test_redis_failure_is_neutral(self):
+        with mock.patch.object(presence, "get_async_redis", side_effect=redis.ConnectionError("down")):
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertIsNone(await presence.join(self.room_uuid, 1, "alice", "ch.1"))
+                self.assertFalse(await presence.heartbeat(self.room_uuid, 1, "alice", "ch.1"))
+                self.assertIsNone(await presence.leave(self.room_uuid, 1, "ch.1"))
+
+    async def test_reaper_runs_once_per_room(self):
+        reaper = presence._Reaper()
+        on_gone = mock.AsyncMock()
+        other_room = str(uuid.uuid4())
+        with mock.patch.object(presence, "reap", mock.AsyncMock(return_value=["alice"])) as reap:
+            for channel_name in ("ch.1", "ch.2", "ch.3"):
+                reaper.add(self.room_uuid, channel_name, on_gone)
+            reaper.add(other_room, "ch.4", on_gone)
+            with contextlib.redirect_stdout(io.StringIO()):
+                await reaper.reap_all()
+            self.assertEqual(sorted(call.args[0] for call in reap.await_args_list), sorted([self.room_uuid, other_room]))
+            # 방마다 한 번만 알림
+            self.assertEqual(on_gone.await_count, 2)
+
+            for channel_name in ("ch.1", "ch.2", "ch.3", "ch.4"):
+                reaper.discard(self.room_uuid if channel_name != "ch.4" else other_room, channel_name)
+            self.assertEqual(reaper.rooms, {})
+            self.assertIsNone(reaper.task)
+
+    @override_settings(CHAT_PRESENCE_HEARTBEAT_INTERVAL=0.05)
+    async def test_reaper_flushes_read_markers_once_per_tick(self):
+        # 연결 수와 관계없이 워커당 한 번만 읽음 시각을 반영
+        reaper = presence._Reaper()
+        on_gone = mock.AsyncMock()
+        ticks = asyncio.Event()
+        with mock.patch.object(presence, "reap", mock.AsyncMock(return_value=[])) as reap, \
+                mock.patch.object(unread, "flush_read_markers", side_effect=lambda: ticks.set()) as flush:
+            for channel_name in ("ch.1", "ch.2", "ch.3"):
+                reaper.add(self.room_uuid, channel_name, on_gone)
+            await asyncio.wait_for(ticks.wait(), 5)
+            for channel_name in ("ch.1", "ch.2", "ch.3"):
+                reaper.discard(self.room_uuid, channel_name)
+        self.assertEqual(flush.call_count, reap.await_count)
+
+    async def test_disconnect_before_presence_discards_group(self):
+        # presence 등록 전에 끊긴 연결도 채널 그룹에서 빠져야 함
+        consumer = ChatConsumer()
+        consumer.room_group_name = "chat_test"
+        consumer.username = "alice"
+        consumer.channel_name = "ch.1"
+        consumer.channel_layer = mock.AsyncMock()
+        with contextlib.redirect_stdout(io.StringIO()):
+            await consumer.disconnect(1000)
+        consumer.channel_layer.group_discard.assert_awaited_once_with("chat_test", "ch.1")
+
+
+@override_settings(CHAT_TYPING_EMIT_INTERVAL=0.05, CHAT_TYPING_TTL=5)
+class TypingIndicatorTests(SimpleTestCase):
+    """여러 워커(집계기)가 같은 방을 나눠 가질 때의 방출 주기 / 중복 제거, debounce 상태 정리"""
+
+    @classmethod
+    def setUpClass(cls):
+        require_redis()
+        super().setUpClass()
+
+    def setUp(self):
+        self.room_uuid = str(uuid.uuid4())
+
+    def tearDown(self):
+        redis_client.delete(
+            typing_indicator.TYPING_KEY.format(self.room_uuid),
+            typing_indicator.EMIT_KEY.format(self.room_uuid),
+            typing_indicator.LAST_KEY.format(self.room_uuid),
+        )
+
+    async def test_workers_share_emit_lock(self):
+        first, second = typing_indicator.TypingAggregator(), typing_indicator.TypingAggregator()
+        with mock.patch.object(room_hub, "room_send", mock.AsyncMock()) as room_send:
+            await first.update(self.room_uuid, "chat_room", "alice", True)
+            await second.update(self.room_uuid, "chat_room", "bob", True)
+            await asyncio.sleep(0.2)
+            # 두 워커가 모두 방출을 예약했지만 같은 목록은 방 전체에서 한 번만 전송
+            self.assertEqual(
+                [call.args[2] for call in room_send.await_args_list],
+                [{"type": "typing_users", "users": ["alice", "bob"]}],
+            )
+
+            # 잠금을 얻지 못한 워커도 잠금이 풀린 뒤 바뀐 목록을 전송
+            await second.update(self.room_uuid, "chat_room", "bob", False)
+            await asyncio.sleep(0.2)
+            self.assertEqual(room_send.await_args_list[-1].args[2]["users"], ["alice"])
+            self.assertEqual(room_send.await_count, 2)
+        for aggregator in (first, second):
+            for state in aggregator._rooms.values():
+                if state.task is not None:
+                    state.task.cancel()
+
+    async def test_user_state_pruned_when_missing_from_hash(self):
+        aggregator = typing_indicator.TypingAggregator()
+        redis_key = typing_indicator.TYPING_KEY.format(self.room_uuid)
+        with mock.patch.object(aggregator, "_schedule"):
+            await aggregator.update(self.room_uuid, "chat_room", "alice", True)
+            # 다른 워커의 연결 종료 등으로 해시에서 빠짐
+            redis_client.hdel(redis_key, "alice")
+            self.assertEqual((await aggregator._current_typers(self.room_uuid))[0], [])
+            self.assertNotIn(self.room_uuid, aggregator._user_state)
+
+            # debounce에 걸리지 않고 바로 다시 기록됨
+            await aggregator.update(self.room_uuid, "chat_room", "alice", True)
+        self.assertTrue(redis_client.hexists(redis_key, "alice"))
+
+
+@override_settings(CHAT_DEDUPE_WINDOW=600, CHAT_DEDUPE_PENDING_TTL=15, CHAT_DEDUPE_PENDING_WAIT=0.2)
+class DedupeTests(SimpleTestCase):
+    """client_msg_id 선점 / 결과 기록 / 저장 중(pending) 재전송 처리"""
+
+    @classmethod
+    def setUpClass(cls):
+        require_redis()
+        super().setUpClass()
+
+    def setUp(self):
+        self.room_uuid = str(uuid.uuid4())
+        self.key = dedupe._key(self.room_uuid, 1, "c1")
+
+    def tearDown(self):
+        redis_client.delete(self.key)
+
+    async def test_duplicate_returns_stored_result_and_timestamp(self):
+        self.assertIsNone(await dedupe.aclaim(self.room_uuid, 1, "c1"))
+        # 저장 중에는 짧은 TTL, 결과를 기록하면 윈도우 전체
+        self.assertLessEqual(redis_client.ttl(self.key), 15)
+        await dedupe.aresolve(self.room_uuid, 1, "c1", message_id=42, timestamp="2026-01-01T00:00:00+00:00")
+        self.assertGreater(redis_client.ttl(self.key), 15)
+        self.assertEqual(await dedupe.aclaim(self.room_uuid, 1, "c1"), {
+            "message_id": 42, "provisional_id": None, "timestamp": "2026-01-01T00:00:00+00:00", "pending": False,
+        })
+
+    async def test_provisional_result(self):
+        await dedupe.aclaim(self.room_uuid, 1, "c1")
+        await dedupe.aresolve(self.room_uuid, 1, "c1", provisional_id="abc", timestamp="2026-01-01T00:00:00+00:00")
+        existing = await dedupe.aclaim(self.room_uuid, 1, "c1")
+        self.assertEqual((existing["message_id"], existing["provisional_id"]), (None, "abc"))
+        self.assertEqual(existing["timestamp"], "2026-01-01T00:00:00+00:00")
+
+        # write-behind 저장 후 실제 message_id로 교체
+        dedupe.resolve_many([(self.room_uuid, 1, "c1", 7, "2026-01-01T00:00:01+00:00")])
+        self.assertEqual((await dedupe.aclaim(self.room_uuid, 1, "c1"))["message_id"], 7)
+
+    async def test_retry_waits_for_first_request(self):
+        await dedupe.aclaim(self.room_uuid, 1, "c1")
+
+        async def finish_first():
+            await asyncio.sleep(0.05)
+            await dedupe.aresolve(self.room_uuid, 1, "c1", message_id=42, timestamp="t")
+
+        _, existing = await asyncio.gather(finish_first(), dedupe.aclaim(self.room_uuid, 1, "c1"))
+        self.assertEqual((existing["message_id"], existing["pending"]), (42, False))
+
+    async def test_stuck_pending_is_retryable(self):
+        await dedupe.aclaim(self.room_uuid, 1, "c1")
+        # 첫 요청이 끝나지 않으면 중복 ack 대신 재전송 요청
+        self.assertTrue((await dedupe.aclaim(self.room_uuid, 1, "c1"))["pending"])
+
+        # 첫 요청을 처리하던 프로세스가 죽어 pending이 만료되면 재전송이 선점
+        redis_client.pexpire(self.key, 50)
+        self.assertIsNone(await dedupe.aclaim(self.room_uuid, 1, "c1"))
+
+
+@override_settings(CHAT_RATE_LIMIT_ENABLED=True, CHAT_RATE_LIMITS={
+    "test:user": (2, 0.001),
+    "test:room": (1, 0.001),
+    "create_room": (5, 5 / 60),
+})
+class RateLimitTests(TestCase):
+    """여러 버킷 동시 차감, 클라이언트 IP 식별, 인증 전 차감 방지"""
+
+    @classmethod
+    def setUpClass(cls):
+        require_redis()
+        super().setUpClass()
+
+    def setUp(self):
+        self.user = f"u-{uuid.uuid4()}"
+        self.room = f"r-{uuid.uuid4()}"
+        self.keys = [ratelimit.BUCKET_KEY.format("test:user", self.user), ratelimit.BUCKET_KEY.format("test:room", self.room)]
+
+    def tearDown(self):
+        redis_client.delete(*self.keys, ratelimit.BUCKET_KEY.format("create_room", "ip:127.0.0.1"))
+
+    def _tokens(self, key):
+        return float(redis_client.hget(key, "tokens"))
+
+    def _check_room_rejection_keeps_user_tokens(self, hit_all):
+        checks = (("test:user", self.user), ("test:room", self.room))
+        self.assertTrue(hit_all(*checks).allowed)
+        decision = hit_all(*checks)
+        self.assertFalse(decision.allowed)
+        self.assertGreater(decision.retry_after, 0)
+        # 방 버킷이 거절했으므로 사용자 버킷은 그대로 (첫 요청의 1개만 차감)
+        self.assertAlmostEqual(self._tokens(self.keys[0]), 1, places=1)
+        self.assertTrue(hit_all(("test:user", self.user)).allowed)
+        self.assertFalse(hit_all(("test:user", self.user)).allowed)
+
+    def test_rejected_bucket_charges_nothing(self):
+        self._check_room_rejection_keeps_user_tokens(ratelimit.hit_all)
+
+    def test_async_rejected_bucket_charges_nothing(self):
+        self._check_room_rejection_keeps_user_tokens(async_to_sync(ratelimit.ahit_all))
+
+    def test_local_fallback_charges_nothing_on_rejection(self):
+        buckets = [("a", 2, 0.001), ("b", 1, 0.001)]
+        local = ratelimit._LocalBuckets()
+        self.assertEqual(local.take_all(buckets, now=100), [0.0, 0.0])
+        retry = local.take_all(buckets, now=100)
+        self.assertEqual(retry[0], 0.0)
+        self.assertGreater(retry[1], 0)
+        self.assertEqual(local.take_all(buckets[:1], now=100), [0.0])
+        self.assertGreater(local.take_all(buckets[:1], now=100)[0], 0)
+
+    def test_client_ip_ignores_untrusted_forwarded_for(self):
+        request = RequestFactory().get("/", REMOTE_ADDR="203.0.113.7", HTTP_X_FORWARDED_FOR="1.2.3.4")
+        self.assertEqual(ratelimit.client_ip(request), "203.0.113.7")
+
+    @override_settings(CHAT_TRUSTED_PROXIES=["10.0.0.0/8"])
+    def test_client_ip_behind_trusted_proxy(self):
+        # 클라이언트가 앞에 넣은 주소(1.2.3.4)는 무시하고 프록시가 덧붙인 실제 주소 사용
+        request = RequestFactory().get(
+            "/", REMOTE_ADDR="10.0.0.2", HTTP_X_FORWARDED_FOR="1.2.3.4, 198.51.100.9, 10.0.0.5"
+        )
+        self.assertEqual(ratelimit.client_ip(request), "198.51.100.9")
+        direct = RequestFactory().get("/", REMOTE_ADDR="198.51.100.10", HTTP_X_FORWARDED_FOR="1.2.3.4")
+        self.assertEqual(ratelimit.client_ip(direct), "198.51.100.10")
+
+    def test_create_room_checks_auth_before_bucket(self):
+        for _ in range(7):
+            response = self.client.post(reverse("chat:create_chat_room"), {"room_name": "x"})
+            self.assertEqual(response.status_code, 401)
+        self.assertFalse(redis_client.exists(ratelimit.BUCKET_KEY.format("create_room", "ip:127.0.0.1")))
+
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class MultiplexTests(TestCase):
+    """멀티플렉스 연결: 채널 하나 공유, 그룹 이벤트 라우팅, 방 권한 일괄 확인"""
+
+    @classmethod
+    def setUpClass(cls):
+        require_redis()
+        super().setUpClass()
+
+    def setUp(self):
+        self.member, self.owner = create_bench_profiles(2, prefix="multiplex")
+        self.rooms = seed_member_rooms(self.member, self.owner, 2)
+        self.other_room = seed_member_rooms(self.owner, self.owner, 1)[0]
+
+    def tearDown(self):
+        drop_redis_keys()
+
+    async def _connect(self, profile):
+        communicator = WebsocketCommunicator(MultiplexConsumer.as_asgi(), "/ws/multiplex/")
+        communicator.scope["user"] = profile.user
+        communicator.scope["profile"] = profile
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def _receive_until(self, communicator, predicate):
+        """predicate를 만족하는 프레임까지 읽음 (그 사이의 입장 알림 등은 건너뜀)"""
+        while True:
+            frame = json.loads(await communicator.receive_from(timeout=5))
+            if predicate(frame):
+                return frame
+
+    async def _subscribe(self, communicator, channels):
+        await communicator.send_json_to({"type": "subscribe", "channels": channels})
+        results = {}
+        while len(results) < len(channels):
+            frame = await self._receive_until(
+                communicator, lambda frame: frame.get("type") in ("subscribed", "unsubscribed")
+            )
+            results[frame["channel"]] = frame
+        return results
+
+    def _channels(self, rooms):
+        return [f"room:{room.room_uuid}" for room in rooms]
+
+    async def test_subscriptions_share_one_channel(self):
+        layer = get_channel_layer()
+        with mock.patch.object(layer, "new_channel", wraps=layer.new_channel) as new_channel:
+            with contextlib.redirect_stdout(io.StringIO()):
+                communicator = await self._connect(self.member)
+                results = await self._subscribe(communicator, self._channels(self.rooms))
+                self.assertEqual({frame["type"] for frame in results.values()}, {"subscribed"})
+                await communicator.disconnect()
+        # 구독은 채널을 새로 만들지 않음 (멀티플렉스 연결의 채널 1개뿐)
+        self.assertEqual(new_channel.call_count, 1)
+        # 연결 종료 후에는 모든 방 그룹에서 빠짐
+        self.assertEqual([layer.groups.get(f"chat_{room.room_uuid}", {}) for room in self.rooms], [{}, {}])
+
+    async def test_group_events_route_to_their_room(self):
+        layer = get_channel_layer()
+        with contextlib.redirect_stdout(io.StringIO()):
+            communicator = await self._connect(self.member)
+            await self._subscribe(communicator, self._channels(self.rooms))
+            group_members = [set(layer.groups[f"chat_{room.room_uuid}"]) for room in self.rooms]
+            # 두 방 그룹 모두 연결의 채널 하나로 가입
+            self.assertEqual(len(group_members[0] | group_members[1]), 1)
+            self.assertEqual(group_members[0], group_members[1])
+
+            target = self.rooms[1]
+            await room_hub.room_send(target.room_uuid, f"chat_{target.room_uuid}", chat_event({
+                "type": "chat_message", "message": "hello", "username": "owner",
+                "message_id": 1, "timestamp": timezone.now().isoformat(),
+            }, self.owner.id))
+            frame = await self._receive_until(
+                communicator, lambda frame: frame.get("event", {}).get("type") == "chat_message"
+            )
+            await communicator.disconnect()
+        self.assertEqual(frame["channel"], f"room:{target.room_uuid}")
+        self.assertEqual(frame["event"]["message"], "hello")
+        self.assertFalse(frame["event"]["is_self"])
+
+    async def test_rooms_checked_once_per_subscribe_frame(self):
+        before = metrics.snapshot()["counters"].get(metrics._key("ws_multiplex_room_checks_total", {}), 0)
+        channels = self._channels(self.rooms + [self.other_room])
+        with mock.patch.object(membership, "roles", wraps=membership.roles) as roles, \
+                mock.patch.object(membership, "role", wraps=membership.role) as role:
+            with contextlib.redirect_stdout(io.StringIO()):
+                communicator = await self._connect(self.member)
+                results = await self._subscribe(communicator, channels)
+                await communicator.disconnect()
+        after = metrics.snapshot()["counters"].get(metrics._key("ws_multiplex_room_checks_total", {}), 0)
+        self.assertEqual(after - before, 1)
+        roles.assert_called_once()
+        role.assert_not_called()
+        # 멤버가 아닌 방만 거부
+        self.assertEqual(results[channels[0]]["type"], "subscribed")
+        self.assertEqual(results[channels[1]]["type"], "subscribed")
+        self.assertEqual(results[channels[2]], {"type": "unsubscribed", "channel": channels[2], "code": 4003})
+
+    async def test_presence_refreshed_by_one_connection_task(self):
+        with mock.patch.object(presence, "heartbeat_interval", return_value=0.05), \
+                mock.patch.object(presence, "heartbeat", wraps=presence.heartbeat) as heartbeat, \
+                mock.patch.object(RoomSubscription, "_presence_heartbeat") as subscription_task:
+            with contextlib.redirect_stdout(io.StringIO()):
+                communicator = await self._connect(self.member)
+                await self._subscribe(communicator, self._channels(self.rooms))
+                refreshed = set()
+                for _ in range(100):
+                    refreshed = {str(call.args[0]) for call in heartbeat.call_args_list}
+                    if len(refreshed) == len(self.rooms):
+                        break
+                    await asyncio.sleep(0.02)
+                await communicator.disconnect()
+        # 두 방 모두 연결의 태스크 하나가 같은 채널로 갱신하고, 구독별 heartbeat 태스크는 없음
+        self.assertEqual(refreshed, {str(room.room_uuid) for room in self.rooms})
+        self.assertEqual(len({call.args[3] for call in heartbeat.call_args_list}), 1)
+        subscription_task.assert_not_called()
+
+
+class FrameSelectionTests(SimpleTestCase):
+    """사전 직렬화된 브로드캐스트 프레임 선택"""
+
+    def setUp(self):
+        self.event = chat_event({"type": "chat_message", "message": "안녕", "username": "alice", "message_id": 7}, 1)
+
+    def test_sender_gets_self_variant(self):
+        frame = json.loads(select_frame(self.event, 1))
+        self.assertTrue(frame["is_self"])
+        self.assertEqual(frame["message"], "안녕")
+
+    def test_others_get_other_variant(self):
+        self.assertFalse(json.loads(select_frame(self.event, 2))["is_self"])
+        # 보낸 사람이 없는 이벤트(시스템 메시지 등)는 모두 other
+        self.assertFalse(json.loads(select_frame(dict(self.event, sender_id=None), 1))["is_self"])
+
+    def test_codec_variant(self):
+        encoded = select_frame(self.event, 2, "msgpack")
+        self.assertIsInstance(encoded, bytes)
+        self.assertEqual(codecs.MSGPACK.decode(encoded), json.loads(select_frame(self.event, 2)))
+
+    def test_returns_preencoded_frame(self):
+        # 수신자마다 다시 직렬화하지 않고 같은 객체를 돌려줌
+        self.assertIs(select_frame(self.event, 2), select_frame(self.event, 3))
+        self.assertIs(select_frame(self.event, 2, "msgpack"), self.event["frames"]["other"]["msgpack"])
+
+
+class CodecTests(SimpleTestCase):
+    """JSON / MessagePack 코덱 왕복, 봉투, subprotocol 협상"""
+
+    frame = {"type": "chat_message", "message": "안녕 👋", "message_id": 12, "is_self": False, "users": ["a", "b"]}
+
+    def test_round_trip(self):
+        for codec in (codecs.JSON, codecs.MSGPACK):
+            with self.subTest(codec=codec.name):
+                self.assertEqual(codec.decode(codec.encode(self.frame)), self.frame)
+        self.assertIsInstance(codecs.JSON.encode(self.frame), str)
+        self.assertIsInstance(codecs.MSGPACK.encode(self.frame), bytes)
+
+    def test_wrap_matches_encoded_envelope(self):
+        for codec in (codecs.JSON, codecs.MSGPACK):
+            with self.subTest(codec=codec.name):
+                wrapped = codec.wrap("room:x", codec.encode(self.frame))
+                self.assertEqual(codec.decode(wrapped), {"channel": "room:x", "event": self.frame})
+
+    def test_invalid_frames(self):
+        with self.assertRaises(codecs.FrameDecodeError):
+            codecs.JSON.decode("{not json")
+        with self.assertRaises(codecs.FrameDecodeError):
+            codecs.MSGPACK.decode(b"\xc1")
+        # 객체가 아닌 프레임은 CodecMixin에서 거부
+        with self.assertRaises(codecs.FrameDecodeError):
+            CodecMixin().decode_frame(text_data="[1, 2]")
+        self.assertEqual(CodecMixin().decode_frame(bytes_data=codecs.MSGPACK.encode(self.frame)), self.frame)
+
+    def test_negotiate(self):
+        self.assertIs(codecs.negotiate({}), codecs.JSON)
+        self.assertIs(codecs.negotiate({"subprotocols": ["unknown.v1"]}), codecs.JSON)
+        self.assertIs(codecs.negotiate({"subprotocols": ["unknown.v1", "devchat.msgpack.v1"]}), codecs.MSGPACK)
+
+    def test_encode_all(self):
+        encoded = codecs.encode_all(self.frame)
+        self.assertEqual(set(encoded), {"json", "msgpack"})
+        self.assertEqual(codecs.MSGPACK.decode(encoded["msgpack"]), json.loads(encoded["json"]))
+
+
+class ChannelShardTests(SimpleTestCase):
+    """채널 레이어 해시 링 배치와 샤드 키"""
+
+    room_uuid = "3f2b8c1e-4d5a-4b6c-8e7f-9a0b1c2d3e4f"
+
+    def test_shard_key_for_process_channels(self):
+        # 같은 프로세스 전용 채널은 모두 "!"까지로 해싱되어 같은 노드를 봄
+        self.assertEqual(channel_layers.shard_key("specific.abc123!def456"), "specific.abc123!")
+        self.assertEqual(channel_layers.shard_key(b"specific.abc123!xyz"), "specific.abc123!")
+
+    def test_shard_key_for_groups(self):
+        self.assertEqual(channel_layers.shard_key(f"chat_{self.room_uuid}"), self.room_uuid)
+        self.assertEqual(channel_layers.shard_key(f"llm_chat_{self.room_uuid}"), self.room_uuid)
+        self.assertEqual(channel_layers.shard_key("broadcast"), "broadcast")
+
+    def test_ring_placement_is_stable(self):
+        nodes = ["redis1:6379", "redis2:6379", "redis3:6379"]
+        keys = [str(uuid.uuid4()) for _ in range(2000)]
+        ring = channel_layers.HashRing(nodes)
+        placement = [ring.get(key) for key in keys]
+        self.assertEqual(placement, [channel_layers.HashRing(nodes).get(key) for key in keys])
+        # 모든 노드가 고르게 쓰임
+        counts = [placement.count(index) for index in range(len(nodes))]
+        self.assertGreater(min(counts), len(keys) / len(nodes) * 0.5)
+
+    def test_adding_node_moves_about_one_nth(self):
+        nodes = ["redis1:6379", "redis2:6379", "redis3:6379"]
+        keys = [str(uuid.uuid4()) for _ in range(2000)]
+        before = channel_layers.HashRing(nodes)
+        after = channel_layers.HashRing(nodes + ["redis4:6379"])
+        moved = [key for key in keys if nodes[before.get(key)] != (nodes + ["redis4:6379"])[after.get(key)]]
+        # 옮겨진 키는 모두 새 노드로 가고, 비율은 약 1/4 (crc32 % N이면 약 3/4)
+        self.assertTrue(all(after.get(key) == 3 for key in moved))
+        self.assertLess(len(moved) / len(keys), 0.4)
+
+    def test_layer_keeps_room_groups_together(self):
+        layer = channel_layers.ShardedRedisChannelLayer(hosts=["redis://redis1:6379", "redis://redis2:6379"])
+        self.assertEqual(
+            layer.consistent_hash(f"chat_{self.room_uuid}"), layer.consistent_hash(f"llm_chat_{self.room_uuid}")
+        )
+        self.assertEqual(layer.consistent_hash("specific.abc!1"), layer.consistent_hash("specific.abc!2"))
+        single = channel_layers.ShardedRedisChannelLayer(hosts=["redis://redis1:6379"])
+        self.assertEqual(single.consistent_hash(f"chat_{self.room_uuid}"), 0)
+
+    def test_host_id_ignores_order(self):
+        hosts = [{"address": "redis://redis1:6379"}, {"host": "redis2", "port": 6380}]
+        self.assertEqual(
+            [channel_layers._host_id(host) for host in hosts], ["redis://redis1:6379", "redis2:6380/0"]
+        )
+        room_group = f"chat_{self.room_uuid}"
+        forward = channel_layers.HashRing(["a", "b"])
+        backward = channel_layers.HashRing(["b", "a"])
+        key = channel_layers.shard_key(room_group)
+        self.assertEqual(["a", "b"][forward.get(key)], ["b", "a"][backward.get(key)])
+
+
+class RecordingRoomConsumer:
+    """방 허브 dispatch 대상 (핸들러 호출 기록)"""
+
+    def __init__(self, fail=False):
+        self.events = []
+        self.fail = fail
+
+    async def chat_message(self, event):
+        if self.fail:
+            raise RuntimeError("boom")
+        self.events.append(event)
+
+
+@override_settings(CHAT_LARGE_ROOM_THRESHOLD=3, CHAT_LARGE_ROOM_CHECK_INTERVAL=60)
+class RoomHubTests(SimpleTestCase):
+    """대형 방 임계값 판단과 허브 로컬 팬아웃"""
+
+    @classmethod
+    def setUpClass(cls):
+        require_redis()
+        super().setUpClass()
+
+    def setUp(self):
+        self.room_uuid = str(uuid.uuid4())
+
+    def tearDown(self):
+        redis_client.delete(presence.CONNS_KEY.format(self.room_uuid))
+
+    def _connections(self, count):
+        redis_client.zadd(presence.CONNS_KEY.format(self.room_uuid), {f"{i}:chan{i}": time.time() for i in range(count)})
+
+    @contextlib.asynccontextmanager
+    async def _hub(self):
+        hub = room_hub.RoomHub(redis.asyncio.Redis(host="127.0.0.1", port=6379))
+        try:
+            yield hub
+        finally:
+            await hub.close()
+
+    async def test_threshold(self):
+        async with self._hub() as hub:
+            self._connections(2)
+            self.assertFalse(await hub.is_large(self.room_uuid))
+            # CHECK_INTERVAL 동안은 캐시된 판단 사용
+            self._connections(3)
+            self.assertFalse(await hub.is_large(self.room_uuid))
+            with override_settings(CHAT_LARGE_ROOM_CHECK_INTERVAL=0):
+                self.assertTrue(await hub.is_large(self.room_uuid))
+
+    def test_disabled_without_threshold(self):
+        self.assertTrue(room_hub.enabled())
+        with override_settings(CHAT_LARGE_ROOM_THRESHOLD=0):
+            self.assertFalse(room_hub.enabled())
+
+    async def test_dispatch_reaches_every_local_consumer(self):
+        async with self._hub() as hub:
+            consumers = [RecordingRoomConsumer(), RecordingRoomConsumer(fail=True), RecordingRoomConsumer()]
+            for consumer in consumers:
+                await hub.join(self.room_uuid, consumer)
+            self.assertEqual(hub.local_count(self.room_uuid), 3)
+            before = metrics.snapshot()["counters"].get("room_hub_delivered_total", 0)
+
+            event = {"type": "chat_message", "message": "hi"}
+            with contextlib.redirect_stdout(io.StringIO()):
+                await hub.dispatch(self.room_uuid, event)
+            # 한 consumer의 핸들러 예외가 나머지 전달을 막지 않음
+            self.assertEqual([consumer.events for consumer in consumers], [[event], [], [event]])
+            self.assertEqual(metrics.snapshot()["counters"]["room_hub_delivered_total"] - before, 3)
+
+            await hub.dispatch(str(uuid.uuid4()), event)
+            for consumer in consumers:
+                await hub.leave(self.room_uuid, consumer)
+            self.assertEqual(hub.local_count(self.room_uuid), 0)
+            self.assertEqual(len(consumers[0].events), 1)
+
+    async def test_published_event_is_dispatched(self):
+        async with self._hub() as hub:
+            consumer = RecordingRoomConsumer()
+            await hub.join(self.room_uuid, consumer)
+            await hub.publish(self.room_uuid, {"type": "chat_message", "message": "via pubsub"})
+            for _ in range(100):
+                if consumer.events:
+                    break
+                await asyncio.sleep(0.02)
+            self.assertEqual(consumer.events, [{"type": "chat_message", "message": "via pubsub"}])
+            await hub.leave(self.room_uuid, consumer)
+
+    async def test_room_send_picks_path_by_size(self):
+        async with self._hub() as hub:
+            layer = mock.AsyncMock()
+            with mock.patch.object(room_hub, "get_room_hub", return_value=hub), \
+                    mock.patch.object(room_hub, "get_channel_layer", return_value=layer), \
+                    mock.patch.object(hub, "publish", new=mock.AsyncMock()) as publish:
+                await room_hub.room_send(self.room_uuid, "chat_x", {"type": "chat_message"})
+                publish.assert_not_called()
+                # 채널 그룹 경로에는 멀티플렉스 라우팅용 그룹 이름이 실림
+                layer.group_send.assert_awaited_once_with("chat_x", {"type": "chat_message", "group": "chat_x"})
+
+                self._connections(3)
+                hub._large.clear()
+                await room_hub.room_send(self.room_uuid, "chat_x", {"type": "chat_message"})
+                publish.assert_awaited_once_with(self.room_uuid, {"type": "chat_message"})
+                self.assertEqual(layer.group_send.await_count, 1)
+
+
+class DrainConsumer(DrainMixin, CodecMixin, OutboundQueueMixin, AsyncWebsocketConsumer):
+    """drain 테스트용: 바로 accept하고 pending_work로 진행 중인 작업 흉내"""
+
+    pending_work = False
+
+    async def connect(self):
+        await self.accept_with_codec()
+
+    def has_pending_work(self):
+        return self.pending_work
+
+
+@override_settings(CHAT_DRAIN_RECONNECT_JITTER_MS=100, CHAT_DRAIN_POLL_INTERVAL=0.05)
+class DrainTests(SimpleTestCase):
+    """drain 트리거(직접 / 관리 명령 키)가 연결을 reconnect 힌트 후 1012로 닫는지"""
+
+    @classmethod
+    def setUpClass(cls):
+        require_redis()
+        super().setUpClass()
+
+    def tearDown(self):
+        drain.stop_drain()
+        drain.cancel_drain()
+        drain.cancel_drain(drain.hostname())
+
+    async def _connect(self):
+        communicator = WebsocketCommunicator(DrainConsumer.as_asgi(), "/ws/drain/")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def _assert_drained(self, communicator, timeout=5):
+        hint = json.loads(await communicator.receive_from(timeout=timeout))
+        self.assertEqual(hint["type"], "reconnect")
+        self.assertEqual(hint["reason"], "drain")
+        self.assertLessEqual(hint["delay_ms"], 100)
+        self.assertEqual(await communicator.receive_output(timeout=timeout), {"type": "websocket.close", "code": 1012})
+        await communicator.disconnect()
+
+    async def test_start_drain_closes_with_1012(self):
+        communicators = [await self._connect() for _ in range(3)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            drain.start_drain(window=0.2)
+            for communicator in communicators:
+                await self._assert_drained(communicator)
+        self.assertTrue(drain.is_draining())
+
+    async def test_new_connection_during_drain(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            drain.start_drain(window=0)
+            communicator = WebsocketCommunicator(DrainConsumer.as_asgi(), "/ws/drain/")
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await self._assert_drained(communicator)
+
+    async def test_command_key_triggers_drain(self):
+        communicator = await self._connect()
+        with contextlib.redirect_stdout(io.StringIO()):
+            drain.request_drain(window=0)
+            await self._assert_drained(communicator)
+        self.assertEqual(drain._state["source"], "command")
+
+    async def test_waits_for_pending_work(self):
+        existing = set(drain._consumers)
+        communicator = await self._connect()
+        consumers = list(drain._consumers - existing)
+        self.assertEqual(len(consumers), 1)
+        consumers[0].pending_work = True
+        with contextlib.redirect_stdout(io.StringIO()):
+            drain.start_drain(window=0)
+            self.assertTrue(await communicator.receive_nothing(timeout=0.7))
+            consumers[0].pending_work = False
+            await self._assert_drained(communicator)
+
+    async def test_stop_drain_keeps_connection(self):
+        communicator = await self._connect()
+        with contextlib.redirect_stdout(io.StringIO()):
+            drain.start_drain(window=5)
+            drain.stop_drain()
+        self.assertTrue(await communicator.receive_nothing(timeout=0.3))
+        await communicator.disconnect()
+
+    def test_signal_handler_installed_at_startup(self):
+        # 첫 연결 전에도 SIGUSR1이 프로세스를 종료하지 않음
+        self.assertIs(signal.getsignal(signal.SIGUSR1), drain._handle_signal)
+
+    @override_settings(CHAT_DRAIN_WINDOW=0)
+    async def test_signal_starts_drain_on_connection_loop(self):
+        communicator = await self._connect()
+        with contextlib.redirect_stdout(io.StringIO()):
+            drain._handle_signal(signal.SIGUSR1, None)
+            await self._assert_drained(communicator)
+        self.assertEqual(drain._state["source"], "signal")
+
+    @override_settings(CHAT_DRAIN_CLOSE_CODE=4012)
+    async def test_close_code_setting(self):
+        communicator = await self._connect()
+        with contextlib.redirect_stdout(io.StringIO()):
+            drain.start_drain(window=0)
+            hint = json.loads(await communicator.receive_from(timeout=5))
+        self.assertEqual(hint["type"], "reconnect")
+        self.assertEqual(await communicator.receive_output(timeout=5), {"type": "websocket.close", "code": 4012})
+        await communicator.disconnect()
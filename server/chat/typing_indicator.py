@@ -0,0 +1,183 @@
+"""
+방 단위 타이핑 표시 집계기
+
+키 입력마다 오는 typing 프레임을 그대로 group_send 하지 않고,
+- 사용자별 상태가 바뀔 때만 Redis 해시(typing:<uuid>)에 반영하고 (debounce)
+- 방마다 최대 CHAT_TYPING_EMIT_INTERVAL 간격으로 "현재 입력 중인 사용자 목록"을 한 번만 브로드캐스트한다.
+입력 중 상태는 CHAT_TYPING_TTL 동안 갱신이 없으면 자동으로 만료된다.
+
+같은 방의 연결이 여러 워커에 나뉘어 있어도 방출 주기와 중복 제거가 방 단위로 지켜지도록
+방출 잠금(typing:<uuid>:emit, PX 방출 주기)과 마지막으로 보낸 목록(typing:<uuid>:last)을 Redis에 둔다.
+잠금을 얻지 못한 워커는 잠금이 풀린 뒤 다시 확인하므로 그 사이 바뀐 상태도 빠지지 않는다.
+"""
+import asyncio
+import json
+import time
+
+import redis
+from django.conf import settings
+
+from . import room_hub
+from .redis_utils import get_async_redis
+
+TYPING_KEY = "typing:{}"
+EMIT_KEY = "typing:{}:emit"
+LAST_KEY = "typing:{}:last"
+
+# 방출 권한 확인: KEYS[1] 방출 잠금, KEYS[2] 마지막으로 보낸 목록, ARGV[1] 현재 목록(JSON), ARGV[2] 방출 주기(ms), ARGV[3] 목록 유지(초)
+# 잠금이 남아 있으면 남은 ms, 마지막 목록과 같으면 0, 방출해야 하면 잠금(SET PX)을 걸고 -1
+_EMIT_SCRIPT = """
+local wait = redis.call('PTTL', KEYS[1])
+if wait > 0 then
+    return wait
+end
+if redis.call('GET', KEYS[2]) == ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], '1', 'PX', ARGV[2])
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[3])
+return -1
+"""
+
+
+def _emit_interval():
+    return getattr(settings, 'CHAT_TYPING_EMIT_INTERVAL', 0.5)
+
+
+def _typing_ttl():
+    return getattr(settings, 'CHAT_TYPING_TTL', 5)
+
+
+class _RoomState:
+    def __init__(self, group_name):
+        self.group_name = group_name
+        self.last_emit = 0.0
+        self.task = None
+        # 예약된 확인 시각 (task가 대기 중일 때만, 조회 중이면 None)
+        self.due = None
+        # 조회 중에 상태가 바뀜: 끝난 뒤 방출 주기 후 다시 확인
+        self.dirty = False
+
+
+class TypingAggregator:
+    """프로세스당 하나. 방별로 방출 주기를 제한하고 사용자별 상태 변화를 debounce"""
+
+    def __init__(self):
+        self._rooms = {}
+        # room_uuid → {username: (is_typing, Redis에 반영한 시각)}
+        self._user_state = {}
+
+    async def update(self, room_uuid, group_name, username, is_typing):
+        room_uuid = str(room_uuid)
+        now = time.time()
+        room_state = self._user_state.setdefault(room_uuid, {})
+        previous = room_state.get(username)
+
+        # 같은 상태가 반복되면 TTL 절반이 지났을 때만 갱신 (키 입력마다 Redis를 치지 않음)
+        if previous and previous[0] == is_typing:
+            if not is_typing or now - previous[1] < _typing_ttl() / 2:
+                return
+
+        if is_typing:
+            room_state[username] = (True, now)
+        else:
+            room_state.pop(username, None)
+            if not room_state:
+                self._user_state.pop(room_uuid, None)
+
+        try:
+            client = get_async_redis()
+            redis_key = TYPING_KEY.format(room_uuid)
+            if is_typing:
+                pipe = client.pipeline(transaction=False)
+                pipe.hset(redis_key, username, now + _typing_ttl())
+                pipe.expire(redis_key, int(_typing_ttl() * 2) + 1)
+                await pipe.execute()
+            else:
+                await client.hdel(redis_key, username)
+        except redis.RedisError as e:
+            print(f"[WARNING] 타이핑 상태 저장 실패: {e}")
+            return
+
+        if not previous or previous[0] != is_typing:
+            self._schedule(room_uuid, group_name)
+
+    def _schedule(self, room_uuid, group_name, delay=None):
+        state = self._rooms.get(room_uuid)
+        if state is None:
+            state = self._rooms[room_uuid] = _RoomState(group_name)
+        if delay is None:
+            delay = max(0.0, state.last_emit + _emit_interval() - time.time())
+        due = time.time() + delay
+        if state.task is not None and not state.task.done():
+            if state.due is None:
+                state.dirty = True
+                return
+            if state.due <= due:
+                return
+            # 만료 확인용으로 늦게 잡힌 예약은 취소하고 앞당김
+            state.task.cancel()
+        state.due = due
+        state.task = asyncio.create_task(self._emit_later(room_uuid, state, delay))
+
+    async def _emit_later(self, room_uuid, state, delay):
+        await asyncio.sleep(delay)
+        state.due = None
+        state.dirty = False
+        try:
+            users, next_expiry = await self._current_typers(room_uuid)
+            wait = await self._claim_emit(room_uuid, users)
+        except redis.RedisError as e:
+            print(f"[WARNING] 타이핑 상태 조회 실패: {e}")
+            return
+        finally:
+            state.task = None
+
+        if wait > 0:
+            # 다른 워커가 방금 방출함: 잠금이 풀린 뒤 다시 확인
+            self._schedule(room_uuid, state.group_name, wait / 1000)
+            return
+
+        if wait < 0:
+            state.last_emit = time.time()
+            await room_hub.room_send(room_uuid, state.group_name, {
+                "type": "typing_users",
+                "users": users,
+            })
+
+        if state.dirty:
+            self._schedule(room_uuid, state.group_name)
+        elif users:
+            # 아무도 멈춤을 알리지 않아도 만료 시점에 목록을 다시 확인
+            self._schedule(room_uuid, state.group_name, max(_emit_interval(), next_expiry - time.time()))
+        else:
+            self._rooms.pop(room_uuid, None)
+
+    async def _claim_emit(self, room_uuid, users):
+        """방 단위 방출 잠금. 잠금 남은 ms(>0), 보낼 필요 없음(0), 방출(-1)"""
+        return int(await get_async_redis().eval(
+            _EMIT_SCRIPT, 2, EMIT_KEY.format(room_uuid), LAST_KEY.format(room_uuid),
+            json.dumps(users), max(1, int(_emit_interval() * 1000)), int(_typing_ttl() * 2) + 1,
+        ))
+
+    async def _current_typers(self, room_uuid):
+        client = get_async_redis()
+        redis_key = TYPING_KEY.format(room_uuid)
+        entries = await client.hgetall(redis_key)
+        now = time.time()
+        expired = [username for username, expires_at in entries.items() if float(expires_at) <= now]
+        if expired:
+            await client.hdel(redis_key, *expired)
+        alive = {username: float(expires_at) for username, expires_at in entries.items() if username not in expired}
+        # 해시에 없는 사용자(만료, 다른 워커가 삭제, 키 만료)는 debounce 상태도 지워야 다음 typing이 다시 기록됨
+        room_state = self._user_state.get(room_uuid)
+        if room_state:
+            for username in [username for username in room_state if username not in alive]:
+                del room_state[username]
+            if not room_state:
+                del self._user_state[room_uuid]
+        next_expiry = min(alive.values()) if alive else now
+        return sorted(alive), next_expiry
+
+
+typing_aggregator = TypingAggregator()
@@ -0,0 +1,246 @@
+"""
+방별 안 읽은 메시지 수 (Redis 카운터 + UserChatRoomActivity.last_read_at)
+
+방마다 메시지 순번과 사용자별 읽음 위치를 Redis에 유지한다.
+- room:<uuid>:seq      STRING  방의 메시지 수 (메시지 저장마다 INCRBY)
+- room:<uuid>:read     HASH    profile_id → 마지막으로 읽은 순번
+- room:<uuid>:read_at  HASH    profile_id → 읽음 처리 시각 (DB 반영 대기)
+- unread:dirty         SET     "<uuid>:<profile_id>" (last_read_at에 아직 반영되지 않은 읽음 위치)
+
+안 읽은 수 = seq - read[profile_id] 이므로 메시지 하나당 방 인원과 무관하게 INCR 한 번이면 된다.
+발신자는 자기 메시지를 읽은 것으로 처리한다.
+seq가 없는 방(만료, Redis 재시작)은 조회 시 DB 메시지 수와 last_read_at으로 다시 채운다.
+"""
+import redis
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import versions
+from .models import Message, UserChatRoomActivity
+from .redis_utils import redis_client, get_async_redis
+
+SEQ_KEY = "room:{}:seq"
+READ_KEY = "room:{}:read"
+READ_AT_KEY = "room:{}:read_at"
+DIRTY_KEY = "unread:dirty"
+
+# 초기화된 방에만 반영: 순번 증가 + 발신자 읽음 위치를 자기 메시지 순번으로 이동
+_MESSAGES_SAVED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local last = redis.call('INCRBY', KEYS[1], #ARGV - 1)
+local seq = last - (#ARGV - 1)
+for i = 2, #ARGV do
+    redis.call('HSET', KEYS[2], ARGV[i], seq + i - 1)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return last
+"""
+
+# 읽음 위치를 현재 순번으로 이동하고 DB 반영 대기 목록에 추가. 현재 순번 반환 (미초기화 방이면 -1)
+# 방 목록 ETag용 사용자 읽음 버전(KEYS[5])은 미초기화 방(DB에 바로 기록)이어도 갱신
+_MARK_READ_SCRIPT = """
+redis.call('SET', KEYS[5], ARGV[5], 'EX', ARGV[6])
+local seq = redis.call('GET', KEYS[1])
+if not seq then
+    return -1
+end
+redis.call('HSET', KEYS[2], ARGV[1], seq)
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+redis.call('SADD', KEYS[4], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+redis.call('EXPIRE', KEYS[3], ARGV[4])
+return tonumber(seq)
+"""
+
+
+def _ttl():
+    return getattr(settings, 'CHAT_UNREAD_TTL', 60 * 60 * 24 * 30)
+
+
+def _keys(room_uuid):
+    room_uuid = str(room_uuid)
+    return [SEQ_KEY.format(room_uuid), READ_KEY.format(room_uuid)]
+
+
+def messages_saved(room_uuid, sender_ids):
+    """메시지 저장 후 호출 (sender_ids: 저장 순서대로 발신자 profile_id 목록)"""
+    if not sender_ids:
+        return
+    try:
+        redis_client.eval(_MESSAGES_SAVED_SCRIPT, 2, *_keys(room_uuid), _ttl(), *sender_ids)
+    except redis.RedisError as e:
+        print(f"[WARNING] 안 읽은 메시지 카운터 갱신 실패: {e}")
+
+
+def _mark_read_args(room_uuid, profile_id):
+    room_uuid = str(room_uuid)
+    keys = _keys(room_uuid) + [READ_AT_KEY.format(room_uuid), DIRTY_KEY, versions.READ_VERSION_KEY.format(profile_id)]
+    args = [
+        profile_id, timezone.now().isoformat(), f"{room_uuid}:{profile_id}", _ttl(),
+        versions.new_version(), getattr(settings, 'CHAT_VERSION_STAMP_TTL', 60 * 60 * 24),
+    ]
+    return keys, args
+
+
+def mark_read(room_uuid, profile_id):
+    """방의 현재 메시지까지 읽음 처리 (REST / 방 참여 시)"""
+    keys, args = _mark_read_args(room_uuid, profile_id)
+    try:
+        seq = redis_client.eval(_MARK_READ_SCRIPT, len(keys), *keys, *args)
+    except redis.RedisError as e:
+        print(f"[WARNING] 읽음 처리 실패, DB에 바로 반영: {e}")
+        seq = -1
+    if int(seq) < 0:
+        # 카운터가 없는 방은 DB에 바로 기록 (다음 조회 때 이 시각 기준으로 다시 채워짐)
+        write_last_read_at(room_uuid, profile_id, timezone.now())
+
+
+async def amark_read(room_uuid, profile_id):
+    """mark_read의 consumer용. False면 호출 측이 write_last_read_at으로 DB에 바로 반영"""
+    keys, args = _mark_read_args(room_uuid, profile_id)
+    try:
+        seq = await get_async_redis().eval(_MARK_READ_SCRIPT, len(keys), *keys, *args)
+    except redis.RedisError as e:
+        print(f"[WARNING] 읽음 처리 실패: {e}")
+        return False
+    return int(seq) >= 0
+
+
+def counts(profile_id, room_uuids):
+    """
+    방별 안 읽은 메시지 수 {room_uuid(str): count}
+    Redis 왕복 한 번 (GET seq + HGET read 파이프라인), 빈 값이 있는 방만 DB로 다시 채움
+    """
+    room_uuids = [str(room_uuid) for room_uuid in room_uuids]
+    if not room_uuids:
+        return {}
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for room_uuid in room_uuids:
+            pipe.get(SEQ_KEY.format(room_uuid))
+            pipe.hget(READ_KEY.format(room_uuid), profile_id)
+        values = pipe.execute()
+    except redis.RedisError as e:
+        print(f"[WARNING] 안 읽은 메시지 수 조회 실패, DB로 계산: {e}")
+        return {
+            room_uuid: unread
+            for room_uuid, (_, unread) in _counts_from_db(profile_id, room_uuids).items()
+        }
+
+    result = {}
+    missing = []
+    for index, room_uuid in enumerate(room_uuids):
+        seq, read = values[index * 2], values[index * 2 + 1]
+        if seq is None or read is None:
+            missing.append(room_uuid)
+        else:
+            result[room_uuid] = max(0, int(seq) - int(read))
+
+    if missing:
+        result.update(_warm(profile_id, missing))
+    return result
+
+
+def _counts_from_db(profile_id, room_uuids):
+    """방별 (전체 메시지 수, last_read_at 이후 메시지 수)를 쿼리 두 번으로 계산"""
+    last_read = {
+        str(room_uuid): read_at
+        for room_uuid, read_at in UserChatRoomActivity.objects.filter(
+            user_id=profile_id, chatroom_id__in=room_uuids
+        ).values_list('chatroom_id', 'last_read_at')
+    }
+    unread_filter = Q()
+    for room_uuid in room_uuids:
+        read_at = last_read.get(room_uuid)
+        condition = Q(room_id=room_uuid)
+        if read_at:
+            condition &= Q(created_at__gt=read_at)
+        unread_filter |= condition
+    rows = (
+        Message.objects.filter(room_id__in=room_uuids)
+        .values('room_id')
+        # 자기 메시지는 읽은 것으로 취급
+        .annotate(total=Count('id'), unread=Count('id', filter=unread_filter & ~Q(sender_id=profile_id)))
+    )
+    totals = {str(room_uuid): (0, 0) for room_uuid in room_uuids}
+    for row in rows:
+        totals[str(row['room_id'])] = (row['total'], row['unread'])
+    return totals
+
+
+def _warm(profile_id, room_uuids):
+    """DB 기준으로 seq / 읽음 위치를 채우고 안 읽은 수를 반환 (이미 있는 값은 유지)"""
+    totals = _counts_from_db(profile_id, room_uuids)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for room_uuid, (total, unread) in totals.items():
+            pipe.set(SEQ_KEY.format(room_uuid), total, nx=True, ex=_ttl())
+            pipe.hsetnx(READ_KEY.format(room_uuid), profile_id, total - unread)
+            pipe.expire(READ_KEY.format(room_uuid), _ttl())
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"[WARNING] 안 읽은 메시지 카운터 초기화 실패: {e}")
+    return {room_uuid: unread for room_uuid, (_, unread) in totals.items()}
+
+
+def write_last_read_at(room_uuid, profile_id, read_at):
+    UserChatRoomActivity.objects.update_or_create(
+        user_id=profile_id, chatroom_id=room_uuid, defaults={"last_read_at": read_at}
+    )
+
+
+def flush_read_markers(batch_size=100):
+    """
+    Redis에만 있는 읽음 시각을 UserChatRoomActivity.last_read_at에 반영 (지연 flush)
+    워커별 presence reaper(heartbeat 주기)와 flush_read_markers 명령에서 주기적으로 호출. 반영한 개수 반환
+    """
+    try:
+        members = redis_client.spop(DIRTY_KEY, batch_size) or []
+        if not members:
+            return 0
+        pipe = redis_client.pipeline(transaction=False)
+        parsed = []
+        for member in members:
+            room_uuid, profile_id = member.rsplit(":", 1)
+            parsed.append((room_uuid, int(profile_id)))
+            pipe.hget(READ_AT_KEY.format(room_uuid), profile_id)
+        read_times = pipe.execute()
+    except redis.RedisError as e:
+        print(f"[WARNING] 읽음 시각 flush 실패: {e}")
+        return 0
+
+    flushed = 0
+    for (room_uuid, profile_id), read_at in zip(parsed, read_times):
+        read_at = parse_datetime(read_at) if read_at else None
+        if read_at is None:
+            continue
+        try:
+            write_last_read_at(room_uuid, profile_id, read_at)
+            flushed += 1
+        except Exception as e:
+            # 방이 삭제된 경우 등은 건너뜀
+            print(f"[WARNING] last_read_at 저장 실패 ({room_uuid}:{profile_id}): {e}")
+    return flushed
+
+
+def member_removed(room_uuid, profile_id):
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hdel(READ_KEY.format(str(room_uuid)), profile_id)
+        pipe.hdel(READ_AT_KEY.format(str(room_uuid)), profile_id)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"[WARNING] 읽음 위치 삭제 실패: {e}")
+
+
+def room_deleted(room_uuid):
+    room_uuid = str(room_uuid)
+    try:
+        redis_client.delete(SEQ_KEY.format(room_uuid), READ_KEY.format(room_uuid), READ_AT_KEY.format(room_uuid))
+    except redis.RedisError as e:
+        print(f"[WARNING] 안 읽은 메시지 카운터 삭제 실패: {e}")
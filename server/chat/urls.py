@@ -13,4 +13,6 @@ urlpatterns = [
     path('select-room/', views.select_room, name='select_room'), # 방 선택
     path('current-room/', views.get_current_room_info, name='get_current_room_info'), # 현재 선택된 방 정보 조회
     path('rooms/<str:room_uuid>/messages/', views.get_room_messages, name='get_room_messages'), # 메세지 조회
+    path('rooms/<str:room_uuid>/read/', views.mark_room_read, name='mark_room_read'), # 읽음 처리
+    path('metrics/', views.get_metrics, name='get_metrics'), # 워커 메트릭 조회 (스태프 전용)
 ]
\ No newline at end of file
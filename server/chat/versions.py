@@ -0,0 +1,199 @@
+"""
+HTTP 조건부 요청(ETag / If-None-Match)용 버전 스탬프
+
+방 목록 / 현재 방 정보 / 메시지 목록 / current_user는 화면을 바꿀 때마다 다시 호출되는데,
+대부분 내용이 그대로다. 응답을 다시 만들지 않고 Redis에 둔 버전 스탬프만 비교해서 304로 답한다.
+
+- room:version:last_message  HASH  room_uuid → 마지막 메시지 id (message_stream.append와 같은 파이프라인에서 갱신)
+- room:version:meta          HASH  room_uuid → 방 정보 버전 (ChatRoom.updated_at 저장 / 멤버십 변경 시각, ns)
+- user:<profile_id>:read_version  STRING  읽음 처리 버전 (unread.mark_read 스크립트에서 갱신)
+- room_list:<profile_id>:rooms    STRING  방 목록을 DB에서 만들 때의 방 uuid 목록 (멤버십 변경 시 room_queries.invalidate가 삭제)
+
+방 스탬프는 방 uuid를 필드로 하는 해시 두 개에 모아 두어서, 방이 수백 개인 목록도 HMGET 두 번(스크립트 한 번)으로 비교한다.
+값이 없으면(새 방, Redis 재시작) 조회하는 순간 현재 시각(ns)으로 채운다. 이전에 나간 어떤 값과도 겹치지 않으므로
+그 뒤에 만든 응답과 짝이 맞고, 이후 변경은 항상 새 값으로 덮어쓴다.
+ETag는 응답을 만들기 전에 읽은 스탬프로 계산하므로, 경합 시에는 304 대신 200이 한 번 더 나갈 뿐 오래된 내용으로 304를 주지는 않는다.
+"""
+import hashlib
+import json
+import time
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+
+from . import metrics
+from .redis_utils import redis_client
+
+LAST_MESSAGE_KEY = "room:version:last_message"
+META_KEY = "room:version:meta"
+READ_VERSION_KEY = "user:{}:read_version"
+ROOM_LIST_ROOMS_KEY = "room_list:{}:rooms"
+
+# 방별 (last_message, meta) 스탬프 조회, 없는 값은 ARGV[1](현재 시각)로 채움
+# KEYS[3](사용자 읽음 버전)이 있으면 그 값도 같은 방식으로 반환 (ARGV[2]: 유지 시간), ARGV[3..]: 방 uuid
+_STAMPS_SCRIPT = """
+local seed = ARGV[1]
+local rooms = {}
+for i = 3, #ARGV do
+    rooms[#rooms + 1] = ARGV[i]
+end
+local result = {}
+for k = 1, 2 do
+    local values = {}
+    if #rooms > 0 then
+        values = redis.call('HMGET', KEYS[k], unpack(rooms))
+    end
+    for i = 1, #rooms do
+        if not values[i] then
+            redis.call('HSET', KEYS[k], rooms[i], seed)
+            values[i] = seed
+        end
+    end
+    result[k] = values
+end
+if #KEYS > 2 then
+    local read_version = redis.call('GET', KEYS[3])
+    if not read_version then
+        redis.call('SET', KEYS[3], seed, 'EX', ARGV[2])
+        read_version = seed
+    end
+    result[3] = read_version
+end
+return result
+"""
+
+
+def _ttl():
+    return getattr(settings, 'CHAT_VERSION_STAMP_TTL', 60 * 60 * 24)
+
+
+def _enabled():
+    return getattr(settings, 'CHAT_CONDITIONAL_GET_ENABLED', True)
+
+
+def new_version():
+    return str(time.time_ns())
+
+
+# ==================== 스탬프 조회 ====================
+
+def _stamps(room_uuids, profile_id=None):
+    keys = [LAST_MESSAGE_KEY, META_KEY]
+    if profile_id is not None:
+        keys.append(READ_VERSION_KEY.format(profile_id))
+    try:
+        return redis_client.eval(
+            _STAMPS_SCRIPT, len(keys), *keys, new_version(), _ttl(), *(str(room_uuid) for room_uuid in room_uuids)
+        )
+    except redis.RedisError as e:
+        print(f"[WARNING] 버전 스탬프 조회 실패: {e}")
+        return None
+
+
+def room_stamp(room_uuid):
+    """방 하나의 {"last_message", "meta"} 스탬프 (Redis 실패 시 None)"""
+    stamps = _stamps([room_uuid])
+    if stamps is None:
+        return None
+    return {"last_message": stamps[0][0], "meta": stamps[1][0]}
+
+
+def room_list_stamp(profile_id):
+    """
+    사용자 방 목록의 스탬프 {"rooms", "last_message", "meta", "read"}
+    방 목록을 아직 DB에서 만든 적이 없거나(멤버십 변경 후 포함) Redis 실패 시 None
+    """
+    try:
+        raw = redis_client.get(ROOM_LIST_ROOMS_KEY.format(profile_id))
+    except redis.RedisError as e:
+        print(f"[WARNING] 방 목록 버전 스탬프 조회 실패: {e}")
+        return None
+    if raw is None:
+        return None
+    room_uuids = json.loads(raw)
+    stamps = _stamps(room_uuids, profile_id)
+    if stamps is None:
+        return None
+    return {"rooms": room_uuids, "last_message": stamps[0], "meta": stamps[1], "read": stamps[2]}
+
+
+def make_etag(*parts):
+    """스탬프/사용자별 값들을 묶은 ETag (따옴표 포함)"""
+    digest = hashlib.sha1(json.dumps(parts, default=str, sort_keys=True).encode()).hexdigest()[:24]
+    return quote_etag(digest)
+
+
+# ==================== 스탬프 갱신 ====================
+
+def remember_room_list(profile_id, rooms):
+    """room_queries가 DB에서 만든 목록(member_rooms 행)의 방 uuid 목록 저장"""
+    try:
+        redis_client.set(
+            ROOM_LIST_ROOMS_KEY.format(profile_id), json.dumps([room["room_uuid"] for room in rooms]), ex=_ttl()
+        )
+    except redis.RedisError as e:
+        print(f"[WARNING] 방 목록 버전 스탬프 저장 실패: {e}")
+
+
+def add_last_message(pipe, room_uuid, message_id):
+    """message_stream.append 파이프라인에 마지막 메시지 id 갱신 추가"""
+    pipe.hset(LAST_MESSAGE_KEY, str(room_uuid), message_id)
+
+
+def members_changed(room_uuid):
+    """멤버십 변경 (membership 훅에서 커밋 후 호출)"""
+    redis_client.hset(META_KEY, str(room_uuid), new_version())
+
+
+def room_updated(room_uuid, updated_at):
+    """방 저장 후 (커밋 후) ChatRoom.updated_at을 방 정보 버전으로 기록"""
+    def run():
+        try:
+            redis_client.hset(META_KEY, str(room_uuid), str(int(updated_at.timestamp() * 1_000_000) * 1000))
+        except redis.RedisError as e:
+            print(f"[WARNING] 방 버전 스탬프 갱신 실패: {e}")
+            forget_room(room_uuid)
+    transaction.on_commit(run)
+
+
+def forget_room(room_uuid):
+    """갱신이 누락됐을 수 있거나 방이 삭제됨: 스탬프 삭제 (다음 조회 때 새 값으로 채움)"""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hdel(LAST_MESSAGE_KEY, str(room_uuid))
+        pipe.hdel(META_KEY, str(room_uuid))
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+# ==================== 뷰 헬퍼 ====================
+
+def not_modified(request, etag, endpoint):
+    """
+    If-None-Match가 etag와 맞으면 304 응답, 아니면 None
+    조건부 요청(If-None-Match가 있는 요청)만 hit/miss로 센다
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match or not _enabled():
+        return None
+    if etag is not None and etag in parse_etags(if_none_match):
+        metrics.inc("http_etag_hits_total")
+        metrics.inc("http_etag_requests_total", endpoint=endpoint, result="hit")
+        return with_etag(HttpResponseNotModified(), etag)
+    metrics.inc("http_etag_misses_total")
+    metrics.inc("http_etag_requests_total", endpoint=endpoint, result="miss")
+    return None
+
+
+def with_etag(response, etag):
+    """응답에 ETag와 재검증 강제 Cache-Control을 붙임 (etag가 None이면 그대로)"""
+    if etag is not None and _enabled():
+        response["ETag"] = etag
+        # 사용자별 응답: 공유 캐시 금지, 쓸 때마다 재검증
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
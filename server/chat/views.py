@@ -1,9 +1,10 @@
-import pyotp
 from .crypto_utils import encrypt_aes_gcm, generate_pseudo_number
 from .models import ChatRoom, Message  # Message도 추가
-from login.models import UserProfile
 from login.auth_check import check_authentication
-from .room_utils import load_room_name, save_room_secret_key, get_room_secret
+from .room_utils import load_room_name, save_room_secret_key, get_room_secret, evict_room_secret
+from . import invites, membership, message_stream, metrics, room_queries, unread, versions
+from .pagination import MAX_LIMIT, keyset_page, page_cursors
+from .ratelimit import rate_limit
 from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseNotFound, HttpResponseServerError
 from django.views.decorators.http import require_POST, require_GET
 from django.shortcuts import get_object_or_404
@@ -11,7 +12,6 @@ from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 import json
 from django.contrib.auth.models import User
-import redis
 from datetime import timedelta
 from django.conf import settings
 
@@ -23,12 +23,6 @@ from django.core.paginator import Paginator
 from django.db.models import Q
 import uuid  # UUID 처리용 추가
 
-# Redis 설정
-redis_client = redis.Redis(
-    host=getattr(settings, 'REDIS_HOST', 'redis'),
-    port=getattr(settings, 'REDIS_PORT', 6379),
-    decode_responses=True
-)
 
 # Create your views here.
 @require_GET
@@ -40,35 +34,43 @@ def get_my_rooms(request):
         if auth_error:
             return auth_error
         
-        try:
-            user_profile = UserProfile.objects.get(user=request.user)
-        except UserProfile.DoesNotExist:
-            return JsonResponse({"rooms": [], "total_count": 0})
+        user_profile = request.profile
+        
+        # 목록의 방 스탬프(마지막 메시지 / 방 정보)와 읽음 버전이 그대로면 목록/안 읽은 수 조회 없이 304
+        list_stamp = versions.room_list_stamp(user_profile.id)
+        etag = versions.make_etag("my_rooms", user_profile.id, list_stamp) if list_stamp else None
+        not_modified = versions.not_modified(request, etag, "my_rooms")
+        if not_modified is not None:
+            return not_modified
+
+        # 방장인 방 + 참가자인 방 (방장/참가자 수/마지막 메시지까지 쿼리 한 번, 짧은 TTL 캐시)
+        # ETag를 붙이는 응답은 스탬프보다 새로운 DB 결과로 만듦
+        all_rooms = room_queries.member_rooms(user_profile.id, use_cache=etag is None)
         
-        # 방장인 방 + 참가자인 방
-        admin_rooms = ChatRoom.objects.filter(admin=user_profile)
-        participant_rooms = ChatRoom.objects.filter(participants=user_profile)
-        all_rooms = (admin_rooms | participant_rooms).distinct().order_by('-updated_at')
+        # 모든 방의 안 읽은 메시지 수를 Redis 파이프라인 한 번으로 조회
+        unread_counts = unread.counts(user_profile.id, [room["room_uuid"] for room in all_rooms])
         
         rooms_data = []
         for room in all_rooms:
             room_info = {
-                "id": str(room.room_uuid),  # 프론트가 이걸로 방 식별
-                "name": room.room_name,
-                "description": room.description,
-                "admin": room.admin.username,
-                "is_admin": (room.admin == user_profile),
-                "participant_count": room.participants.count() + 1,
-                "last_activity": room.updated_at.isoformat(),
-                "created_at": room.created_at.isoformat()
+                "id": room["room_uuid"],  # 프론트가 이걸로 방 식별
+                "name": room["room_name"],
+                "description": room["description"],
+                "admin": room["admin_username"],
+                "is_admin": (room["admin_id"] == user_profile.id),
+                "participant_count": room["participant_count"] + 1,
+                "last_activity": room["updated_at"],
+                "created_at": room["created_at"],
+                "last_message": room["last_message"],
+                "unread_count": unread_counts.get(room["room_uuid"], 0)
             }
             rooms_data.append(room_info)
         
-        return JsonResponse({
+        return versions.with_etag(JsonResponse({
             "result": "success",
             "rooms": rooms_data,
             "total_count": len(rooms_data)
-        })
+        }), etag)
         
     except Exception as e:
         return JsonResponse({"error": f"Failed to get rooms: {str(e)}"}, status=500)
@@ -77,6 +79,7 @@ def get_my_rooms(request):
 
 @csrf_exempt
 @require_POST
+@rate_limit('create_room', require_auth=True)
 def create_chat_room(request):
     """채팅방 생성해서 room_id 반환"""
     try:
@@ -85,10 +88,7 @@ def create_chat_room(request):
             return JsonResponse({"error": "Authentication required"}, status=401)
 
         # 0. 현재 사용자 프로필 가져오기
-        try:
-            admin_profile = UserProfile.objects.get(user=request.user)
-        except UserProfile.DoesNotExist:
-            admin_profile = UserProfile.objects.create(user=request.user)
+        admin_profile = request.profile
 
         # 1. 채팅방 이름 전달
         room_name = load_room_name(request)
@@ -153,10 +153,7 @@ def delete_room(request):
             return JsonResponse({"error": "Room UUID is required"}, status=400)
         
         # 현재 사용자 프로필 가져오기
-        try:
-            user_profile = UserProfile.objects.get(user=request.user)
-        except UserProfile.DoesNotExist:
-            return JsonResponse({"error": "User profile not found"}, status=404)
+        user_profile = request.profile
         
         # 채팅방 존재 확인
         try:
@@ -166,10 +163,10 @@ def delete_room(request):
             return JsonResponse({"error": "Room not found"}, status=404)
         
         # 사용자가 방에 속해있는지 확인
-        is_admin = (room.admin == user_profile)
-        is_participant = user_profile in room.participants.all()
+        user_role = membership.role(room.room_uuid, user_profile.id)
+        is_admin = (user_role == membership.ROLE_ADMIN)
         
-        if not (is_admin or is_participant):
+        if user_role is None:
             return JsonResponse({
                 "error": "Access denied", 
                 "message": "You are not a member of this room"
@@ -185,7 +182,18 @@ def delete_room(request):
             
             print(f"[DEBUG] 삭제할 방 정보 - 이름: {room_name}, 참가자: {participant_count}명")
             
-            # 1. SecureData 삭제 (채팅방 시크릿 키)
+            # 1. Redis에서 관련 초대 코드 삭제 (가능한 경우)
+            # SecureData를 지우기 전에 비밀키를 읽어야 함 (보통 access-code 때 캐시된 값)
+            try:
+                # 이 방이 가진 이전 / 현재 / 다음 창 코드를 삭제
+                secret = get_room_secret(room.room_uuid)
+                if secret:
+                    invites.close_invitation(room.room_uuid, secret)
+                    print(f"[DEBUG] Redis 초대 코드 삭제: {room.room_uuid}")
+            except Exception as e:
+                print(f"[WARNING] Redis 캐시 삭제 중 오류: {e}")
+            
+            # 2. SecureData 삭제 (채팅방 시크릿 키)
             try:
                 from .models import SecureData
                 secure_data = SecureData.objects.filter(room=room)
@@ -195,19 +203,6 @@ def delete_room(request):
             except Exception as e:
                 print(f"[WARNING] SecureData 삭제 중 오류: {e}")
             
-            # 2. Redis에서 관련 TOTP 캐시 삭제 (가능한 경우)
-            try:
-                # 현재 활성화된 TOTP가 있다면 삭제
-                secret = get_room_secret(room.room_uuid)
-                if secret:
-                    totp = pyotp.TOTP(secret)
-                    current_totp = totp.now()
-                    redis_key = f"totp:{current_totp}"
-                    redis_client.delete(redis_key)
-                    print(f"[DEBUG] Redis TOTP 캐시 삭제: {redis_key}")
-            except Exception as e:
-                print(f"[WARNING] Redis 캐시 삭제 중 오류: {e}")
-            
             # 3. 참가자 관계 해제 (ManyToMany 관계)
             try:
                 room.participants.clear()
@@ -232,6 +227,10 @@ def delete_room(request):
             
             # 6. 마지막으로 채팅방 완전 삭제
             room.delete()
+            evict_room_secret(room_uuid)
+            membership.room_deleted(room_uuid)
+            message_stream.delete(room_uuid)
+            unread.room_deleted(room_uuid)
             print(f"[DEBUG] 채팅방 '{room_name}' 완전 삭제 완료")
             
             return JsonResponse({
@@ -251,11 +250,14 @@ def delete_room(request):
             
             # 참가자 목록에서 해당 사용자 제거
             room.participants.remove(user_profile)
+            membership.member_removed(room.room_uuid, user_profile.id)
+            unread.member_removed(room.room_uuid, user_profile.id)
             
             # 방 활동 시간 업데이트
             from django.utils import timezone
             room.updated_at = timezone.now()
             room.save()
+            versions.room_updated(room.room_uuid, room.updated_at)
             
             # 현재 세션에서 선택된 방이 나간 방이라면 세션 정리
             if request.session.get('selected_room_uuid') == room_uuid:
@@ -288,6 +290,7 @@ def delete_room(request):
 @csrf_exempt
 @require_POST
 @login_required
+@rate_limit('generate_totp')
 def generate_totp(request):
     """POST로 UUID를 받아서 TOTP 생성 - 방장만 가능"""
     try:
@@ -309,10 +312,7 @@ def generate_totp(request):
             return JsonResponse({"error": "Room UUID is required"}, status=400)
         
         # 사용자 프로필 가져오기
-        try:
-            user_profile = UserProfile.objects.get(user=request.user)
-        except UserProfile.DoesNotExist:
-            return JsonResponse({"error": "User profile not found"}, status=404)
+        user_profile = request.profile
         
         # 방 존재 확인
         try:
@@ -321,8 +321,8 @@ def generate_totp(request):
         except ChatRoom.DoesNotExist:
             return JsonResponse({"error": "Room not found"}, status=404)
         
-        # 방장 권한 확인
-        if room.admin != user_profile:
+        # 방장 권한 확인 (admin을 따로 불러오지 않고 id로 비교)
+        if room.admin_id != user_profile.id:
             return JsonResponse({
                 "error": "Permission denied",
                 "message": "Only admin can generate TOTP"
@@ -333,24 +333,20 @@ def generate_totp(request):
         if not secret:
             return JsonResponse({"error": "Room secret not found"}, status=404)
         
-        totp = pyotp.TOTP(secret)
-        current_totp = totp.now()
+        # 초대 코드 인덱스에 현재 / 다음 창 코드 등록 (다른 방과 겹치면 이 방 코드로 등록된 창 사용)
+        current_totp, expires_in = invites.open_invitation(room.room_uuid, secret)
+        if current_totp is None:
+            return JsonResponse({
+                "error": "Access code unavailable",
+                "message": "Please try again shortly"
+            }, status=503)
         print(f"[DEBUG] 생성된 TOTP: {current_totp}")
-        
-        # Redis에 TOTP -> Room UUID 매핑 저장 (30초 TTL)
-        redis_key = f"totp:{current_totp}"
-        redis_value = {
-            "room_uuid": str(room.room_uuid),
-            "room_name": room.room_name,
-            "admin": room.admin.username
-        }
-        redis_client.setex(redis_key, 30, json.dumps(redis_value))
-        print(f"[DEBUG] Redis 저장 완료: {redis_key}")
 
         return JsonResponse({
             "result": "success",
             "totp": current_totp,
-            "interval": 30,
+            "interval": invites.INTERVAL,
+            "expires_in": expires_in,
             "room_name": room.room_name,
             "room_uuid": str(room.room_uuid)
         })
@@ -367,6 +363,7 @@ def generate_totp(request):
 @csrf_exempt
 @require_POST
 @login_required
+@rate_limit('join_room')
 def join_room(request):
     """TOTP 코드만으로 방 참여 - UUID 불필요"""
     try:
@@ -393,37 +390,25 @@ def join_room(request):
             return JsonResponse({"error": "Invalid TOTP format. Must be 6 digits."}, status=400)
         
         # 현재 사용자 프로필 가져오기
-        try:
-            user_profile = UserProfile.objects.get(user=request.user)
-        except UserProfile.DoesNotExist:
-            user_profile = UserProfile.objects.create(user=request.user)
+        user_profile = request.profile
         
         print(f"[DEBUG] 사용자 프로필: {user_profile.username}")
 
-        # Redis에서 빠르게 검색
-        redis_key = f"totp:{totp_code}"
-        room_data = redis_client.get(redis_key)
+        # 초대 코드 인덱스에서 검색 (GET 한 번, 이전 / 다음 창 코드 포함)
+        room_uuid_from_cache = invites.lookup(totp_code)
 
-        if not room_data:
+        if not room_uuid_from_cache:
             return JsonResponse({"error": "Invalid or expired TOTP"}, status=400)
 
-        # Redis에서 방 정보 추출
-        try:
-            room_info = json.loads(room_data)
-            room_uuid_from_cache = room_info['room_uuid']
-            room_name_from_cache = room_info['room_name']
-        except (json.JSONDecodeError, KeyError) as e:
-            return JsonResponse({"error": "Invalid cached room data"}, status=500)
-        
         # 해당 방 가져오기
         try:
             room = ChatRoom.objects.get(room_uuid=room_uuid_from_cache)
         except ChatRoom.DoesNotExist:
-            redis_client.delete(redis_key)
+            invites.forget(totp_code, room_uuid_from_cache)
             return JsonResponse({"error": "Room no longer exists"}, status=404)
         
         # 이미 참여 중인지 확인
-        if user_profile in room.participants.all() or room.admin == user_profile:
+        if membership.is_member(room.room_uuid, user_profile.id):
             print(f"[DEBUG] 사용자 이미 참여 중: {user_profile.username}")
             return JsonResponse({
                 "result": "already_joined",
@@ -435,12 +420,16 @@ def join_room(request):
         
         # 방에 참여 추가
         room.participants.add(user_profile)
+        membership.member_added(room.room_uuid, user_profile.id)
+        # 참여 이전 메시지는 안 읽은 메시지로 세지 않음
+        unread.mark_read(room.room_uuid, user_profile.id)
         print(f"[DEBUG] 사용자 {user_profile.username}를 {room.room_name}에 추가 완료")
         
         # 방 활동 시간 업데이트 (선택사항)
         from django.utils import timezone
         room.updated_at = timezone.now()
         room.save()
+        versions.room_updated(room.room_uuid, room.updated_at)
         
         return JsonResponse({
             "result": "success",
@@ -478,14 +467,11 @@ def select_room(request):
             return JsonResponse({"error": "Room ID is required"}, status=400)
         
         # 권한 확인
-        user_profile = UserProfile.objects.get(user=request.user)
+        user_profile = request.profile
         try:
             room = ChatRoom.objects.get(room_uuid=room_uuid)
             
-            is_admin = (room.admin == user_profile)
-            is_participant = user_profile in room.participants.all()
-            
-            if not (is_admin or is_participant):
+            if not membership.is_member(room.room_uuid, user_profile.id):
                 return JsonResponse({"error": "Access denied"}, status=403)
             
             # 세션에 선택된 방 저장
@@ -517,18 +503,26 @@ def get_current_room_info(request):
         if not room_uuid:
             return JsonResponse({"error": "No room selected"}, status=400)
         
-        user_profile = UserProfile.objects.get(user=request.user)
+        user_profile = request.profile
+        
+        # 멤버십 캐시로 권한을 먼저 확인하고, 방 스탬프가 그대로면 방/참가자 조회 없이 304
+        user_role = membership.role(room_uuid, user_profile.id)
+        stamp = versions.room_stamp(room_uuid)
+        etag = versions.make_etag("current_room", room_uuid, user_profile.id, user_role, stamp["meta"]) if stamp else None
+        if user_role is not None:
+            not_modified = versions.not_modified(request, etag, "current_room")
+            if not_modified is not None:
+                return not_modified
         
         try:
-            room = ChatRoom.objects.get(room_uuid=room_uuid)
+            room = ChatRoom.objects.select_related('admin__user').get(room_uuid=room_uuid)
         except ChatRoom.DoesNotExist:
             return JsonResponse({"error": "Selected room not found"}, status=404)
         
         # 권한 확인
-        is_admin = (room.admin == user_profile)
-        is_participant = user_profile in room.participants.all()
+        is_admin = (user_role == membership.ROLE_ADMIN)
         
-        if not (is_admin or is_participant):
+        if user_role is None:
             return JsonResponse({"error": "Access denied"}, status=403)
         
         # 참가자 목록
@@ -539,7 +533,8 @@ def get_current_room_info(request):
             "is_admin": True
         })
         
-        for participant in room.participants.all():
+        # 참가자 사용자명까지 JOIN 한 번으로
+        for participant in room.participants.select_related('user'):
             if participant != room.admin:
                 participants.append({
                     "username": participant.username,
@@ -563,7 +558,7 @@ def get_current_room_info(request):
             }
         }
         
-        return JsonResponse(room_info)
+        return versions.with_etag(JsonResponse(room_info), etag)
         
     except Exception as e:
         return JsonResponse({"error": f"Failed to get room info: {str(e)}"}, status=500)
@@ -571,6 +566,7 @@ def get_current_room_info(request):
 
 @require_GET
 @login_required
+@rate_limit('room_messages')
 def get_room_messages(request, room_uuid):
     """채팅방의 메시지 내역 조회 (Django API)"""
     try:
@@ -593,15 +589,22 @@ def get_room_messages(request, room_uuid):
             }, status=400)
 
         # 3. 사용자 프로필 조회
-        try:
-            user_profile = UserProfile.objects.get(user=request.user)
-        except UserProfile.DoesNotExist:
-            return JsonResponse({
-                "result": "error",
-                "message": "사용자 프로필을 찾을 수 없습니다."
-            }, status=404)
-
-        # 4. 채팅방 조회
+        user_profile = request.profile
+
+        # 4. 권한 확인 (멤버십 캐시) 후 방 스탬프(마지막 메시지 / 방 정보 버전)가 그대로면 304
+        user_role = membership.role(room_uuid_obj, user_profile.id)
+        stamp = versions.room_stamp(room_uuid_obj)
+        etag = None
+        if stamp is not None:
+            etag = versions.make_etag(
+                "messages", room_uuid, user_profile.id, user_role, stamp, sorted(request.GET.items())
+            )
+        if user_role is not None:
+            not_modified = versions.not_modified(request, etag, "room_messages")
+            if not_modified is not None:
+                return not_modified
+
+        # 5. 채팅방 조회
         try:
             room = ChatRoom.objects.select_related('admin__user').get(room_uuid=room_uuid_obj)
         except ChatRoom.DoesNotExist:
@@ -610,11 +613,10 @@ def get_room_messages(request, room_uuid):
                 "message": "존재하지 않는 채팅방입니다."
             }, status=404)
 
-        # 5. 권한 확인 (방장이거나 참가자여야 함)
-        is_admin = room.admin == user_profile
-        is_participant = user_profile in room.participants.all()
+        # 권한 확인 (방장이거나 참가자여야 함)
+        is_admin = (user_role == membership.ROLE_ADMIN)
         
-        if not (is_admin or is_participant):
+        if user_role is None:
             return JsonResponse({
                 "result": "error",
                 "message": "채팅방에 참여 권한이 없습니다."
@@ -622,43 +624,136 @@ def get_room_messages(request, room_uuid):
 
         # 6. 페이지네이션 파라미터
         page = int(request.GET.get('page', 1))
-        limit = min(int(request.GET.get('limit', 50)), 100)  # 최대 100개로 제한
+        limit = min(int(request.GET.get('limit', 50)), MAX_LIMIT)  # 최대 100개로 제한
+        before = request.GET.get('before')
+        after = request.GET.get('after')
 
         print(f"[API] 권한 확인 완료 - 방: {room.room_name}, 페이지: {page}, 제한: {limit}")
 
-        # 7. 🎯 해당 채팅방의 메시지만 조회 (최신순) - AI 채팅 포함
-        messages_queryset = Message.objects.filter(room=room)\
-            .select_related('sender__user')\
-            .order_by('-created_at')
-        
-        total_count = messages_queryset.count()
-        
-        # 페이지네이션 적용
-        paginator = Paginator(messages_queryset, limit)
-        
-        try:
-            page_obj = paginator.get_page(page)
-        except:
-            return JsonResponse({
-                "result": "error",
-                "message": "잘못된 페이지 번호입니다."
-            }, status=400)
+        # 7. before/after 커서가 있으면 keyset 페이지네이션 (COUNT/OFFSET 없이 깊이와 무관하게 일정)
+        #    커서가 없으면 page 방식: 첫 페이지는 방별 최근 메시지 스트림(Redis)에서 응답, 나머지 페이지는 DB 조회
+        use_stream = (
+            page == 1
+            and getattr(settings, 'CHAT_MESSAGE_CACHE_ENABLED', True)
+            and limit <= getattr(settings, 'CHAT_MESSAGE_STREAM_MAXLEN', 200)
+        )
+        if before is not None or after is not None:
+            try:
+                rows, has_more = keyset_page(
+                    Message.objects.filter(room=room).select_related('sender__user'),
+                    limit, before=before, after=after
+                )
+            except ValueError:
+                return JsonResponse({
+                    "result": "error",
+                    "message": "잘못된 커서입니다."
+                }, status=400)
+
+            message_list = [
+                {
+                    "id": msg.id,
+                    "content": msg.content,
+                    "sender_username": msg.sender.user.username,
+                    "sender_id": msg.sender.id,
+                    "created_at": msg.created_at.isoformat(),
+                    "is_self": msg.sender.id == user_profile.id
+                }
+                for msg in rows
+            ]
+            cursors = page_cursors(message_list)
+            pagination = {
+                "limit": limit,
+                # 커서 메시지 자체가 반대 방향에 있으므로 반대쪽은 항상 True
+                "has_older": has_more if after is None else True,
+                "has_newer": has_more if after is not None else True,
+                # 빈 페이지면 받은 커서를 그대로 돌려줌 (새 메시지 폴링 등)
+                "before_cursor": cursors["before_cursor"] or before,
+                "after_cursor": cursors["after_cursor"] or after,
+                "total": None,
+            }
+            # 전체 개수는 요청할 때만 (스트림 메타의 근사치, 없으면 DB COUNT)
+            if request.GET.get('include_total') == '1':
+                total = message_stream.approximate_total(room.room_uuid)
+                if total is None:
+                    total = Message.objects.filter(room=room).count()
+                pagination["total"] = total
+            total_count = pagination["total"]
+        elif use_stream:
+            cached = message_stream.recent_page(room.room_uuid, limit)
+            if cached is not None:
+                metrics.inc("message_cache_hits_total")
+            else:
+                metrics.inc("message_cache_misses_total")
+                cached = message_stream.warm(room.room_uuid, limit)
+            recent_messages, total_count = cached
+
+            num_pages = max(1, -(-total_count // limit))
+            pagination = {
+                "total": total_count,
+                "page": 1,
+                "limit": limit,
+                "has_next": num_pages > 1,
+                "has_previous": False,
+                "num_pages": num_pages
+            }
+            message_list = [
+                {
+                    "id": msg["id"],
+                    "content": msg["content"],
+                    "sender_username": msg["username"],
+                    "sender_id": msg["sender_id"],
+                    "created_at": msg["created_at"],
+                    "is_self": msg["sender_id"] == user_profile.id
+                }
+                for msg in recent_messages
+            ]
+        else:
+            # 🎯 해당 채팅방의 메시지만 조회 (최신순) - AI 채팅 포함
+            messages_queryset = Message.objects.filter(room=room)\
+                .select_related('sender__user')\
+                .order_by('-created_at', '-id')
+            
+            total_count = messages_queryset.count()
+            
+            # 페이지네이션 적용
+            paginator = Paginator(messages_queryset, limit)
+            
+            try:
+                page_obj = paginator.get_page(page)
+            except:
+                return JsonResponse({
+                    "result": "error",
+                    "message": "잘못된 페이지 번호입니다."
+                }, status=400)
+
+            pagination = {
+                "total": total_count,
+                "page": page,
+                "limit": limit,
+                "has_next": page_obj.has_next(),
+                "has_previous": page_obj.has_previous(),
+                "num_pages": paginator.num_pages
+            }
 
-        # 8. 응답 데이터 구성 (채팅 순서대로 정렬)
-        message_list = []
-        for msg in reversed(page_obj.object_list):  # 오래된 것부터 (채팅 순서)
-            message_list.append({
-                "id": msg.id,
-                "content": msg.content,
-                "sender_username": msg.sender.user.username,
-                "sender_id": msg.sender.id,
-                "created_at": msg.created_at.isoformat(),
-                "is_self": msg.sender.id == user_profile.id
-            })
+            # 8. 응답 데이터 구성 (채팅 순서대로 정렬)
+            message_list = []
+            for msg in reversed(page_obj.object_list):  # 오래된 것부터 (채팅 순서)
+                message_list.append({
+                    "id": msg.id,
+                    "content": msg.content,
+                    "sender_username": msg.sender.user.username,
+                    "sender_id": msg.sender.id,
+                    "created_at": msg.created_at.isoformat(),
+                    "is_self": msg.sender.id == user_profile.id
+                })
+
+        if before is None and after is None:
+            # page 방식 응답에도 커서를 붙여 다음 요청부터 before/after로 이어갈 수 있게 함
+            pagination.update(page_cursors(message_list))
 
         print(f"[API] ✅ 메시지 조회 완료 - {len(message_list)}개 (총 {total_count}개)")
 
-        return JsonResponse({
+        return versions.with_etag(JsonResponse({
             "result": "success",
             "messages": message_list,
             "room_info": {
@@ -668,15 +763,8 @@ def get_room_messages(request, room_uuid):
                 "is_admin": is_admin,
                 "participant_count": room.participants.count()
             },
-            "pagination": {
-                "total": total_count,
-                "page": page,
-                "limit": limit,
-                "has_next": page_obj.has_next(),
-                "has_previous": page_obj.has_previous(),
-                "num_pages": paginator.num_pages
-            }
-        })
+            "pagination": pagination
+        }), etag)
 
     except Exception as e:
         print(f"[ERROR] 메시지 조회 API 실패: {e}")
@@ -685,4 +773,43 @@ def get_room_messages(request, room_uuid):
         return JsonResponse({
             "result": "error",
             "message": "서버 내부 오류가 발생했습니다."
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+
+@csrf_exempt
+@require_POST
+@login_required
+def mark_room_read(request, room_uuid):
+    """방의 현재 메시지까지 읽음 처리 (안 읽은 메시지 수 0으로)"""
+    try:
+        room_uuid_obj = uuid.UUID(room_uuid)
+    except ValueError:
+        return JsonResponse({"error": "Invalid UUID format"}, status=400)
+
+    user_profile = request.profile
+
+    if not membership.is_member(room_uuid_obj, user_profile.id):
+        return JsonResponse({"error": "Permission denied"}, status=403)
+
+    unread.mark_read(room_uuid_obj, user_profile.id)
+    return JsonResponse({
+        "result": "success",
+        "room_uuid": str(room_uuid_obj),
+        "unread_count": 0
+    })
+
+
+@require_GET
+@login_required
+def get_metrics(request):
+    """이 워커 프로세스의 WebSocket/캐시 메트릭 스냅샷 (스태프 전용)"""
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Permission denied"}, status=403)
+    return JsonResponse({
+        "result": "success",
+        "metrics": metrics.snapshot(),
+        "ratios": {
+            "message_cache_hit": metrics.ratio("message_cache_hits_total", "message_cache_misses_total"),
+            "http_etag_hit": metrics.ratio("http_etag_hits_total", "http_etag_misses_total"),
+        },
+    })
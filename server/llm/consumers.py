@@ -1,16 +1,25 @@
-import json
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from .models import AiChatSession, AiChatMessage
 from chat.models import ChatRoom
+from chat import membership
 from login.models import UserProfile
 from .services import get_ai_response 
+from chat.frames import chat_event, select_frame
+from chat.codecs import CodecMixin, FrameDecodeError
+from chat.outbound import OutboundQueueMixin
+from chat.heartbeat import HeartbeatMixin, HEARTBEAT_TYPES
+from chat.drain import DrainMixin
+from chat import ratelimit
 
 User = get_user_model()
 
-class AiChatConsumer(AsyncWebsocketConsumer): 
+class AiChatConsumer(DrainMixin, HeartbeatMixin, CodecMixin, OutboundQueueMixin, AsyncWebsocketConsumer): 
+    # 생성 중인 AI 응답 수 (drain 시 끝날 때까지 연결 유지)
+    _ai_pending = 0
+
     async def connect(self):
         try:
             print(f"\n[AI_DEBUG] ========== AI WebSocket 연결 시도 ==========")
@@ -34,8 +43,8 @@ class AiChatConsumer(AsyncWebsocketConsumer):
                 await self.close(code=4002)
                 return
             
-            # 3. 사용자 프로필 가져오기
-            self.user_profile = await self._get_user_profile(self.user)
+            # 3. 사용자 프로필 가져오기 (ProfileScopeMiddleware가 연결 시 캐시에서 조회, 없으면 DB)
+            self.user_profile = self.scope.get('profile') or await self._get_user_profile(self.user)
             if not self.user_profile:
                 print(f"[AI_ERROR] UserProfile 가져오기 실패")
                 await self.close(code=4001)
@@ -75,7 +84,7 @@ class AiChatConsumer(AsyncWebsocketConsumer):
             self.room_group_name = f"chat_{self.room.room_uuid}"
             
             await self.channel_layer.group_add(self.ai_group_name, self.channel_name)
-            await self.accept()
+            await self.accept_with_codec()
             
             print(f"[AI_SUCCESS] ✅ AI WebSocket 연결 성공: {self.username} → AI Session {self.session_id}")
             
@@ -91,8 +100,7 @@ class AiChatConsumer(AsyncWebsocketConsumer):
                 print(f"[AI_WARNING] ⚠️ WebSocket 연결 상태 불안정, 히스토리 전송 건너뜀")
             
             # 9. AI 입장 메시지 전송 (AI 그룹에만)
-            await self.channel_layer.group_send(
-                self.ai_group_name,
+            await self._send_to_ai_group(
                 {
                     "type": "ai_joined",
                     "username": self.ai_username,
@@ -119,11 +127,11 @@ class AiChatConsumer(AsyncWebsocketConsumer):
             print(f"[AI_ERROR] AI WebSocket 연결 종료 중 오류: {e}")
 
     async def receive(self, text_data=None, bytes_data=None):
-        if not text_data:
+        if not text_data and not bytes_data:
             return
 
         try:
-            data = json.loads(text_data)
+            data = self.decode_frame(text_data, bytes_data)
             message_type = data.get("type", "")
             
             print(f"[AI_DEBUG] AI 메시지 수신: type={message_type}, data={data}")
@@ -133,15 +141,17 @@ class AiChatConsumer(AsyncWebsocketConsumer):
                 await self._handle_chat_message(data)
             elif message_type == "get_message_history":
                 await self._handle_get_message_history(data)
+            elif message_type in HEARTBEAT_TYPES:
+                await self.handle_heartbeat_frame(data)
             else:
                 print(f"[AI_WARNING] 알 수 없는 메시지 타입: {message_type}")
                 
-        except json.JSONDecodeError as e:
-            print(f"[AI_ERROR] JSON 파싱 실패: {e}")
-            await self.send(text_data=json.dumps({
+        except FrameDecodeError as e:
+            print(f"[AI_ERROR] 프레임 파싱 실패: {e}")
+            await self.send_frame({
                 "type": "error",
                 "message": "잘못된 메시지 형식입니다."
-            }))
+            })
         except Exception as e:
             print(f"[AI_ERROR] 메시지 처리 실패: {e}")
             import traceback
@@ -156,10 +166,19 @@ class AiChatConsumer(AsyncWebsocketConsumer):
 
         # 메시지 길이 제한
         if len(message) > 2000:
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 "type": "error",
                 "message": "메시지가 너무 깁니다. (최대 2000자)"
-            }))
+            })
+            return
+
+        # OpenAI 호출 비용 보호: 사용자별 → 세션별 순으로 요청 제한
+        decision = await ratelimit.ahit_all(
+            ("ws_ai_message:user", self.user_profile.id),
+            ("ws_ai_message:session", self.session_id),
+        )
+        if not decision.allowed:
+            await self.send_frame(ratelimit.rate_limited_frame(decision))
             return
 
         print(f"[AI_DEBUG] 사용자 메시지 처리: {self.username} → {message[:50]}...")
@@ -168,31 +187,28 @@ class AiChatConsumer(AsyncWebsocketConsumer):
         stored_message = await self._save_ai_message(self.ai_session, self.user_profile, message, is_ai=False)
         
         if not stored_message:
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 "type": "error",
                 "message": "메시지 저장 중 오류가 발생했습니다."
-            }))
+            })
             return
         
-        # 2. 사용자 메시지를 AI 그룹에만 브로드캐스트
-        await self.channel_layer.group_send(
-            self.ai_group_name,
-            {
+        # 2. 사용자 메시지를 AI 그룹에만 브로드캐스트 (프레임은 한 번만 직렬화)
+        await self._send_to_ai_group(
+            chat_event({
                 "type": "chat_message",
                 "message": message,
                 "username": self.username,
                 "message_id": stored_message.id,
                 "timestamp": stored_message.created_at.isoformat(),
-                "sender_id": self.user_profile.id,
                 "is_ai": False,
-            }
+            }, self.user_profile.id)
         )
         
         print(f"[AI_DEBUG] 사용자 메시지 브로드캐스트 완료 (AI 그룹만)")
         
         # 3. AI 처리 시작 표시 (AI 그룹에만)
-        await self.channel_layer.group_send(
-            self.ai_group_name,
+        await self._send_to_ai_group(
             {
                 "type": "ai_thinking",
                 "username": self.ai_username,
@@ -221,7 +237,7 @@ class AiChatConsumer(AsyncWebsocketConsumer):
             has_previous = page > 1
             
             # 히스토리 응답 전송
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 "type": "message_history",
                 "messages": history_messages,
                 "pagination": {
@@ -232,7 +248,7 @@ class AiChatConsumer(AsyncWebsocketConsumer):
                     "has_previous": has_previous
                 },
                 "session_id": self.session_id
-            }))
+            })
             
             print(f"[AI_DEBUG] 메시지 히스토리 응답 완료: {len(history_messages)}개 메시지")
             
@@ -241,13 +257,17 @@ class AiChatConsumer(AsyncWebsocketConsumer):
             import traceback
             traceback.print_exc()
             
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 "type": "error",
                 "message": "메시지 히스토리를 불러올 수 없습니다."
-            }))
+            })
+
+    def has_pending_work(self):
+        return self._ai_pending > 0
 
     async def _process_ai_request(self, user_message: str):
         """AI 응답 생성 및 전송"""
+        self._ai_pending += 1
         try:
             print(f"[AI_DEBUG] AI 응답 생성 시작...")
             
@@ -283,18 +303,16 @@ class AiChatConsumer(AsyncWebsocketConsumer):
             if not stored_response:
                 raise Exception("AI 응답 저장 실패")
             
-            # AI 응답을 AI 그룹에만 브로드캐스트
-            await self.channel_layer.group_send(
-                self.ai_group_name,
-                {
+            # AI 응답을 AI 그룹에만 브로드캐스트 (프레임은 한 번만 직렬화)
+            await self._send_to_ai_group(
+                chat_event({
                     "type": "chat_message",
                     "message": ai_text,
                     "username": self.ai_username,
                     "message_id": stored_response.id,
                     "timestamp": stored_response.created_at.isoformat(),
-                    "sender_id": self.ai_profile.id,
                     "is_ai": True,
-                }
+                }, self.ai_profile.id)
             )
             
             print(f"[AI_DEBUG] AI 응답 브로드캐스트 완료 (AI 그룹만)")
@@ -305,36 +323,25 @@ class AiChatConsumer(AsyncWebsocketConsumer):
             traceback.print_exc()
             
             # 에러 메시지 전송 (AI 그룹에만)
-            await self.channel_layer.group_send(
-                self.ai_group_name,
+            await self._send_to_ai_group(
                 {
                     "type": "ai_error",
                     "message": "AI 응답 생성 중 오류가 발생했습니다.",
                 }
             )
+        finally:
+            self._ai_pending -= 1
+
+    async def _send_to_ai_group(self, event):
+        """AI 그룹 브로드캐스트 (멀티플렉스 연결이 구독을 찾을 수 있도록 그룹 이름을 함께 보냄)"""
+        await self.channel_layer.group_send(self.ai_group_name, dict(event, group=self.ai_group_name))
 
 
     # ==================== WebSocket 이벤트 핸들러들 ====================
     
     async def chat_message(self, event):
-        """채팅 메시지 전송 - AI와 사용자 메시지 모두 처리"""
-        # 현재 사용자가 메시지 발송자인지 확인
-        is_self = event.get("sender_id") == self.user_profile.id
-        is_ai = event.get("is_ai", False)
-        
-        message_data = {
-            "type": "chat_message",
-            "message": event.get("message"),
-            "username": event.get("username"),
-            "message_id": event.get("message_id"),
-            "timestamp": event.get("timestamp"),
-            "is_self": is_self,
-            "is_ai": is_ai,
-        }
-        
-        print(f"[AI_DEBUG] 메시지 전송: {self.username} ← {event.get('username')}: {event.get('message', '')[:50]}...")
-        
-        await self.send(text_data=json.dumps(message_data))
+        """채팅 메시지 전송 - AI와 사용자 메시지 모두 처리 (미리 직렬화된 프레임 전송)"""
+        await self.send_encoded(select_frame(event, self.user_profile.id, self.codec.name))
 
     async def ai_joined(self, event):
         """AI 참여 알림"""
@@ -347,7 +354,7 @@ class AiChatConsumer(AsyncWebsocketConsumer):
         
         print(f"[AI_DEBUG] AI 참여 알림: {join_data}")
         
-        await self.send(text_data=json.dumps(join_data))
+        await self.send_frame(join_data)
 
     async def ai_thinking(self, event):
         """AI 생각 중 표시"""
@@ -358,7 +365,7 @@ class AiChatConsumer(AsyncWebsocketConsumer):
         
         print(f"[AI_DEBUG] AI 생각 중...")
         
-        await self.send(text_data=json.dumps(thinking_data))
+        await self.send_frame(thinking_data)
 
     async def ai_error(self, event):
         """AI 에러 알림"""
@@ -369,7 +376,7 @@ class AiChatConsumer(AsyncWebsocketConsumer):
         
         print(f"[AI_DEBUG] AI 에러 알림: {event.get('message')}")
         
-        await self.send(text_data=json.dumps(error_data))
+        await self.send_frame(error_data)
 
     # ==================== 데이터베이스 접근 함수들 ====================
     
@@ -404,9 +411,10 @@ class AiChatConsumer(AsyncWebsocketConsumer):
             
             room = session.base_room
             
-            # 참여 권한 확인: 방장이거나 참가자여야 함
-            is_admin = room.admin == user_profile
-            is_participant = user_profile in room.participants.all()
+            # 참여 권한 확인: 방장이거나 참가자여야 함 (멤버십 인덱스 사용)
+            user_role = membership.role(room.room_uuid, user_profile.id)
+            is_admin = user_role == membership.ROLE_ADMIN
+            is_participant = user_role is not None
             
             print(f"[AI_DEBUG] 권한 확인 - 방장: {is_admin}, 참가자: {is_participant}")
             
@@ -585,7 +593,7 @@ class AiChatConsumer(AsyncWebsocketConsumer):
                             "from_history": True  # 히스토리에서 온 메시지임을 표시
                         }
                         
-                        await self.send(text_data=json.dumps(single_message))
+                        await self.send_frame(single_message)
                         print(f"[AI_DEBUG] ✅ 히스토리 메시지 전송 ({i+1}/{len(history_messages)}): {msg['username']} - {msg['message'][:20]}...")
                         
                         # 메시지 간 짧은 딜레이 (프론트엔드 처리 시간 확보)
@@ -602,7 +610,7 @@ class AiChatConsumer(AsyncWebsocketConsumer):
                     "total_messages": len(history_messages),
                     "session_id": self.session_id
                 }
-                await self.send(text_data=json.dumps(completion_payload))
+                await self.send_frame(completion_payload)
                 print(f"[AI_DEBUG] 🎉 메시지 히스토리 전송 완료: {len(history_messages)}개")
                 
             else:
@@ -614,7 +622,7 @@ class AiChatConsumer(AsyncWebsocketConsumer):
                     "total_messages": 0,
                     "session_id": self.session_id
                 }
-                await self.send(text_data=json.dumps(empty_payload))
+                await self.send_frame(empty_payload)
                 print(f"[AI_DEBUG] 📤 빈 히스토리 전송 완료")
                 
         except Exception as e:
@@ -624,11 +632,11 @@ class AiChatConsumer(AsyncWebsocketConsumer):
             
             # 에러 시에도 완료 알림 전송 (무한 로딩 방지)
             try:
-                await self.send(text_data=json.dumps({
+                await self.send_frame({
                     "type": "history_complete", 
                     "total_messages": 0,
                     "error": "히스토리 로드 중 오류가 발생했습니다."
-                }))
+                })
             except Exception as send_error:
                 print(f"[AI_ERROR] 에러 메시지 전송도 실패: {send_error}")
 
@@ -0,0 +1,58 @@
+from django.urls import reverse
+
+from chat.test_utils import SEED_MESSAGES, EndpointBudgetTestCase
+
+from .models import AiChatMessage, AiChatSession
+
+
+class LlmEndpointBudgetTests(EndpointBudgetTestCase):
+    """llm/urls.py 엔드포인트별 쿼리 수 / 응답 시간 회귀 테스트"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # 모든 방에 활성 AI 세션 하나씩
+        sessions = AiChatSession.objects.bulk_create(
+            AiChatSession(base_room=room, session_id=f"suite-{room.room_uuid}", is_active=True)
+            for room in cls.small_rooms + cls.large_rooms
+        )
+        by_room = {session.base_room_id: session for session in sessions}
+        cls.quiet_session = by_room[cls.small_rooms[1].room_uuid]
+        cls.busy_session = by_room[cls.large_rooms[1].room_uuid]
+        for session, member, count in (
+            (cls.quiet_session, cls.small_member, 120),
+            (cls.busy_session, cls.large_member, SEED_MESSAGES),
+        ):
+            AiChatMessage.objects.bulk_create(
+                (
+                    AiChatMessage(session=session, sender=member, content=f"seed question {i}", is_ai_message=i % 2 == 1)
+                    for i in range(count)
+                ),
+                batch_size=2000,
+            )
+
+    def test_start_session(self):
+        result = self.request(
+            self.large_member, "post", reverse("llm:start_ai_session"),
+            {"room_uuid": str(self.large_rooms[2].room_uuid)},
+        )
+        self.assertWithinBudget(result, queries=7, ms=250)
+
+    def test_sessions(self):
+        path = reverse("llm:get_ai_sessions")
+        small = self.request(self.small_member, "get", path)
+        large = self.request(self.large_member, "get", path)
+        self.assertQueriesDoNotScale(small, large)
+        self.assertWithinBudget(large, queries=6, ms=250)
+
+    def test_session_messages(self):
+        small = self.request(
+            self.small_member, "get", reverse("llm:get_ai_messages", args=[self.quiet_session.session_id]),
+            {"page": 2, "limit": 50},
+        )
+        large = self.request(
+            self.large_member, "get", reverse("llm:get_ai_messages", args=[self.busy_session.session_id]),
+            {"page": 2, "limit": 50},
+        )
+        self.assertQueriesDoNotScale(small, large)
+        self.assertWithinBudget(large, queries=8, ms=250)
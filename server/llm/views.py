@@ -6,11 +6,13 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from .models import AiChatSession, AiChatMessage
 from chat.models import ChatRoom
-from login.models import UserProfile
+from chat import membership
+from chat.ratelimit import rate_limit
 
 @csrf_exempt
 @require_POST
 @login_required
+@rate_limit('start_ai_session')
 def start_ai_session(request):
     """AI 채팅 세션 시작"""
     try:
@@ -34,11 +36,7 @@ def start_ai_session(request):
             return JsonResponse({"error": "Invalid request body"}, status=400)
         
         # 2. 사용자 프로필 가져오기
-        try:
-            user_profile = UserProfile.objects.get(user=request.user)
-        except UserProfile.DoesNotExist:
-            print(f"[AI_API ERROR] UserProfile이 존재하지 않음")
-            return JsonResponse({"error": "User profile not found"}, status=404)
+        user_profile = request.profile
         
         # 3. ChatRoom 조회
         try:
@@ -56,10 +54,11 @@ def start_ai_session(request):
             return JsonResponse({"error": "Chat room not found"}, status=404)
         
         # 4. 권한 확인: 방장이거나 참가자여야 함
-        is_admin = base_room.admin == user_profile
-        is_participant = user_profile in base_room.participants.all()
+        user_role = membership.role(base_room.room_uuid, user_profile.id)
+        is_admin = user_role == membership.ROLE_ADMIN
+        is_participant = user_role is not None
         
-        if not (is_admin or is_participant):
+        if user_role is None:
             print(f"[AI_API ERROR] 채팅방 참여 권한 없음")
             return JsonResponse({"error": "No permission to access this room"}, status=403)
         
@@ -113,10 +112,7 @@ def get_ai_sessions(request):
         print(f"[AI_API] 사용자: {request.user.username}")
         
         # 사용자 프로필 가져오기
-        try:
-            user_profile = UserProfile.objects.get(user=request.user)
-        except UserProfile.DoesNotExist:
-            return JsonResponse({"sessions": [], "total_count": 0})
+        user_profile = request.profile
         
         # 사용자가 참여한 방의 활성 AI 세션들 가져오기
         admin_rooms = ChatRoom.objects.filter(admin=user_profile)
@@ -161,10 +157,7 @@ def get_ai_messages(request, session_id):
         print(f"\n[AI_API] ========== AI 메시지 조회 ==========\nsession_id: {session_id}")
         
         # 1. 사용자 프로필 검증
-        try:
-            user_profile = UserProfile.objects.get(user=request.user)
-        except UserProfile.DoesNotExist:
-            return JsonResponse({"error": "User profile not found"}, status=404)
+        user_profile = request.profile
         
         # 2. AI 세션 조회 및 권한 확인
         try:
@@ -174,11 +167,7 @@ def get_ai_messages(request, session_id):
             )
             
             # 권한 확인: 방장이거나 참가자여야 함
-            room = session.base_room
-            is_admin = room.admin == user_profile
-            is_participant = user_profile in room.participants.all()
-            
-            if not (is_admin or is_participant):
+            if not membership.is_member(session.base_room_id, user_profile.id):
                 return JsonResponse({"error": "No permission to access this session"}, status=403)
                 
         except AiChatSession.DoesNotExist:
@@ -0,0 +1,36 @@
+"""
+요청/연결 단위 UserProfile 주입
+
+- HTTP: ProfileMiddleware (AuthenticationMiddleware 다음) → request.profile
+  처음 접근할 때 profile_cache에서 한 번 조회한다 (프로필을 쓰지 않는 요청은 비용 없음).
+  비로그인 요청이면 None으로 평가되므로, 뷰는 인증 확인 후에 사용한다.
+- WebSocket: ProfileScopeMiddleware (AuthMiddlewareStack 안쪽) → scope['profile']
+  로그인 사용자면 연결 시 한 번 조회, 아니면 None.
+"""
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from . import profile_cache
+
+
+class ProfileMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: profile_cache.get_profile(request.user))
+        return self.get_response(request)
+
+
+class ProfileScopeMiddleware(BaseMiddleware):
+    async def __call__(self, scope, receive, send):
+        user = scope.get("user")
+        profile = None
+        if user is not None and user.is_authenticated:
+            # 로컬 LRU에 있으면 스레드 전환 없이 바로
+            profile = profile_cache.get_local(user)
+            if profile is None:
+                profile = await database_sync_to_async(profile_cache.get_profile)(user)
+        scope = dict(scope, profile=profile)
+        return await super().__call__(scope, receive, send)
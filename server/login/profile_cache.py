@@ -0,0 +1,143 @@
+"""
+User → UserProfile 조회 캐시 (프로세스 로컬 LRU + Redis 2단계)
+
+거의 모든 뷰와 WebSocket 연결이 UserProfile.objects.get(user=...)로 시작하므로
+요청/연결마다 쿼리 하나가 나간다. 프로필 필드 값을 캐시해 두고 매번 새 인스턴스로 복원한다.
+
+- 1단계: 프로세스 로컬 LRU (PROFILE_CACHE_LOCAL_SIZE개, PROFILE_CACHE_LOCAL_TTL초)
+- 2단계: Redis profile:user:<user_id> (PROFILE_CACHE_TTL초)
+- 둘 다 없으면 DB get_or_create 후 양쪽에 채움
+
+UserProfile이 저장/삭제되면 시그널(login.signals)에서 Redis 키와 이 프로세스의 LRU 항목을 지운다.
+다른 프로세스의 LRU는 로컬 TTL 동안 이전 값을 볼 수 있다.
+github_access_token은 캐시에 넣지 않는다 (접근하면 Django가 DB에서 지연 로딩).
+"""
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import redis
+from django.conf import settings
+
+from chat.redis_utils import redis_client
+from .models import UserProfile
+
+PROFILE_KEY = "profile:user:{}"
+
+# 캐시하지 않는 필드 (deferred로 남아 접근 시 DB에서 읽음)
+EXCLUDED_FIELDS = {"github_access_token"}
+CACHED_FIELDS = [
+    field for field in UserProfile._meta.concrete_fields if field.name not in EXCLUDED_FIELDS
+]
+CACHED_ATTNAMES = [field.attname for field in CACHED_FIELDS]
+
+_lock = threading.Lock()
+_local = OrderedDict()
+
+
+def _local_size():
+    return getattr(settings, 'PROFILE_CACHE_LOCAL_SIZE', 1024)
+
+
+def _local_ttl():
+    return getattr(settings, 'PROFILE_CACHE_LOCAL_TTL', 30)
+
+
+def _redis_ttl():
+    return getattr(settings, 'PROFILE_CACHE_TTL', 600)
+
+
+def _encode(value):
+    """JSON 저장용 (datetime은 마이크로초까지 유지, UUID는 문자열)"""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _build(values, user=None):
+    """캐시된 필드 값 → 새 UserProfile 인스턴스 (user를 주면 FK 캐시로 붙여 추가 쿼리 없음)"""
+    profile = UserProfile.from_db('default', CACHED_ATTNAMES, values)
+    if user is not None and user.pk == profile.user_id:
+        profile.user = user
+    return profile
+
+
+# ==================== 로컬 LRU ====================
+
+def get_local(user, now=None):
+    """로컬 LRU에서만 조회 (없거나 만료면 None). async 코드에서 스레드 전환 없이 쓸 수 있음"""
+    now = time.monotonic() if now is None else now
+    with _lock:
+        entry = _local.get(user.pk)
+        if entry is None:
+            return None
+        expires_at, values = entry
+        if expires_at <= now:
+            del _local[user.pk]
+            return None
+        _local.move_to_end(user.pk)
+    return _build(values, user)
+
+
+def _put_local(user_id, values):
+    with _lock:
+        _local[user_id] = (time.monotonic() + _local_ttl(), values)
+        _local.move_to_end(user_id)
+        while len(_local) > _local_size():
+            _local.popitem(last=False)
+
+
+# ==================== 조회 ====================
+
+def get_profile(user):
+    """
+    로그인 사용자의 UserProfile (없으면 생성). 비로그인이면 None
+    로컬 LRU → Redis → DB 순서로 찾는다
+    """
+    if user is None or not user.is_authenticated:
+        return None
+    profile = get_local(user)
+    if profile is not None:
+        return profile
+
+    key = PROFILE_KEY.format(user.pk)
+    try:
+        cached = redis_client.get(key)
+    except redis.RedisError as e:
+        print(f"[WARNING] 프로필 캐시 조회 실패: {e}")
+        cached = None
+    if cached is not None:
+        values = [field.to_python(value) for field, value in zip(CACHED_FIELDS, json.loads(cached))]
+        _put_local(user.pk, values)
+        return _build(values, user)
+
+    profile, created = UserProfile.objects.get_or_create(user=user)
+    if created:
+        print(f"[DEBUG] 새 UserProfile 생성: {user.username}")
+    values = [getattr(profile, attname) for attname in CACHED_ATTNAMES]
+    _put_local(user.pk, values)
+    try:
+        redis_client.set(key, json.dumps([_encode(value) for value in values]), ex=_redis_ttl())
+    except redis.RedisError as e:
+        print(f"[WARNING] 프로필 캐시 저장 실패: {e}")
+    profile.user = user
+    return profile
+
+
+def invalidate(user_id):
+    """프로필 저장/삭제 후 호출 (이 프로세스의 LRU + Redis)"""
+    with _lock:
+        _local.pop(user_id, None)
+    try:
+        redis_client.delete(PROFILE_KEY.format(user_id))
+    except redis.RedisError as e:
+        print(f"[WARNING] 프로필 캐시 삭제 실패: {e}")
+
+
+def clear_local():
+    with _lock:
+        _local.clear()
@@ -5,7 +5,9 @@ from allauth.socialaccount.signals import pre_social_login, social_account_added
 from allauth.socialaccount.models import SocialAccount, SocialToken
 from .models import UserProfile, GithubFriend
 import requests
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from . import profile_cache
 
 @receiver(pre_social_login)
 def handle_pre_social_login(sender, request, sociallogin, **kwargs):
@@ -220,4 +222,11 @@ def handle_user_post_save(sender, instance, created, **kwargs):
                 print(f"[DEBUG] No GitHub social account found")
                 
         except Exception as e:
-            print(f"[ERROR] post_save handler: {e}")
\ No newline at end of file
+            print(f"[ERROR] post_save handler: {e}")
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_profile_cache(sender, instance, **kwargs):
+    """프로필이 바뀌거나 삭제되면 request.profile 캐시 삭제 (커밋 후)"""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: profile_cache.invalidate(user_id))
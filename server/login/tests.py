@@ -1,3 +1,44 @@
-from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from chat.test_utils import EndpointBudgetTestCase
+
+from . import profile_cache
+from .models import UserProfile
+
+
+class LoginEndpointBudgetTests(EndpointBudgetTestCase):
+    """login/urls.py 엔드포인트별 쿼리 수 / 응답 시간 회귀 테스트 (home은 프론트 빌드의 index.html을 렌더링하므로 제외)"""
+
+    def test_current_user(self):
+        path = reverse("login:current_user")
+        small = self.request(self.small_member, "get", path)
+        large = self.request(self.large_member, "get", path)
+        self.assertQueriesDoNotScale(small, large)
+        self.assertWithinBudget(large, queries=7, ms=500)
+
+    def test_current_user_not_modified(self):
+        path = reverse("login:current_user")
+        small = self.conditional(self.small_member, path)
+        large = self.conditional(self.large_member, path)
+        self.assertQueriesDoNotScale(small, large)
+        self.assertWithinBudget(large, queries=5, ms=100, status=304)
+
+    def test_profile_cache(self):
+        user = self.small_member.user
+        profile_cache.invalidate(user.pk)
+        with self.assertNumQueries(1):
+            profile_cache.get_profile(user)
+        # 로컬 LRU → Redis 순서로 쿼리 없이 복원, 토큰은 캐시하지 않음
+        with self.assertNumQueries(0):
+            profile = profile_cache.get_profile(user)
+            profile_cache.clear_local()
+            from_redis = profile_cache.get_profile(user)
+        self.assertEqual((from_redis.pk, from_redis.uuid, from_redis.created_at), (profile.pk, profile.uuid, profile.created_at))
+        self.assertIn("github_access_token", from_redis.get_deferred_fields())
+
+        # 저장하면 커밋 후 무효화
+        with self.captureOnCommitCallbacks(execute=True):
+            stored = UserProfile.objects.get(pk=profile.pk)
+            stored.github_bio = "updated"
+            stored.save()
+        self.assertEqual(profile_cache.get_profile(user).github_bio, "updated")
@@ -13,41 +13,9 @@ def current_user(request):
     if not request.user.is_authenticated:
         return JsonResponse({'is_authenticated': False}, status=401)
     
-    try:
-        profile = UserProfile.objects.get(user=request.user)
-    except UserProfile.DoesNotExist:
-        profile = UserProfile.objects.create(user=request.user)
-
-    # 채팅방 목록 가져오기
-    try:
-        from chat.models import ChatRoom
-        
-        # 방장인 방들
-        admin_rooms = ChatRoom.objects.filter(admin=profile)
-        
-        # 참여자인 방들  
-        participant_rooms = ChatRoom.objects.filter(participants=profile)
-        
-        # 모든 방 통합 (중복 제거)
-        all_rooms = (admin_rooms | participant_rooms).distinct().order_by('-created_at')
-        
-        rooms_data = []
-        for room in all_rooms:
-            rooms_data.append({
-                "room_uuid": str(room.pk),  # room_uuid가 primary_key
-                "room_name": room.room_name,
-                "description": room.description,
-                "is_admin": room.admin == profile,
-                "admin_username": room.admin.user.username,  # user.username → user.user.username
-                "participant_count": room.participants.count() + 1,
-                "created_at": room.created_at.isoformat(),
-            })
-            
-    except Exception as e:
-        print(f"[ERROR] getting rooms in current_user: {e}")
-        rooms_data = []
+    profile = request.profile
 
-    response_data = {
+    user_data = {
         # 기본 User 정보
         'uuid': str(profile.uuid) if hasattr(profile, 'uuid') else None,
         'username': request.user.username,
@@ -68,13 +36,51 @@ def current_user(request):
         'github_location': profile.github_location or '',
         'github_followers': profile.github_followers or 0,
         'github_following': profile.github_following or 0,
+    }
+
+    from chat import room_queries, versions
+
+    # 프로필 정보와 방 목록 스탬프가 그대로면 방 목록 조회 없이 304
+    list_stamp = versions.room_list_stamp(profile.id)
+    etag = None
+    if list_stamp is not None:
+        etag = versions.make_etag("current_user", profile.id, user_data, list_stamp["rooms"], list_stamp["meta"])
+    not_modified = versions.not_modified(request, etag, "current_user")
+    if not_modified is not None:
+        return not_modified
+
+    # 채팅방 목록 가져오기
+    try:
+        # 방장인 방 + 참여자인 방 (쿼리 한 번, get_my_rooms와 같은 캐시), 생성 최신순
+        all_rooms = sorted(
+            room_queries.member_rooms(profile.id, use_cache=etag is None), key=lambda room: room["created_at"], reverse=True
+        )
+        
+        rooms_data = []
+        for room in all_rooms:
+            rooms_data.append({
+                "room_uuid": room["room_uuid"],  # room_uuid가 primary_key
+                "room_name": room["room_name"],
+                "description": room["description"],
+                "is_admin": room["admin_id"] == profile.id,
+                "admin_username": room["admin_username"],
+                "participant_count": room["participant_count"] + 1,
+                "created_at": room["created_at"],
+            })
+            
+    except Exception as e:
+        print(f"[ERROR] getting rooms in current_user: {e}")
+        rooms_data = []
+
+    response_data = {
+        **user_data,
         
         # 채팅방 목록
         'rooms': rooms_data,
         'rooms_count': len(rooms_data)
     }
     
-    return JsonResponse(response_data)
+    return versions.with_etag(JsonResponse(response_data), etag)
 
 @require_GET
 def user_profile(request, user_uuid):
@@ -9,12 +9,15 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 import chat.routing
 import llm.routing
+from login.middleware import ProfileScopeMiddleware
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": AuthMiddlewareStack(
-        URLRouter(
-            chat.routing.websocket_urlpatterns + llm.routing.websocket_urlpatterns
+        ProfileScopeMiddleware(
+            URLRouter(
+                chat.routing.websocket_urlpatterns + llm.routing.websocket_urlpatterns
+            )
         )
     ),
 })
\ No newline at end of file
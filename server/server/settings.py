@@ -140,6 +140,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'login.middleware.ProfileMiddleware',  # request.profile (AuthenticationMiddleware 다음)
     'allauth.account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -166,15 +167,28 @@ WSGI_APPLICATION = 'server.wsgi.application'
 ASGI_APPLICATION = 'server.asgi.application'
 
 # Channels - Redis 호스트명 수정
+# CHANNEL_REDIS_HOSTS="redis1:6379,redis2:6379" 처럼 여러 노드를 주면 그룹을 해시 링으로 나눠 담음
+CHANNEL_REDIS_HOSTS = [
+    (host.rsplit(':', 1)[0], int(host.rsplit(':', 1)[1])) if ':' in host else (host, 6379)
+    for host in (h.strip() for h in os.environ.get('CHANNEL_REDIS_HOSTS', '').split(',')) if host
+] or [(REDIS_HOST, REDIS_PORT)]
+
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'BACKEND': (
+            'chat.channel_layers.ShardedRedisChannelLayer'
+            if len(CHANNEL_REDIS_HOSTS) > 1 else 'channels_redis.core.RedisChannelLayer'
+        ),
         'CONFIG': {
-            "hosts": [(REDIS_HOST, REDIS_PORT)],
+            "hosts": CHANNEL_REDIS_HOSTS,
         },
     },
 }
 
+# 단일 프로세스 개발/벤치마크용: CHANNEL_LAYER_BACKEND=memory 이면 Redis 없이 인메모리 레이어 사용
+if os.environ.get('CHANNEL_LAYER_BACKEND', 'redis').lower() == 'memory':
+    CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -267,4 +281,116 @@ if DEBUG:
     }
 
 # OpenAI API 설정
-OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', None)
\ No newline at end of file
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', None)
+
+# 채팅 메시지 write-behind 설정 (opt-in)
+# 켜면 메시지를 임시 ID로 먼저 브로드캐스트하고, 배치 단위로 bulk_create 저장
+CHAT_WRITE_BEHIND = os.environ.get('CHAT_WRITE_BEHIND', 'False').lower() == 'true'
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('CHAT_WRITE_BEHIND_BATCH_SIZE', 100))
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('CHAT_WRITE_BEHIND_FLUSH_INTERVAL', 0.2))
+# 메시지 하나의 저장 시도 한도 (넘으면 dead letter로 옮기고 message_failed 전송)
+CHAT_WRITE_BEHIND_MAX_ATTEMPTS = int(os.environ.get('CHAT_WRITE_BEHIND_MAX_ATTEMPTS', 5))
+# 종료 시 flusher가 저장 중인 배치를 기다리는 시간(초). 지나면 그 배치를 다시 저장
+CHAT_WRITE_BEHIND_SHUTDOWN_TIMEOUT = float(os.environ.get('CHAT_WRITE_BEHIND_SHUTDOWN_TIMEOUT', 10))
+
+# 채팅방 멤버십 인덱스 (Redis Set) 캐시 유지 시간(초). 갱신이 누락된 경우 이전 멤버가 남는 최대 시간
+CHAT_MEMBERSHIP_CACHE_TTL = int(os.environ.get('CHAT_MEMBERSHIP_CACHE_TTL', 600))
+
+# 접속자(presence) heartbeat 주기(초). 3주기 동안 갱신이 없으면 끊긴 연결로 정리
+CHAT_PRESENCE_HEARTBEAT_INTERVAL = int(os.environ.get('CHAT_PRESENCE_HEARTBEAT_INTERVAL', 30))
+
+# 타이핑 표시 집계: 방별 최대 브로드캐스트 주기(초)와 입력 중 상태 만료 시간(초)
+CHAT_TYPING_EMIT_INTERVAL = float(os.environ.get('CHAT_TYPING_EMIT_INTERVAL', 0.5))
+CHAT_TYPING_TTL = float(os.environ.get('CHAT_TYPING_TTL', 5))
+
+# WebSocket 연결별 송신 큐 크기와 가득 찼을 때 정책 (drop_typing / coalesce / disconnect)
+CHAT_OUTBOUND_QUEUE_SIZE = int(os.environ.get('CHAT_OUTBOUND_QUEUE_SIZE', 256))
+CHAT_OUTBOUND_POLICY = os.environ.get('CHAT_OUTBOUND_POLICY', 'drop_typing')
+# disconnect 정책에서 사용하는 close code (클라이언트는 재접속 후 이어받기)
+CHAT_OUTBOUND_CLOSE_CODE = int(os.environ.get('CHAT_OUTBOUND_CLOSE_CODE', 4008))
+# daphne transport에 소켓으로 못 보낸 바이트가 이만큼 쌓이면 송신 큐에서 꺼내지 않음(바이트), 다시 확인하는 주기(초)
+CHAT_OUTBOUND_MAX_BUFFERED_BYTES = int(os.environ.get('CHAT_OUTBOUND_MAX_BUFFERED_BYTES', 256 * 1024))
+CHAT_OUTBOUND_DRAIN_POLL = float(os.environ.get('CHAT_OUTBOUND_DRAIN_POLL', 0.05))
+
+# 요청 제한 (토큰 버킷): 정책 이름 → (버킷 크기, 초당 충전 토큰 수)
+CHAT_RATE_LIMIT_ENABLED = os.environ.get('CHAT_RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+# X-Forwarded-For를 믿을 프록시 주소/CIDR (콤마 구분, 예: nginx 컨테이너 네트워크). 비어 있으면 REMOTE_ADDR만 사용
+CHAT_TRUSTED_PROXIES = [value for value in os.environ.get('CHAT_TRUSTED_PROXIES', '').split(',') if value.strip()]
+CHAT_RATE_LIMITS = {
+    # WebSocket 채팅 메시지: 사용자별 순간 10개, 초당 2개 / 방 전체 초당 20개
+    'ws_chat_message:user': (10, 2.0),
+    'ws_chat_message:room': (50, 20.0),
+    'ws_typing:user': (10, 5.0),
+    # AI 요청 (OpenAI 비용 보호): 사용자별 분당 6회 / 세션별 분당 10회
+    'ws_ai_message:user': (3, 0.1),
+    'ws_ai_message:session': (5, 10 / 60),
+    # REST: TOTP 추측 방지 및 쓰기 엔드포인트 보호
+    'join_room': (5, 5 / 60),
+    'generate_totp': (5, 1 / 6),
+    'create_room': (5, 5 / 60),
+    'start_ai_session': (5, 5 / 60),
+    'room_messages': (30, 5.0),
+}
+
+# 방별 최근 메시지 Redis 스트림 (재접속 재전송용): 최대 길이와 유지 시간(초)
+CHAT_MESSAGE_STREAM_MAXLEN = int(os.environ.get('CHAT_MESSAGE_STREAM_MAXLEN', 200))
+CHAT_MESSAGE_STREAM_TTL = int(os.environ.get('CHAT_MESSAGE_STREAM_TTL', 60 * 60 * 24 * 7))
+# 재접속 시 한 번에 재전송하는 최대 메시지 수 (넘으면 has_more=True)
+CHAT_RESUME_MAX_MESSAGES = int(os.environ.get('CHAT_RESUME_MAX_MESSAGES', 500))
+# 메시지 목록 첫 페이지를 스트림에서 응답할지 여부 (끄면 항상 DB 조회)
+CHAT_MESSAGE_CACHE_ENABLED = os.environ.get('CHAT_MESSAGE_CACHE_ENABLED', 'True').lower() == 'true'
+
+# 안 읽은 메시지 카운터(Redis) 유지 시간(초). 만료되면 DB의 last_read_at 기준으로 다시 계산
+CHAT_UNREAD_TTL = int(os.environ.get('CHAT_UNREAD_TTL', 60 * 60 * 24 * 30))
+
+# chat_message 재전송 중복 제거: client_msg_id 선점 키(Redis) 유지 시간(초). 지난 뒤에는 DB unique 제약으로 처리
+CHAT_DEDUPE_WINDOW = int(os.environ.get('CHAT_DEDUPE_WINDOW', 600))
+# 저장 중(pending) 선점의 유지 시간(초, 저장 도중 프로세스가 죽으면 이 시간 뒤 재전송 가능),
+# 재전송이 pending을 만났을 때 첫 요청의 결과를 기다리는 시간(초)
+CHAT_DEDUPE_PENDING_TTL = int(os.environ.get('CHAT_DEDUPE_PENDING_TTL', 15))
+CHAT_DEDUPE_PENDING_WAIT = float(os.environ.get('CHAT_DEDUPE_PENDING_WAIT', 2.0))
+
+# 대형 방 모드: 방 접속 수가 이 값 이상이면 group_send 대신 워커별 방 허브(Redis pub/sub 1회 + 프로세스 내 팬아웃)로 전송
+# 0이면 끔 (예: 200). 접속 수는 방마다 CHECK_INTERVAL(초)에 한 번만 조회
+CHAT_LARGE_ROOM_THRESHOLD = int(os.environ.get('CHAT_LARGE_ROOM_THRESHOLD', 0))
+CHAT_LARGE_ROOM_CHECK_INTERVAL = float(os.environ.get('CHAT_LARGE_ROOM_CHECK_INTERVAL', 5))
+
+# 멀티플렉스 WebSocket(ws/multiplex/) 연결 하나당 최대 구독(방 + AI 세션) 수
+CHAT_MULTIPLEX_MAX_SUBSCRIPTIONS = int(os.environ.get('CHAT_MULTIPLEX_MAX_SUBSCRIPTIONS', 100))
+
+# WebSocket 애플리케이션 heartbeat: ping 주기(초, 0이면 끔), pong을 보내는 클라이언트의 응답 대기 한도,
+# pong을 보내지 않는 클라이언트를 포함해 아무 프레임도 없을 때 정리하는 시간(초, 0이면 끔, ping 주기 × 3보다 짧으면 그 값으로 늘림),
+# 정리 시 close code (클라이언트는 이 코드를 받으면 바로 재접속)
+CHAT_WS_PING_INTERVAL = float(os.environ.get('CHAT_WS_PING_INTERVAL', 20))
+CHAT_WS_PONG_TIMEOUT = float(os.environ.get('CHAT_WS_PONG_TIMEOUT', 45))
+CHAT_WS_IDLE_TIMEOUT = float(os.environ.get('CHAT_WS_IDLE_TIMEOUT', 300))
+CHAT_WS_REAP_CLOSE_CODE = int(os.environ.get('CHAT_WS_REAP_CLOSE_CODE', 4009))
+
+# WebSocket drain 모드 (배포 전 연결 분산 종료): 기존 연결을 닫는 데 쓰는 시간(초), reconnect 힌트의 최대 지연(ms),
+# 진행 중인 AI 응답을 기다리는 최대 시간(초), drain_websockets 요청 확인 주기(초),
+# drain_websockets 요청 키 유지 시간(초), drain으로 닫을 때의 close code(1012 = Service Restart)
+CHAT_DRAIN_WINDOW = float(os.environ.get('CHAT_DRAIN_WINDOW', 60))
+CHAT_DRAIN_RECONNECT_JITTER_MS = int(os.environ.get('CHAT_DRAIN_RECONNECT_JITTER_MS', 10000))
+CHAT_DRAIN_AI_GRACE = float(os.environ.get('CHAT_DRAIN_AI_GRACE', 120))
+CHAT_DRAIN_POLL_INTERVAL = float(os.environ.get('CHAT_DRAIN_POLL_INTERVAL', 2))
+CHAT_DRAIN_KEY_TTL = int(os.environ.get('CHAT_DRAIN_KEY_TTL', 3600))
+CHAT_DRAIN_CLOSE_CODE = int(os.environ.get('CHAT_DRAIN_CLOSE_CODE', 1012))
+
+# 사용자별 방 목록(get_my_rooms / current_user) 캐시 TTL(초), 0이면 끔. 멤버십 변경 시 무효화
+CHAT_ROOM_LIST_CACHE_TTL = int(os.environ.get('CHAT_ROOM_LIST_CACHE_TTL', 5))
+
+# 방 목록 / 현재 방 / 메시지 목록 / current_user의 ETag(If-None-Match → 304) 사용 여부와 버전 스탬프 유지 시간(초)
+CHAT_CONDITIONAL_GET_ENABLED = os.environ.get('CHAT_CONDITIONAL_GET_ENABLED', 'True').lower() == 'true'
+CHAT_VERSION_STAMP_TTL = int(os.environ.get('CHAT_VERSION_STAMP_TTL', 60 * 60 * 24))
+
+# request.profile / scope['profile'] 조회 캐시: 프로세스 로컬 LRU 크기와 TTL(초), Redis TTL(초)
+PROFILE_CACHE_LOCAL_SIZE = int(os.environ.get('PROFILE_CACHE_LOCAL_SIZE', 1024))
+PROFILE_CACHE_LOCAL_TTL = float(os.environ.get('PROFILE_CACHE_LOCAL_TTL', 30))
+PROFILE_CACHE_TTL = int(os.environ.get('PROFILE_CACHE_TTL', 600))
+
+# 복호화한 방 TOTP 비밀키 프로세스 로컬 캐시: 최대 방 수와 TTL(초, 0이면 끔). 방 삭제 시 제거
+CHAT_ROOM_SECRET_CACHE_SIZE = int(os.environ.get('CHAT_ROOM_SECRET_CACHE_SIZE', 1024))
+CHAT_ROOM_SECRET_CACHE_TTL = float(os.environ.get('CHAT_ROOM_SECRET_CACHE_TTL', 300))
+
+# 초대 코드: access-code 요청 후 refresh_invite_codes가 다음 창 코드를 계속 미리 등록하는 시간(초)
+CHAT_INVITE_OPEN_SECONDS = int(os.environ.get('CHAT_INVITE_OPEN_SECONDS', 300))